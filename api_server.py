@@ -0,0 +1,624 @@
+"""
+API REST locale : import, évaluation, liste de travail et détail des cas
+
+Permet aux autres systèmes de l'hôpital d'envoyer des images et de lire les
+prédictions et le statut d'annotation, sur les classes de l'application
+(DataManager, IngestionPipeline, RescoreJob).
+
+Serveur HTTP/1.1 asyncio de la bibliothèque standard : une boucle gère les
+connexions (keep-alive) et confie le travail bloquant à des exécuteurs :
+    - stockage : pool de DataManager (APP_API_STORAGE_POOL), un thread par
+      instance ; chaque instance garde son cache des stores d'une requête à
+      l'autre (fichiers relus seulement s'ils ont changé) ;
+    - modèle : un seul thread, modèle chargé au premier appel à /score.
+Les listes sont envoyées en flux (Transfer-Encoding: chunked) et encodées
+par tranches hors de la boucle : les premières lignes partent avant que la
+réponse complète ne soit encodée, et elle n'est jamais assemblée en mémoire.
+
+Points d'accès :
+    GET  /health                         état du serveur (sans authentification)
+    GET  /metrics                        requêtes, erreurs et latences par point d'accès
+    GET  /worklist?status=pending&urgency=Critique&patient_id=P001&limit=100&format=ndjson
+                                         images par priorité, avec prédiction et annotation
+    GET  /cases/<image_id>               image, patient, prédiction, annotation et historique
+    GET  /export/training-data?images=1&split=0&archived=1
+                                         archive ZIP de réentraînement des cas validés
+                                         (archivés compris sauf archived=0), en flux
+    POST /import?filename=x.dcm&urgency=Normale&score=1
+                                         corps : fichier DICOM
+    POST /import                         {"paths": [...], "urgency": "Normale", "score": false}
+                                         fichiers sous APP_API_IMPORT_ROOTS
+    POST /score                          {"image_ids": [...]} (défaut : images en attente)
+
+Usage:
+    python api_server.py [--host 127.0.0.1] [--port 8780] [--data-dir data] [--pool-size 4]
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import re
+import signal
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+from functools import partial
+from http import HTTPStatus
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import config
+from data_manager import DataManager
+from export_service import get_validated_images, iter_training_zip
+from inference_scheduler import URGENCY_LEVELS, priority_level, request_time, urgency_of
+from ingestion_pipeline import IngestionPipeline
+
+# Taille maximale d'un corps de requête (fichier DICOM envoyé)
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# Lignes encodées par tranche d'une réponse en flux
+STREAM_CHUNK_ROWS = 500
+
+class HttpError(Exception):
+    """Erreur renvoyée au client avec son statut HTTP"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'keep_alive')
+    
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes,
+                 keep_alive: bool):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+    
+    def json(self) -> Dict:
+        if not self.body:
+            return {}
+        try:
+            payload = json.loads(self.body)
+        except ValueError as e:
+            raise HttpError(400, f"JSON invalide: {e}")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Objet JSON attendu")
+        return payload
+
+class JsonResponse:
+    def __init__(self, status: int, payload):
+        self.status = status
+        self.payload = payload
+
+class RowStream:
+    """Liste envoyée en flux : JSON {"total": n, "items": [...]} ou une ligne JSON par élément"""
+    
+    def __init__(self, rows: List[Dict], ndjson: bool = False, header: Optional[Dict] = None):
+        self.status = 200
+        self.rows = rows
+        self.ndjson = ndjson
+        self.header = header or {}
+        self.content_type = 'application/x-ndjson' if ndjson else 'application/json'
+    
+    def _encode(self, start: int) -> bytes:
+        rows = self.rows[start:start + STREAM_CHUNK_ROWS]
+        if self.ndjson:
+            return ''.join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows).encode('utf-8')
+        text = ','.join(json.dumps(row, ensure_ascii=False, default=str) for row in rows)
+        return (',' + text if start and text else text).encode('utf-8')
+    
+    async def chunks(self):
+        """Tranches encodées dans un thread, la boucle reste disponible pour les autres requêtes"""
+        loop = asyncio.get_running_loop()
+        if not self.ndjson:
+            fields = ''.join(f"{json.dumps(key)}: {json.dumps(value, default=str)}, " for key, value in self.header.items())
+            yield ('{' + fields + '"items": [').encode('utf-8')
+        for start in range(0, len(self.rows), STREAM_CHUNK_ROWS):
+            yield await loop.run_in_executor(None, self._encode, start)
+        if not self.ndjson:
+            yield b']}'
+
+class FileStream:
+    """Fichier produit par un générateur bloquant, envoyé à mesure de sa production"""
+    
+    def __init__(self, iterator, content_type: str, filename: str):
+        self.status = 200
+        self.iterator = iterator
+        self.content_type = content_type
+        self.filename = filename
+    
+    async def chunks(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, self.iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Client déconnecté : libère les fichiers ouverts par le générateur
+            self.iterator.close()
+
+# ========== Lectures du stockage ==========
+
+def build_worklist(data_manager: DataManager, statuses: Optional[List[str]] = None,
+                   urgencies: Optional[List[str]] = None, patient_id: Optional[str] = None,
+                   limit: int = 0) -> List[Dict]:
+    """
+    Liste de travail : images par priorité (urgence puis ancienneté de la demande)
+    
+    La dernière prédiction et l'annotation courante de chaque image sont
+    jointes en un seul passage sur chaque store.
+    """
+    latest_prediction = {}
+    for prediction in data_manager.get_records('predictions'):
+        latest_prediction[prediction.get('image_id')] = prediction
+    annotations = {annotation.get('image_id'): annotation for annotation in data_manager.get_records('annotations')}
+    
+    images = [
+        img for img in data_manager.get_records('images')
+        if (not statuses or img.get('status', 'pending') in statuses)
+        and (not urgencies or urgency_of(img) in urgencies)
+        and (patient_id is None or img.get('patient_id') == patient_id)
+    ]
+    images.sort(key=lambda img: (priority_level(img), request_time(img)))
+    if limit > 0:
+        images = images[:limit]
+    
+    rows = []
+    for img in images:
+        prediction = latest_prediction.get(img.id)
+        annotation = annotations.get(img.id)
+        rows.append({
+            'image_id': img.id,
+            'patient_id': img.get('patient_id'),
+            'status': img.get('status', 'pending'),
+            'urgency': urgency_of(img),
+            'exam_date': img.get('exam_date'),
+            'modality': img.get('modality'),
+            'station_name': img.get('station_name'),
+            'created_at': img.get('created_at'),
+            'prediction': {
+                'label': prediction.get('label'),
+                'confidence': prediction.get('confidence'),
+                'model_version': prediction.get('model_version')
+            } if prediction else None,
+            'annotation': {
+                'label': annotation.get('label'),
+                'user_role': annotation.get('user_role'),
+                'user_name': annotation.get('user_name'),
+                'version': annotation.get('version'),
+                'created_at': annotation.get('created_at')
+            } if annotation else None,
+            'sent_for_review_at': img.get('sent_for_review_at'),
+            'finalized_at': img.get('finalized_at')
+        })
+    return rows
+
+def case_detail(data_manager: DataManager, image_id: str) -> Optional[Dict]:
+    """Détail d'un cas (None si l'image est inconnue)"""
+    image = data_manager.get_image(image_id)
+    if image is None:
+        return None
+    return {
+        'image': image,
+        'patient': data_manager.get_patient_by_id(image.get('patient_id')),
+        'prediction': data_manager.get_prediction_by_image(image_id),
+        'annotation': data_manager.get_annotation_by_image(image_id),
+        'annotation_history': data_manager.get_annotation_history(image_id)
+    }
+
+def _validated_with_archive(data_manager: DataManager) -> List[Dict]:
+    from archive_manager import ArchiveManager
+    
+    return get_validated_images(data_manager, ArchiveManager(data_manager))
+
+def _write_file(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        with suppress(OSError):
+            os.remove(path)
+
+class DataManagerPool:
+    """DataManager réutilisés d'une requête à l'autre, chacun utilisé par un thread à la fois"""
+    
+    def __init__(self, data_dir: str, size: int):
+        self.size = max(1, size)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(DataManager(data_dir))
+        self.executor = ThreadPoolExecutor(self.size, thread_name_prefix='api-storage')
+    
+    @asynccontextmanager
+    async def acquire(self):
+        data_manager = await self._idle.get()
+        try:
+            yield data_manager
+        finally:
+            self._idle.put_nowait(data_manager)
+    
+    async def run(self, func, *args):
+        """Exécute func(data_manager, *args) dans le pool de stockage"""
+        async with self.acquire() as data_manager:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, data_manager, *args))
+    
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+class _RouteStats:
+    """Requêtes, erreurs et latences (jusqu'au début de la réponse) par point d'accès"""
+    
+    def __init__(self, window: int = 4096):
+        self.window = window
+        self.routes: Dict[str, Dict] = {}
+    
+    def record(self, route: str, status: int, seconds: float):
+        stats = self.routes.setdefault(route, {'count': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)})
+        stats['count'] += 1
+        if status >= 400:
+            stats['errors'] += 1
+        stats['latencies'].append(seconds)
+    
+    def snapshot(self) -> Dict:
+        result = {}
+        for route, stats in self.routes.items():
+            latencies = sorted(stats['latencies'])
+            
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else 0.0
+            
+            result[route] = {'count': stats['count'], 'errors': stats['errors'],
+                             'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99)}
+        return result
+
+class ApiServer:
+    """Serveur HTTP de l'API"""
+    
+    def __init__(self, data_dir: Optional[str] = None, pool_size: Optional[int] = None, token: Optional[str] = None,
+                 import_roots: Optional[List[str]] = None):
+        """
+        Args:
+            data_dir: Répertoire des données (défaut: APP_DATA_DIR)
+            pool_size: DataManager du pool de stockage (défaut: APP_API_STORAGE_POOL)
+            token: Jeton d'accès (défaut: APP_API_TOKEN ; vide: pas d'authentification)
+            import_roots: Répertoires importables par chemin (défaut: APP_API_IMPORT_ROOTS)
+        """
+        self.data_dir = data_dir or config.DATA_DIR
+        self.pool_size = pool_size or config.API_STORAGE_POOL
+        self.token = config.API_TOKEN if token is None else token
+        roots = config.API_IMPORT_ROOTS if import_roots is None else import_roots
+        self.import_roots = [os.path.realpath(root) for root in roots]
+        self.upload_dir = os.path.join(self.data_dir, 'uploads')
+        self.pool: Optional[DataManagerPool] = None
+        self.stats = _RouteStats()
+        self.started_at = time.time()
+        # Modèle : un seul thread, chargé au premier besoin
+        self._model_executor = ThreadPoolExecutor(1, thread_name_prefix='api-model')
+        self._scorer = None
+        self._connections = set()
+        self._routes = [
+            ('GET', re.compile(r'/health$'), 'health', self.health),
+            ('GET', re.compile(r'/metrics$'), 'metrics', self.metrics),
+            ('GET', re.compile(r'/worklist$'), 'worklist', self.worklist),
+            ('GET', re.compile(r'/cases/([^/]+)$'), 'cases', self.case),
+            ('GET', re.compile(r'/export/training-data$'), 'export', self.export_training_data),
+            ('POST', re.compile(r'/import$'), 'import', self.import_files),
+            ('POST', re.compile(r'/score$'), 'score', self.score)
+        ]
+    
+    async def start(self, host: str, port: int) -> asyncio.base_events.Server:
+        """Ouvre le pool de stockage et commence à écouter"""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.pool = DataManagerPool(self.data_dir, self.pool_size)
+        self.started_at = time.time()
+        return await asyncio.start_server(self._serve_connection, host, port)
+    
+    def close(self):
+        # Connexions keep-alive inactives : fin de lecture, leurs tâches se terminent normalement
+        for writer in list(self._connections):
+            writer.close()
+        self._model_executor.shutdown(wait=False)
+        if self.pool is not None:
+            self.pool.executor.shutdown(wait=False)
+    
+    # ========== Protocole HTTP ==========
+    
+    async def _read_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[Request]:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Ligne de requête invalide")
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise HttpError(431, "Trop d'en-têtes")
+        
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HttpError(411, "Corps 'chunked' non pris en charge : indiquer Content-Length")
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Length invalide")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Corps trop volumineux ({length} octets)")
+        if length and headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        body = await reader.readexactly(length) if length else b''
+        
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return Request(method.upper(), unquote(url.path), query, headers, body, keep_alive)
+    
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader, writer)
+                except HttpError as e:
+                    # Corps éventuellement non lu : la connexion est fermée
+                    await self._send(writer, JsonResponse(e.status, {'error': e.message}), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                response = await self._dispatch(request)
+                await self._send(writer, response, request.keep_alive)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+    
+    async def _dispatch(self, request: Request):
+        start = time.perf_counter()
+        route_name = 'inconnu'
+        try:
+            handler, params, route_name = self._route(request)
+            if self.token and route_name != 'health':
+                expected = f"Bearer {self.token}"
+                if not hmac.compare_digest(request.headers.get('authorization', ''), expected):
+                    raise HttpError(401, "Jeton d'accès manquant ou invalide")
+            response = await handler(request, *params)
+        except HttpError as e:
+            response = JsonResponse(e.status, {'error': e.message})
+        except Exception as e:
+            response = JsonResponse(500, {'error': f"Erreur interne: {e}"})
+        self.stats.record(route_name, response.status, time.perf_counter() - start)
+        return response
+    
+    def _route(self, request: Request):
+        allowed = False
+        for method, pattern, name, handler in self._routes:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method:
+                    return handler, match.groups(), name
+                allowed = True
+        if allowed:
+            raise HttpError(405, f"Méthode {request.method} non autorisée sur {request.path}")
+        raise HttpError(404, f"Chemin inconnu: {request.path}")
+    
+    async def _send(self, writer: asyncio.StreamWriter, response, keep_alive: bool):
+        phrase = HTTPStatus(response.status).phrase
+        head = [f"HTTP/1.1 {response.status} {phrase}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if isinstance(response, (RowStream, FileStream)):
+            if isinstance(response, FileStream):
+                head += [f"Content-Type: {response.content_type}",
+                         f'Content-Disposition: attachment; filename="{response.filename}"']
+            else:
+                head.append(f"Content-Type: {response.content_type}; charset=utf-8")
+            head.append("Transfer-Encoding: chunked")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+            async for chunk in response.chunks():
+                if chunk:
+                    writer.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
+                    # Client lent : la production attend que le tampon d'envoi se vide
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            body = json.dumps(response.payload, ensure_ascii=False, default=str).encode('utf-8')
+            head += ["Content-Type: application/json; charset=utf-8", f"Content-Length: {len(body)}"]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+    
+    # ========== Points d'accès ==========
+    
+    async def health(self, request: Request) -> JsonResponse:
+        scorer = self._scorer
+        return JsonResponse(200, {
+            'status': 'ok',
+            'model_loaded': scorer is not None,
+            'model_version': scorer.model_version if scorer else None,
+            'uptime_seconds': round(time.time() - self.started_at, 1)
+        })
+    
+    async def metrics(self, request: Request) -> JsonResponse:
+        return JsonResponse(200, {
+            'routes': self.stats.snapshot(),
+            'storage_pool': {'size': self.pool.size, 'idle': self.pool.idle()},
+            'uptime_seconds': round(time.time() - self.started_at, 1)
+        })
+    
+    async def worklist(self, request: Request) -> RowStream:
+        statuses = [s for s in request.query.get('status', '').split(',') if s] or None
+        urgencies = [u for u in request.query.get('urgency', '').split(',') if u] or None
+        unknown = [u for u in urgencies or [] if u not in URGENCY_LEVELS]
+        if unknown:
+            raise HttpError(400, f"Urgence inconnue: {', '.join(unknown)}")
+        try:
+            limit = int(request.query.get('limit') or 0)
+        except ValueError:
+            raise HttpError(400, "limit doit être un entier")
+        output = request.query.get('format', 'json')
+        if output not in ('json', 'ndjson'):
+            raise HttpError(400, "format: 'json' ou 'ndjson'")
+        
+        rows = await self.pool.run(build_worklist, statuses, urgencies, request.query.get('patient_id'), limit)
+        return RowStream(rows, ndjson=output == 'ndjson', header={'total': len(rows)})
+    
+    async def case(self, request: Request, image_id: str) -> JsonResponse:
+        detail = await self.pool.run(case_detail, image_id)
+        if detail is None:
+            raise HttpError(404, f"Image inconnue: {image_id}")
+        return JsonResponse(200, detail)
+    
+    async def export_training_data(self, request: Request) -> FileStream:
+        if request.query.get('archived', '1').lower() in ('0', 'false', 'no'):
+            validated_images = await self.pool.run(get_validated_images)
+        else:
+            validated_images = await self.pool.run(_validated_with_archive)
+        include_images = request.query.get('images', '1').lower() not in ('0', 'false', 'no')
+        split_dataset = request.query.get('split', '').lower() in ('1', 'true', 'yes')
+        # Une image illisible est omise de l'archive et de labels.csv (statut déjà envoyé)
+        archive = iter_training_zip(validated_images, include_images, split_dataset, warn=lambda message: None)
+        filename = f"training_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return FileStream(archive, 'application/zip', filename)
+    
+    async def import_files(self, request: Request) -> JsonResponse:
+        loop = asyncio.get_running_loop()
+        uploads = []
+        if request.headers.get('content-type', '').split(';')[0].strip() == 'application/json':
+            payload = request.json()
+            paths = payload.get('paths')
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                raise HttpError(400, "'paths' doit être une liste de chemins")
+            for path in paths:
+                real = os.path.realpath(path)
+                if not any(real == root or real.startswith(root + os.sep) for root in self.import_roots):
+                    raise HttpError(403, f"Chemin hors des répertoires autorisés (APP_API_IMPORT_ROOTS): {path}")
+            urgency = payload.get('urgency', 'Normale')
+            score = bool(payload.get('score'))
+        else:
+            if not request.body:
+                raise HttpError(400, "Corps vide : envoyer le fichier DICOM")
+            filename = os.path.basename(request.query.get('filename') or 'upload.dcm')
+            path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}_{filename}")
+            await loop.run_in_executor(None, _write_file, path, request.body)
+            paths = uploads = [path]
+            urgency = request.query.get('urgency', 'Normale')
+            score = request.query.get('score', '').lower() in ('1', 'true', 'yes')
+        if urgency not in URGENCY_LEVELS:
+            raise HttpError(400, f"Urgence inconnue: {urgency}")
+        
+        try:
+            async with self.pool.acquire() as data_manager:
+                results = await IngestionPipeline(data_manager, urgency=urgency).run_async(paths)
+        finally:
+            if uploads:
+                await loop.run_in_executor(None, _remove_files, uploads)
+        
+        items = [{
+            'file': os.path.basename(result['file_path']).split('_', 1)[1] if uploads else result['file_path'],
+            'success': result['success'],
+            'error': result['error'],
+            'image_id': result.get('image_id'),
+            'patient_id': (result.get('metadata') or {}).get('patient_id')
+        } for result in results]
+        
+        image_ids = [item['image_id'] for item in items if item['success']]
+        if score and image_ids:
+            scored = await loop.run_in_executor(self._model_executor, self._score_images, image_ids)
+            for item in items:
+                if item['image_id'] in scored['results']:
+                    item['analysis'] = scored['results'][item['image_id']]
+        status = 200 if all(item['success'] for item in items) else 207
+        return JsonResponse(status, {'results': items})
+    
+    async def score(self, request: Request) -> JsonResponse:
+        image_ids = request.json().get('image_ids')
+        if image_ids is not None and (not isinstance(image_ids, list)
+                                      or not all(isinstance(image_id, str) for image_id in image_ids)):
+            raise HttpError(400, "'image_ids' doit être une liste d'identifiants")
+        result = await asyncio.get_running_loop().run_in_executor(self._model_executor, self._score_images, image_ids)
+        return JsonResponse(200, result)
+    
+    # ========== Modèle (thread dédié) ==========
+    
+    def _get_scorer(self):
+        if self._scorer is None:
+            from model_interface import ModelInterface
+            from rescore_job import RescoreJob
+            
+            # Version figée : redémarrer le serveur pour servir une nouvelle version du registre
+            model_interface = ModelInterface(follow_registry=False)
+            if model_interface.model is None:
+                raise HttpError(503, "Modèle non chargé")
+            self._scorer = RescoreJob(DataManager(self.data_dir), model_interface)
+        return self._scorer
+    
+    def _score_images(self, image_ids: Optional[List[str]]) -> Dict:
+        """Évalue des images (toutes celles en attente si image_ids est None) et enregistre les résultats"""
+        scorer = self._get_scorer()
+        if image_ids is None:
+            images = scorer.select_images(['pending'], retry_failed=True)
+            results = {}
+        else:
+            by_id = {img.id: img for img in scorer.data_manager.get_records('images') if img.get('image_path')}
+            images = [by_id[image_id] for image_id in dict.fromkeys(image_ids) if image_id in by_id]
+            results = {image_id: {'error': "Image inconnue ou sans fichier"} for image_id in image_ids
+                       if image_id not in by_id}
+        
+        for start in range(0, len(images), scorer.batch_size):
+            predictions, failed = scorer.score_and_save(images[start:start + scorer.batch_size])
+            for prediction in predictions:
+                results[prediction['image_id']] = {'label': prediction['label'], 'confidence': prediction['confidence'],
+                                                   'prediction_id': prediction['id']}
+            results.update({image_id: {'error': error} for image_id, error in failed.items()})
+        return {'model_version': scorer.model_version, 'results': results}
+
+async def serve(host: str, port: int, data_dir: str, pool_size: int):
+    api = ApiServer(data_dir, pool_size)
+    server = await api.start(host, port)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f"✅ API sur http://{host}:{port} (données: {data_dir}, pool de stockage: {api.pool.size})")
+    if not api.token:
+        print("⚠️  Aucun jeton d'accès (APP_API_TOKEN) : réserver l'écoute à la machine locale")
+    async with server:
+        await stop.wait()
+        server.close()
+        api.close()
+        await asyncio.sleep(0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=config.API_HOST)
+    parser.add_argument('--port', type=int, default=config.API_PORT)
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--pool-size', type=int, default=config.API_STORAGE_POOL, help="DataManager du pool de stockage")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.data_dir, args.pool_size))
+
+if __name__ == "__main__":
+    main()
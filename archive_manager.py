@@ -0,0 +1,264 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import config
+from record_deltas import reconstruct_versions
+from storage_codecs import decode_payload
+from storage_io import atomic_write_bytes, file_lock, StorageCorruptionError
+
+class ArchiveManager:
+    """
+    Archivage des cas finalisés (stockage froid)
+    
+    Les cas finalisés depuis plus de `max_age_days` jours sont déplacés hors
+    des fichiers actifs vers des segments JSON compressés (gzip), partitionnés
+    par mois de finalisation (ex: data/archive/segments/2024-03.json.gz).
+    Un index (data/archive/index.json) associe chaque image archivée à son
+    segment pour permettre une consultation à la demande.
+    """
+    
+    SEGMENT_KEYS = ('images', 'predictions', 'annotations', 'annotation_history', 'audit_log')
+    
+    def __init__(self, data_manager, archive_dir: Optional[str] = None,
+                 max_age_days: Optional[int] = None):
+        """
+        Initialise le gestionnaire d'archives
+        
+        Args:
+            data_manager: Instance de DataManager (stockage actif)
+            archive_dir: Répertoire des archives (par défaut: <data_dir>/archive)
+            max_age_days: Âge minimal d'un cas finalisé avant archivage
+        """
+        self.data_manager = data_manager
+        self.archive_dir = archive_dir or os.path.join(data_manager.data_dir, 'archive')
+        self.segments_dir = os.path.join(self.archive_dir, 'segments')
+        self.index_file = os.path.join(self.archive_dir, 'index.json')
+        self.max_age_days = config.ARCHIVE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        
+        # Cache des segments déjà décompressés: nom -> (mtime, contenu)
+        self._segment_cache = {}
+        
+        os.makedirs(self.segments_dir, exist_ok=True)
+    
+    # ========== Index ==========
+    
+    def _load_index(self) -> Dict:
+        """Charge l'index des archives (un index illisible n'est jamais remplacé par un index vide)"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'images': {}, 'segments': {}}
+        except json.JSONDecodeError as e:
+            raise StorageCorruptionError(f"Index d'archive illisible: {self.index_file} ({e})") from e
+    
+    def _save_index(self, index: Dict):
+        """Sauvegarde l'index des archives (écriture atomique)"""
+        atomic_write_bytes(self.index_file, json.dumps(index, ensure_ascii=False, default=str).encode('utf-8'))
+    
+    # ========== Segments ==========
+    
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.segments_dir, f"{segment}.json.gz")
+    
+    @staticmethod
+    def _segment_name(finalized_at: str) -> str:
+        """Nom de partition (AAAA-MM) à partir de la date de finalisation"""
+        return (finalized_at or '')[:7] or 'undated'
+    
+    def load_segment(self, segment: str) -> Dict[str, List[Dict]]:
+        """Charge (et met en cache) le contenu d'un segment d'archive"""
+        path = self._segment_path(segment)
+        if not os.path.exists(path):
+            return {key: [] for key in self.SEGMENT_KEYS}
+        
+        mtime = os.path.getmtime(path)
+        cached = self._segment_cache.get(segment)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        with gzip.open(path, 'rb') as f:
+            content = decode_payload(f.read())
+        for key in self.SEGMENT_KEYS:
+            content.setdefault(key, [])
+        
+        self._segment_cache[segment] = (mtime, content)
+        return content
+    
+    def _write_segment(self, segment: str, content: Dict[str, List[Dict]]):
+        """Écrit un segment compressé (écriture atomique)"""
+        atomic_write_bytes(self._segment_path(segment), gzip.compress(self.data_manager.codec.encode(content)))
+        self._segment_cache.pop(segment, None)
+    
+    def list_segments(self) -> Dict[str, Dict]:
+        """Liste les segments avec leur nombre d'images"""
+        return self._load_index().get('segments', {})
+    
+    # ========== Archivage ==========
+    
+    def archive_finalized_cases(self, user_name: str, max_age_days: Optional[int] = None,
+                                now: Optional[datetime] = None) -> Dict:
+        """
+        Déplace les cas finalisés anciens vers les segments d'archive
+        
+        Les segments et l'index sont écrits avant la purge des fichiers actifs :
+        une interruption laisse au pire un cas présent des deux côtés, et
+        l'exécution suivante termine la purge sans dupliquer l'archive.
+        L'index et les stores actifs restent verrouillés pendant toute
+        l'opération (plusieurs processus peuvent lancer l'archivage).
+        
+        Args:
+            user_name: Utilisateur à l'origine de l'archivage (journalisé)
+            max_age_days: Âge minimal depuis la finalisation (défaut: configuration)
+            now: Date de référence (défaut: maintenant)
+        
+        Returns:
+            Dictionnaire avec le nombre d'images archivées et les segments modifiés
+        """
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).isoformat()
+        
+        with file_lock(self.index_file), self.data_manager.case_store_lock():
+            candidates = self.data_manager.get_finalized_images(finalized_before=cutoff)
+            if not candidates:
+                return {'archived': 0, 'segments': []}
+            
+            image_ids = [img['id'] for img in candidates]
+            records = self.data_manager.collect_case_records(image_ids)
+            index = self._load_index()
+            
+            # Regrouper les enregistrements par segment (mois de finalisation)
+            segment_of = {img['id']: self._segment_name(img.get('finalized_at')) for img in records['images']}
+            by_segment = {}
+            for key in self.SEGMENT_KEYS:
+                for record in records[key]:
+                    if key == 'images':
+                        owner = record['id']
+                    elif key == 'audit_log':
+                        details = record.get('details') or {}
+                        owner = details.get('image_id') or details.get('image_ids', [None])[0]
+                    else:
+                        owner = record.get('image_id')
+                    
+                    segment = segment_of.get(owner)
+                    if segment is None:
+                        continue
+                    by_segment.setdefault(segment, {k: [] for k in self.SEGMENT_KEYS})[key].append(record)
+            
+            archived_at = datetime.now().isoformat()
+            for segment, new_records in by_segment.items():
+                # Un cas déjà présent (exécution interrompue) n'est pas dupliqué
+                content = self.load_segment(segment)
+                known_ids = {key: {r.get('id') for r in content[key]} for key in self.SEGMENT_KEYS}
+                for key in self.SEGMENT_KEYS:
+                    content[key].extend(r for r in new_records[key] if r.get('id') not in known_ids[key])
+                self._write_segment(segment, content)
+                
+                for img in new_records['images']:
+                    index['images'][img['id']] = {
+                        'segment': segment,
+                        'patient_id': img.get('patient_id'),
+                        'exam_date': img.get('exam_date'),
+                        'finalized_at': img.get('finalized_at')
+                    }
+                index['segments'][segment] = {
+                    'images': len(content['images']),
+                    'updated_at': archived_at
+                }
+            
+            self._save_index(index)
+            self.data_manager.purge_case_records(image_ids)
+        
+        self.data_manager._log_change(user_name, 'cases_archived', {
+            'count': len(image_ids),
+            'segments': sorted(by_segment.keys()),
+            'max_age_days': max_age_days
+        })
+        
+        return {'archived': len(image_ids), 'segments': sorted(by_segment.keys())}
+    
+    # ========== Consultation ==========
+    
+    def is_archived(self, image_id: str) -> bool:
+        """Vérifie si une image est archivée"""
+        return image_id in self._load_index().get('images', {})
+    
+    def find_archived_images(self, patient_id: Optional[str] = None,
+                             finalized_from: Optional[str] = None,
+                             finalized_to: Optional[str] = None) -> List[Dict]:
+        """
+        Recherche dans l'index sans décompresser les segments
+        
+        Args:
+            patient_id: Filtrer par ID patient
+            finalized_from: Date ISO minimale de finalisation
+            finalized_to: Date ISO maximale de finalisation
+        
+        Returns:
+            Liste d'entrées d'index (image_id, segment, patient_id, dates)
+        """
+        results = []
+        for image_id, entry in self._load_index().get('images', {}).items():
+            finalized_at = entry.get('finalized_at') or ''
+            if patient_id and entry.get('patient_id') != patient_id:
+                continue
+            if finalized_from and finalized_at < finalized_from:
+                continue
+            if finalized_to and finalized_at > finalized_to:
+                continue
+            results.append({'image_id': image_id, **entry})
+        return results
+    
+    @staticmethod
+    def _concerns(entry: Dict, image_id: str) -> bool:
+        """Entrée du journal portant sur l'image (seule ou dans un lot)"""
+        details = entry.get('details') or {}
+        return details.get('image_id') == image_id or image_id in (details.get('image_ids') or [])
+    
+    def iter_archived_cases(self) -> Iterator[Dict]:
+        """
+        Parcourt les cas archivés, segment par segment (export)
+        
+        Yields:
+            {'image': image, 'annotation': annotation courante ou None,
+             'prediction': prédiction la plus récente ou None}
+        """
+        for segment in sorted(self.list_segments()):
+            content = self.load_segment(segment)
+            annotations = {a.get('image_id'): a for a in content['annotations']}
+            predictions = {p.get('image_id'): p for p in content['predictions']}
+            for image in content['images']:
+                yield {
+                    'image': image,
+                    'annotation': annotations.get(image['id']),
+                    'prediction': predictions.get(image['id'])
+                }
+    
+    def get_archived_case(self, image_id: str) -> Optional[Dict]:
+        """
+        Reconstitue un cas archivé (image, prédiction, annotations, journal)
+        
+        Seul le segment contenant l'image est décompressé.
+        """
+        entry = self._load_index().get('images', {}).get(image_id)
+        if not entry:
+            return None
+        
+        content = self.load_segment(entry['segment'])
+        image = next((img for img in content['images'] if img['id'] == image_id), None)
+        if not image:
+            return None
+        
+        annotation = next((a for a in content['annotations'] if a.get('image_id') == image_id), None)
+        deltas = [d for d in content['annotation_history'] if d.get('image_id') == image_id]
+        return {
+            'image': image,
+            'prediction': next((p for p in content['predictions'] if p.get('image_id') == image_id), None),
+            'annotation': annotation,
+            'annotations': reconstruct_versions(annotation, deltas) if annotation else [],
+            'audit_log': [e for e in content['audit_log'] if self._concerns(e, image_id)],
+            'patient': self.data_manager.get_patient_by_id(image.get('patient_id'))
+        }
@@ -0,0 +1,131 @@
+"""
+Benchmark du décodage parallèle remis au processus d'inférence
+
+Pour des fichiers DICOM simulés (generate_test_data.py, 512x512 16 bits)
+et les PNG de images-test/, mesure le débit jusqu'au lot float32 prêt pour
+le modèle (BatchPreprocessor.to_batch) :
+    - threads          : BatchPreprocessor.decode_many (processus unique)
+    - processus pickle : ProcessPoolExecutor, tenseurs uint8 renvoyés par tube
+    - processus f32    : idem, tenseurs float32 (768 Ko par image)
+    - anneau partagé   : DecodePool (shm_ring.py), aucun pixel sérialisé
+
+Vérifie aussi que les lots sont identiques quelle que soit la variante.
+
+Usage:
+    python benchmark_decode.py [--count 256] [--processes 4] [--batch-size 32]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from convert_model import list_test_images
+from generate_test_data import create_test_dicom
+from image_preprocessing import BatchPreprocessor, decode_file
+from shm_ring import DecodePool
+
+def decode_float32(path: str) -> np.ndarray:
+    return decode_file(path).astype(np.float32)
+
+def run_threads(paths: list, workers: int, batch_size: int) -> dict:
+    preprocessor = BatchPreprocessor(workers=workers)
+    batches = {}
+    for start in range(0, len(paths), batch_size):
+        batch = preprocessor.to_batch(preprocessor.decode_many(paths[start:start + batch_size]))
+        for offset, pixels in enumerate(batch):
+            batches[start + offset] = float(pixels.sum())
+    preprocessor.close()
+    return batches
+
+def run_pickle(paths: list, executor: ProcessPoolExecutor, decode, batch_size: int) -> dict:
+    preprocessor = BatchPreprocessor(workers=1)
+    batches = {}
+    for start in range(0, len(paths), batch_size):
+        batch = preprocessor.to_batch(list(executor.map(decode, paths[start:start + batch_size])))
+        for offset, pixels in enumerate(batch):
+            batches[start + offset] = float(pixels.sum())
+    return batches
+
+def run_ring(paths: list, pool: DecodePool) -> dict:
+    preprocessor = BatchPreprocessor(workers=1)
+    batches = {}
+    for indices, views, errors in pool.iter_batches(paths):
+        assert not errors, errors
+        batch = preprocessor.to_batch(views)
+        del views
+        for index, pixels in zip(indices, batch):
+            batches[index] = float(pixels.sum())
+    return batches
+
+def measure(name: str, func, count: int, repeat: int = 3) -> dict:
+    """Meilleur de plusieurs passages"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return {'name': name, 'seconds': best, 'rate': count / best, 'result': result}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=256, help="Fichiers par jeu")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            dicoms = []
+            for i in range(min(args.count, 32)):
+                path = os.path.join(work_dir, f"P{i:04d}.dcm")
+                create_test_dicom(f"P{i:04d}", path, is_sick=i % 2 == 0)
+                dicoms.append(path)
+        pngs = list_test_images('images-test')
+        datasets = {
+            'DICOM 512x512': [dicoms[i % len(dicoms)] for i in range(args.count)],
+            'PNG images-test': [pngs[i % len(pngs)] for i in range(args.count)]
+        }
+        
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(args.processes, mp_context=context)
+        pool = DecodePool(args.processes, batch_size=args.batch_size)
+        # Démarrage des processus hors mesure
+        list(executor.map(decode_file, pngs[:args.processes]))
+        run_ring(pngs[:args.processes], pool)
+        
+        sample = decode_file(pngs[0])
+        print(f"Benchmark décodage: {args.count} fichiers par jeu, {args.processes} processus/threads, "
+              f"lots de {args.batch_size}")
+        print(f"Sérialisé par image : uint8 {len(pickle.dumps(sample)) / 1024:.0f} Ko, "
+              f"float32 {len(pickle.dumps(sample.astype(np.float32))) / 1024:.0f} Ko ; anneau : "
+              f"{len(pickle.dumps((1, 0, 0, 3, None)))} octets")
+        print("=" * 64)
+        print(f"{'Jeu':<18}{'Variante':<20}{'Temps (s)':>12}{'Images/s':>12}")
+        try:
+            for dataset, paths in datasets.items():
+                runs = [
+                    measure('threads', lambda: run_threads(paths, args.processes, args.batch_size), len(paths)),
+                    measure('processus pickle', lambda: run_pickle(paths, executor, decode_file, args.batch_size), len(paths)),
+                    measure('processus f32', lambda: run_pickle(paths, executor, decode_float32, args.batch_size), len(paths)),
+                    measure('anneau partagé', lambda: run_ring(paths, pool), len(paths))
+                ]
+                reference = runs[0]['result']
+                for run in runs:
+                    identical = "" if run['result'] == reference else "  (lots différents !)"
+                    print(f"{dataset:<18}{run['name']:<20}{run['seconds']:>12.3f}{run['rate']:>12.0f}{identical}")
+        finally:
+            executor.shutdown()
+            pool.close()
+        print("=" * 64)
+        print(f"Cœurs disponibles: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark de l'export des cas validés (CSV et JSON complet)
+
+Génère un répertoire de données temporaire (patients, images, prédictions
+dont une partie réévaluée par une seconde version, annotations médicales)
+puis mesure :
+    - avant : recherches par ligne (get_patient_by_id / get_prediction_by_image),
+              mesurées sur un échantillon et extrapolées à tous les cas
+    - jointure : index construits une fois (build_export_index)
+    - export : generate_export complet (CSV + JSON écrits par tranches)
+
+Usage:
+    python benchmark_export.py [--cases 100000] [--legacy-sample 500]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from data_manager import DataManager
+from export_service import build_export_index, generate_export, get_validated_images
+
+def seed_data(data_manager: DataManager, count: int):
+    """Stores simulés, écrits directement (un fichier par store)"""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    patients = [{
+        'id': f"pat_{i}",
+        'patient_id': f"PATIENT_{i:06d}",
+        'metadata': {'sex': rng.choice('MF'), 'age': rng.randint(18, 95), 'institution_name': 'CHU',
+                     'station_name': rng.choice(['URGENCES', 'RADIO-01'])},
+        'created_at': (start + timedelta(minutes=i)).isoformat()
+    } for i in range(count // 4)]
+    images, predictions, annotations = [], [], []
+    for i in range(count):
+        created = start + timedelta(minutes=i)
+        patient_id = f"PATIENT_{i % len(patients):06d}"
+        images.append({
+            'id': f"img_{i}",
+            'patient_id': patient_id,
+            'image_path': f"data/images/{patient_id}_{i:06d}.png",
+            'exam_date': created.strftime("%Y-%m-%d"),
+            'modality': 'CR',
+            'body_part': 'CHEST',
+            'view_position': rng.choice(['PA', 'AP']),
+            'created_at': created.isoformat(),
+            'status': 'validated'
+        })
+        for version in ['v1', 'v2'] if i % 3 == 0 else ['v1']:
+            predictions.append({
+                'id': f"pred_{len(predictions)}",
+                'image_id': f"img_{i}",
+                'patient_id': patient_id,
+                'label': rng.choice(['malade', 'sain']),
+                'confidence': round(rng.random(), 4),
+                'raw_prediction': rng.random(),
+                'model_version': version,
+                'created_at': created.isoformat()
+            })
+        annotations.append({
+            'id': f"ann_{i}",
+            'image_id': f"img_{i}",
+            'patient_id': patient_id,
+            'label': rng.choice(['malade', 'sain']),
+            'confidence': round(rng.random(), 2),
+            'notes': '',
+            'additional_info': {
+                'symptoms': 'Toux, fièvre',
+                'spo2': rng.randint(85, 100),
+                'temperature': round(rng.uniform(36.0, 40.0), 1),
+                'ground_truth': 'Confirmé'
+            } if i % 2 else {},
+            'user_name': 'Dr Test',
+            'user_role': 'Médecin',
+            'created_at': created.isoformat(),
+            'version': 1
+        })
+    data_manager._save_json(data_manager.patients_file, patients)
+    data_manager._save_json(data_manager.images_file, images)
+    data_manager._save_json(data_manager.predictions_file, predictions)
+    data_manager._save_json(data_manager.annotations_file, annotations)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=100_000)
+    parser.add_argument('--legacy-sample', type=int, default=500, help="Cas mesurés pour l'extrapolation 'avant'")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        data_manager = DataManager(os.path.join(directory, 'data'))
+        seed_data(data_manager, args.cases)
+        validated_images = get_validated_images(data_manager)
+        
+        print(f"Benchmark export: {len(validated_images)} cas validés")
+        print("=" * 60)
+        
+        sample = validated_images[::max(1, len(validated_images) // args.legacy_sample)]
+        start = time.perf_counter()
+        for v in sample:
+            data_manager.get_patient_by_id(v['image'].get('patient_id'))
+            data_manager.get_prediction_by_image(v['image']['id'])
+        legacy = (time.perf_counter() - start) / len(sample) * len(validated_images)
+        print(f"{'avant (recherches par ligne, extrapolé)':<44}{legacy:>12.2f} s")
+        
+        start = time.perf_counter()
+        build_export_index(data_manager)
+        print(f"{'jointure (index construits une fois)':<44}{time.perf_counter() - start:>12.2f} s")
+        
+        for formats in (['csv'], ['json'], ['csv', 'json']):
+            start = time.perf_counter()
+            files = generate_export(data_manager, validated_images, formats, export_root=os.path.join(directory, 'exports'))
+            elapsed = time.perf_counter() - start
+            size_mb = sum(os.path.getsize(path) for path in files.values()) / (1024 * 1024)
+            print(f"{'export ' + ' + '.join(formats).upper():<44}{elapsed:>12.2f} s  ({size_mb:.0f} Mo)")
+            time.sleep(1)  # Répertoire d'export horodaté à la seconde
+        print("=" * 60)
+        print("'avant' : recherches seules, sans l'écriture des fichiers")
+
+if __name__ == "__main__":
+    main()
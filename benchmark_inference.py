@@ -0,0 +1,107 @@
+"""
+Benchmark des moteurs d'inférence (Keras, TFLite, ONNX)
+
+Chaque moteur est mesuré dans un processus séparé (démarrage à froid) :
+    - démarrage : import de ModelInterface + chargement du modèle
+    - mémoire   : RSS maximale du processus
+    - latence   : prédiction d'une image (médiane)
+    - débit     : images par seconde sur des lots de --batch-size images
+
+Les modèles .tflite / .onnx doivent avoir été produits par convert_model.py
+(et quantize_model.py pour les variantes int8 / float16).
+
+Usage:
+    python benchmark_inference.py [--images images-test] [--batch-size 32] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+def run_worker(backend: str, model_path: str, images_dir: str, batch_size: int, repeat: int) -> dict:
+    """Mesures effectuées dans le processus enfant"""
+    start = time.perf_counter()
+    from model_interface import ModelInterface
+    interface = ModelInterface(model_path, backend=backend)
+    startup = time.perf_counter() - start
+    if interface.model is None:
+        raise RuntimeError(f"Modèle non chargé: {model_path}")
+    
+    import numpy as np
+    from convert_model import list_test_images
+    
+    image_paths = list_test_images(images_dir)
+    single = interface._preprocess_image(image_paths[0])
+    arrays = [interface._preprocess_image(path) for path in image_paths]
+    batch = np.concatenate([arrays[i % len(arrays)] for i in range(batch_size)])
+    
+    # Premier appel hors mesure (allocation des tenseurs)
+    interface._predict_array(single)
+    interface._predict_array(batch)
+    
+    latencies = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        interface._predict_array(single)
+        latencies.append(time.perf_counter() - t0)
+    
+    t0 = time.perf_counter()
+    for _ in range(max(1, repeat // 4)):
+        interface._predict_array(batch)
+    throughput = max(1, repeat // 4) * batch_size / (time.perf_counter() - t0)
+    
+    return {
+        'startup_s': startup,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'latency_ms': float(np.median(latencies)) * 1000,
+        'throughput': throughput
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='images-test')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--worker', nargs=2, metavar=('BACKEND', 'MODEL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        result = run_worker(args.worker[0], args.worker[1], args.images, args.batch_size, args.repeat)
+        print(json.dumps(result))
+        return
+    
+    print(f"Benchmark inférence: lots de {args.batch_size}, {args.repeat} répétitions")
+    print("=" * 72)
+    print(f"{'Moteur':<10}{'Démarrage (s)':>15}{'RSS (Mo)':>12}{'Latence (ms)':>15}{'Débit (img/s)':>18}")
+    
+    variants = [
+        ('keras', 'keras', 'model.h5'),
+        ('tflite', 'tflite', 'model.tflite'),
+        ('onnx', 'onnx', 'model.onnx'),
+        ('int8', 'tflite', 'model_int8.tflite'),
+        ('float16', 'tflite', 'model_float16.tflite')
+    ]
+    for name, backend, model_path in variants:
+        if not os.path.exists(model_path):
+            print(f"{name:<10}absent ({model_path})")
+            continue
+        completed = subprocess.run(
+            [sys.executable, __file__, '--images', args.images, '--batch-size', str(args.batch_size),
+             '--repeat', str(args.repeat), '--worker', backend, model_path],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            print(f"{name:<10}échec ({completed.stderr.strip().splitlines()[-1]})")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{name:<10}{result['startup_s']:>15.2f}{result['rss_mb']:>12.0f}"
+              f"{result['latency_ms']:>15.2f}{result['throughput']:>18.0f}")
+    
+    print("=" * 72)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark de l'import DICOM : séquentiel contre pipeline à étapes
+
+Génère des fichiers DICOM simulés (generate_test_data.py) puis les importe
+dans des répertoires de données temporaires :
+    - séquentiel : DICOMImporter.import_batch puis add_patient / add_image
+                   par fichier (ancien import de la vue préparateur)
+    - pipeline   : IngestionPipeline avec threads, puis avec processus de
+                   décodage (--processes)
+
+Affiche le débit de chaque variante et, pour le pipeline, les métriques par
+étape (débit, occupation des workers, profondeur maximale des files).
+
+Usage:
+    python benchmark_ingestion.py [--count 500] [--workers 4] [--processes 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from data_manager import DataManager
+from dicom_importer import DICOMImporter
+from generate_test_data import create_test_dicom
+from ingestion_pipeline import IngestionPipeline, image_data, patient_metadata
+
+def import_sequential(data_dir: str, file_paths: list) -> int:
+    data_manager = DataManager(data_dir)
+    results = DICOMImporter().import_batch(file_paths, os.path.join(data_dir, 'images'))
+    for result in results:
+        if result['success']:
+            data_manager.add_patient(result['metadata']['patient_id'], patient_metadata(result['metadata']))
+            data_manager.add_image(image_data(result))
+    return sum(1 for result in results if result['success'])
+
+def import_pipeline(data_dir: str, file_paths: list, workers: int, processes: int) -> tuple:
+    pipeline = IngestionPipeline(DataManager(data_dir), workers=workers, decode_processes=processes)
+    results = pipeline.run(file_paths)
+    return sum(1 for result in results if result['success']), pipeline.metrics()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=500, help="Nombre de fichiers DICOM")
+    parser.add_argument('--workers', type=int, default=4, help="Threads par étape du pipeline")
+    parser.add_argument('--processes', type=int, default=4, help="Processus de décodage (0: ignorer)")
+    args = parser.parse_args()
+    
+    work_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    try:
+        source_dir = os.path.join(work_dir, 'dicom')
+        os.makedirs(source_dir)
+        file_paths = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.count):
+                path = os.path.join(source_dir, f"IMG{i:05d}.dcm")
+                create_test_dicom(f"P{i // 2:05d}", path, is_sick=i % 3 == 0)
+                file_paths.append(path)
+        
+        print(f"Benchmark import: {args.count} fichiers DICOM 512x512, {os.cpu_count()} cœur(s)")
+        print("=" * 64)
+        print(f"{'Variante':<28}{'Temps (s)':>12}{'Fichiers/s':>12}{'Importés':>12}")
+        
+        start = time.perf_counter()
+        imported = import_sequential(os.path.join(work_dir, 'sequential'), file_paths)
+        elapsed = time.perf_counter() - start
+        print(f"{'séquentiel':<28}{elapsed:>12.2f}{args.count / elapsed:>12.1f}{imported:>12}")
+        
+        variants = [('pipeline (threads)', 0)]
+        if args.processes:
+            variants.append((f"pipeline ({args.processes} processus)", args.processes))
+        all_metrics = []
+        for name, processes in variants:
+            start = time.perf_counter()
+            imported, metrics = import_pipeline(os.path.join(work_dir, f'pipeline_{processes}'), file_paths,
+                                                args.workers, processes)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<28}{elapsed:>12.2f}{args.count / elapsed:>12.1f}{imported:>12}")
+            all_metrics.append((name, metrics))
+        
+        for name, metrics in all_metrics:
+            print(f"\n{name} : métriques par étape")
+            print(f"{'Étape':<18}{'Workers':>8}{'Débit/s':>10}{'Occupation':>12}{'File max':>10}")
+            for stage, values in metrics['stages'].items():
+                print(f"{stage:<18}{values['workers']:>8}{values['per_second']:>10.1f}"
+                      f"{values['busy_ratio']:>12.0%}{values['queue_max']:>6}/{values['queue_capacity']:<3}")
+        print("=" * 64)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark de latence par appel selon la taille de lot
+
+Pour chaque variante (processus séparé) et chaque taille de lot, mesure la
+latence d'un appel au modèle : médiane (p50) et 99e centile (p99).
+Variantes :
+    - keras predict()  : model.predict(lot, verbose=0), boucle générique de Keras
+    - keras direct     : appel direct model(lot) (APP_MODEL_COMPILE=0)
+    - keras compilé    : tf.function à signature fixe, préchauffée (défaut)
+    - keras XLA        : tf.function compilée par XLA (APP_MODEL_XLA=1)
+    - tflite / onnx    : si model.tflite / model.onnx existent
+
+Les réglages de threads et d'affinité (APP_INFERENCE_INTRA_OP_THREADS,
+APP_INFERENCE_INTER_OP_THREADS, APP_CPU_AFFINITY) sont transmis aux
+processus de mesure.
+
+Usage:
+    python benchmark_latency.py [--sizes 1,2,4,8,16,32,64] [--repeat 30] [--variants keras-compile,keras-xla]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# nom: (moteur, fichier, variables d'environnement, appel par model.predict)
+VARIANTS = {
+    'keras-predict': ('keras', 'model.h5', {'APP_MODEL_COMPILE': '0', 'APP_MODEL_XLA': '0'}, True),
+    'keras-direct': ('keras', 'model.h5', {'APP_MODEL_COMPILE': '0', 'APP_MODEL_XLA': '0'}, False),
+    'keras-compile': ('keras', 'model.h5', {'APP_MODEL_COMPILE': '1', 'APP_MODEL_XLA': '0'}, False),
+    'keras-xla': ('keras', 'model.h5', {'APP_MODEL_COMPILE': '1', 'APP_MODEL_XLA': '1'}, False),
+    'tflite': ('tflite', 'model.tflite', {}, False),
+    'onnx': ('onnx', 'model.onnx', {}, False)
+}
+
+def run_worker(variant: str, sizes: list, repeat: int) -> dict:
+    """Mesures effectuées dans le processus enfant"""
+    import numpy as np
+    import config
+    from model_backends import get_backend_class
+    
+    backend_name, model_path, _, use_predict = VARIANTS[variant]
+    # La taille maximale mesurée est préchauffée comme une taille servie
+    config.INFERENCE_BATCH_SIZE = max(sizes)
+    start = time.perf_counter()
+    backend = get_backend_class(backend_name)(model_path)
+    load_s = time.perf_counter() - start
+    
+    if use_predict:
+        call = lambda batch: backend.model.predict(batch, verbose=0)
+    else:
+        call = backend.predict
+    
+    rng = np.random.default_rng(0)
+    shape = tuple(backend.input_shape[1:])
+    results = {'load_s': load_s, 'sizes': {}}
+    for size in sizes:
+        batch = rng.integers(0, 256, (size,) + shape).astype(np.float32)
+        call(batch)  # allocation des tenseurs pour cette taille
+        latencies = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            call(batch)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results['sizes'][str(size)] = {
+            'p50': float(np.percentile(latencies, 50)),
+            'p99': float(np.percentile(latencies, 99))
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,2,4,8,16,32,64', help="Tailles de lot, séparées par des virgules")
+    parser.add_argument('--repeat', type=int, default=30, help="Appels mesurés par taille de lot")
+    parser.add_argument('--variants', default=','.join(VARIANTS), help="Variantes à mesurer")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, sizes, args.repeat)))
+        return
+    
+    print(f"Benchmark latence: {args.repeat} appels par taille de lot, p50 / p99 en ms")
+    header = ''.join(f"{size:>14}" for size in sizes)
+    print("=" * (26 + 14 * len(sizes)))
+    print(f"{'Variante':<16}{'Charg. (s)':>10}{header}")
+    
+    for variant in args.variants.split(','):
+        backend_name, model_path, env, _ = VARIANTS[variant]
+        if not os.path.exists(model_path):
+            print(f"{variant:<16}absent ({model_path})")
+            continue
+        completed = subprocess.run(
+            [sys.executable, __file__, '--sizes', args.sizes, '--repeat', str(args.repeat), '--worker', variant],
+            capture_output=True, text=True, env=dict(os.environ, **env)
+        )
+        if completed.returncode != 0:
+            print(f"{variant:<16}échec ({completed.stderr.strip().splitlines()[-1]})")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        cells = ''.join(
+            f"{result['sizes'][str(size)]['p50']:>7.1f}/{result['sizes'][str(size)]['p99']:<6.1f}"
+            for size in sizes
+        )
+        print(f"{variant:<16}{result['load_s']:>10.2f}{cells}")
+    
+    print("=" * (26 + 14 * len(sizes)))
+    print("Chargement : lecture du modèle + préchauffage (traçage / compilation XLA)")
+
+if __name__ == "__main__":
+    main()
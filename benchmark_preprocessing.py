@@ -0,0 +1,115 @@
+"""
+Benchmark du prétraitement des images (image_preprocessing)
+
+Compare keras.utils.load_img + img_to_array (implémentation historique) au
+mode exact et au mode rapide, séquentiels et en lot multi-threadé, sur :
+    - images-test/ (PNG d'origine)
+    - les mêmes images réencodées en JPEG 1024x1024 (aperçus) et 2048x2048
+      (imports d'images simples)
+
+Vérifie aussi que le mode exact est identique au bit près à load_img et
+mesure l'écart du mode rapide (pixels et probabilités du modèle).
+
+Usage:
+    python benchmark_preprocessing.py [--images images-test] [--repeat 5] [--workers 4]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from convert_model import list_test_images
+from image_preprocessing import BatchPreprocessor, decode_image
+
+def make_jpeg_set(image_paths: list, directory: str, size: int) -> list:
+    """Réencode les images en JPEG carré de la taille donnée"""
+    paths = []
+    for path in image_paths:
+        target = os.path.join(directory, f"{os.path.splitext(os.path.basename(path))[0]}_{size}.jpg")
+        Image.open(path).convert('RGB').resize((size, size), Image.BICUBIC).save(target, quality=90)
+        paths.append(target)
+    return paths
+
+def best_time(func, repeat: int) -> float:
+    """Meilleur temps d'exécution"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='images-test')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    
+    try:
+        from keras.utils import load_img, img_to_array
+    except ImportError:
+        load_img = None
+    
+    sources = list_test_images(args.images)
+    exact_pool = BatchPreprocessor(workers=args.workers, fast=False)
+    fast_pool = BatchPreprocessor(workers=args.workers, fast=True)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        datasets = [
+            ('PNG 299', sources),
+            ('JPEG 1024', make_jpeg_set(sources, directory, 1024)),
+            ('JPEG 2048', make_jpeg_set(sources, directory, 2048))
+        ]
+        
+        print(f"Benchmark prétraitement: {len(sources)} images par jeu, {args.workers} threads, meilleur de {args.repeat}")
+        print("=" * 78)
+        print(f"{'Jeu':<11}{'load_img':>11}{'exact':>11}{'exact lot':>12}{'rapide lot':>13}{'  (ms / image)'}")
+        
+        fast_results = []
+        for name, paths in datasets:
+            per_image = lambda seconds: seconds / len(paths) * 1000
+            row = f"{name:<11}"
+            if load_img is not None:
+                baseline = best_time(lambda: [img_to_array(load_img(p, target_size=(256, 256))) for p in paths], args.repeat)
+                row += f"{per_image(baseline):>11.2f}"
+                for path in paths:
+                    reference = img_to_array(load_img(path, target_size=(256, 256)))
+                    assert np.array_equal(reference, decode_image(path).astype(np.float32)), f"Mode exact différent de load_img: {path}"
+            else:
+                row += f"{'-':>11}"
+            
+            exact = best_time(lambda: [decode_image(p) for p in paths], args.repeat)
+            exact_batch = best_time(lambda: exact_pool.to_batch(exact_pool.decode_many(paths)), args.repeat)
+            fast_batch = best_time(lambda: fast_pool.to_batch(fast_pool.decode_many(paths)), args.repeat)
+            print(row + f"{per_image(exact):>11.2f}{per_image(exact_batch):>12.2f}{per_image(fast_batch):>13.2f}")
+            
+            exact_pixels = np.stack([decode_image(p) for p in paths]).astype(np.float32)
+            fast_pixels = np.stack([decode_image(p, fast=True) for p in paths]).astype(np.float32)
+            fast_results.append((name, exact_pixels, fast_pixels))
+        
+        print("=" * 78)
+        print("Mode exact identique au bit près à load_img" if load_img is not None else "Keras absent : comparaison à load_img ignorée")
+        
+        # Écart du mode rapide, en pixels et en probabilités du modèle
+        from model_interface import ModelInterface
+        interface = ModelInterface()
+        for name, exact_pixels, fast_pixels in fast_results:
+            pixel_diff = np.abs(exact_pixels - fast_pixels)
+            line = f"Mode rapide {name:<10}: pixels écart max {pixel_diff.max():.0f}, moyen {pixel_diff.mean():.2f}"
+            if interface.model is not None:
+                expected = interface._predict_array(exact_pixels)
+                actual = interface._predict_array(fast_pixels)
+                flips = int(np.sum((expected >= 0.5) != (actual >= 0.5)))
+                line += f" ; probabilité écart max {np.abs(expected - actual).max():.4f}, labels changés {flips}"
+            print(line)
+    
+    exact_pool.close()
+    fast_pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark mémoire des enregistrements typés
+
+Compare l'empreinte mémoire et le temps d'une boucle de lecture entre
+une liste de dictionnaires (format historique) et des ImageRecord à slots.
+
+Usage:
+    python benchmark_records.py [--records 100000]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmark_storage import make_records
+from records import ImageRecord, to_records
+
+def measure_memory(build) -> tuple:
+    """Mesure la mémoire allouée par la construction d'une structure"""
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current / (1024 * 1024)
+
+def time_loop(func, repeat: int = 5) -> float:
+    """Meilleur temps d'exécution d'une boucle"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100_000)
+    args = parser.parse_args()
+    
+    source = make_records(args.records)
+    for record in source:
+        record.pop('additional_info')
+    payload = json.dumps(source)
+    
+    dicts, dict_mb = measure_memory(lambda: json.loads(payload))
+    records, record_mb = measure_memory(lambda: to_records(json.loads(payload), ImageRecord))
+    
+    assert [r.to_dict() for r in records] == dicts, "Conversion non fidèle"
+    
+    def count_dicts():
+        counts = {}
+        for img in dicts:
+            counts[img['status']] = counts.get(img['status'], 0) + 1
+    
+    def count_records():
+        counts = {}
+        for img in records:
+            counts[img.status] = counts.get(img.status, 0) + 1
+    
+    print(f"Benchmark enregistrements: {args.records} images")
+    print("=" * 60)
+    print(f"{'Format':<22}{'Mémoire (Mo)':>16}{'Boucle statut (ms)':>20}")
+    print(f"{'dictionnaires':<22}{dict_mb:>16.1f}{time_loop(count_dicts) * 1000:>20.1f}")
+    print(f"{'ImageRecord (slots)':<22}{record_mb:>16.1f}{time_loop(count_records) * 1000:>20.1f}")
+    print("=" * 60)
+    print(f"Réduction mémoire: {(1 - record_mb / dict_mb) * 100:.0f}%")
+
+if __name__ == "__main__":
+    main()
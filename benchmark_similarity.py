@@ -0,0 +1,78 @@
+"""
+Benchmark de la recherche de cas similaires (embedding_index.py)
+
+Construit un index temporaire d'embeddings synthétiques (groupés autour de
+centres, comme des radiographies proches), puis mesure pour des requêtes
+filtrées comme dans la vue médecin (un cas sur deux validé) :
+    - recherche exacte (force brute NumPy)
+    - recherche IVF, avec son rappel@k par rapport à la recherche exacte
+
+Usage:
+    python benchmark_similarity.py [--size 100000] [--dim 64] [--queries 200] [--k 5]
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import config
+from embedding_index import EmbeddingIndex
+
+def synthetic_embeddings(size: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Embeddings positifs (sorties ReLU moyennées) groupés autour de 500 centres"""
+    rng = np.random.default_rng(seed)
+    centers = rng.gamma(2.0, 1.0, (500, dim))
+    assignment = rng.integers(0, len(centers), size)
+    return (centers[assignment] + rng.gamma(1.0, 1.5, (size, dim))).astype(np.float32)
+
+def time_queries(index: EmbeddingIndex, queries: np.ndarray, k: int, accept) -> tuple:
+    """(résultats, latences en ms)"""
+    results, latencies = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        results.append([image_id for image_id, _ in index.search(query, k, accept)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return results, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+    
+    vectors = synthetic_embeddings(args.size + args.queries, args.dim)
+    queries = vectors[args.size:]
+    validated = {f"img_{i}" for i in range(0, args.size, 2)}
+    accept = validated.__contains__
+    
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = EmbeddingIndex(index_dir)
+        t0 = time.perf_counter()
+        index.add_many((f"img_{i}", vectors[i]) for i in range(args.size))
+        add_s = time.perf_counter() - t0
+        
+        exact, exact_ms = time_queries(index, queries, args.k, accept)
+        t0 = time.perf_counter()
+        summary = index.build_ivf()
+        build_s = time.perf_counter() - t0
+        
+        print(f"Benchmark cas similaires: {args.size} embeddings de dimension {args.dim}, "
+              f"{args.queries} requêtes, k={args.k}")
+        print(f"Ajout à l'index: {add_s:.2f}s, construction IVF ({summary['lists']} listes): {build_s:.2f}s")
+        print("=" * 62)
+        print(f"{'Recherche':<22}{'p50 (ms)':>10}{'p99 (ms)':>10}{'Rappel@k':>12}")
+        print(f"{'exacte':<22}{np.percentile(exact_ms, 50):>10.2f}{np.percentile(exact_ms, 99):>10.2f}{1.0:>12.3f}")
+        for nprobe in (4, 8, 16, 32):
+            config.EMBEDDING_IVF_NPROBE = nprobe
+            approx, approx_ms = time_queries(index, queries, args.k, accept)
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)])
+            print(f"{f'IVF nprobe={nprobe}':<22}{np.percentile(approx_ms, 50):>10.2f}"
+                  f"{np.percentile(approx_ms, 99):>10.2f}{recall:>12.3f}")
+        print("=" * 62)
+
+if __name__ == "__main__":
+    main()
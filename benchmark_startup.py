@@ -0,0 +1,142 @@
+"""
+Benchmark du démarrage de l'application
+
+Chaque scénario est mesuré dans un processus neuf (démarrage à froid de
+Python, cache disque chaud) :
+    - import app           : import de app.py (mode Streamlit « bare »)
+    - session médecin      : + construction de DoctorView
+    - session préparateur  : + construction de PreparatorView
+    - première prédiction  : + une prédiction sur une image de images-test/
+
+Pour chaque scénario : temps écoulé, mémoire maximale et présence des
+modules ML lourds (TensorFlow, Keras...). --ref mesure aussi une autre
+révision git (extraite dans un dossier temporaire) pour comparer avant /
+après une modification.
+
+Budget : l'import de app.py et l'ouverture d'une session (médecin ou
+préparateur) doivent rester sous --budget-ms sans importer TensorFlow ;
+le script se termine en erreur sinon.
+
+Usage:
+    python benchmark_startup.py [--ref <révision>] [--repeat 3] [--budget-ms 1500]
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# Modules dont la présence après un scénario indique un import ML
+HEAVY_MODULES = ('tensorflow', 'keras', 'onnxruntime', 'tflite_runtime')
+
+SCENARIOS = ['import app', 'session médecin', 'session préparateur', 'première prédiction']
+
+WORKER = r"""
+import json, os, resource, sys, time
+sys.path.insert(0, {source_dir!r})
+scenario = {scenario!r}
+start = time.perf_counter()
+import app
+import streamlit as st
+if scenario == 'session médecin':
+    from doctor_view import DoctorView
+    DoctorView()
+elif scenario in ('session préparateur', 'première prédiction'):
+    from preparator_view import PreparatorView
+    view = PreparatorView()
+    if scenario == 'première prédiction':
+        result = view.model_interface.predict({image_path!r})
+        assert result['label'] != 'error', result
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': [m for m in {heavy!r} if m in sys.modules]
+}}))
+"""
+
+def extract_revision(repo_dir: str, revision: str, target_dir: str):
+    """Extrait les fichiers suivis d'une révision git dans un dossier"""
+    archive = subprocess.run(['git', '-C', repo_dir, 'archive', '--format=tar', revision],
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target_dir)
+
+def measure(source_dir: str, scenario: str, image_path: str, repeat: int) -> dict:
+    """Médiane de plusieurs mesures d'un scénario, chacune dans un processus neuf"""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as work_dir:
+            env = dict(os.environ, APP_DATA_DIR=os.path.join(work_dir, 'data'))
+            code = WORKER.format(source_dir=source_dir, scenario=scenario,
+                                 image_path=image_path, heavy=HEAVY_MODULES)
+            completed = subprocess.run([sys.executable, '-c', code], cwd=work_dir, env=env,
+                                       capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1]}
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        'ms': statistics.median(run['ms'] for run in runs),
+        'rss_mb': statistics.median(run['rss_mb'] for run in runs),
+        'heavy': runs[-1]['heavy']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ref', help="Révision git à comparer (ex: HEAD~1)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, default=1500.0,
+                        help="Temps maximal de l'import et de l'ouverture d'une session")
+    args = parser.parse_args()
+    
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    image_dir = os.path.join(repo_dir, 'images-test')
+    image_path = os.path.join(image_dir, sorted(os.listdir(image_dir))[0])
+    
+    trees = [('actuel', repo_dir)]
+    with tempfile.TemporaryDirectory() as ref_dir:
+        if args.ref:
+            extract_revision(repo_dir, args.ref, ref_dir)
+            trees.insert(0, (args.ref, ref_dir))
+        
+        results = {
+            name: {scenario: measure(source_dir, scenario, image_path, args.repeat) for scenario in SCENARIOS}
+            for name, source_dir in trees
+        }
+    
+    print(f"Benchmark démarrage: médiane de {args.repeat} processus par scénario")
+    print("=" * 78)
+    print(f"{'Scénario':<22}{'Version':<12}{'Temps (ms)':>12}{'Mémoire (Mo)':>14}  Modules ML")
+    for scenario in SCENARIOS:
+        for name, _ in trees:
+            result = results[name][scenario]
+            if 'error' in result:
+                print(f"{scenario:<22}{name:<12}  erreur: {result['error']}")
+                continue
+            heavy = ', '.join(result['heavy']) or '-'
+            print(f"{scenario:<22}{name:<12}{result['ms']:>12.0f}{result['rss_mb']:>14.0f}  {heavy}")
+    print("=" * 78)
+    
+    failures = []
+    for scenario in SCENARIOS[:3]:
+        result = results['actuel'][scenario]
+        if 'error' in result:
+            failures.append(f"{scenario}: {result['error']}")
+        elif result['ms'] > args.budget_ms:
+            failures.append(f"{scenario}: {result['ms']:.0f} ms > budget {args.budget_ms:.0f} ms")
+        elif result['heavy']:
+            failures.append(f"{scenario}: import de {', '.join(result['heavy'])} avant toute prédiction")
+    
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print(f"✅ Budget respecté ({args.budget_ms:.0f} ms, aucun module ML avant la première prédiction)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark de sérialisation des fichiers de données
+
+Mesure les temps de sauvegarde / chargement et la taille sur disque
+d'un store de 100 000 enregistrements pour chaque codec disponible,
+en comparaison du format historique (JSON indenté).
+
+Usage:
+    python benchmark_storage.py [--records 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from data_manager import DataManager
+from storage_codecs import get_codec
+
+def make_records(count: int) -> list:
+    """Génère des enregistrements représentatifs (images + annotation imbriquée)"""
+    random.seed(42)
+    start = datetime(2024, 1, 1)
+    records = []
+    for i in range(1, count + 1):
+        created = start + timedelta(minutes=i)
+        records.append({
+            'id': f"img_{i}",
+            'patient_id': f"PATIENT_{i % 5000:05d}",
+            'file_path': f"temp_uploads/IMG_{i:06d}.dcm",
+            'image_path': f"data/images/PATIENT_{i % 5000:05d}_{i:06d}.png",
+            'exam_date': created.strftime("%Y-%m-%d"),
+            'exam_time': created.strftime("%H%M%S"),
+            'modality': 'CR',
+            'body_part': 'CHEST',
+            'patient_position': random.choice(['STANDING', 'SUPINE']),
+            'view_position': random.choice(['PA', 'AP']),
+            'study_description': 'CHEST',
+            'created_at': created.isoformat(),
+            'status': random.choice(['pending', 'completed', 'ready_for_review', 'finalized']),
+            'additional_info': {
+                'symptoms': 'Toux, fièvre',
+                'spo2': random.randint(85, 100),
+                'temperature': round(random.uniform(36.0, 40.0), 1),
+                'urgency': random.choice(['Normale', 'Élevée', 'Critique'])
+            }
+        })
+    return records
+
+def time_legacy(records: list, directory: str, repeat: int) -> dict:
+    """Mesure l'implémentation historique (json.dump indent=2 / json.load)"""
+    file_path = os.path.join(directory, "bench_legacy.json")
+    
+    save_times, load_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False, default=str)
+        save_times.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            json.load(f)
+        load_times.append(time.perf_counter() - start)
+    
+    return {
+        'save': min(save_times),
+        'load': min(load_times),
+        'size_mb': os.path.getsize(file_path) / (1024 * 1024)
+    }
+
+def time_codec(codec_name: str, records: list, directory: str, repeat: int) -> dict:
+    """Mesure le meilleur temps de sauvegarde et de chargement pour un codec"""
+    manager = DataManager(directory, codec=codec_name)
+    file_path = os.path.join(directory, f"bench_{codec_name}.dat")
+    
+    save_times, load_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        manager._save_json(file_path, records)
+        save_times.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        loaded = manager._load_json(file_path)
+        load_times.append(time.perf_counter() - start)
+    
+    assert loaded == records, f"Aller-retour non fidèle pour {codec_name}"
+    return {
+        'save': min(save_times),
+        'load': min(load_times),
+        'size_mb': os.path.getsize(file_path) / (1024 * 1024)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    records = make_records(args.records)
+    print(f"Benchmark stockage: {args.records} enregistrements, meilleur de {args.repeat}")
+    print("=" * 60)
+    print(f"{'Codec':<10}{'Sauvegarde (s)':>16}{'Chargement (s)':>16}{'Taille (Mo)':>14}")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        result = time_legacy(records, directory, args.repeat)
+        print(f"{'avant':<10}{result['save']:>16.3f}{result['load']:>16.3f}{result['size_mb']:>14.1f}")
+        
+        for codec_name in ['pretty', 'json', 'orjson', 'msgpack']:
+            try:
+                get_codec(codec_name)
+            except ValueError as e:
+                print(f"{codec_name:<10}indisponible ({e})")
+                continue
+            result = time_codec(codec_name, records, directory, args.repeat)
+            print(f"{codec_name:<10}{result['save']:>16.3f}{result['load']:>16.3f}{result['size_mb']:>14.1f}")
+    
+    print("=" * 60)
+    print("'avant' : implémentation historique (json.dump indent=2 / json.load)")
+    print("Les autres lignes passent par DataManager (lecture avec détection du format)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Ligne de commande : import, évaluation et export sans l'interface Streamlit
+
+Pour les tâches planifiées (cron) : chaque commande écrit sur la sortie
+standard des lignes JSON, une par événement, et les messages lisibles
+(chargement du modèle, avertissements) sur la sortie d'erreur :
+    {"event": "start", "command": "import", "total": 120}
+    {"event": "progress", "command": "import", "done": 40, "total": 120, "failed": 1, "per_second": 52.3}
+    {"event": "error", "command": "import", "item": "/dicom/x.dcm", "error": "..."}
+    {"event": "summary", "command": "import", "imported": 119, "failed": 1, ...}
+
+Codes de sortie :
+    0  tout a réussi (ou rien à faire)
+    1  terminé avec des échecs partiels (fichiers ou images en erreur)
+    2  arguments invalides
+    3  échec fatal (modèle absent, stockage illisible, ...)
+  130  interrompu (Ctrl+C, SIGTERM) ; relancer la même commande pour reprendre
+
+Usage:
+    python cli.py import <dossier|fichier.dcm>... [--urgency Normale] [--score]
+    python cli.py score [--retry-failed] [--batch-size 32] [--no-heatmaps]
+    python cli.py export [--format csv --format json | --format all] [--no-images] [--split] [--no-archived]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+import config
+from data_manager import DataManager
+from inference_scheduler import URGENCY_LEVELS
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FATAL = 3
+EXIT_INTERRUPTED = 130
+
+DICOM_EXTENSIONS = ('.dcm', '.dicom')
+
+class JsonLines:
+    """Événements JSON, un par ligne, avec limitation de fréquence des progressions"""
+    
+    def __init__(self, command: str, stream=None, interval: float = 1.0):
+        """
+        Args:
+            command: Nom de la commande, répété dans chaque événement
+            stream: Sortie des événements (défaut: sortie standard d'origine)
+            interval: Secondes minimum entre deux événements 'progress'
+        """
+        self.command = command
+        self.stream = stream or sys.__stdout__
+        self.interval = interval
+        self._last_progress = 0.0
+    
+    def emit(self, event: str, **fields):
+        self.stream.write(json.dumps({'event': event, 'command': self.command, **fields},
+                                     ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+    
+    def progress(self, done: int, total: int, force: bool = False, **fields):
+        now = time.monotonic()
+        if force or done == total or now - self._last_progress >= self.interval:
+            self._last_progress = now
+            self.emit('progress', done=done, total=total, **fields)
+
+def collect_dicom_files(paths: List[str]) -> List[str]:
+    """Fichiers DICOM des chemins donnés (dossiers parcourus récursivement), triés"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names
+                             if name.lower().endswith(DICOM_EXTENSIONS))
+        else:
+            # Un fichier nommé explicitement est importé quelle que soit son extension
+            files.append(path)
+    return sorted(set(files))
+
+def load_model():
+    """Modèle local à version figée ; None s'il ne peut pas être chargé"""
+    from model_interface import ModelInterface
+    
+    model_interface = ModelInterface(follow_registry=False, server_url='')
+    return model_interface if model_interface.model is not None else None
+
+# ========== Commandes ==========
+
+def cmd_import(args, data_manager: DataManager, events: JsonLines) -> int:
+    from ingestion_pipeline import IngestionPipeline
+    
+    file_paths = collect_dicom_files(args.paths)
+    events.emit('start', total=len(file_paths))
+    if not file_paths:
+        events.emit('summary', imported=0, failed=0)
+        return EXIT_OK
+    
+    model_interface = None
+    if args.score:
+        model_interface = load_model()
+        if model_interface is None:
+            events.emit('fatal', error="Modèle non chargé")
+            return EXIT_FATAL
+    
+    pipeline = IngestionPipeline(data_manager, args.images_dir, args.urgency, model_interface,
+                                 workers=args.workers, decode_processes=args.processes,
+                                 batch_size=args.batch_size, explain=False if args.no_heatmaps else None)
+    failed = []
+    
+    def progress(done, total):
+        metrics = pipeline.metrics()
+        events.progress(done, total, per_second=round(done / metrics['elapsed_s'], 1) if metrics['elapsed_s'] else 0.0,
+                        queues={name: stage['queue_depth'] for name, stage in metrics['stages'].items()})
+    
+    results = pipeline.run(file_paths, progress)
+    for result in results:
+        if not result['success']:
+            failed.append(result)
+            events.emit('error', item=result['file_path'], error=result['error'])
+        elif result.get('analysis_error'):
+            events.emit('error', item=result['image_id'], error=result['analysis_error'], stage='évaluation')
+    
+    analysis_failed = sum(1 for result in results if result.get('analysis_error'))
+    metrics = pipeline.metrics()
+    events.emit('summary', imported=len(results) - len(failed), failed=len(failed),
+                scored=sum(1 for result in results if 'label' in result), analysis_failed=analysis_failed,
+                elapsed_s=round(metrics['elapsed_s'], 2), stages=metrics['stages'])
+    return EXIT_PARTIAL if failed or analysis_failed else EXIT_OK
+
+def cmd_score(args, data_manager: DataManager, events: JsonLines) -> int:
+    from embedding_index import open_index
+    from rescore_job import RescoreJob
+    
+    model_interface = load_model()
+    if model_interface is None:
+        events.emit('fatal', error="Modèle non chargé")
+        return EXIT_FATAL
+    
+    job = RescoreJob(data_manager, model_interface, args.batch_size, explain=False if args.no_heatmaps else None)
+    # Images sans prédiction de la version courante : relancer la commande reprend là où elle s'est arrêtée
+    images = job.select_images(['pending', 'failed'] if args.retry_failed else ['pending'], retry_failed=True)
+    events.emit('start', total=len(images), model_version=job.model_version)
+    
+    stopping = []
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    
+    scored = 0
+    failures: Dict[str, str] = {}
+    start = time.perf_counter()
+    for offset in range(0, len(images), job.batch_size):
+        if stopping:
+            break
+        batch = images[offset:offset + job.batch_size]
+        predictions, failed = job.score_and_save(batch)
+        
+        scored += len(predictions)
+        failures.update(failed)
+        for image_id, error in failed.items():
+            events.emit('error', item=image_id, error=error)
+        done = offset + len(batch)
+        events.progress(done, len(images), failed=len(failures),
+                        per_second=round(done / (time.perf_counter() - start), 1))
+    
+    if scored and open_index(data_manager.data_dir, job.model_version).maybe_build_ivf():
+        print("✅ Index des cas similaires (IVF) reconstruit")
+    events.emit('summary', scored=scored, failed=len(failures), model_version=job.model_version,
+                interrupted=bool(stopping), elapsed_s=round(time.perf_counter() - start, 2))
+    if stopping:
+        return EXIT_INTERRUPTED
+    return EXIT_PARTIAL if failures else EXIT_OK
+
+def cmd_export(args, data_manager: DataManager, events: JsonLines) -> int:
+    from archive_manager import ArchiveManager
+    from export_service import EXPORT_FORMATS, generate_export, get_validated_images
+    
+    formats = list(EXPORT_FORMATS) if not args.format or 'all' in args.format else args.format
+    archive_manager = None if args.no_archived else ArchiveManager(data_manager)
+    validated_images = get_validated_images(data_manager, archive_manager)
+    events.emit('start', total=len(validated_images), formats=formats)
+    if not validated_images:
+        events.emit('summary', exported=0, files={})
+        return EXIT_OK
+    
+    warnings = []
+    
+    def warn(message):
+        warnings.append(message)
+        events.emit('error', error=message)
+    
+    files = generate_export(data_manager, validated_images, formats, include_images=not args.no_images,
+                            split_dataset=args.split, export_root=args.output, warn=warn)
+    events.emit('summary', exported=len(validated_images), files=files,
+                sizes={name: os.path.getsize(path) for name, path in files.items() if os.path.exists(path)},
+                warnings=len(warnings))
+    return EXIT_PARTIAL if warnings else EXIT_OK
+
+# ========== Point d'entrée ==========
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--progress-interval', type=float, default=1.0,
+                        help="Secondes minimum entre deux événements de progression")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    import_parser = commands.add_parser('import', help="Importer des fichiers DICOM")
+    import_parser.add_argument('paths', nargs='+', help="Dossiers (parcourus récursivement) ou fichiers")
+    import_parser.add_argument('--urgency', default='Normale', choices=list(URGENCY_LEVELS))
+    import_parser.add_argument('--images-dir', help="Répertoire des aperçus (défaut: <data-dir>/images)")
+    import_parser.add_argument('--score', action='store_true', help="Évaluer les images importées")
+    import_parser.add_argument('--workers', type=int, help="Threads par étape (défaut: APP_INGEST_WORKERS)")
+    import_parser.add_argument('--processes', type=int, help="Processus de décodage (défaut: APP_INGEST_DECODE_PROCESSES)")
+    import_parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    import_parser.add_argument('--no-heatmaps', action='store_true', help="Ne pas calculer les cartes d'attention")
+    
+    score_parser = commands.add_parser('score', help="Évaluer les images en attente d'analyse")
+    score_parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    score_parser.add_argument('--retry-failed', action='store_true', help="Réessayer les images en échec")
+    score_parser.add_argument('--no-heatmaps', action='store_true', help="Ne pas calculer les cartes d'attention")
+    
+    export_parser = commands.add_parser('export', help="Exporter les cas validés par le médecin")
+    export_parser.add_argument('--format', action='append', choices=['csv', 'json', 'folders', 'all'],
+                               help="Format (répétable, défaut: all)")
+    export_parser.add_argument('--no-images', action='store_true', help="Référencer les images sans les copier")
+    export_parser.add_argument('--split', action='store_true', help="Séparer en train/validation/test (70/15/15)")
+    export_parser.add_argument('--no-archived', action='store_true', help="Exclure les cas archivés (inclus par défaut)")
+    export_parser.add_argument('--output', help="Répertoire des exports (défaut: <data-dir>/exports)")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    events = JsonLines(args.command, sys.stdout, args.progress_interval)
+    handlers = {'import': cmd_import, 'score': cmd_score, 'export': cmd_export}
+    
+    # Les messages lisibles (print des modules) ne se mêlent pas aux événements JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return handlers[args.command](args, DataManager(args.data_dir), events)
+        except KeyboardInterrupt:
+            events.emit('fatal', error="Interrompu")
+            return EXIT_INTERRUPTED
+        except Exception as e:
+            events.emit('fatal', error=f"{type(e).__name__}: {e}")
+            return EXIT_FATAL
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Paramètres de configuration de l'application
+
+Chaque paramètre peut être surchargé par une variable d'environnement
+(préfixe APP_) sans modifier le code.
+"""
+
+import os
+from typing import List
+
+def _env_int(name: str, default: int) -> int:
+    """Lit un entier depuis l'environnement"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _env_float(name: str, default: float) -> float:
+    """Lit un nombre décimal depuis l'environnement"""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _env_list(name: str, default: str = '') -> List[str]:
+    """Lit une liste de valeurs séparées par des virgules (en majuscules)"""
+    return [value.strip().upper() for value in os.environ.get(name, default).split(',') if value.strip()]
+
+# ========== Stockage ==========
+
+# Répertoire des données de l'application
+DATA_DIR = os.environ.get('APP_DATA_DIR', 'data')
+
+# Codec d'écriture des fichiers de données: 'auto', 'json', 'orjson', 'msgpack' ou 'pretty'
+STORAGE_CODEC = os.environ.get('APP_STORAGE_CODEC', 'auto')
+
+# Âge minimal (en jours depuis la finalisation) avant archivage d'un cas
+ARCHIVE_MAX_AGE_DAYS = _env_int('APP_ARCHIVE_MAX_AGE_DAYS', 30)
+
+# Nombre d'images par fichier du stockage de tenseurs prétraités (data/tensors)
+TENSOR_CHUNK_SIZE = _env_int('APP_TENSOR_CHUNK_SIZE', 1024)
+
+# ========== Modèle ==========
+
+# Moteur d'inférence: 'keras' (model.h5), 'tflite' (model.tflite) ou 'onnx' (model.onnx)
+MODEL_BACKEND = os.environ.get('APP_MODEL_BACKEND', 'keras')
+
+# Chemin du fichier modèle (vide: version active du registre, sinon fichier par défaut du projet)
+MODEL_PATH = os.environ.get('APP_MODEL_PATH', '')
+
+# Registre des modèles versionnés (voir model_registry.py), relatif au dossier du projet
+MODEL_REGISTRY_DIR = os.environ.get('APP_MODEL_REGISTRY_DIR', 'models')
+
+# Utiliser le modèle niveaux de gris (model_gray.*) pour les images monocanal (0 pour désactiver)
+GRAYSCALE_FOLDING = _env_int('APP_GRAYSCALE_FOLDING', 1)
+
+# Prétraitement rapide des JPEG (réduction au décodage, voir image_preprocessing.py)
+PREPROCESS_FAST = _env_int('APP_PREPROCESS_FAST', 0)
+
+# Nombre de threads de décodage des images pour les prédictions par lot
+PREPROCESS_WORKERS = _env_int('APP_PREPROCESS_WORKERS', 4)
+
+# Processus de décodage pour les prédictions par lot, tenseurs remis par mémoire partagée
+# (voir shm_ring.py, utile pour les fichiers DICOM) ; 0: threads du processus (APP_PREPROCESS_WORKERS)
+DECODE_PROCESSES = _env_int('APP_DECODE_PROCESSES', 0)
+
+# Slots de l'anneau de mémoire partagée (192 Ko chacun) ; 0: quatre lots d'inférence
+DECODE_RING_SLOTS = _env_int('APP_DECODE_RING_SLOTS', 0)
+
+# Import DICOM (ingestion_pipeline.py) : threads de lecture, de décodage et d'aperçus
+INGEST_WORKERS = _env_int('APP_INGEST_WORKERS', 4)
+
+# Processus de décodage DICOM à l'import (pydicom garde le GIL) ; 0: threads (APP_INGEST_WORKERS)
+INGEST_DECODE_PROCESSES = _env_int('APP_INGEST_DECODE_PROCESSES', 0)
+
+# Fichiers en attente au plus dans chaque file entre deux étapes de l'import
+INGEST_QUEUE_SIZE = _env_int('APP_INGEST_QUEUE_SIZE', 32)
+
+# Taille maximale des lots envoyés au moteur d'inférence
+INFERENCE_BATCH_SIZE = _env_int('APP_INFERENCE_BATCH_SIZE', 32)
+
+# Appel Keras compilé (tf.function à signature fixe, préchauffé au chargement) ; 0: appel direct
+MODEL_COMPILE = _env_int('APP_MODEL_COMPILE', 1)
+
+# Compilation XLA de l'appel Keras (lots complétés à une puissance de 2 pour limiter les recompilations)
+MODEL_XLA = _env_int('APP_MODEL_XLA', 0)
+
+# Threads de calcul d'une opération (TensorFlow intra-op, TFLite, ONNX Runtime) ; 0: cœurs disponibles
+INFERENCE_INTRA_OP_THREADS = _env_int('APP_INFERENCE_INTRA_OP_THREADS', 0)
+
+# Opérations indépendantes exécutées en parallèle (TensorFlow / ONNX Runtime inter-op) ; 0: défaut du moteur
+INFERENCE_INTER_OP_THREADS = _env_int('APP_INFERENCE_INTER_OP_THREADS', 0)
+
+# Cœurs autorisés pour les processus d'inférence, ex: "0-3" ou "0,2,4" (vide: tous) ;
+# plusieurs processus sur une même machine peuvent ainsi se répartir les cœurs
+CPU_AFFINITY = os.environ.get('APP_CPU_AFFINITY', '')
+
+# Serveur d'inférence local (ex: http://127.0.0.1:8765 ou unix:///tmp/pneumonia-inference.sock) ;
+# vide: chaque processus charge son propre modèle
+INFERENCE_SERVER_URL = os.environ.get('APP_INFERENCE_SERVER_URL', '')
+
+# Attente maximale du serveur d'inférence pour compléter un lot (millisecondes)
+INFERENCE_MAX_LATENCY_MS = _env_float('APP_INFERENCE_MAX_LATENCY_MS', 10.0)
+
+# Variante quantifiée servie: 'none', 'int8' ou 'float16' (fichier model_<variante>.tflite)
+MODEL_QUANTIZATION = os.environ.get('APP_MODEL_QUANTIZATION', 'none')
+
+# Taux maximal de désaccord avec le modèle float avant refus d'un modèle quantifié
+QUANTIZATION_MAX_DISAGREEMENT = _env_float('APP_QUANTIZATION_MAX_DISAGREEMENT', 0.01)
+
+# Écart maximal de probabilité brute (raw_prediction) compté comme un accord
+QUANTIZATION_RAW_TOLERANCE = _env_float('APP_QUANTIZATION_RAW_TOLERANCE', 0.05)
+
+# Calculer les cartes d'attention (Grad-CAM) avec les prédictions, moteur keras (0 pour désactiver)
+EXPLAIN_HEATMAPS = _env_int('APP_EXPLAIN_HEATMAPS', 1)
+
+# ========== Cas similaires ==========
+
+# Nombre de cas validés similaires affichés dans la vue détaillée du médecin
+SIMILAR_CASES_K = _env_int('APP_SIMILAR_CASES_K', 5)
+
+# Nombre d'embeddings à partir duquel un index approximatif (IVF) est construit (0: jamais)
+EMBEDDING_IVF_MIN_SIZE = _env_int('APP_EMBEDDING_IVF_MIN_SIZE', 50000)
+
+# Listes de l'index IVF parcourues par recherche (plus: meilleur rappel, recherche plus lente)
+EMBEDDING_IVF_NPROBE = _env_int('APP_EMBEDDING_IVF_NPROBE', 8)
+
+# ========== Ordonnancement des analyses ==========
+
+# Images en file d'analyse au-delà desquelles les soumissions non critiques sont refusées
+SCHEDULER_MAX_QUEUE = _env_int('APP_SCHEDULER_MAX_QUEUE', 2000)
+
+# Attente (secondes depuis l'import) qui fait gagner un niveau de priorité à une image ; 0: pas de vieillissement
+SCHEDULER_AGING_SECONDS = _env_float('APP_SCHEDULER_AGING_SECONDS', 600.0)
+
+# Stations d'acquisition (StationName DICOM) dont les examens passent un niveau plus tôt, ex: "URGENCES,REA-01"
+SCHEDULER_PRIORITY_STATIONS = _env_list('APP_SCHEDULER_PRIORITY_STATIONS')
+
+# Modalités dont les examens passent un niveau plus tôt, ex: "DX" (vide: aucune)
+SCHEDULER_PRIORITY_MODALITIES = _env_list('APP_SCHEDULER_PRIORITY_MODALITIES')
+
+# ========== Workers de scoring ==========
+
+# Table des jobs de scoring partagée par les workers (scoring_worker.py)
+JOB_QUEUE_PATH = os.environ.get('APP_JOB_QUEUE_PATH', os.path.join(DATA_DIR, 'jobs.sqlite3'))
+
+# Durée d'un bail sans heartbeat (secondes) ; au-delà, les jobs sont repris par un autre worker
+JOB_LEASE_SECONDS = _env_float('APP_JOB_LEASE_SECONDS', 120.0)
+
+# Tentatives d'évaluation d'une image avant échec définitif
+JOB_MAX_ATTEMPTS = _env_int('APP_JOB_MAX_ATTEMPTS', 3)
+
+# Journal WAL de la base des jobs (0 si elle est sur un système de fichiers réseau)
+JOB_QUEUE_WAL = _env_int('APP_JOB_QUEUE_WAL', 1)
+
+# ========== API REST ==========
+
+# Adresse d'écoute de l'API (api_server.py) ; 127.0.0.1: accessible depuis la machine seulement
+API_HOST = os.environ.get('APP_API_HOST', '127.0.0.1')
+API_PORT = _env_int('APP_API_PORT', 8780)
+
+# Jeton exigé dans l'en-tête "Authorization: Bearer <jeton>" (vide: pas d'authentification)
+API_TOKEN = os.environ.get('APP_API_TOKEN', '')
+
+# DataManager partagés par les requêtes (lectures et écritures du stockage en parallèle)
+API_STORAGE_POOL = _env_int('APP_API_STORAGE_POOL', 4)
+
+# Répertoires dont les fichiers peuvent être importés par chemin, séparés par ':' (vide: envoi du fichier seulement)
+API_IMPORT_ROOTS = [path for path in os.environ.get('APP_API_IMPORT_ROOTS', '').split(os.pathsep) if path]
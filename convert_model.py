@@ -0,0 +1,108 @@
+"""
+Conversion du modèle Keras vers TFLite ou ONNX
+
+Exporte model.h5 une fois pour les moteurs d'inférence légers, puis vérifie
+que les probabilités restent équivalentes à celles du modèle Keras sur les
+images de test (écart absolu maximal <= tolérance). Le modèle exporté a une
+seconde sortie, les embeddings des images (voir build_embedding_model).
+
+Usage:
+    python convert_model.py --format tflite [--model model.h5] [--output model.tflite]
+    python convert_model.py --format onnx   (nécessite tf2onnx)
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+from model_backends import build_embedding_model, get_backend_class
+from model_interface import ModelInterface
+
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg')
+
+def convert_to_tflite(keras_path: str, output_path: str):
+    """Exporte le modèle Keras en TFLite float32 (sans quantification)"""
+    import tensorflow as tf
+    model = build_embedding_model(tf.keras.models.load_model(keras_path))
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+def convert_to_onnx(keras_path: str, output_path: str, opset: int = 13):
+    """Exporte le modèle Keras en ONNX (taille de lot dynamique)"""
+    import tensorflow as tf
+    import tf2onnx
+    model = build_embedding_model(tf.keras.models.load_model(keras_path))
+    input_shape = (None,) + tuple(model.input_shape[1:])
+    spec = (tf.TensorSpec(input_shape, tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+CONVERTERS = {
+    'tflite': convert_to_tflite,
+    'onnx': convert_to_onnx
+}
+
+def list_test_images(images_dir: str) -> list:
+    """Liste les images d'un répertoire (PNG/JPEG)"""
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(images_dir, pattern)))
+    return sorted(paths)
+
+def compare_backends(reference: ModelInterface, candidate: ModelInterface, image_paths: list) -> dict:
+    """
+    Compare les probabilités de deux interfaces sur les mêmes images
+    
+    Returns:
+        Dictionnaire avec l'écart absolu maximal et le nombre de labels différents
+    """
+    if reference.model.channels == 1:
+        # Modèle niveaux de gris (fold_grayscale.py) : images monocanal uniquement
+        batch = np.concatenate([img for img in map(ModelInterface._load_grayscale, image_paths) if img is not None])
+    else:
+        batch = np.concatenate([reference._preprocess_image(path) for path in image_paths])
+    expected = reference._predict_array(batch)
+    actual = candidate._predict_array(batch)
+    return {
+        'images': len(batch),
+        'max_abs_diff': float(np.max(np.abs(expected - actual))),
+        'label_mismatches': int(np.sum((expected >= 0.5) != (actual >= 0.5)))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', choices=sorted(CONVERTERS), required=True)
+    parser.add_argument('--model', default='model.h5', help="Modèle Keras source")
+    parser.add_argument('--output', help="Fichier de sortie (défaut: model.<format>)")
+    parser.add_argument('--images', default='images-test', help="Images de vérification")
+    parser.add_argument('--tolerance', type=float, default=1e-4, help="Écart absolu maximal accepté")
+    args = parser.parse_args()
+    
+    output_path = args.output or os.path.splitext(args.model)[0] + get_backend_class(args.format).extension
+    
+    print(f"🔄 Conversion {args.model} -> {output_path}")
+    CONVERTERS[args.format](args.model, output_path)
+    print(f"✅ Modèle exporté ({os.path.getsize(output_path) / (1024 * 1024):.1f} Mo)")
+    
+    image_paths = list_test_images(args.images)
+    if not image_paths:
+        print(f"⚠️  Aucune image dans {args.images} : équivalence non vérifiée")
+        return
+    
+    reference = ModelInterface(args.model, backend='keras')
+    candidate = ModelInterface(output_path, backend=args.format)
+    result = compare_backends(reference, candidate, image_paths)
+    print(f"Images comparées: {result['images']}")
+    print(f"Écart absolu maximal: {result['max_abs_diff']:.2e} (tolérance {args.tolerance:.0e})")
+    print(f"Labels différents: {result['label_mismatches']}")
+    
+    if result['max_abs_diff'] > args.tolerance or result['label_mismatches']:
+        print("❌ Modèle converti non équivalent au modèle Keras")
+        sys.exit(1)
+    print("✅ Modèle converti équivalent au modèle Keras")
+
+if __name__ == "__main__":
+    main()
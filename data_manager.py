@@ -1,25 +1,53 @@
-import json
 import os
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import pandas as pd
+import config
+from record_deltas import diff_records, reconstruct_versions
+from storage_codecs import get_codec
+from storage_io import (
+    atomic_write_bytes, file_lock, StorageCorruptionError, ConcurrentModificationError
+)
+from records import (
+    PatientRecord, ImageRecord, PredictionRecord, ShadowPredictionRecord, AnnotationRecord,
+    AuditEntry, Record, to_records, to_dicts, find_record
+)
 
 class DataManager:
     """Gestionnaire centralisé des données de l'application"""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", codec: Optional[str] = None):
         self.data_dir = data_dir
+        
+        # Codec d'écriture (la lecture détecte le format de chaque fichier)
+        self.codec = get_codec(codec or config.STORAGE_CODEC)
         self.patients_file = os.path.join(data_dir, "patients.json")
         self.images_file = os.path.join(data_dir, "images.json")
         self.predictions_file = os.path.join(data_dir, "predictions.json")
+        self.shadow_predictions_file = os.path.join(data_dir, "shadow_predictions.json")
         self.annotations_file = os.path.join(data_dir, "annotations.json")
+        self.annotation_history_file = os.path.join(data_dir, "annotation_history.json")
         self.audit_log_file = os.path.join(data_dir, "audit_log.json")
+        self.sequences_file = os.path.join(data_dir, "sequences.json")
+        
+        # Cache des stores sous forme d'enregistrements typés (invalidé quand le fichier change)
+        self._record_types = {
+            self.patients_file: PatientRecord,
+            self.images_file: ImageRecord,
+            self.predictions_file: PredictionRecord,
+            self.shadow_predictions_file: ShadowPredictionRecord,
+            self.annotations_file: AnnotationRecord,
+            self.audit_log_file: AuditEntry
+        }
+        self._record_cache = {}
         
         # Créer le répertoire de données s'il n'existe pas
         os.makedirs(data_dir, exist_ok=True)
         
         # Initialiser les fichiers JSON s'ils n'existent pas
         self._initialize_files()
+        self._migrate_annotation_history()
     
     def _initialize_files(self):
         """Initialise les fichiers JSON s'ils n'existent pas"""
@@ -27,178 +55,503 @@ class DataManager:
             self.patients_file: [],
             self.images_file: [],
             self.predictions_file: [],
+            self.shadow_predictions_file: [],
             self.annotations_file: [],
+            self.annotation_history_file: [],
             self.audit_log_file: []
         }
         
         for file_path, default_value in files.items():
             if not os.path.exists(file_path):
-                self._save_json(file_path, default_value)
+                with self._lock(file_path):
+                    if not os.path.exists(file_path):
+                        self._save_json(file_path, default_value)
     
     def _load_json(self, file_path: str) -> List[Dict]:
-        """Charge un fichier JSON"""
+        """
+        Charge un fichier de données (JSON indenté, JSON compact ou MessagePack)
+        
+        Un fichier absent est un store vide ; un fichier illisible lève
+        StorageCorruptionError au lieu d'être écrasé par la prochaine sauvegarde.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
             return []
+        try:
+            return self.codec.decode(raw)
+        except ValueError as e:
+            raise StorageCorruptionError(f"Fichier de données illisible: {file_path} ({e})") from e
     
     def _save_json(self, file_path: str, data: List[Dict]):
-        """Sauvegarde un fichier JSON"""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        """Sauvegarde un fichier de données avec le codec configuré (écriture atomique)"""
+        atomic_write_bytes(file_path, self.codec.encode(data))
+        self._record_cache.pop(file_path, None)
+    
+    @contextmanager
+    def _lock(self, *file_paths: str):
+        """
+        Verrouille un ou plusieurs fichiers pour une séquence lecture-modification-écriture
+        
+        Les verrous sont toujours pris dans le même ordre pour éviter les
+        interblocages entre processus. Le journal d'audit est écrit après la
+        libération des verrous (voir _log_change).
+        """
+        with ExitStack() as stack:
+            for file_path in sorted(set(file_paths)):
+                stack.enter_context(file_lock(file_path))
+            yield
+    
+    def _load_records(self, file_path: str) -> List[Record]:
+        """
+        Charge un store sous forme d'enregistrements typés (lecture seule)
+        
+        Le résultat est mis en cache tant que le fichier n'a pas été modifié,
+        par ce processus ou par un autre.
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return []
+        
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._record_cache.get(file_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        
+        records = to_records(self._load_json(file_path), self._record_types[file_path])
+        self._record_cache[file_path] = (key, records)
+        return records
+    
+    def get_records(self, store: str) -> List[Record]:
+        """
+        Récupère les enregistrements typés d'un store, pour les boucles de lecture
+        
+        Args:
+            store: 'patients', 'images', 'predictions', 'shadow_predictions',
+                'annotations' ou 'audit_log'
+        
+        Returns:
+            Liste partagée d'enregistrements (ne pas modifier ; utiliser to_dict())
+        """
+        files = {
+            'patients': self.patients_file,
+            'images': self.images_file,
+            'predictions': self.predictions_file,
+            'shadow_predictions': self.shadow_predictions_file,
+            'annotations': self.annotations_file,
+            'audit_log': self.audit_log_file
+        }
+        return self._load_records(files[store])
+    
+    def _next_id(self, prefix: str, records: List[Dict]) -> str:
+        """
+        Génère le prochain identifiant d'un store (ex: img_42)
+        
+        Les enregistrements archivés ne sont plus dans les fichiers actifs :
+        on part donc du plus grand identifiant connu (actif ou archivé)
+        plutôt que du nombre d'enregistrements.
+        """
+        last = self.get_sequences().get(prefix, 0)
+        for record in records:
+            suffix = str(record.get('id', '')).rpartition('_')[2]
+            if suffix.isdigit():
+                last = max(last, int(suffix))
+        return f"{prefix}_{last + 1}"
+    
+    def get_sequences(self) -> Dict[str, int]:
+        """Récupère les plus grands identifiants attribués par store"""
+        return self._load_json(self.sequences_file) or {}
+    
+    def reserve_sequences(self, records_by_prefix: Dict[str, List[Dict]]):
+        """Mémorise les identifiants d'enregistrements sortis des fichiers actifs"""
+        with self._lock(self.sequences_file):
+            sequences = self.get_sequences()
+            for prefix, records in records_by_prefix.items():
+                for record in records:
+                    suffix = str(record.get('id', '')).rpartition('_')[2]
+                    if suffix.isdigit():
+                        sequences[prefix] = max(sequences.get(prefix, 0), int(suffix))
+            self._save_json(self.sequences_file, sequences)
     
     # ========== Gestion des patients ==========
     
     def add_patient(self, patient_id: str, metadata: Dict) -> str:
         """Ajoute un nouveau patient"""
-        patients = self._load_json(self.patients_file)
-        
-        # Vérifier si le patient existe déjà
-        existing = next((p for p in patients if p['patient_id'] == patient_id), None)
-        if existing:
-            return existing['id']
-        
-        patient = {
-            'id': f"pat_{len(patients) + 1}",
-            'patient_id': patient_id,
-            'metadata': metadata,
-            'created_at': datetime.now().isoformat()
-        }
+        return self.add_patients({patient_id: metadata})[patient_id]
+    
+    def add_patients(self, patients_metadata: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        Ajoute plusieurs patients en une seule écriture (import par lots)
         
-        patients.append(patient)
-        self._save_json(self.patients_file, patients)
-        return patient['id']
+        Un patient déjà connu n'est pas modifié.
+        
+        Returns:
+            ID interne de chaque patient, par identifiant patient
+        """
+        with self._lock(self.patients_file):
+            patients = self._load_json(self.patients_file)
+            ids = {p['patient_id']: p['id'] for p in patients if p['patient_id'] in patients_metadata}
+            
+            new_patients = [patient_id for patient_id in patients_metadata if patient_id not in ids]
+            if not new_patients:
+                return ids
+            
+            created_at = datetime.now().isoformat()
+            first = int(self._next_id('pat', patients).rpartition('_')[2])
+            for offset, patient_id in enumerate(new_patients):
+                patient = {
+                    'id': f"pat_{first + offset}",
+                    'patient_id': patient_id,
+                    'metadata': patients_metadata[patient_id],
+                    'created_at': created_at
+                }
+                patients.append(patient)
+                ids[patient_id] = patient['id']
+            
+            self._save_json(self.patients_file, patients)
+        return ids
     
     def get_patient_by_id(self, patient_id: str) -> Optional[Dict]:
         """Récupère un patient par son ID"""
-        patients = self._load_json(self.patients_file)
-        return next((p for p in patients if p['patient_id'] == patient_id), None)
+        patient = find_record(self._load_records(self.patients_file), 'patient_id', patient_id)
+        return patient.to_dict() if patient else None
     
     def get_all_patients(self) -> List[Dict]:
         """Récupère tous les patients"""
-        return self._load_json(self.patients_file)
+        return to_dicts(self._load_records(self.patients_file))
     
     # ========== Gestion des images ==========
     
     def add_image(self, image_data: Dict) -> str:
         """Ajoute une nouvelle image"""
-        images = self._load_json(self.images_file)
-        
-        image = {
-            'id': f"img_{len(images) + 1}",
-            **image_data,
-            'created_at': datetime.now().isoformat(),
-            'status': 'pending'  # pending, processing, completed, failed
-        }
-        
-        images.append(image)
-        self._save_json(self.images_file, images)
-        return image['id']
+        return self.add_images([image_data])[0]
     
-    def update_image_status(self, image_id: str, status: str, error: Optional[str] = None):
-        """Met à jour le statut d'une image"""
-        images = self._load_json(self.images_file)
-        for img in images:
-            if img['id'] == image_id:
-                img['status'] = status
-                if error:
-                    img['error'] = error
-                img['updated_at'] = datetime.now().isoformat()
-                break
-        self._save_json(self.images_file, images)
+    def add_images(self, images_data: List[Dict]) -> List[str]:
+        """Ajoute plusieurs images en une seule écriture (import par lots)"""
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            
+            ids = []
+            created_at = datetime.now().isoformat()
+            first = int(self._next_id('img', images).rpartition('_')[2])
+            for offset, image_data in enumerate(images_data):
+                image = {
+                    'id': f"img_{first + offset}",
+                    **image_data,
+                    'created_at': created_at,
+                    'status': 'pending',  # pending, processing, completed, failed
+                    'rev': 1
+                }
+                images.append(image)
+                ids.append(image['id'])
+            
+            self._save_json(self.images_file, images)
+        return ids
+    
+    def update_image_status(self, image_id: str, status: str, error: Optional[str] = None,
+                            expected_rev: Optional[int] = None) -> int:
+        """
+        Met à jour le statut d'une image
+        
+        Args:
+            image_id: ID de l'image
+            status: Nouveau statut
+            error: Message d'erreur éventuel
+            expected_rev: Révision lue par l'appelant ; si l'image a été modifiée
+                depuis, ConcurrentModificationError est levée
+        
+        Returns:
+            Nouvelle révision de l'image
+        """
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            img = next((i for i in images if i['id'] == image_id), None)
+            if img is None:
+                return 0
+            self._check_revision(img, expected_rev)
+            img['status'] = status
+            if error:
+                img['error'] = error
+            img['updated_at'] = datetime.now().isoformat()
+            img['rev'] = img.get('rev', 0) + 1
+            self._save_json(self.images_file, images)
+        return img['rev']
+    
+    def set_analysis_statuses(self, completed: List[str], failed: Dict[str, str]):
+        """
+        Statut d'analyse d'un lot d'images, en une seule écriture
+        
+        Seules les images encore au stade de l'analyse (pending, processing,
+        failed) changent de statut : une image déjà envoyée en revue ou
+        finalisée garde le sien.
+        
+        Args:
+            completed: IDs des images analysées
+            failed: ID de l'image -> message d'erreur
+        """
+        updates = {image_id: ('completed', None) for image_id in completed}
+        updates.update({image_id: ('failed', error) for image_id, error in failed.items()})
+        if not updates:
+            return
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            updated_at = datetime.now().isoformat()
+            for img in images:
+                if img['id'] in updates and img.get('status', 'pending') in ('pending', 'processing', 'failed'):
+                    img['status'], error = updates[img['id']]
+                    if error:
+                        img['error'] = error
+                    img['updated_at'] = updated_at
+                    img['rev'] = img.get('rev', 0) + 1
+            self._save_json(self.images_file, images)
+    
+    def set_processing_statuses(self, image_ids: List[str]):
+        """
+        Marque un lot d'images 'processing' (passage au modèle), en une seule écriture
+        
+        Comme pour set_analysis_statuses, seules les images encore au stade de
+        l'analyse (pending, failed) changent de statut.
+        
+        Args:
+            image_ids: IDs des images du lot
+        """
+        ids = set(image_ids)
+        if not ids:
+            return
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            updated_at = datetime.now().isoformat()
+            for img in images:
+                if img['id'] in ids and img.get('status', 'pending') in ('pending', 'failed'):
+                    img['status'] = 'processing'
+                    img['updated_at'] = updated_at
+                    img['rev'] = img.get('rev', 0) + 1
+            self._save_json(self.images_file, images)
+    
+    @staticmethod
+    def _check_revision(image: Dict, expected_rev: Optional[int]):
+        """Contrôle optimiste : l'image n'a pas changé depuis sa lecture par l'appelant"""
+        if expected_rev is not None and image.get('rev', 0) != expected_rev:
+            raise ConcurrentModificationError(
+                f"Image {image['id']} modifiée entre-temps "
+                f"(révision {image.get('rev', 0)}, attendue {expected_rev})"
+            )
     
     def get_image(self, image_id: str) -> Optional[Dict]:
         """Récupère une image par son ID"""
-        images = self._load_json(self.images_file)
-        return next((img for img in images if img['id'] == image_id), None)
+        image = find_record(self._load_records(self.images_file), 'id', image_id)
+        return image.to_dict() if image else None
     
     def get_images_by_patient(self, patient_id: str) -> List[Dict]:
         """Récupère toutes les images d'un patient"""
-        images = self._load_json(self.images_file)
-        return [img for img in images if img.get('patient_id') == patient_id]
+        images = self._load_records(self.images_file)
+        return [img.to_dict() for img in images if img.get('patient_id') == patient_id]
     
     def get_all_images(self) -> List[Dict]:
         """Récupère toutes les images"""
-        return self._load_json(self.images_file)
+        return to_dicts(self._load_records(self.images_file))
     
     # ========== Gestion des prédictions ==========
     
     def add_prediction(self, prediction_data: Dict) -> str:
         """Ajoute une prédiction du modèle"""
-        predictions = self._load_json(self.predictions_file)
-        
-        prediction = {
-            'id': f"pred_{len(predictions) + 1}",
-            **prediction_data,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        predictions.append(prediction)
-        self._save_json(self.predictions_file, predictions)
-        return prediction['id']
+        return self.add_predictions([prediction_data])[0]
     
-    def get_prediction_by_image(self, image_id: str) -> Optional[Dict]:
-        """Récupère la prédiction pour une image"""
-        predictions = self._load_json(self.predictions_file)
-        return next((p for p in predictions if p.get('image_id') == image_id), None)
+    def add_predictions(self, predictions_data: List[Dict]) -> List[str]:
+        """Ajoute plusieurs prédictions en une seule écriture (réévaluation par lots)"""
+        with self._lock(self.predictions_file):
+            predictions = self._load_json(self.predictions_file)
+            
+            ids = []
+            created_at = datetime.now().isoformat()
+            first = int(self._next_id('pred', predictions).rpartition('_')[2])
+            for offset, prediction_data in enumerate(predictions_data):
+                prediction = {
+                    'id': f"pred_{first + offset}",
+                    **prediction_data,
+                    'created_at': created_at
+                }
+                predictions.append(prediction)
+                ids.append(prediction['id'])
+            
+            self._save_json(self.predictions_file, predictions)
+        return ids
+    
+    def add_predictions_once(self, predictions_data: List[Dict]) -> List[Tuple[str, bool]]:
+        """
+        Ajoute des prédictions de manière idempotente (workers de scoring)
+        
+        Chaque prédiction porte la clé de son job ('job_id') : une prédiction
+        dont la clé est déjà enregistrée n'est pas ajoutée une seconde fois,
+        même si deux workers valident le même job (bail expiré puis repris).
+        
+        Returns:
+            (ID de la prédiction, True si elle vient d'être ajoutée) pour chaque entrée
+        """
+        with self._lock(self.predictions_file):
+            predictions = self._load_json(self.predictions_file)
+            existing = {p['job_id']: p['id'] for p in predictions if p.get('job_id')}
+            
+            results = []
+            created_at = datetime.now().isoformat()
+            next_number = int(self._next_id('pred', predictions).rpartition('_')[2])
+            for prediction_data in predictions_data:
+                job_id = prediction_data['job_id']
+                if job_id in existing:
+                    results.append((existing[job_id], False))
+                    continue
+                prediction = {
+                    'id': f"pred_{next_number}",
+                    **prediction_data,
+                    'created_at': created_at
+                }
+                next_number += 1
+                predictions.append(prediction)
+                existing[job_id] = prediction['id']
+                results.append((prediction['id'], True))
+            
+            if any(created for _, created in results):
+                self._save_json(self.predictions_file, predictions)
+        return results
+    
+    def get_prediction_by_image(self, image_id: str, model_version: Optional[str] = None) -> Optional[Dict]:
+        """
+        Récupère la prédiction la plus récente pour une image
+        
+        Args:
+            image_id: ID de l'image
+            model_version: Restreindre aux prédictions d'une version du modèle
+        """
+        for prediction in reversed(self._load_records(self.predictions_file)):
+            if prediction.get('image_id') == image_id and (
+                    model_version is None or prediction.get('model_version') == model_version):
+                return prediction.to_dict()
+        return None
+    
+    def get_scored_image_ids(self, model_version: str) -> set:
+        """IDs des images ayant déjà une prédiction de cette version du modèle"""
+        return {
+            p.get('image_id') for p in self._load_records(self.predictions_file)
+            if p.get('model_version') == model_version
+        }
     
     def get_all_predictions(self) -> List[Dict]:
         """Récupère toutes les prédictions"""
-        return self._load_json(self.predictions_file)
+        return to_dicts(self._load_records(self.predictions_file))
+    
+    def add_shadow_predictions(self, predictions_data: List[Dict]) -> List[str]:
+        """
+        Ajoute les prédictions d'un modèle shadow (voir model_registry.py)
+        
+        Stockées à part : elles n'apparaissent jamais comme prédiction d'une
+        image. Chaque entrée référence par 'prediction_id' la prédiction du
+        modèle actif issue de la même passe.
+        """
+        with self._lock(self.shadow_predictions_file):
+            shadow_predictions = self._load_json(self.shadow_predictions_file)
+            
+            ids = []
+            created_at = datetime.now().isoformat()
+            first = int(self._next_id('shadow', shadow_predictions).rpartition('_')[2])
+            for offset, prediction_data in enumerate(predictions_data):
+                prediction = {
+                    'id': f"shadow_{first + offset}",
+                    **prediction_data,
+                    'created_at': created_at
+                }
+                shadow_predictions.append(prediction)
+                ids.append(prediction['id'])
+            
+            self._save_json(self.shadow_predictions_file, shadow_predictions)
+        return ids
+    
+    def get_shadow_predictions(self, model_version: Optional[str] = None) -> List[Dict]:
+        """Récupère les prédictions shadow, éventuellement d'une seule version"""
+        return [
+            p.to_dict() for p in self._load_records(self.shadow_predictions_file)
+            if model_version is None or p.get('model_version') == model_version
+        ]
     
     # ========== Gestion des annotations ==========
     
     def add_annotation(self, annotation_data: Dict) -> str:
         """Ajoute une annotation (préparateur ou médecin)"""
-        annotations = self._load_json(self.annotations_file)
-        
-        annotation = {
-            'id': f"ann_{len(annotations) + 1}",
-            **annotation_data,
-            'created_at': datetime.now().isoformat(),
-            'version': 1
-        }
-        
-        annotations.append(annotation)
-        self._save_json(self.annotations_file, annotations)
+        with self._lock(self.annotations_file, self.annotation_history_file):
+            annotations = self._load_json(self.annotations_file)
+            history = self._load_json(self.annotation_history_file)
+            
+            annotation = {
+                'id': self._next_id('ann', annotations + history),
+                **annotation_data,
+                'created_at': datetime.now().isoformat(),
+                'version': 1
+            }
+            
+            # Une annotation existe déjà pour cette image : elle devient une version antérieure
+            existing = next((a for a in annotations if a.get('image_id') == annotation.get('image_id')), None)
+            if existing:
+                annotation['version'] = existing.get('version', 0) + 1
+                annotation['previous_version_id'] = existing['id']
+                self._replace_annotation_snapshot(annotations, history, existing, annotation)
+            else:
+                annotations.append(annotation)
+                self._save_json(self.annotations_file, annotations)
         
         # Journaliser le changement
         self._log_change(annotation_data.get('user_name'), 'annotation_created', annotation)
         
         return annotation['id']
     
-    def update_annotation(self, image_id: str, user_name: str, updates: Dict) -> Optional[str]:
-        """Met à jour une annotation existante"""
-        annotations = self._load_json(self.annotations_file)
-        
-        # Trouver l'annotation la plus récente pour cette image
-        image_annotations = [a for a in annotations if a.get('image_id') == image_id]
-        if not image_annotations:
-            return None
-        
-        # Trier par version et prendre la plus récente
-        latest = max(image_annotations, key=lambda x: x.get('version', 0))
-        
-        # Créer une nouvelle version
-        old_label = latest.get('label')
-        new_annotation = {
-            'id': f"ann_{len(annotations) + 1}",
-            'image_id': image_id,
-            'patient_id': latest.get('patient_id'),
-            'label': updates.get('label', latest.get('label')),
-            'confidence': updates.get('confidence', latest.get('confidence')),
-            'notes': updates.get('notes', latest.get('notes', '')),
-            'additional_info': updates.get('additional_info', latest.get('additional_info', {})),
-            'user_name': user_name,
-            'user_role': updates.get('user_role', latest.get('user_role')),
-            'created_at': datetime.now().isoformat(),
-            'version': latest.get('version', 0) + 1,
-            'previous_version_id': latest['id']
-        }
-        
-        annotations.append(new_annotation)
-        self._save_json(self.annotations_file, annotations)
+    def update_annotation(self, image_id: str, user_name: str, updates: Dict,
+                          expected_version: Optional[int] = None) -> Optional[str]:
+        """
+        Met à jour une annotation existante
+        
+        Args:
+            image_id: ID de l'image annotée
+            user_name: Auteur de la modification
+            updates: Champs modifiés
+            expected_version: Version sur laquelle l'utilisateur a travaillé ; si une
+                autre version a été enregistrée depuis, ConcurrentModificationError est levée
+        
+        Returns:
+            ID de la nouvelle version, ou None si l'image n'a pas d'annotation
+        """
+        with self._lock(self.annotations_file, self.annotation_history_file):
+            annotations = self._load_json(self.annotations_file)
+            
+            # Version courante de l'annotation pour cette image
+            latest = next((a for a in annotations if a.get('image_id') == image_id), None)
+            if not latest:
+                return None
+            if expected_version is not None and latest.get('version', 0) != expected_version:
+                raise ConcurrentModificationError(
+                    f"Annotation de {image_id} modifiée entre-temps par {latest.get('user_name')} "
+                    f"(version {latest.get('version', 0)}, attendue {expected_version})"
+                )
+            
+            history = self._load_json(self.annotation_history_file)
+            
+            # Créer une nouvelle version
+            old_label = latest.get('label')
+            new_annotation = {
+                'id': self._next_id('ann', annotations + history),
+                'image_id': image_id,
+                'patient_id': latest.get('patient_id'),
+                'label': updates.get('label', latest.get('label')),
+                'confidence': updates.get('confidence', latest.get('confidence')),
+                'notes': updates.get('notes', latest.get('notes', '')),
+                'additional_info': updates.get('additional_info', latest.get('additional_info', {})),
+                'user_name': user_name,
+                'user_role': updates.get('user_role', latest.get('user_role')),
+                'created_at': datetime.now().isoformat(),
+                'version': latest.get('version', 0) + 1,
+                'previous_version_id': latest['id']
+            }
+            
+            self._replace_annotation_snapshot(annotations, history, latest, new_annotation)
         
         # Journaliser le changement
         self._log_change(user_name, 'annotation_updated', {
@@ -210,17 +563,72 @@ class DataManager:
         
         return new_annotation['id']
     
+    def _replace_annotation_snapshot(self, annotations: List[Dict], history: List[Dict],
+                                     previous: Dict, current: Dict):
+        """
+        Remplace la version courante d'une annotation
+        
+        Seul le delta permettant de revenir à la version précédente est
+        conservé dans l'historique, pas une copie complète.
+        """
+        history.append({
+            'id': previous['id'],
+            'image_id': previous.get('image_id'),
+            'version': previous.get('version', 0),
+            'patch': diff_records(previous, current)
+        })
+        annotations[annotations.index(previous)] = current
+        self._save_json(self.annotation_history_file, history)
+        self._save_json(self.annotations_file, annotations)
+    
     def get_annotation_by_image(self, image_id: str) -> Optional[Dict]:
         """Récupère l'annotation la plus récente pour une image"""
-        annotations = self._load_json(self.annotations_file)
-        image_annotations = [a for a in annotations if a.get('image_id') == image_id]
-        if not image_annotations:
-            return None
-        return max(image_annotations, key=lambda x: x.get('version', 0))
+        annotation = find_record(self._load_records(self.annotations_file), 'image_id', image_id)
+        return annotation.to_dict() if annotation else None
     
     def get_all_annotations(self) -> List[Dict]:
-        """Récupère toutes les annotations"""
-        return self._load_json(self.annotations_file)
+        """Récupère la version courante de toutes les annotations"""
+        return to_dicts(self._load_records(self.annotations_file))
+    
+    def get_annotation_history(self, image_id: str) -> List[Dict]:
+        """Reconstruit toutes les versions de l'annotation d'une image (version croissante)"""
+        snapshot = self.get_annotation_by_image(image_id)
+        if not snapshot:
+            return []
+        deltas = [d for d in self._load_json(self.annotation_history_file) if d.get('image_id') == image_id]
+        return reconstruct_versions(snapshot, deltas)
+    
+    def _migrate_annotation_history(self):
+        """Convertit l'ancien format (toutes les versions complètes) en version courante + deltas"""
+        with self._lock(self.annotations_file, self.annotation_history_file):
+            self._migrate_annotation_history_locked()
+    
+    def _migrate_annotation_history_locked(self):
+        """Migration proprement dite (verrous déjà pris)"""
+        annotations = self._load_json(self.annotations_file)
+        image_ids = [a.get('image_id') for a in annotations]
+        if len(set(image_ids)) == len(image_ids):
+            return
+        
+        versions_by_image = {}
+        for ann in annotations:
+            versions_by_image.setdefault(ann.get('image_id'), []).append(ann)
+        
+        snapshots = []
+        history = self._load_json(self.annotation_history_file)
+        for versions in versions_by_image.values():
+            versions.sort(key=lambda x: x.get('version', 0))
+            for previous, current in zip(versions, versions[1:]):
+                history.append({
+                    'id': previous['id'],
+                    'image_id': previous.get('image_id'),
+                    'version': previous.get('version', 0),
+                    'patch': diff_records(previous, current)
+                })
+            snapshots.append(versions[-1])
+        
+        self._save_json(self.annotation_history_file, history)
+        self._save_json(self.annotations_file, snapshots)
     
     def is_patient_annotated(self, patient_id: str) -> bool:
         """Vérifie si un patient a été annoté par le préparateur"""
@@ -239,13 +647,15 @@ class DataManager:
     
     def mark_batch_for_review(self, image_ids: List[str], user_name: str):
         """Marque un lot d'images comme prêt pour revue médicale"""
-        images = self._load_json(self.images_file)
-        for img in images:
-            if img['id'] in image_ids:
-                img['status'] = 'ready_for_review'
-                img['sent_for_review_at'] = datetime.now().isoformat()
-                img['sent_by'] = user_name
-        self._save_json(self.images_file, images)
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            for img in images:
+                if img['id'] in image_ids:
+                    img['status'] = 'ready_for_review'
+                    img['sent_for_review_at'] = datetime.now().isoformat()
+                    img['sent_by'] = user_name
+                    img['rev'] = img.get('rev', 0) + 1
+            self._save_json(self.images_file, images)
         
         self._log_change(user_name, 'batch_sent_for_review', {
             'image_ids': image_ids,
@@ -254,24 +664,90 @@ class DataManager:
     
     def get_images_for_review(self) -> List[Dict]:
         """Récupère les images en attente de revue médicale"""
-        images = self._load_json(self.images_file)
-        return [img for img in images if img.get('status') == 'ready_for_review']
+        images = self._load_records(self.images_file)
+        return [img.to_dict() for img in images if img.get('status') == 'ready_for_review']
     
     def mark_batch_finalized(self, image_ids: List[str], user_name: str):
         """Marque un lot comme finalisé par le médecin"""
-        images = self._load_json(self.images_file)
-        for img in images:
-            if img['id'] in image_ids:
-                img['status'] = 'finalized'
-                img['finalized_at'] = datetime.now().isoformat()
-                img['finalized_by'] = user_name
-        self._save_json(self.images_file, images)
+        with self._lock(self.images_file):
+            images = self._load_json(self.images_file)
+            for img in images:
+                if img['id'] in image_ids:
+                    img['status'] = 'finalized'
+                    img['finalized_at'] = datetime.now().isoformat()
+                    img['finalized_by'] = user_name
+                    img['rev'] = img.get('rev', 0) + 1
+            self._save_json(self.images_file, images)
         
         self._log_change(user_name, 'batch_finalized', {
             'image_ids': image_ids,
             'count': len(image_ids)
         })
     
+    def get_finalized_images(self, finalized_before: Optional[str] = None) -> List[Dict]:
+        """Récupère les images finalisées, éventuellement avant une date ISO donnée"""
+        images = self._load_records(self.images_file)
+        return [
+            img.to_dict() for img in images
+            if img.get('status') == 'finalized'
+            and (finalized_before is None or img.get('finalized_at', '') < finalized_before)
+        ]
+    
+    def collect_case_records(self, image_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Rassemble tous les enregistrements actifs liés à un ensemble d'images"""
+        ids = set(image_ids)
+        return {
+            'images': [img for img in self._load_json(self.images_file) if img['id'] in ids],
+            'predictions': [p for p in self._load_json(self.predictions_file) if p.get('image_id') in ids],
+            'annotations': [a for a in self._load_json(self.annotations_file) if a.get('image_id') in ids],
+            'annotation_history': [d for d in self._load_json(self.annotation_history_file) if d.get('image_id') in ids],
+            'audit_log': [e for e in self._load_json(self.audit_log_file) if self._audit_entry_within(e, ids)]
+        }
+    
+    def case_store_lock(self):
+        """Verrou de tous les stores contenant des enregistrements de cas"""
+        return self._lock(
+            self.images_file, self.predictions_file, self.annotations_file,
+            self.annotation_history_file, self.audit_log_file
+        )
+    
+    def purge_case_records(self, image_ids: List[str]):
+        """Retire des fichiers actifs tous les enregistrements liés à un ensemble d'images"""
+        ids = set(image_ids)
+        with self.case_store_lock():
+            removed = self.collect_case_records(image_ids)
+            
+            # Conserver les plus grands identifiants pour ne jamais les réattribuer
+            self.reserve_sequences({
+                'img': removed['images'],
+                'pred': removed['predictions'],
+                'ann': removed['annotations'] + removed['annotation_history'],
+                'log': removed['audit_log']
+            })
+            
+            images = self._load_json(self.images_file)
+            self._save_json(self.images_file, [img for img in images if img['id'] not in ids])
+            predictions = self._load_json(self.predictions_file)
+            self._save_json(self.predictions_file, [p for p in predictions if p.get('image_id') not in ids])
+            annotations = self._load_json(self.annotations_file)
+            self._save_json(self.annotations_file, [a for a in annotations if a.get('image_id') not in ids])
+            history = self._load_json(self.annotation_history_file)
+            self._save_json(self.annotation_history_file, [d for d in history if d.get('image_id') not in ids])
+            log = self._load_json(self.audit_log_file)
+            self._save_json(self.audit_log_file, [e for e in log if not self._audit_entry_within(e, ids)])
+    
+    @staticmethod
+    def _audit_entry_within(entry: Dict, image_ids: set) -> bool:
+        """Vérifie si une entrée d'audit ne concerne que des images de l'ensemble"""
+        details = entry.get('details') or {}
+        if not isinstance(details, dict):
+            return False
+        if details.get('image_id') is not None:
+            return details['image_id'] in image_ids
+        if details.get('image_ids'):
+            return all(img_id in image_ids for img_id in details['image_ids'])
+        return False
+    
     def start_treatment(self, image_id: str, user_name: str, action_type: str, details: Dict) -> str:
         """Démarre un traitement pour un patient"""
         # Créer ou mettre à jour l'annotation avec les informations de traitement
@@ -359,60 +835,48 @@ class DataManager:
     
     def get_patients_in_treatment(self) -> List[Dict]:
         """Récupère tous les patients en traitement"""
-        images = self._load_json(self.images_file)
-        annotations = self._load_json(self.annotations_file)
+        images = self._load_records(self.images_file)
+        annotations = self._load_records(self.annotations_file)
         
-        # Créer un dictionnaire des annotations les plus récentes par image
-        latest_annotations = {}
-        for ann in annotations:
-            img_id = ann.get('image_id')
-            if img_id:
-                if img_id not in latest_annotations:
-                    latest_annotations[img_id] = ann
-                elif ann.get('version', 0) > latest_annotations[img_id].get('version', 0):
-                    latest_annotations[img_id] = ann
+        # Dictionnaire des annotations courantes par image
+        latest_annotations = {ann.get('image_id'): ann for ann in annotations if ann.get('image_id')}
         
         # Filtrer les images avec traitement
         patients_in_treatment = []
         for img in images:
-            ann = latest_annotations.get(img['id'])
-            if ann and ann.get('additional_info', {}).get('treatment'):
-                treatment = ann['additional_info']['treatment']
+            ann = latest_annotations.get(img.id)
+            if ann and (ann.get('additional_info') or {}).get('treatment'):
+                treatment = ann.additional_info['treatment']
                 if treatment.get('status') in ['en_traitement', 'en_attente_examens', 'hospitalise']:
+                    ann = ann.to_dict()
                     patients_in_treatment.append({
-                        'image': img,
+                        'image': img.to_dict(),
                         'annotation': ann,
-                        'treatment': treatment
+                        'treatment': ann['additional_info']['treatment']
                     })
         
         return patients_in_treatment
     
     def get_patients_with_completed_treatment(self) -> List[Dict]:
         """Récupère tous les patients avec traitement terminé (statut 'termine')"""
-        images = self._load_json(self.images_file)
-        annotations = self._load_json(self.annotations_file)
+        images = self._load_records(self.images_file)
+        annotations = self._load_records(self.annotations_file)
         
-        # Créer un dictionnaire des annotations les plus récentes par image
-        latest_annotations = {}
-        for ann in annotations:
-            img_id = ann.get('image_id')
-            if img_id:
-                if img_id not in latest_annotations:
-                    latest_annotations[img_id] = ann
-                elif ann.get('version', 0) > latest_annotations[img_id].get('version', 0):
-                    latest_annotations[img_id] = ann
+        # Dictionnaire des annotations courantes par image
+        latest_annotations = {ann.get('image_id'): ann for ann in annotations if ann.get('image_id')}
         
         # Filtrer les images avec traitement terminé
         completed_patients = []
         for img in images:
-            ann = latest_annotations.get(img['id'])
-            if ann and ann.get('additional_info', {}).get('treatment'):
-                treatment = ann['additional_info']['treatment']
+            ann = latest_annotations.get(img.id)
+            if ann and (ann.get('additional_info') or {}).get('treatment'):
+                treatment = ann.additional_info['treatment']
                 if treatment.get('status') == 'termine':
+                    ann = ann.to_dict()
                     completed_patients.append({
-                        'image': img,
+                        'image': img.to_dict(),
                         'annotation': ann,
-                        'treatment': treatment
+                        'treatment': ann['additional_info']['treatment']
                     })
         
         return completed_patients
@@ -421,25 +885,26 @@ class DataManager:
     
     def _log_change(self, user_name: str, action: str, details: Dict):
         """Journalise un changement dans le système"""
-        log = self._load_json(self.audit_log_file)
-        
-        log_entry = {
-            'id': f"log_{len(log) + 1}",
-            'user_name': user_name,
-            'action': action,
-            'details': details,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        log.append(log_entry)
-        self._save_json(self.audit_log_file, log)
+        with self._lock(self.audit_log_file):
+            log = self._load_json(self.audit_log_file)
+            
+            log_entry = {
+                'id': self._next_id('log', log),
+                'user_name': user_name,
+                'action': action,
+                'details': details,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            log.append(log_entry)
+            self._save_json(self.audit_log_file, log)
     
     def get_audit_log(self, image_id: Optional[str] = None) -> List[Dict]:
         """Récupère le journal d'audit"""
-        log = self._load_json(self.audit_log_file)
+        log = self._load_records(self.audit_log_file)
         if image_id:
-            return [entry for entry in log if image_id in str(entry.get('details', {}))]
-        return log
+            return [entry.to_dict() for entry in log if image_id in str(entry.get('details', {}))]
+        return to_dicts(log)
     
     # ========== Utilitaires ==========
     
@@ -470,20 +935,20 @@ class DataManager:
     
     def get_dataframe_for_preparator(self) -> pd.DataFrame:
         """Crée un DataFrame pour l'affichage dans la vue préparateur"""
-        images = self.get_all_images()
-        predictions = {p.get('image_id'): p for p in self.get_all_predictions()}
-        annotations = {a.get('image_id'): a for a in self.get_all_annotations()}
-        patients = {p['patient_id']: p for p in self.get_all_patients()}
+        images = self._load_records(self.images_file)
+        predictions = {p.get('image_id'): p for p in self._load_records(self.predictions_file)}
+        annotations = {a.get('image_id'): a for a in self._load_records(self.annotations_file)}
+        patients = {p.patient_id: p for p in self._load_records(self.patients_file)}
         
         rows = []
         for img in images:
             patient_id = img.get('patient_id')
             patient = patients.get(patient_id, {})
-            pred = predictions.get(img['id'], {})
-            ann = annotations.get(img['id'], {})
+            pred = predictions.get(img.id, {})
+            ann = annotations.get(img.id, {})
             
             rows.append({
-                'ID Image': img['id'],
+                'ID Image': img.id,
                 'ID Patient': patient_id,
                 'Date Examen': img.get('exam_date', 'N/A'),
                 'Sexe': patient.get('metadata', {}).get('sex', 'N/A'),
@@ -497,17 +962,17 @@ class DataManager:
     
     def get_dataframe_for_doctor(self) -> pd.DataFrame:
         """Crée un DataFrame pour l'affichage dans la vue médecin"""
-        images = self.get_images_for_review()
-        predictions = {p.get('image_id'): p for p in self.get_all_predictions()}
-        annotations = {a.get('image_id'): a for a in self.get_all_annotations()}
-        patients = {p['patient_id']: p for p in self.get_all_patients()}
+        images = [img for img in self._load_records(self.images_file) if img.get('status') == 'ready_for_review']
+        predictions = {p.get('image_id'): p for p in self._load_records(self.predictions_file)}
+        annotations = {a.get('image_id'): a for a in self._load_records(self.annotations_file)}
+        patients = {p.patient_id: p for p in self._load_records(self.patients_file)}
         
         rows = []
         for img in images:
             patient_id = img.get('patient_id')
             patient = patients.get(patient_id, {})
-            pred = predictions.get(img['id'], {})
-            ann = annotations.get(img['id'], {})
+            pred = predictions.get(img.id, {})
+            ann = annotations.get(img.id, {})
             
             # Priorité : malade > sain
             priority = 0
@@ -517,7 +982,7 @@ class DataManager:
                 priority = 1
             
             rows.append({
-                'ID Image': img['id'],
+                'ID Image': img.id,
                 'ID Patient': patient_id,
                 'Date Examen': img.get('exam_date', 'N/A'),
                 'Sexe': patient.get('metadata', {}).get('sex', 'N/A'),
@@ -533,4 +998,3 @@ class DataManager:
             df = df.sort_values('Priorité', ascending=False)
         
         return df
-
@@ -18,9 +18,9 @@ class DICOMImporter:
             'ViewPosition'
         ]
     
-    def read_dicom_file(self, file_path: str) -> Tuple[Optional[pydicom.Dataset], Optional[str]]:
+    def read_dicom_file(self, file_path) -> Tuple[Optional[pydicom.Dataset], Optional[str]]:
         """
-        Lit un fichier DICOM et retourne le dataset et une erreur éventuelle
+        Lit un fichier DICOM (chemin ou objet fichier) et retourne le dataset et une erreur éventuelle
         """
         try:
             ds = pydicom.dcmread(file_path)
@@ -108,18 +108,25 @@ class DICOMImporter:
             print(f"Erreur lors de la conversion PIL: {e}")
             return None
     
+    def make_preview(self, pixel_array: np.ndarray) -> Optional[Image.Image]:
+        """
+        Image de prévisualisation (réduite à 1024 px au plus)
+        """
+        pil_image = self.convert_to_pil_image(pixel_array)
+        if pil_image:
+            # Redimensionner si trop grande (max 1024px)
+            max_size = 1024
+            if max(pil_image.size) > max_size:
+                pil_image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        return pil_image
+    
     def save_image_preview(self, pixel_array: np.ndarray, output_path: str) -> bool:
         """
         Sauvegarde une prévisualisation de l'image
         """
         try:
-            pil_image = self.convert_to_pil_image(pixel_array)
+            pil_image = self.make_preview(pixel_array)
             if pil_image:
-                # Redimensionner si trop grande (max 1024px)
-                max_size = 1024
-                if max(pil_image.size) > max_size:
-                    pil_image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                
                 pil_image.save(output_path, format='PNG')
                 return True
             return False
@@ -139,60 +146,78 @@ class DICOMImporter:
         except:
             return default
     
-    def import_batch(self, file_paths: List[str], images_dir: str = "data/images") -> List[Dict]:
+    # ========== Étapes de l'import ==========
+    
+    def decode(self, file_path: str, raw: Optional[bytes] = None) -> Tuple[Dict, np.ndarray]:
         """
-        Importe un lot de fichiers DICOM
+        Lecture du dataset, métadonnées et pixels normalisés d'un fichier
         
-        Retourne une liste de dictionnaires avec les métadonnées et chemins des images
+        Args:
+            file_path: Chemin du fichier DICOM
+            raw: Contenu du fichier s'il a déjà été lu
+        
+        Returns:
+            (métadonnées, array uint8)
+        
+        Raises:
+            ValueError: Fichier illisible, métadonnées ou image manquantes
         """
-        os.makedirs(images_dir, exist_ok=True)
+        ds, error = self.read_dicom_file(io.BytesIO(raw) if raw is not None else file_path)
+        if error:
+            raise ValueError(error)
         
-        results = []
+        try:
+            metadata = self.extract_metadata(ds)
+        except Exception as e:
+            raise ValueError(f"Erreur métadonnées: {str(e)}")
         
-        for file_path in file_paths:
-            result = {
-                'file_path': file_path,
-                'success': False,
-                'error': None,
-                'metadata': None,
-                'image_path': None
-            }
-            
-            # Lire le fichier DICOM
-            ds, error = self.read_dicom_file(file_path)
-            if error:
-                result['error'] = error
-                results.append(result)
-                continue
-            
-            # Extraire les métadonnées
-            try:
-                metadata = self.extract_metadata(ds)
-                result['metadata'] = metadata
-            except Exception as e:
-                result['error'] = f"Erreur métadonnées: {str(e)}"
-                results.append(result)
-                continue
-            
-            # Extraire l'image
-            pixel_array = self.extract_image_array(ds)
-            if pixel_array is None:
-                result['error'] = "Impossible d'extraire l'image"
-                results.append(result)
-                continue
-            
-            # Sauvegarder l'image
-            file_name = os.path.basename(file_path)
-            image_name = f"{metadata['patient_id']}_{os.path.splitext(file_name)[0]}.png"
-            image_path = os.path.join(images_dir, image_name)
-            
-            if self.save_image_preview(pixel_array, image_path):
-                result['image_path'] = image_path
-                result['success'] = True
-            else:
-                result['error'] = "Impossible de sauvegarder l'image"
-            
-            results.append(result)
+        pixel_array = self.extract_image_array(ds)
+        if pixel_array is None:
+            raise ValueError("Impossible d'extraire l'image")
+        return metadata, pixel_array
+    
+    def preview_path(self, file_path: str, metadata: Dict, images_dir: str) -> str:
+        """Chemin de la prévisualisation PNG d'un fichier importé"""
+        file_name = os.path.basename(file_path)
+        image_name = f"{metadata['patient_id']}_{os.path.splitext(file_name)[0]}.png"
+        return os.path.join(images_dir, image_name)
+    
+    def import_file(self, file_path: str, images_dir: str = "data/images") -> Dict:
+        """
+        Importe un fichier DICOM : décodage puis sauvegarde de la prévisualisation
         
-        return results
-
+        Retourne un dictionnaire avec les métadonnées et le chemin de l'image
+        """
+        result = {
+            'file_path': file_path,
+            'success': False,
+            'error': None,
+            'metadata': None,
+            'image_path': None
+        }
+        
+        try:
+            metadata, pixel_array = self.decode(file_path)
+        except ValueError as e:
+            result['error'] = str(e)
+            return result
+        result['metadata'] = metadata
+        
+        # Sauvegarder l'image
+        image_path = self.preview_path(file_path, metadata, images_dir)
+        if self.save_image_preview(pixel_array, image_path):
+            result['image_path'] = image_path
+            result['success'] = True
+        else:
+            result['error'] = "Impossible de sauvegarder l'image"
+        return result
+    
+    def import_batch(self, file_paths: List[str], images_dir: str = "data/images") -> List[Dict]:
+        """
+        Importe un lot de fichiers DICOM, l'un après l'autre
+        
+        Retourne une liste de dictionnaires avec les métadonnées et chemins des images
+        (voir ingestion_pipeline.py pour les imports volumineux)
+        """
+        os.makedirs(images_dir, exist_ok=True)
+        return [self.import_file(file_path, images_dir) for file_path in file_paths]
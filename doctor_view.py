@@ -1,17 +1,26 @@
 import streamlit as st
 import os
-import json
 import pandas as pd
 from datetime import datetime
-import shutil
-import zipfile
 from pathlib import Path
+import config
+from archive_manager import ArchiveManager
+from embedding_index import open_index
+from export_service import FORMAT_CHOICES, generate_export, get_validated_images
+from heatmap_cache import HeatmapCache, overlay
+from storage_io import ConcurrentModificationError
 
 class DoctorView:
     """Vue pour le rôle Médecin"""
     
     def __init__(self):
         self.data_manager = st.session_state.data_manager
+        # Conservé entre les relances : son cache de segments décompressés aussi
+        archive_manager = st.session_state.get('archive_manager')
+        if archive_manager is None or archive_manager.data_manager is not self.data_manager:
+            archive_manager = st.session_state.archive_manager = ArchiveManager(self.data_manager)
+        self.archive_manager = archive_manager
+        self.heatmap_cache = HeatmapCache(self.data_manager.data_dir)
     
     def render(self):
         st.header("👨‍⚕️ Vue Médecin")
@@ -139,7 +148,15 @@ class DoctorView:
             st.subheader("Radiographie")
             image_path = image.get('image_path')
             if image_path and os.path.exists(image_path):
-                st.image(image_path, use_container_width=True)
+                # Carte d'attention calculée avec la prédiction (voir heatmap_cache.py)
+                heatmap = None
+                if prediction and prediction.get('model_version'):
+                    heatmap = self.heatmap_cache.get(prediction['model_version'], image_id)
+                if heatmap is not None and st.toggle("Zones déterminantes pour le modèle", key=f"heatmap_{image_id}"):
+                    st.image(overlay(image_path, heatmap), use_container_width=True)
+                    st.caption("Rouge : zones ayant le plus contribué à la prédiction « malade » (Grad-CAM)")
+                else:
+                    st.image(image_path, use_container_width=True)
             else:
                 st.warning("Image non disponible")
         
@@ -193,6 +210,9 @@ class DoctorView:
                     }
                     st.write(f"**Urgence:** {urgency_color.get(info.get('urgency'), '')} {info.get('urgency')}")
         
+        # Cas validés ressemblant à cette radiographie
+        self._render_similar_cases(image_id, prediction)
+        
         # Section pour démarrer le traitement
         st.divider()
         st.subheader("💊 Démarrer le Traitement")
@@ -291,6 +311,43 @@ class DoctorView:
         else:
             st.info("Aucun historique disponible")
     
+    def _render_similar_cases(self, image_id, prediction):
+        """Affiche les cas validés les plus proches (embeddings de la prédiction, voir embedding_index.py)"""
+        st.divider()
+        st.subheader("🔍 Cas Similaires Validés")
+        
+        model_version = prediction.get('model_version') if prediction else None
+        index = open_index(self.data_manager.data_dir, model_version) if model_version else None
+        query = index.get(image_id) if index is not None else None
+        if query is None:
+            st.info("Pas d'embedding pour cette image (relancer l'analyse ou `python embedding_index.py backfill`)")
+            return
+        
+        validated = {a.get('image_id'): a for a in self.data_manager.get_all_annotations()
+                     if a.get('user_role') == 'Médecin'}
+        similar = index.search(
+            query, k=config.SIMILAR_CASES_K,
+            accept=lambda candidate: candidate != image_id and candidate in validated
+        )
+        if not similar:
+            st.info("Aucun cas validé comparable pour cette version du modèle")
+            return
+        
+        columns = st.columns(len(similar))
+        for column, (similar_id, similarity) in zip(columns, similar):
+            similar_image = self.data_manager.get_image(similar_id) or {}
+            annotation = validated[similar_id]
+            with column:
+                image_path = similar_image.get('image_path')
+                if image_path and os.path.exists(image_path):
+                    st.image(image_path, use_container_width=True)
+                st.write(f"**Patient:** {similar_image.get('patient_id', 'N/A')}")
+                if annotation.get('label') == 'malade':
+                    st.error(f"🔴 {annotation.get('label')}")
+                else:
+                    st.success(f"🟢 {annotation.get('label')}")
+                st.caption(f"Similarité: {similarity:.3f}")
+    
     def _render_treatment_tab(self):
         """Onglet pour démarrer le traitement"""
         st.subheader("💊 Démarrer un Traitement")
@@ -493,8 +550,8 @@ class DoctorView:
                         st.write(f"**Notes:** {details.get('notes')}")
                     
                     # Vérifier si le patient est déjà validé
-                    medical_annotations = [a for a in self.data_manager.get_all_annotations() 
-                                         if a.get('image_id') == image['id'] and a.get('user_role') == 'Médecin']
+                    medical_annotations = [a for a in self.data_manager.get_annotation_history(image['id'])
+                                         if a.get('user_role') == 'Médecin']
                     is_validated = len(medical_annotations) > 0
                     
                     if is_validated:
@@ -636,6 +693,11 @@ class DoctorView:
                     st.divider()
                     st.subheader("Verdict Final du Traitement")
                     
+                    # Version attendue : celle affichée au passage précédent (voir la vue préparateur)
+                    version_key = f"annotation_version_{image['id']}"
+                    seen_version = st.session_state.get(version_key, annotation.get('version', 0))
+                    st.session_state[version_key] = annotation.get('version', 0)
+                    
                     with st.form(f"finalization_form_{image['id']}"):
                         result_notes = st.text_area(
                             "Notes de résultat final",
@@ -686,14 +748,20 @@ class DoctorView:
                                 'additional_info': updated_additional_info
                             }
                             
-                            self.data_manager.update_annotation(
-                                image['id'],
-                                st.session_state.current_user_name,
-                                medical_annotation_data
-                            )
-                            
-                            st.success("✅ Verdict final consigné avec succès")
-                            st.rerun()
+                            try:
+                                self.data_manager.update_annotation(
+                                    image['id'],
+                                    st.session_state.current_user_name,
+                                    medical_annotation_data,
+                                    expected_version=seen_version
+                                )
+                            except ConcurrentModificationError as e:
+                                del st.session_state[version_key]
+                                st.error(f"❌ {e}. Rechargez la page pour voir la version actuelle.")
+                            else:
+                                st.session_state.pop(version_key, None)
+                                st.success("✅ Verdict final consigné avec succès")
+                                st.rerun()
                     
                     # Afficher le verdict si déjà consigné
                     if has_final_verdict:
@@ -705,208 +773,64 @@ class DoctorView:
                             st.write(f"**Notes:** {additional_info.get('ground_truth_notes')}")
                         st.write(f"**Consigné le:** {additional_info.get('finalized_at', 'N/A')}")
     
+    def _render_archive_section(self):
+        """Section d'archivage et de consultation des cas finalisés archivés"""
+        st.subheader("🗄️ Archivage des Cas Finalisés")
+        
+        segments = self.archive_manager.list_segments()
+        archived_count = sum(seg.get('images', 0) for seg in segments.values())
+        col1, col2 = st.columns(2)
+        col1.metric("Cas archivés", archived_count)
+        col2.metric("Segments d'archive", len(segments))
+        
+        max_age_days = st.number_input(
+            "Archiver les cas finalisés depuis plus de (jours)",
+            min_value=0,
+            value=self.archive_manager.max_age_days,
+            help="Les cas archivés sont retirés des listes actives mais restent consultables"
+        )
+        
+        if st.button("🗄️ Archiver les cas finalisés", key="archive_finalized"):
+            result = self.archive_manager.archive_finalized_cases(
+                st.session_state.current_user_name,
+                max_age_days=int(max_age_days)
+            )
+            if result['archived']:
+                st.success(f"✅ {result['archived']} cas archivé(s) ({', '.join(result['segments'])})")
+                st.rerun()
+            else:
+                st.info("Aucun cas finalisé à archiver")
+        
+        # Consultation d'un cas archivé
+        search_patient = st.text_input("Rechercher un cas archivé par ID Patient", key="archive_search_patient")
+        if search_patient:
+            archived_images = self.archive_manager.find_archived_images(patient_id=search_patient)
+            if not archived_images:
+                st.info("Aucun cas archivé pour ce patient")
+                return
+            
+            selected_archived = st.selectbox(
+                "Sélectionner un cas archivé",
+                [entry['image_id'] for entry in archived_images],
+                key="archive_select_image"
+            )
+            case = self.archive_manager.get_archived_case(selected_archived)
+            if case:
+                annotation = case['annotation'] or {}
+                prediction = case['prediction'] or {}
+                st.write(f"**Date Examen:** {case['image'].get('exam_date', 'N/A')}")
+                st.write(f"**Finalisé le:** {case['image'].get('finalized_at', 'N/A')} par {case['image'].get('finalized_by', 'N/A')}")
+                st.write(f"**Diagnostic final:** {annotation.get('label', 'N/A')} (Version {annotation.get('version', 'N/A')})")
+                st.write(f"**Prédiction Modèle:** {prediction.get('label', 'N/A')}")
+                image_path = case['image'].get('image_path')
+                if image_path and os.path.exists(image_path):
+                    st.image(image_path, use_container_width=True)
+    
     def _generate_complete_export(self, validated_images, export_format, include_images, split_dataset):
         """Génère un export complet avec plusieurs formats"""
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            export_dir = f"data/exports/export_{timestamp}"
-            os.makedirs(export_dir, exist_ok=True)
-            
-            results = {}
-            
-            # Préparer les données complètes
-            export_data = []
-            patients_data = []
-            
-            for v in validated_images:
-                img = v['image']
-                ann = v['annotation']
-                patient = self.data_manager.get_patient_by_id(img.get('patient_id'))
-                pred = self.data_manager.get_prediction_by_image(img['id'])
-                
-                # Données pour CSV et analyses statistiques
-                patient_row = {
-                    'image_id': img['id'],
-                    'patient_id': img.get('patient_id', 'N/A'),
-                    'label': ann.get('label', 'N/A'),  # malade ou sain
-                    'label_numeric': 1 if ann.get('label') == 'malade' else 0,
-                    'sexe': patient.get('metadata', {}).get('sex', 'N/A') if patient else 'N/A',
-                    'age': patient.get('metadata', {}).get('age', 'N/A') if patient else 'N/A',
-                    'zone_geographique': patient.get('metadata', {}).get('institution_name', 'N/A') if patient else 'N/A',
-                    'station': patient.get('metadata', {}).get('station_name', 'N/A') if patient else 'N/A',
-                    'date_examen': img.get('exam_date', 'N/A'),
-                    'modality': img.get('modality', 'N/A'),
-                    'body_part': img.get('body_part', 'N/A'),
-                    'patient_position': img.get('patient_position', 'N/A'),
-                    'view_position': img.get('view_position', 'N/A'),
-                    'prediction_originale': pred.get('label', 'N/A') if pred else 'N/A',
-                    'confidence_modele': pred.get('confidence', 0.0) if pred else 0.0,
-                    'confidence_medecin': ann.get('confidence', 0.0),
-                    'ground_truth': ann.get('additional_info', {}).get('ground_truth', 'Non déterminé'),
-                    'validated_by': ann.get('user_name', 'N/A'),
-                    'validated_at': ann.get('created_at', 'N/A'),
-                    'image_path': img.get('image_path', 'N/A')
-                }
-                
-                # Ajouter les informations complémentaires si disponibles
-                additional_info = ann.get('additional_info', {})
-                if additional_info:
-                    patient_row['symptoms'] = additional_info.get('symptoms', '')
-                    patient_row['comorbidities'] = additional_info.get('comorbidities', '')
-                    patient_row['spo2'] = additional_info.get('spo2', '')
-                    patient_row['temperature'] = additional_info.get('temperature', '')
-                    patient_row['crp'] = additional_info.get('crp', '')
-                    patient_row['image_quality'] = additional_info.get('image_quality', '')
-                    patient_row['urgency'] = additional_info.get('urgency', '')
-                
-                patients_data.append(patient_row)
-                
-                # Données pour JSON complet
-                export_data.append({
-                    'image_id': img['id'],
-                    'patient_id': img.get('patient_id'),
-                    'image_path': img.get('image_path'),
-                    'final_label': ann.get('label'),
-                    'label_numeric': 1 if ann.get('label') == 'malade' else 0,
-                    'ground_truth': ann.get('additional_info', {}).get('ground_truth'),
-                    'confidence': ann.get('confidence'),
-                    'notes': ann.get('notes', ''),
-                    'validated_by': ann.get('user_name'),
-                    'validated_at': ann.get('created_at'),
-                    'patient_metadata': patient.get('metadata', {}) if patient else {},
-                    'original_prediction': pred if pred else None,
-                    'clinical_metadata': additional_info
-                })
-            
-            # Générer les exports selon le format demandé
-            if export_format in ['CSV (Analyses statistiques)', 'Tous les formats']:
-                csv_path = os.path.join(export_dir, f"patients_data_{timestamp}.csv")
-                df = pd.DataFrame(patients_data)
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                results['CSV'] = csv_path
-            
-            if export_format in ['JSON complet', 'Tous les formats']:
-                json_path = os.path.join(export_dir, f"export_complet_{timestamp}.json")
-                export_metadata = {
-                    'export_date': datetime.now().isoformat(),
-                    'total_samples': len(export_data),
-                    'pneumonia_count': sum(1 for d in export_data if d['final_label'] == 'malade'),
-                    'healthy_count': sum(1 for d in export_data if d['final_label'] == 'sain'),
-                    'export_version': '1.0',
-                    'samples': export_data
-                }
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(export_metadata, f, indent=2, ensure_ascii=False, default=str)
-                results['JSON'] = json_path
-            
-            if export_format in ['Structure de dossiers (Réentraînement)', 'Tous les formats']:
-                # Créer la structure de dossiers pour le réentraînement
-                training_dir = os.path.join(export_dir, 'training_data')
-                
-                if split_dataset:
-                    train_dir = os.path.join(training_dir, 'train')
-                    val_dir = os.path.join(training_dir, 'validation')
-                    test_dir = os.path.join(training_dir, 'test')
-                    
-                    for label in ['malade', 'sain']:
-                        os.makedirs(os.path.join(train_dir, label), exist_ok=True)
-                        os.makedirs(os.path.join(val_dir, label), exist_ok=True)
-                        os.makedirs(os.path.join(test_dir, label), exist_ok=True)
-                else:
-                    for label in ['malade', 'sain']:
-                        os.makedirs(os.path.join(training_dir, label), exist_ok=True)
-                
-                # Créer le fichier labels.csv
-                labels_data = []
-                
-                # Copier les images et créer les labels
-                import random
-                random.seed(42)  # Pour la reproductibilité
-                
-                for v in validated_images:
-                    img = v['image']
-                    ann = v['annotation']
-                    label = ann.get('label', 'sain')
-                    image_path = img.get('image_path')
-                    
-                    if not image_path or not os.path.exists(image_path):
-                        continue
-                    
-                    # Déterminer le dossier de destination
-                    if split_dataset:
-                        rand = random.random()
-                        if rand < 0.7:
-                            dest_folder = 'train'
-                        elif rand < 0.85:
-                            dest_folder = 'validation'
-                        else:
-                            dest_folder = 'test'
-                    else:
-                        dest_folder = None
-                    
-                    # Copier l'image
-                    if include_images:
-                        file_ext = os.path.splitext(image_path)[1] or '.png'
-                        new_filename = f"{img['id']}{file_ext}"
-                        
-                        if dest_folder:
-                            dest_path = os.path.join(training_dir, dest_folder, label, new_filename)
-                        else:
-                            dest_path = os.path.join(training_dir, label, new_filename)
-                        
-                        try:
-                            shutil.copy2(image_path, dest_path)
-                            # Récupérer l'issue du traitement depuis les annotations
-                            additional_info = ann.get('additional_info', {})
-                            treatment_outcome = additional_info.get('treatment_outcome', 'N/A')
-                            if treatment_outcome == 'Autre' and additional_info.get('treatment_outcome_other'):
-                                treatment_outcome = additional_info.get('treatment_outcome_other')
-                            
-                            labels_data.append({
-                                'image_path': os.path.relpath(dest_path, training_dir),
-                                'label': label,
-                                'label_numeric': 1 if label == 'malade' else 0,
-                                'patient_id': img.get('patient_id'),
-                                'image_id': img['id'],
-                                'treatment_outcome': treatment_outcome
-                            })
-                        except Exception as e:
-                            st.warning(f"Impossible de copier {image_path}: {e}")
-                    else:
-                        # Juste ajouter la référence
-                        # Récupérer l'issue du traitement depuis les annotations
-                        additional_info = ann.get('additional_info', {})
-                        treatment_outcome = additional_info.get('treatment_outcome', 'N/A')
-                        if treatment_outcome == 'Autre' and additional_info.get('treatment_outcome_other'):
-                            treatment_outcome = additional_info.get('treatment_outcome_other')
-                        
-                        labels_data.append({
-                            'image_path': image_path,
-                            'label': label,
-                            'label_numeric': 1 if label == 'malade' else 0,
-                            'patient_id': img.get('patient_id'),
-                            'image_id': img['id'],
-                            'treatment_outcome': treatment_outcome
-                        })
-                
-                # Sauvegarder labels.csv
-                labels_df = pd.DataFrame(labels_data)
-                labels_csv_path = os.path.join(training_dir, 'labels.csv')
-                labels_df.to_csv(labels_csv_path, index=False, encoding='utf-8-sig')
-                
-                # Créer un fichier ZIP
-                zip_path = os.path.join(export_dir, f"training_data_{timestamp}.zip")
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(training_dir):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, training_dir)
-                            zipf.write(file_path, arcname)
-                
-                results['Structure de dossiers'] = zip_path
-            
-            return results
-            
+            return generate_export(self.data_manager, validated_images, FORMAT_CHOICES[export_format],
+                                   include_images, split_dataset, warn=st.warning)
         except Exception as e:
             st.error(f"Erreur lors de l'export: {str(e)}")
             return None
@@ -916,74 +840,80 @@ class DoctorView:
         st.subheader("Résultats Finalisés et Export")
         
         # Récupérer les images validées par le médecin
-        images = self.data_manager.get_all_images()
-        medical_annotations = {a.get('image_id'): a for a in self.data_manager.get_all_annotations() 
-                              if a.get('user_role') == 'Médecin'}
-        
-        validated_images = []
-        for img in images:
-            if img['id'] in medical_annotations:
-                validated_images.append({
-                    'image': img,
-                    'annotation': medical_annotations[img['id']]
-                })
+        validated_images = get_validated_images(self.data_manager)
         
         if not validated_images:
             st.info("Aucun patient validé pour le moment")
-            return
-        
-        st.write(f"**{len(validated_images)} patient(s) validé(s)**")
-        
-        # Statistiques
-        confirmed_sick = sum(1 for v in validated_images if v['annotation'].get('label') == 'malade')
-        confirmed_healthy = sum(1 for v in validated_images if v['annotation'].get('label') == 'sain')
-        
-        col1, col2 = st.columns(2)
-        col1.metric("Pneumonie confirmée", confirmed_sick)
-        col2.metric("Absence de pneumonie", confirmed_healthy)
-        
-        # Liste des patients validés
-        st.subheader("Liste des Patients Validés")
-        
-        df_results = pd.DataFrame([{
-            'ID Image': v['image']['id'],
-            'ID Patient': v['image'].get('patient_id', 'N/A'),
-            'Date Examen': v['image'].get('exam_date', 'N/A'),
-            'Diagnostic Final': v['annotation'].get('label', 'N/A'),
-            'Confiance': v['annotation'].get('confidence', 0.0),
-            'Vérité Terrain': v['annotation'].get('additional_info', {}).get('ground_truth', 'Non déterminé'),
-            'Validé par': v['annotation'].get('user_name', 'N/A'),
-            'Date Validation': v['annotation'].get('created_at', 'N/A')
-        } for v in validated_images])
-        
-        st.dataframe(df_results, use_container_width=True)
-        
-        # Sélection des patients à finaliser
-        st.subheader("Finalisation du Lot")
-        
-        selected_images = st.multiselect(
-            "Sélectionner les patients à finaliser",
-            [v['image']['id'] for v in validated_images],
-            default=[v['image']['id'] for v in validated_images]
-        )
-        
-        if st.button("✅ Marquer comme Finalisé", type="primary"):
-            self.data_manager.mark_batch_finalized(
-                selected_images,
-                st.session_state.current_user_name
+        else:
+            st.write(f"**{len(validated_images)} patient(s) validé(s)**")
+            
+            # Statistiques
+            confirmed_sick = sum(1 for v in validated_images if v['annotation'].get('label') == 'malade')
+            confirmed_healthy = sum(1 for v in validated_images if v['annotation'].get('label') == 'sain')
+            
+            col1, col2 = st.columns(2)
+            col1.metric("Pneumonie confirmée", confirmed_sick)
+            col2.metric("Absence de pneumonie", confirmed_healthy)
+            
+            # Liste des patients validés
+            st.subheader("Liste des Patients Validés")
+            
+            df_results = pd.DataFrame([{
+                'ID Image': v['image']['id'],
+                'ID Patient': v['image'].get('patient_id', 'N/A'),
+                'Date Examen': v['image'].get('exam_date', 'N/A'),
+                'Diagnostic Final': v['annotation'].get('label', 'N/A'),
+                'Confiance': v['annotation'].get('confidence', 0.0),
+                'Vérité Terrain': v['annotation'].get('additional_info', {}).get('ground_truth', 'Non déterminé'),
+                'Validé par': v['annotation'].get('user_name', 'N/A'),
+                'Date Validation': v['annotation'].get('created_at', 'N/A')
+            } for v in validated_images])
+            
+            st.dataframe(df_results, use_container_width=True)
+            
+            # Sélection des patients à finaliser
+            st.subheader("Finalisation du Lot")
+            
+            selected_images = st.multiselect(
+                "Sélectionner les patients à finaliser",
+                [v['image']['id'] for v in validated_images],
+                default=[v['image']['id'] for v in validated_images]
             )
-            st.success(f"✅ {len(selected_images)} patient(s) marqué(s) comme finalisé(s)")
-            st.rerun()
+            
+            if st.button("✅ Marquer comme Finalisé", type="primary"):
+                self.data_manager.mark_batch_finalized(
+                    selected_images,
+                    st.session_state.current_user_name
+                )
+                st.success(f"✅ {len(selected_images)} patient(s) marqué(s) comme finalisé(s)")
+                st.rerun()
+        
+        # Archivage des cas finalisés
+        st.divider()
+        self._render_archive_section()
         
         # Export complet pour réentraînement et analyses
         st.divider()
         st.subheader("📥 Export Complet pour Réentraînement et Analyses")
         
         # Utiliser les images validées (pas seulement finalisées) pour l'export
-        if not validated_images:
+        include_archived = st.checkbox(
+            "Inclure les cas archivés",
+            value=True,
+            help="Les cas finalisés puis archivés sont des cas validés : ils restent exportés par défaut"
+        )
+        # Cas archivés comptés depuis l'index : les segments ne sont lus qu'à la génération
+        archived_count = 0
+        if include_archived:
+            active_ids = {v['image']['id'] for v in validated_images}
+            archived_count = sum(1 for entry in self.archive_manager.find_archived_images()
+                                 if entry['image_id'] not in active_ids)
+        export_count = len(validated_images) + archived_count
+        
+        if not export_count:
             st.info("Aucun patient validé disponible pour l'export")
         else:
-            st.write(f"**{len(validated_images)} patient(s) validé(s) disponible(s) pour export**")
+            st.write(f"**{export_count} patient(s) validé(s) disponible(s) pour export**")
             
             # Options d'export
             export_format = st.radio(
@@ -995,7 +925,7 @@ class DoctorView:
             include_images = st.checkbox(
                 "Inclure les images dans l'export",
                 value=True,
-                help="Crée une copie des images dans le dossier d'export (pour réentraînement)"
+                help="Ajoute les images à l'archive ZIP de la structure de dossiers (pour réentraînement)"
             )
             
             split_dataset = st.checkbox(
@@ -1006,6 +936,8 @@ class DoctorView:
             
             if st.button("📥 Générer l'Export", type="primary"):
                 with st.spinner("Préparation de l'export en cours..."):
+                    if archived_count:
+                        validated_images = get_validated_images(self.data_manager, self.archive_manager)
                     export_results = self._generate_complete_export(
                         validated_images,
                         export_format,
@@ -1110,9 +1042,7 @@ class DoctorView:
                     st.write(f"**Date de validation:** {selected_patient['validated_at']}")
                     
                     # Récupérer toutes les annotations pour ce patient (historique complet)
-                    patient_annotations = [a for a in all_annotations 
-                                          if a.get('image_id') == selected_image_id]
-                    patient_annotations.sort(key=lambda x: x.get('version', 0))
+                    patient_annotations = self.data_manager.get_annotation_history(selected_image_id)
                     
                     # Récupérer l'audit log
                     audit_log = self.data_manager.get_audit_log(selected_image_id)
@@ -1218,4 +1148,3 @@ class DoctorView:
                                             st.write(f"- Nouveau statut: {details.get('new_status')}")
                     else:
                         st.info("Aucun historique disponible pour ce patient")
-
@@ -0,0 +1,429 @@
+"""
+Index persistant des embeddings d'images pour la recherche de cas similaires
+
+Chaque prédiction du modèle fournit l'embedding de l'image (voir
+build_embedding_model dans model_backends.py), ajouté ici au fil des
+évaluations. Les embeddings de versions différentes du modèle ne sont pas
+comparables : un index par version.
+    data/embeddings/<version>/
+        vectors.npy     embeddings normalisés float32 (capacité, D), mappés en mémoire
+        index.json      dimension, capacité et IDs d'image dans l'ordre des lignes
+        ivf.npz         index approximatif optionnel (voir build_ivf)
+
+Recherche : similarité cosinus par un produit matriciel NumPy sur toutes les
+lignes (exacte, quelques millisecondes pour 100 000 images). Au-delà de
+APP_EMBEDDING_IVF_MIN_SIZE embeddings, un index IVF (k-means sphérique)
+limite le calcul aux APP_EMBEDDING_IVF_NPROBE listes les plus proches de la
+requête ; les embeddings ajoutés après sa construction sont parcourus en
+plus, en force brute, jusqu'à la reconstruction suivante.
+
+Usage:
+    python embedding_index.py backfill [--batch-size 32]   (images déjà évaluées sans embedding)
+    python embedding_index.py build-ivf [--version <version>] [--lists 256]
+    python embedding_index.py stats
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from storage_io import atomic_write_bytes, file_lock
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise des embeddings (norme L2 = 1 ; un vecteur nul reste nul)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class EmbeddingIndex:
+    """Embeddings normalisés d'une version du modèle, indexés par ID d'image"""
+    
+    def __init__(self, index_dir: str):
+        """
+        Args:
+            index_dir: Répertoire de l'index (ex: data/embeddings/<version>)
+        """
+        self.index_dir = index_dir
+        self.index_file = os.path.join(index_dir, 'index.json')
+        self.vectors_file = os.path.join(index_dir, 'vectors.npy')
+        self.ivf_file = os.path.join(index_dir, 'ivf.npz')
+        # (signature de index.json, index, ID -> ligne, embeddings mappés)
+        self._state_cache = None
+        self._ivf_cache = None
+    
+    # ========== Lecture ==========
+    
+    def _state(self) -> Tuple[Dict, Dict[str, int], Optional[np.ndarray]]:
+        """Index, lignes par ID et embeddings (mis en cache tant que index.json n'a pas changé)"""
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return {'dim': 0, 'capacity': 0, 'ids': []}, {}, None
+        
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._state_cache and self._state_cache[0] == key:
+            return self._state_cache[1:]
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        rows = {image_id: row for row, image_id in enumerate(index['ids'])}
+        # Fichier ouvert après l'index : au moins aussi récent que lui
+        vectors = np.load(self.vectors_file, mmap_mode='r')
+        self._state_cache = (key, index, rows, vectors)
+        return index, rows, vectors
+    
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._state()[1]
+    
+    def __len__(self) -> int:
+        return len(self._state()[0]['ids'])
+    
+    @property
+    def dim(self) -> int:
+        return self._state()[0]['dim']
+    
+    def get(self, image_id: str) -> Optional[np.ndarray]:
+        """
+        Embedding normalisé d'une image
+        
+        Returns:
+            Tableau float32 (D,), ou None si l'image n'est pas indexée
+        """
+        _, rows, vectors = self._state()
+        row = rows.get(image_id)
+        return None if row is None else np.array(vectors[row])
+    
+    # ========== Écriture ==========
+    
+    def add(self, image_id: str, embedding):
+        """Ajoute (ou remplace) l'embedding d'une image"""
+        self.add_many([(image_id, embedding)])
+    
+    def add_many(self, items: Iterable[Tuple[str, object]]):
+        """
+        Ajoute plusieurs embeddings avec une seule écriture de l'index
+        
+        Args:
+            items: (ID d'image, embedding (D,) liste ou tableau)
+        """
+        items = [(image_id, np.asarray(embedding, dtype=np.float32)) for image_id, embedding in items]
+        if not items:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        with file_lock(self.index_file):
+            index, rows, _ = self._state()
+            index = dict(index, ids=list(index['ids']))
+            rows = dict(rows)
+            dim = index['dim'] or len(items[0][1])
+            for image_id, embedding in items:
+                if embedding.shape != (dim,):
+                    raise ValueError(f"Embedding de forme {embedding.shape} pour {image_id}, attendu ({dim},)")
+                if image_id not in rows:
+                    rows[image_id] = len(index['ids'])
+                    index['ids'].append(image_id)
+            
+            vectors = self._writable_vectors(index, dim, len(index['ids']))
+            for image_id, embedding in items:
+                vectors[rows[image_id]] = normalize(embedding)
+            # Les embeddings sont sur disque avant que l'index ne les référence
+            vectors.flush()
+            index['dim'] = dim
+            index['capacity'] = len(vectors)
+            atomic_write_bytes(self.index_file, json.dumps(index, separators=(',', ':')).encode('utf-8'))
+            self._state_cache = None
+    
+    def _writable_vectors(self, index: Dict, dim: int, needed: int) -> np.memmap:
+        """
+        Embeddings ouverts en écriture, avec au moins `needed` lignes
+        
+        La capacité double quand elle est atteinte : le nouveau fichier est
+        rempli à côté puis renommé, un lecteur garde l'ancien jusqu'à relire l'index.
+        """
+        if index['capacity'] >= needed:
+            return np.load(self.vectors_file, mmap_mode='r+')
+        
+        capacity = max(needed, 2 * index['capacity'], 1024)
+        tmp_path = f"{self.vectors_file}.tmp"
+        vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+        if index['capacity']:
+            previous = np.load(self.vectors_file, mmap_mode='r')
+            vectors[:len(previous)] = previous
+        vectors.flush()
+        os.replace(tmp_path, self.vectors_file)
+        return vectors
+    
+    # ========== Recherche ==========
+    
+    def search(self, query, k: int = 5, accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        Images les plus proches d'un embedding (similarité cosinus)
+        
+        Args:
+            query: Embedding de la requête (D,), normalisé ou non
+            k: Nombre de résultats
+            accept: Filtre sur les IDs d'image (ex: cas validés, hors image courante)
+        
+        Returns:
+            [(ID d'image, similarité)] par similarité décroissante
+        """
+        index, _, vectors = self._state()
+        count = len(index['ids'])
+        if count == 0 or k <= 0:
+            return []
+        query = normalize(query)
+        
+        rows = self._ivf_rows(query, count)
+        if rows is None:
+            scores = vectors[:count] @ query
+        else:
+            scores = vectors[rows] @ query
+        
+        # Meilleurs scores par paquets croissants jusqu'à k résultats acceptés
+        results = []
+        seen = 0
+        wanted = 4 * k
+        while seen < len(scores) and len(results) < k:
+            wanted = min(wanted, len(scores))
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-scores[top], kind='stable')][seen:]
+            for position in top:
+                image_id = index['ids'][position if rows is None else rows[position]]
+                if accept is None or accept(image_id):
+                    results.append((image_id, float(scores[position])))
+                    if len(results) == k:
+                        break
+            seen = wanted
+            wanted *= 4
+        return results
+    
+    # ========== Index approximatif (IVF) ==========
+    
+    def _load_ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        """Index IVF (mis en cache tant que le fichier n'a pas changé), ou None s'il n'est pas construit"""
+        try:
+            stat = os.stat(self.ivf_file)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._ivf_cache is None or self._ivf_cache[0] != key:
+            with np.load(self.ivf_file) as data:
+                self._ivf_cache = (key, {name: data[name] for name in data.files})
+        return self._ivf_cache[1]
+    
+    def _ivf_rows(self, query: np.ndarray, count: int) -> Optional[np.ndarray]:
+        """Lignes à comparer avec l'index IVF (listes sondées + ajouts récents), None sans IVF"""
+        ivf = self._load_ivf()
+        if ivf is None:
+            return None
+        centroids, order, offsets = ivf['centroids'], ivf['order'], ivf['offsets']
+        nprobe = min(max(1, config.EMBEDDING_IVF_NPROBE), len(centroids))
+        probed = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        parts = [order[offsets[list_id]:offsets[list_id + 1]] for list_id in probed]
+        parts.append(np.arange(int(ivf['count']), count))
+        return np.concatenate(parts)
+    
+    @staticmethod
+    def _assign(data: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+        """Centroïde le plus proche de chaque embedding (par tranches pour borner la mémoire)"""
+        return np.concatenate([
+            np.argmax(data[start:start + chunk_size] @ centroids.T, axis=1)
+            for start in range(0, len(data), chunk_size)
+        ])
+    
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10) -> Dict:
+        """
+        Construit l'index approximatif : k-means sphérique sur les embeddings
+        
+        Args:
+            n_lists: Nombre de listes (défaut: racine carrée du nombre d'embeddings)
+            iterations: Itérations du k-means
+        
+        Returns:
+            Résumé (embeddings, listes)
+        """
+        index, _, vectors = self._state()
+        count = len(index['ids'])
+        if count == 0:
+            raise ValueError("Index vide")
+        data = np.asarray(vectors[:count])
+        n_lists = min(count, n_lists or max(1, int(np.sqrt(count))))
+        
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(count, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(data, centroids)
+            order = np.argsort(assignment, kind='stable')
+            sizes = np.bincount(assignment, minlength=n_lists)
+            filled = np.flatnonzero(sizes)
+            # Sommes par liste non vide (segments contigus une fois triés) ; une liste vide garde son centroïde
+            starts = np.concatenate([[0], np.cumsum(sizes)])[filled]
+            centroids[filled] = normalize(np.add.reduceat(data[order], starts, axis=0))
+        
+        assignment = self._assign(data, centroids)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        
+        buffer = io.BytesIO()
+        np.savez(buffer, centroids=centroids, order=order.astype(np.int64),
+                 offsets=offsets.astype(np.int64), count=np.int64(count))
+        atomic_write_bytes(self.ivf_file, buffer.getvalue())
+        return {'embeddings': count, 'lists': n_lists}
+    
+    def maybe_build_ivf(self) -> Optional[Dict]:
+        """
+        Construit (ou reconstruit) l'IVF si l'index dépasse APP_EMBEDDING_IVF_MIN_SIZE
+        
+        Reconstruit quand plus de 10 % des embeddings ont été ajoutés depuis
+        la dernière construction (parcourus en force brute d'ici là).
+        
+        Returns:
+            Résumé de la construction, ou None si elle n'était pas nécessaire
+        """
+        count = len(self)
+        if not config.EMBEDDING_IVF_MIN_SIZE or count < config.EMBEDDING_IVF_MIN_SIZE:
+            return None
+        ivf = self._load_ivf()
+        if ivf is not None and count - int(ivf['count']) <= count // 10:
+            return None
+        return self.build_ivf()
+    
+    def stats(self) -> Dict:
+        """Taille de l'index et état de l'IVF"""
+        index, _, _ = self._state()
+        ivf = self._load_ivf()
+        return {
+            'embeddings': len(index['ids']),
+            'dim': index['dim'],
+            'ivf_lists': len(ivf['centroids']) if ivf is not None else 0,
+            'ivf_pending': len(index['ids']) - int(ivf['count']) if ivf is not None else 0
+        }
+
+_indexes = {}
+
+def embeddings_dir(data_dir: str) -> str:
+    return os.path.join(data_dir, 'embeddings')
+
+def open_index(data_dir: str, model_version: str) -> EmbeddingIndex:
+    """
+    Index des embeddings d'une version du modèle
+    
+    Une instance par répertoire et par processus : l'index en mémoire et
+    les fichiers mappés restent en cache d'un affichage à l'autre.
+    """
+    index_dir = os.path.abspath(os.path.join(embeddings_dir(data_dir), model_version))
+    index = _indexes.get(index_dir)
+    if index is None:
+        index = _indexes[index_dir] = EmbeddingIndex(index_dir)
+    return index
+
+def index_results(data_dir: str, image_ids: List[str], results: List[Dict]) -> int:
+    """
+    Ajoute aux index les embeddings de résultats de ModelInterface
+    
+    Args:
+        data_dir: Répertoire des données
+        image_ids: ID d'image de chaque résultat
+        results: Résultats de prédiction (ceux sans 'embedding' sont ignorés)
+    
+    Returns:
+        Nombre d'embeddings ajoutés
+    """
+    by_version = {}
+    for image_id, result in zip(image_ids, results):
+        if result.get('embedding') is not None and result.get('model_version'):
+            by_version.setdefault(result['model_version'], []).append((image_id, result['embedding']))
+    added = 0
+    for model_version, items in by_version.items():
+        # Index dérivé des prédictions (reconstructible par backfill) : une erreur ne les bloque pas
+        try:
+            open_index(data_dir, model_version).add_many(items)
+            added += len(items)
+        except Exception as e:
+            print(f"⚠️  Embeddings non indexés ({model_version}): {e}")
+    return added
+
+def backfill(data_manager, model_interface, batch_size: int, progress=print) -> int:
+    """
+    Calcule les embeddings des images absentes de l'index de la version servie
+    
+    Les tenseurs prétraités (data/tensors) sont réutilisés ; une image pas
+    encore prétraitée est décodée et ajoutée au stockage.
+    
+    Returns:
+        Nombre d'embeddings ajoutés
+    """
+    from tensor_store import TensorStore
+    
+    index = open_index(data_manager.data_dir, model_interface.model_version)
+    tensor_store = TensorStore(os.path.join(data_manager.data_dir, 'tensors'))
+    images = [img for img in data_manager.get_records('images')
+              if img.get('image_path') and img.id not in index]
+    
+    missing = [img for img in images if img.id not in tensor_store]
+    decoded = model_interface.preprocessor.decode_many(
+        [img.image_path for img in missing], allow_grayscale=True
+    )
+    tensor_store.put_many([(img.id, pixels) for img, pixels in zip(missing, decoded)
+                           if not isinstance(pixels, Exception)])
+    
+    added = 0
+    ids = [img.id for img in images]
+    for batch_ids, batch in tensor_store.iter_batches(batch_size, image_ids=ids):
+        results = model_interface.predict_arrays(batch)
+        if results and 'embedding' not in results[0] and results[0]['label'] != 'error':
+            raise ValueError(f"Le moteur '{model_interface.backend_name}' ne fournit pas d'embeddings "
+                             f"(reconvertir le modèle avec convert_model.py)")
+        added += index_results(data_manager.data_dir, batch_ids, results)
+        progress(f"🔄 {added}/{len(ids)} embeddings")
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['backfill', 'build-ivf', 'stats'])
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--version', help="Version du modèle (défaut: version servie pour backfill, toutes sinon)")
+    parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    parser.add_argument('--lists', type=int, help="Nombre de listes de l'IVF (défaut: racine carrée de la taille)")
+    args = parser.parse_args()
+    
+    if args.command == 'backfill':
+        from data_manager import DataManager
+        from model_interface import ModelInterface
+        
+        data_manager = DataManager(args.data_dir)
+        model_interface = ModelInterface(follow_registry=False, server_url='')
+        if model_interface.model is None:
+            sys.exit(1)
+        try:
+            added = backfill(data_manager, model_interface, args.batch_size)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        index = open_index(args.data_dir, model_interface.model_version)
+        if index.maybe_build_ivf():
+            print(f"✅ Index IVF reconstruit ({index.stats()['ivf_lists']} listes)")
+        print(f"✅ {added} embedding(s) ajouté(s) pour la version {model_interface.model_version}")
+        return
+    
+    root = embeddings_dir(args.data_dir)
+    versions = [args.version] if args.version else sorted(os.listdir(root)) if os.path.isdir(root) else []
+    if not versions:
+        print("⚠️  Aucun index d'embeddings")
+        return
+    for version in versions:
+        index = open_index(args.data_dir, version)
+        if args.command == 'build-ivf':
+            summary = index.build_ivf(args.lists)
+            print(f"✅ {version}: IVF de {summary['lists']} listes sur {summary['embeddings']} embeddings")
+        else:
+            stats = index.stats()
+            print(f"{version}: {stats['embeddings']} embeddings (dimension {stats['dim']}), "
+                  f"IVF: {stats['ivf_lists']} listes, {stats['ivf_pending']} ajout(s) hors IVF")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""
+Export des cas validés par le médecin (analyses statistiques et réentraînement)
+
+Formats :
+    - csv     : une ligne par image (patients_data_<date>.csv)
+    - json    : export complet avec métadonnées cliniques (export_complet_<date>.json)
+    - folders : images rangées par label (train/validation/test en option)
+                et labels.csv, dans training_data_<date>.zip, écrite en flux
+                depuis les images sources (voir iter_training_zip)
+
+Les patients et prédictions sont joints aux cas par des index construits en
+un passage sur chaque store (build_export_index), et le CSV et le JSON sont
+écrits par tranches (write_export_files).
+
+Utilisé par la vue médecin et par la ligne de commande (cli.py export) :
+aucune dépendance à Streamlit.
+"""
+
+import contextlib
+import copy
+import json
+import os
+import random
+import textwrap
+import zipfile
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import pandas as pd
+
+from data_manager import DataManager
+from records import PredictionRecord, Record
+
+EXPORT_FORMATS = ('csv', 'json', 'folders')
+
+# Choix de la vue médecin -> formats
+FORMAT_CHOICES = {
+    'CSV (Analyses statistiques)': ['csv'],
+    'Structure de dossiers (Réentraînement)': ['folders'],
+    'JSON complet': ['json'],
+    'Tous les formats': list(EXPORT_FORMATS)
+}
+
+# Images déjà compressées : stockées telles quelles dans l'archive (recompresser ne gagne rien)
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Taille des blocs lus dans chaque image ajoutée à l'archive
+ZIP_COPY_CHUNK = 1024 * 1024
+
+# Cas assemblés puis écrits à la fois dans le CSV et le JSON complet
+EXPORT_CHUNK_ROWS = 5000
+
+# Colonnes du CSV ; les informations cliniques sont ajoutées si au moins un cas en a
+CSV_COLUMNS = [
+    'image_id', 'patient_id', 'label', 'label_numeric', 'sexe', 'age', 'zone_geographique', 'station',
+    'date_examen', 'modality', 'body_part', 'patient_position', 'view_position', 'prediction_originale',
+    'confidence_modele', 'confidence_medecin', 'ground_truth', 'validated_by', 'validated_at', 'image_path'
+]
+CLINICAL_COLUMNS = ['symptoms', 'comorbidities', 'spo2', 'temperature', 'crp', 'image_quality', 'urgency']
+# Types des colonnes numériques, fixés par le schéma : chaque tranche s'écrit comme
+# le document entier. Les colonnes pouvant être vides sont en float64 (cellule vide) ;
+# les autres colonnes gardent leurs valeurs telles quelles
+CSV_DTYPES = {
+    'label_numeric': 'int64',
+    'confidence_modele': 'float64',
+    'confidence_medecin': 'float64',
+    'spo2': 'float64',
+    'temperature': 'float64',
+    'crp': 'float64'
+}
+
+def get_validated_images(data_manager: DataManager, archive_manager=None) -> List[Dict]:
+    """
+    Images annotées par un médecin, avec leur annotation
+    
+    Args:
+        data_manager: Stockage des données
+        archive_manager: ArchiveManager dont les cas archivés (finalisés, donc
+            validés) sont ajoutés à la suite des cas actifs ; None: cas actifs seuls
+    
+    Returns:
+        Liste de {'image': image, 'annotation': annotation médicale}, avec
+        'prediction' pour les cas archivés (prédictions retirées du stockage actif)
+    """
+    medical_annotations = {a.get('image_id'): a for a in data_manager.get_records('annotations')
+                           if a.get('user_role') == 'Médecin'}
+    validated = [{'image': img.to_dict(), 'annotation': medical_annotations[img.id].to_dict()}
+                 for img in data_manager.get_records('images') if img.id in medical_annotations]
+    
+    if archive_manager is not None:
+        # Un archivage interrompu peut laisser un cas des deux côtés : le cas actif est gardé
+        active_ids = {v['image']['id'] for v in validated}
+        for case in archive_manager.iter_archived_cases():
+            annotation = case['annotation']
+            if annotation and annotation.get('user_role') == 'Médecin' and case['image']['id'] not in active_ids:
+                prediction = case['prediction']
+                validated.append({
+                    'image': case['image'],
+                    'annotation': annotation,
+                    'prediction': PredictionRecord.from_dict(prediction) if prediction else None
+                })
+    return validated
+
+def build_export_index(data_manager: DataManager) -> Tuple[Dict[str, Record], Dict[str, Record]]:
+    """
+    Index de jointure de l'export, construits en un passage sur chaque store
+    
+    Returns:
+        (premier patient par patient_id, prédiction la plus récente par image_id),
+        mêmes correspondances que get_patient_by_id / get_prediction_by_image
+    """
+    patients = {}
+    for patient in data_manager.get_records('patients'):
+        patients.setdefault(patient.get('patient_id'), patient)
+    predictions = {prediction.get('image_id'): prediction for prediction in data_manager.get_records('predictions')}
+    return patients, predictions
+
+def csv_row(validated: Dict, patients: Dict[str, Record], predictions: Dict[str, Record]) -> Dict:
+    """
+    Ligne CSV d'un cas validé (analyses statistiques)
+    
+    Args:
+        validated: Cas à exporter ({'image': ..., 'annotation': ...})
+        patients, predictions: Index de build_export_index
+    """
+    img = validated['image']
+    ann = validated['annotation']
+    patient = patients.get(img.get('patient_id'))
+    pred = validated['prediction'] if 'prediction' in validated else predictions.get(img['id'])
+    patient_metadata = (patient.get('metadata') or {}) if patient else {}
+    
+    row = {
+        'image_id': img['id'],
+        'patient_id': img.get('patient_id', 'N/A'),
+        'label': ann.get('label', 'N/A'),  # malade ou sain
+        'label_numeric': 1 if ann.get('label') == 'malade' else 0,
+        'sexe': patient_metadata.get('sex', 'N/A') if patient else 'N/A',
+        'age': patient_metadata.get('age', 'N/A') if patient else 'N/A',
+        'zone_geographique': patient_metadata.get('institution_name', 'N/A') if patient else 'N/A',
+        'station': patient_metadata.get('station_name', 'N/A') if patient else 'N/A',
+        'date_examen': img.get('exam_date', 'N/A'),
+        'modality': img.get('modality', 'N/A'),
+        'body_part': img.get('body_part', 'N/A'),
+        'patient_position': img.get('patient_position', 'N/A'),
+        'view_position': img.get('view_position', 'N/A'),
+        'prediction_originale': pred.get('label', 'N/A') if pred else 'N/A',
+        'confidence_modele': pred.get('confidence', 0.0) if pred else 0.0,
+        'confidence_medecin': ann.get('confidence', 0.0),
+        'ground_truth': ann.get('additional_info', {}).get('ground_truth', 'Non déterminé'),
+        'validated_by': ann.get('user_name', 'N/A'),
+        'validated_at': ann.get('created_at', 'N/A'),
+        'image_path': img.get('image_path', 'N/A')
+    }
+    
+    # Ajouter les informations complémentaires si disponibles
+    additional_info = ann.get('additional_info', {})
+    if additional_info:
+        for column in CLINICAL_COLUMNS:
+            row[column] = additional_info.get(column, '')
+    return row
+
+def json_sample(validated: Dict, patients: Dict[str, Record], predictions: Dict[str, Record]) -> Dict:
+    """Entrée 'samples' du JSON complet pour un cas validé (voir csv_row)"""
+    img = validated['image']
+    ann = validated['annotation']
+    patient = patients.get(img.get('patient_id'))
+    pred = validated['prediction'] if 'prediction' in validated else predictions.get(img['id'])
+    return {
+        'image_id': img['id'],
+        'patient_id': img.get('patient_id'),
+        'image_path': img.get('image_path'),
+        'final_label': ann.get('label'),
+        'label_numeric': 1 if ann.get('label') == 'malade' else 0,
+        'ground_truth': ann.get('additional_info', {}).get('ground_truth'),
+        'confidence': ann.get('confidence'),
+        'notes': ann.get('notes', ''),
+        'validated_by': ann.get('user_name'),
+        'validated_at': ann.get('created_at'),
+        'patient_metadata': patient.get('metadata', {}) if patient else {},
+        'original_prediction': pred.to_dict() if pred else None,
+        'clinical_metadata': ann.get('additional_info', {})
+    }
+
+def write_export_files(validated_images: List[Dict], patients: Dict[str, Record], predictions: Dict[str, Record],
+                       csv_file: Optional[TextIO] = None, json_file: Optional[TextIO] = None):
+    """
+    Écrit le CSV et/ou le JSON complet par tranches de EXPORT_CHUNK_ROWS cas
+    
+    Seule la tranche en cours est en mémoire ; les compteurs de l'en-tête
+    JSON sont calculés d'abord depuis les annotations.
+    
+    Args:
+        validated_images: Cas à exporter (voir get_validated_images)
+        patients, predictions: Index de build_export_index
+        csv_file: Fichier CSV ouvert en écriture (encodage utf-8-sig, newline='')
+        json_file: Fichier JSON ouvert en écriture
+    """
+    columns = CSV_COLUMNS
+    if any(v['annotation'].get('additional_info') for v in validated_images):
+        columns = CSV_COLUMNS + CLINICAL_COLUMNS
+    
+    if json_file is not None:
+        labels = [v['annotation'].get('label') for v in validated_images]
+        header = json.dumps({
+            'export_date': datetime.now().isoformat(),
+            'total_samples': len(validated_images),
+            'pneumonia_count': labels.count('malade'),
+            'healthy_count': labels.count('sain'),
+            'export_version': '1.0'
+        }, indent=2, ensure_ascii=False)
+        # Même mise en forme que json.dump(..., indent=2) du document complet
+        json_file.write(header[:-2] + ',\n  "samples": [')
+    
+    for start in range(0, max(len(validated_images), 1), EXPORT_CHUNK_ROWS):
+        chunk = validated_images[start:start + EXPORT_CHUNK_ROWS]
+        if csv_file is not None:
+            frame = pd.DataFrame([csv_row(v, patients, predictions) for v in chunk], columns=columns, dtype=object)
+            for column in columns:
+                if column in CSV_DTYPES:
+                    frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(CSV_DTYPES[column])
+            frame.to_csv(csv_file, header=start == 0, index=False)
+        if json_file is not None and chunk:
+            json_file.write(('\n' if start == 0 else ',\n') + ',\n'.join(
+                textwrap.indent(json.dumps(json_sample(v, patients, predictions), indent=2, ensure_ascii=False,
+                                           default=str), '    ')
+                for v in chunk
+            ))
+    
+    if json_file is not None:
+        json_file.write('\n  ]\n}' if validated_images else ']\n}')
+
+class _ZipSink:
+    """
+    Sortie de zipfile dont les octets écrits sont repris au fur et à mesure
+    
+    La sortie se présente comme positionnable : zipfile n'ajoute alors pas de
+    descripteur de données après chaque entrée (refusé par les lecteurs en
+    flux, ex. ZipInputStream, pour une entrée stockée) mais réécrit l'en-tête
+    local à la fermeture de l'entrée. Pour que rien ne soit réécrit après
+    avoir été repris :
+        - expect_header : en-tête local définitif d'une entrée stockée (CRC et
+          taille calculés d'avance), substitué à l'en-tête provisoire ; la
+          réécriture de zipfile doit lui être identique
+        - hold / release : entrée retenue en mémoire jusqu'à sa réécriture
+          (entrées compressées, dont la taille n'est connue qu'à la fin)
+    """
+    
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0        # octets écrits (repris ou retenus)
+        self._position = 0
+        self._held = None       # entrée retenue, None: écriture directe
+        self._held_start = 0
+        self._expected = None   # en-tête local annoncé pour la prochaine entrée
+        self._headers = {}      # position -> en-tête annoncé, en attente de la réécriture
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self._offset}[whence]
+        self._position = base + offset
+        return self._position
+    
+    def expect_header(self, header: bytes):
+        self._expected = header
+    
+    def hold(self):
+        self._held = bytearray()
+        self._held_start = self._offset
+    
+    def release(self):
+        if self._held is not None:
+            self._chunks.append(bytes(self._held))
+            self._held = None
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        if self._position < self._offset:
+            # Réécriture de l'en-tête local par zipfile, à la fermeture de l'entrée
+            if self._held is not None and self._position >= self._held_start:
+                start = self._position - self._held_start
+                self._held[start:start + len(data)] = data
+            elif self._headers.pop(self._position, None) != data:
+                raise ValueError("Fichier modifié pendant l'export (CRC ou taille différents de la première lecture)")
+            self._position += len(data)
+            return len(data)
+        
+        if self._expected is not None:
+            if len(self._expected) != len(data):
+                raise ValueError("En-tête local annoncé incompatible avec celui de zipfile")
+            self._headers[self._position] = self._expected
+            data, self._expected = self._expected, None
+        if self._held is not None:
+            self._held += data
+        else:
+            self._chunks.append(data)
+        self._offset += len(data)
+        self._position = self._offset
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stored_header(zinfo: zipfile.ZipInfo, source) -> bytes:
+    """
+    En-tête local définitif d'une entrée stockée, par une première lecture du fichier
+    
+    Le CRC-32 et la taille sont calculés par blocs de ZIP_COPY_CHUNK octets ;
+    le fichier est ensuite repositionné au début pour la copie.
+    """
+    crc = size = 0
+    while True:
+        block = source.read(ZIP_COPY_CHUNK)
+        if not block:
+            break
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+    source.seek(0)
+    
+    final = copy.copy(zinfo)
+    final.CRC = crc
+    final.compress_size = final.file_size = size
+    final.flag_bits = 0
+    # Même choix ZIP64 que zipfile, fait sur la taille annoncée (ZipInfo.from_file)
+    return final.FileHeader(zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT)
+
+def _treatment_outcome(annotation: Dict) -> str:
+    """Issue du traitement depuis les annotations"""
+    additional_info = annotation.get('additional_info', {})
+    treatment_outcome = additional_info.get('treatment_outcome', 'N/A')
+    if treatment_outcome == 'Autre' and additional_info.get('treatment_outcome_other'):
+        treatment_outcome = additional_info.get('treatment_outcome_other')
+    return treatment_outcome
+
+def iter_training_zip(validated_images: List[Dict], include_images: bool = True, split_dataset: bool = False,
+                      warn: Callable[[str], None] = print) -> Iterator[bytes]:
+    """
+    Archive ZIP de réentraînement (images rangées par label et labels.csv), produite par morceaux
+    
+    Les images sont lues par blocs de ZIP_COPY_CHUNK octets et écrites
+    directement dans l'archive (stockées sans recompression si elles sont
+    déjà compressées) : la mémoire utilisée ne dépend pas de la taille de
+    l'export, et chaque morceau peut être envoyé dès qu'il est produit.
+    Les entrées stockées n'ont pas de descripteur de données (lisibles par
+    les lecteurs en flux) : leur CRC est calculé par une première lecture du
+    fichier. Les autres entrées sont retenues une à une (voir _ZipSink).
+    
+    Args:
+        validated_images: Cas à exporter (voir get_validated_images)
+        include_images: Ajouter les images à l'archive (sinon labels.csv référence leur chemin)
+        split_dataset: Répartir les images en train/validation/test (70/15/15)
+        warn: Appelée pour chaque image qui n'a pas pu être lue
+    
+    Yields:
+        Morceaux successifs du fichier ZIP
+    """
+    sink = _ZipSink()
+    labels_data = []
+    rng = random.Random(42)  # Pour la reproductibilité
+    
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for v in validated_images:
+            img = v['image']
+            ann = v['annotation']
+            label = ann.get('label', 'sain')
+            image_path = img.get('image_path')
+            
+            if not image_path or not os.path.exists(image_path):
+                continue
+            
+            # Déterminer le dossier de destination
+            if split_dataset:
+                rand = rng.random()
+                if rand < 0.7:
+                    dest_folder = 'train'
+                elif rand < 0.85:
+                    dest_folder = 'validation'
+                else:
+                    dest_folder = 'test'
+            else:
+                dest_folder = None
+            
+            if include_images:
+                file_ext = os.path.splitext(image_path)[1] or '.png'
+                arcname = '/'.join(filter(None, [dest_folder, label, f"{img['id']}{file_ext}"]))
+                
+                try:
+                    source = open(image_path, 'rb')
+                except OSError as e:
+                    warn(f"Impossible de copier {image_path}: {e}")
+                    continue
+                with source:
+                    zinfo = zipfile.ZipInfo.from_file(image_path, arcname)
+                    if file_ext.lower() in STORED_EXTENSIONS:
+                        zinfo.compress_type = zipfile.ZIP_STORED
+                        sink.expect_header(_stored_header(zinfo, source))
+                    else:
+                        zinfo.compress_type = zipfile.ZIP_DEFLATED
+                        sink.hold()
+                    with zipf.open(zinfo, 'w') as dest:
+                        while True:
+                            block = source.read(ZIP_COPY_CHUNK)
+                            if not block:
+                                break
+                            dest.write(block)
+                            yield sink.take()
+                    sink.release()
+                yield sink.take()
+                relative_path = arcname
+            else:
+                # Juste ajouter la référence
+                relative_path = image_path
+            
+            labels_data.append({
+                'image_path': relative_path,
+                'label': label,
+                'label_numeric': 1 if label == 'malade' else 0,
+                'patient_id': img.get('patient_id'),
+                'image_id': img['id'],
+                'treatment_outcome': _treatment_outcome(ann)
+            })
+        
+        sink.hold()
+        zipf.writestr('labels.csv', pd.DataFrame(labels_data).to_csv(index=False).encode('utf-8-sig'))
+        sink.release()
+    yield sink.take()
+
+def generate_export(data_manager: DataManager, validated_images: List[Dict], formats: List[str],
+                    include_images: bool = True, split_dataset: bool = False,
+                    export_root: Optional[str] = None, warn: Callable[[str], None] = print) -> Dict[str, str]:
+    """
+    Génère un export complet avec plusieurs formats
+    
+    Args:
+        data_manager: Stockage des données
+        validated_images: Cas à exporter (voir get_validated_images)
+        formats: Formats parmi EXPORT_FORMATS
+        include_images: Ajouter les images à l'archive de la structure de dossiers
+        split_dataset: Répartir les images en train/validation/test (70/15/15)
+        export_root: Répertoire des exports (défaut: <data_dir>/exports)
+        warn: Appelée pour chaque image qui n'a pas pu être copiée
+    
+    Returns:
+        Chemin du fichier généré par format ('CSV', 'JSON', 'Structure de dossiers')
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    export_dir = os.path.join(export_root or os.path.join(data_manager.data_dir, 'exports'), f"export_{timestamp}")
+    os.makedirs(export_dir, exist_ok=True)
+    
+    results = {}
+    
+    if 'csv' in formats or 'json' in formats:
+        patients, predictions = build_export_index(data_manager)
+        with contextlib.ExitStack() as stack:
+            csv_file = json_file = None
+            if 'csv' in formats:
+                results['CSV'] = os.path.join(export_dir, f"patients_data_{timestamp}.csv")
+                csv_file = stack.enter_context(open(results['CSV'], 'w', encoding='utf-8-sig', newline=''))
+            if 'json' in formats:
+                results['JSON'] = os.path.join(export_dir, f"export_complet_{timestamp}.json")
+                json_file = stack.enter_context(open(results['JSON'], 'w', encoding='utf-8'))
+            write_export_files(validated_images, patients, predictions, csv_file, json_file)
+    
+    if 'folders' in formats:
+        # Archive écrite au fil de la lecture des images, sans copie intermédiaire sur disque
+        zip_path = os.path.join(export_dir, f"training_data_{timestamp}.zip")
+        with open(zip_path, 'wb') as f:
+            for chunk in iter_training_zip(validated_images, include_images, split_dataset, warn):
+                f.write(chunk)
+        
+        results['Structure de dossiers'] = zip_path
+    
+    return results
@@ -0,0 +1,127 @@
+"""
+Modèle à entrée niveaux de gris (repliement des canaux RGB dans la 1re convolution)
+
+Une radiographie en niveaux de gris est chargée en RGB, c'est-à-dire avec
+trois canaux identiques. Les couches qui précèdent la première Conv2D
+(Rescaling, MaxPooling2D) agissent canal par canal : les trois canaux restent
+identiques jusqu'à la convolution, qui calcule alors
+    sum_c x * W[:, :, c, :] = x * sum_c W[:, :, c, :]
+Sommer le noyau sur l'axe des canaux d'entrée donne donc un modèle équivalent
+prenant une entrée 256x256x1 : prétraitement 3x plus léger en mémoire et
+première convolution 3x moins coûteuse.
+
+Le script construit model_gray.h5 puis vérifie l'équivalence avec le modèle
+d'origine sur les images de test et sur des images aléatoires.
+
+Usage:
+    python fold_grayscale.py [--model model.h5] [--output model_gray.h5] [--tolerance 1e-5]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Couches sans mélange des canaux, autorisées avant la première convolution
+CHANNEL_WISE_LAYERS = ('InputLayer', 'Rescaling', 'MaxPooling2D', 'AveragePooling2D')
+
+def fold_grayscale_model(model):
+    """
+    Construit le modèle équivalent à une entrée niveaux de gris (1 canal)
+    
+    Args:
+        model: Modèle Keras Sequential à entrée (H, W, 3)
+    
+    Returns:
+        Nouveau modèle Keras à entrée (H, W, 1)
+    """
+    import tensorflow as tf
+    
+    config = model.get_config()
+    first_conv = None
+    for index, layer in enumerate(config['layers']):
+        if layer['class_name'] == 'Conv2D':
+            first_conv = index
+            break
+        if layer['class_name'] not in CHANNEL_WISE_LAYERS:
+            raise ValueError(f"Couche {layer['class_name']} avant la première Conv2D : repliement impossible")
+    if first_conv is None:
+        raise ValueError("Aucune couche Conv2D dans le modèle")
+    
+    for layer in config['layers']:
+        shape = layer['config'].get('batch_input_shape')
+        if shape is not None:
+            if shape[-1] != 3:
+                raise ValueError(f"Entrée RGB attendue, reçu {shape}")
+            layer['config']['batch_input_shape'] = tuple(shape[:-1]) + (1,)
+    
+    folded = tf.keras.Sequential.from_config(config)
+    conv_name = config['layers'][first_conv]['config']['name']
+    for source, target in zip(model.layers, folded.layers):
+        weights = source.get_weights()
+        if source.name == conv_name:
+            # Noyau (kh, kw, 3, filtres) -> (kh, kw, 1, filtres)
+            weights[0] = weights[0].sum(axis=2, keepdims=True)
+        target.set_weights(weights)
+    return folded
+
+def verify_folded_model(model, folded, gray_batch: np.ndarray) -> float:
+    """
+    Écart absolu maximal entre le modèle d'origine (canaux répliqués) et le modèle replié
+    
+    Args:
+        model: Modèle d'origine (entrée RGB)
+        folded: Modèle replié (entrée niveaux de gris)
+        gray_batch: Lot float32 (N, H, W, 1)
+    """
+    expected = np.asarray(model(np.repeat(gray_batch, 3, axis=-1), training=False)).reshape(-1)
+    actual = np.asarray(folded(gray_batch, training=False)).reshape(-1)
+    return float(np.max(np.abs(expected - actual)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.h5')
+    parser.add_argument('--output', help="Fichier de sortie (défaut: model_gray.h5)")
+    parser.add_argument('--images', default='images-test', help="Images de vérification")
+    parser.add_argument('--random', type=int, default=32, help="Images aléatoires supplémentaires")
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    args = parser.parse_args()
+    
+    import tensorflow as tf
+    from convert_model import list_test_images
+    from model_interface import ModelInterface
+    
+    output_path = args.output or os.path.join(os.path.dirname(args.model), 'model_gray.h5')
+    model = tf.keras.models.load_model(args.model)
+    folded = fold_grayscale_model(model)
+    
+    # Vérification avant sauvegarde : images réelles + bruit uniforme 0-255
+    batches = []
+    gray_images = [ModelInterface._load_grayscale(p) for p in list_test_images(args.images)]
+    gray_images = [img for img in gray_images if img is not None]
+    if gray_images:
+        batches.append(('images de test', np.concatenate(gray_images)))
+    rng = np.random.default_rng(0)
+    batches.append(('images aléatoires', rng.integers(0, 256, (args.random,) + folded.input_shape[1:]).astype(np.float32)))
+    
+    failed = False
+    for name, batch in batches:
+        diff = verify_folded_model(model, folded, batch)
+        status = "✅" if diff <= args.tolerance else "❌"
+        failed |= diff > args.tolerance
+        print(f"{status} {name} ({len(batch)}): écart absolu maximal {diff:.2e} (tolérance {args.tolerance:.0e})")
+    
+    if failed:
+        print("❌ Modèle replié non équivalent : non sauvegardé")
+        sys.exit(1)
+    
+    folded.save(output_path)
+    conv = next(layer for layer in model.layers if isinstance(layer, tf.keras.layers.Conv2D))
+    macs_before = np.prod(conv.output_shape[1:3]) * conv.kernel.shape.num_elements()
+    print(f"✅ Modèle niveaux de gris sauvegardé: {output_path}")
+    print(f"Première convolution: {tuple(conv.kernel.shape)} -> {tuple(folded.get_layer(conv.name).kernel.shape)} "
+          f"({macs_before / 1e6:.1f} -> {macs_before / 3e6:.1f} M multiplications)")
+
+if __name__ == "__main__":
+    main()
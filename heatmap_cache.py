@@ -0,0 +1,201 @@
+"""
+Cache des cartes d'attention du modèle (Grad-CAM, voir model_backends.build_explainer)
+
+Les cartes sont calculées par lots avec les prédictions (ModelInterface,
+explain=True) puis enregistrées en PNG niveaux de gris uint8, à la
+résolution de la dernière carte de caractéristiques du réseau (31x31 pour
+model.h5, moins de 1 Ko) :
+    data/heatmaps/<version>/<image_id>.png
+
+Une carte dépend de la version du modèle : elle n'est recalculée que si
+l'image est évaluée par une nouvelle version (analyse, rescore_job.py). La
+vue médecin superpose la carte à la radiographie à l'affichage, sans passer
+par le modèle.
+
+Usage:
+    python heatmap_cache.py backfill [--batch-size 32]   (images évaluées sans carte)
+    python heatmap_cache.py purge [--keep <version>]     (cartes des autres versions)
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+import config
+from storage_io import atomic_write_bytes
+
+# Palette de la superposition : bleu (peu déterminant) -> cyan -> jaune -> rouge
+_PALETTE_STOPS = np.array([0, 96, 160, 255], dtype=np.float32)
+_PALETTE_COLORS = np.array([[0, 0, 255], [0, 255, 255], [255, 255, 0], [255, 0, 0]], dtype=np.float32)
+
+def colorize(heatmap: np.ndarray) -> np.ndarray:
+    """Carte uint8 (H, W) -> image RGB uint8 (H, W, 3)"""
+    levels = np.arange(256, dtype=np.float32)
+    palette = np.stack([np.interp(levels, _PALETTE_STOPS, _PALETTE_COLORS[:, c]) for c in range(3)], axis=1)
+    return palette.astype(np.uint8)[heatmap]
+
+def overlay(image_path: str, heatmap: np.ndarray, alpha: float = 0.4) -> Image.Image:
+    """
+    Superpose une carte d'attention à la radiographie d'origine
+    
+    La carte (basse résolution, couvrant toute l'entrée du modèle) est
+    agrandie à la taille de l'image ; son opacité suit son intensité, les
+    zones sans importance laissent la radiographie intacte.
+    
+    Args:
+        image_path: Radiographie d'origine
+        heatmap: Carte uint8 (h, w)
+        alpha: Opacité maximale de la carte
+    """
+    with Image.open(image_path) as img:
+        base = img.convert('RGB')
+    size = base.size
+    colors = Image.fromarray(colorize(heatmap)).resize(size, Image.BILINEAR)
+    mask = Image.fromarray(heatmap).resize(size, Image.BILINEAR).point(lambda v: int(v * alpha))
+    return Image.composite(colors, base, mask)
+
+class HeatmapCache:
+    """Cartes d'attention par version du modèle et par image"""
+    
+    def __init__(self, data_dir: str):
+        """
+        Args:
+            data_dir: Répertoire des données (les cartes vont dans data_dir/heatmaps)
+        """
+        self.root = os.path.join(data_dir, 'heatmaps')
+    
+    def path(self, model_version: str, image_id: str) -> str:
+        return os.path.join(self.root, model_version, f"{image_id}.png")
+    
+    def has(self, model_version: str, image_id: str) -> bool:
+        return os.path.exists(self.path(model_version, image_id))
+    
+    def get(self, model_version: str, image_id: str) -> Optional[np.ndarray]:
+        """
+        Carte d'une image pour une version du modèle
+        
+        Returns:
+            Tableau uint8 (h, w), ou None si elle n'a pas été calculée
+        """
+        try:
+            with Image.open(self.path(model_version, image_id)) as img:
+                return np.asarray(img)
+        except FileNotFoundError:
+            return None
+    
+    def put(self, model_version: str, image_id: str, heatmap: np.ndarray):
+        """Enregistre une carte uint8 (h, w)"""
+        os.makedirs(os.path.join(self.root, model_version), exist_ok=True)
+        buffer = io.BytesIO()
+        Image.fromarray(np.asarray(heatmap, dtype=np.uint8), 'L').save(buffer, format='PNG', optimize=True)
+        atomic_write_bytes(self.path(model_version, image_id), buffer.getvalue())
+    
+    def store_results(self, image_ids: List[str], results: List[Dict]) -> int:
+        """
+        Enregistre les cartes de résultats de ModelInterface (explain=True)
+        
+        Un cache ne bloque jamais les prédictions : une erreur d'écriture est
+        signalée et la carte sera recalculée par backfill.
+        
+        Returns:
+            Nombre de cartes enregistrées
+        """
+        stored = 0
+        for image_id, result in zip(image_ids, results):
+            if result.get('heatmap') is None or not result.get('model_version'):
+                continue
+            try:
+                self.put(result['model_version'], image_id, result['heatmap'])
+                stored += 1
+            except OSError as e:
+                print(f"⚠️  Carte d'attention non enregistrée ({image_id}): {e}")
+        return stored
+    
+    def purge(self, keep_versions: List[str]) -> int:
+        """
+        Supprime les cartes des versions du modèle qui ne sont plus servies
+        
+        Returns:
+            Nombre de versions supprimées
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        for version in os.listdir(self.root):
+            if version not in keep_versions:
+                shutil.rmtree(os.path.join(self.root, version))
+                removed += 1
+        return removed
+
+def backfill(data_manager, model_interface, batch_size: int, progress=print) -> int:
+    """
+    Calcule les cartes manquantes de la version servie
+    
+    Les tenseurs prétraités (data/tensors) sont réutilisés.
+    
+    Returns:
+        Nombre de cartes enregistrées
+    """
+    from tensor_store import TensorStore
+    
+    if not model_interface.model.supports_explain:
+        raise ValueError(f"Le moteur '{model_interface.backend_name}' ne calcule pas de cartes d'attention "
+                         f"(utiliser APP_MODEL_BACKEND=keras)")
+    model_version = model_interface.model_version
+    cache = HeatmapCache(data_manager.data_dir)
+    tensor_store = TensorStore(os.path.join(data_manager.data_dir, 'tensors'))
+    images = [img for img in data_manager.get_records('images')
+              if img.get('image_path') and not cache.has(model_version, img.id)]
+    
+    missing = [img for img in images if img.id not in tensor_store]
+    decoded = model_interface.preprocessor.decode_many(
+        [img.image_path for img in missing], allow_grayscale=True
+    )
+    tensor_store.put_many([(img.id, pixels) for img, pixels in zip(missing, decoded)
+                           if not isinstance(pixels, Exception)])
+    
+    stored = 0
+    ids = [img.id for img in images]
+    for batch_ids, batch in tensor_store.iter_batches(batch_size, image_ids=ids):
+        stored += cache.store_results(batch_ids, model_interface.predict_arrays(batch, explain=True))
+        progress(f"🔄 {stored}/{len(ids)} cartes")
+    return stored
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['backfill', 'purge'])
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    parser.add_argument('--keep', action='append', help="purge: autre version à conserver (répétable)")
+    args = parser.parse_args()
+    
+    from data_manager import DataManager
+    from model_interface import ModelInterface
+    
+    data_manager = DataManager(args.data_dir)
+    # Version figée pour toute la commande ; cartes calculées par gradients : modèle Keras local
+    model_interface = ModelInterface(follow_registry=False, server_url='')
+    if model_interface.model is None:
+        sys.exit(1)
+    
+    if args.command == 'purge':
+        keep = [model_interface.model_version] + (args.keep or [])
+        removed = HeatmapCache(args.data_dir).purge(keep)
+        print(f"✅ {removed} version(s) de cartes supprimée(s) (conservées: {', '.join(keep)})")
+        return
+    
+    try:
+        stored = backfill(data_manager, model_interface, args.batch_size)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ {stored} carte(s) d'attention enregistrée(s) pour la version {model_interface.model_version}")
+
+if __name__ == "__main__":
+    main()
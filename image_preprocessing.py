@@ -0,0 +1,176 @@
+"""
+Décodage et redimensionnement des images pour le modèle
+
+Deux modes :
+    - exact  : reproduit keras.utils.load_img(target_size=(256, 256)) +
+               img_to_array au bit près (conversion RGB, redimensionnement
+               au plus proche) ;
+    - rapide : pour les JPEG, le décodeur réduit directement l'image
+               (Image.draft, facteurs 1/2, 1/4, 1/8) avant le redimensionnement.
+               Les autres formats sont traités comme en mode exact.
+
+Tolérance du mode rapide (mesurée par benchmark_preprocessing.py sur
+images-test/ réencodées en JPEG 1024 et 2048) : les pixels diffèrent car le
+décodeur moyenne les blocs au lieu d'échantillonner (écart moyen < 1 niveau
+de gris), les probabilités du modèle restent à moins de 0,04 près, sans
+changement de label. Le mode rapide est donc désactivé par défaut
+(APP_PREPROCESS_FAST=1 pour l'activer).
+
+Les images sont décodées en uint8 (256, 256, C) ; BatchPreprocessor les
+décode en parallèle (le décodage PIL libère le GIL) et les assemble dans un
+tampon float32 réutilisé d'un lot à l'autre.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+import config
+
+# Taille d'entrée du modèle (largeur, hauteur)
+TARGET_SIZE = (256, 256)
+
+def decode_image(image_path: str, allow_grayscale: bool = False, fast: bool = False) -> np.ndarray:
+    """
+    Décode une image au format d'entrée du modèle
+    
+    Args:
+        image_path: Chemin vers l'image
+        allow_grayscale: Retourner un seul canal si l'image est réellement en
+            niveaux de gris (mode 'L' ou canaux RGB identiques)
+        fast: Réduction au décodage pour les JPEG (mode rapide)
+    
+    Returns:
+        Tableau uint8 (256, 256, 3) ou (256, 256, 1)
+    """
+    with open(image_path, 'rb') as f:
+        img = Image.open(f)
+        if fast and img.format == 'JPEG':
+            # Le décodeur choisit la plus forte réduction qui reste >= 256x256
+            img.draft(img.mode, TARGET_SIZE)
+        return to_model_input(img, allow_grayscale)
+
+def to_model_input(img: Image.Image, allow_grayscale: bool = False) -> np.ndarray:
+    """
+    Image PIL -> tableau uint8 (256, 256, 3) ou (256, 256, 1), voir decode_image
+    """
+    # Le redimensionnement au plus proche sélectionne les mêmes pixels
+    # quel que soit le mode : une image 'L' peut rester sur un canal
+    gray = allow_grayscale and img.mode == 'L'
+    if not gray and img.mode != 'RGB':
+        img = img.convert('RGB')
+    if img.size != TARGET_SIZE:
+        img = img.resize(TARGET_SIZE, Image.NEAREST)
+    pixels = np.asarray(img)
+    
+    if gray:
+        return pixels[..., np.newaxis]
+    if allow_grayscale and (pixels[..., 0] == pixels[..., 1]).all() and (pixels[..., 1] == pixels[..., 2]).all():
+        return pixels[..., :1]
+    return pixels
+
+def decode_file(file_path: str, allow_grayscale: bool = False, fast: bool = False) -> np.ndarray:
+    """
+    Comme decode_image, en acceptant aussi les fichiers DICOM (.dcm, .dicom)
+    
+    Les pixels DICOM sont normalisés comme à l'import (DICOMImporter) puis
+    réduits directement à 256x256, sans passer par l'aperçu PNG (réduit à
+    1024 px au préalable) : les pixels peuvent différer légèrement de ceux
+    du tenseur calculé depuis l'aperçu.
+    """
+    if not file_path.lower().endswith(('.dcm', '.dicom')):
+        return decode_image(file_path, allow_grayscale, fast)
+    
+    from dicom_importer import DICOMImporter
+    
+    importer = DICOMImporter()
+    ds, error = importer.read_dicom_file(file_path)
+    if error:
+        raise ValueError(f"Fichier DICOM illisible: {error}")
+    pixel_array = importer.extract_image_array(ds)
+    img = importer.convert_to_pil_image(pixel_array) if pixel_array is not None else None
+    if img is None:
+        raise ValueError("Impossible d'extraire l'image DICOM")
+    return to_model_input(img, allow_grayscale)
+
+class BatchPreprocessor:
+    """
+    Prétraitement par lots : décodage parallèle et tampons de sortie réutilisés
+    
+    Le tableau retourné par to_batch est une vue sur un tampon interne :
+    il doit être consommé avant l'appel suivant. Le tampon conservé ne
+    dépasse pas max_batch images ; les appelants découpent leurs lots à
+    cette taille.
+    """
+    
+    def __init__(self, workers: Optional[int] = None, fast: Optional[bool] = None,
+                 max_batch: Optional[int] = None):
+        """
+        Args:
+            workers: Nombre de threads de décodage (défaut: APP_PREPROCESS_WORKERS)
+            fast: Mode rapide (défaut: APP_PREPROCESS_FAST)
+            max_batch: Taille maximale du tampon conservé (défaut: APP_INFERENCE_BATCH_SIZE)
+        """
+        self.workers = max(1, config.PREPROCESS_WORKERS if workers is None else workers)
+        self.fast = bool(config.PREPROCESS_FAST if fast is None else fast)
+        self.max_batch = max(1, max_batch or config.INFERENCE_BATCH_SIZE)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Tampons float32 par nombre de canaux
+        self._buffers: Dict[int, np.ndarray] = {}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preprocess')
+            return self._executor
+    
+    def decode_many(self, image_paths: List[str], allow_grayscale: bool = False) -> List[Union[np.ndarray, Exception]]:
+        """
+        Décode plusieurs images (ou fichiers DICOM) en parallèle
+        
+        Returns:
+            Pour chaque chemin, le tableau uint8 ou l'exception levée au décodage
+        """
+        def decode(path):
+            try:
+                return decode_file(path, allow_grayscale, self.fast)
+            except Exception as e:
+                return e
+        
+        if self.workers == 1 or len(image_paths) <= 1:
+            return [decode(path) for path in image_paths]
+        return list(self._get_executor().map(decode, image_paths))
+    
+    def to_batch(self, arrays: List[np.ndarray]) -> np.ndarray:
+        """
+        Assemble des images décodées (même nombre de canaux) en un lot float32
+        
+        Returns:
+            Vue (N, 256, 256, C) sur le tampon réutilisé (tableau non conservé
+            au-delà de max_batch images)
+        """
+        channels = arrays[0].shape[-1]
+        shape = (TARGET_SIZE[1], TARGET_SIZE[0], channels)
+        if len(arrays) > self.max_batch:
+            buffer = np.empty((len(arrays),) + shape, dtype=np.float32)
+        else:
+            buffer = self._buffers.get(channels)
+            if buffer is None or len(buffer) < len(arrays):
+                buffer = np.empty((self.max_batch,) + shape, dtype=np.float32)
+                self._buffers[channels] = buffer
+        
+        batch = buffer[:len(arrays)]
+        for slot, pixels in zip(batch, arrays):
+            np.copyto(slot, pixels)  # conversion uint8 -> float32 sans tableau intermédiaire
+        return batch
+    
+    def close(self):
+        """Arrête les threads de décodage"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
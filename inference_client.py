@@ -0,0 +1,141 @@
+"""
+Client du serveur d'inférence local (voir inference_server.py)
+
+Utilisé par ModelInterface en mode client (APP_INFERENCE_SERVER_URL) : le
+processus de l'application ne charge alors ni TensorFlow ni le modèle.
+Les images sont désignées par leur chemin (le serveur tourne sur la même
+machine et lit les mêmes fichiers) ; les tenseurs déjà prétraités sont
+envoyés au format .npy.
+
+Adresses acceptées :
+    - http://127.0.0.1:8765
+    - unix:///tmp/pneumonia-inference.sock
+"""
+
+import http.client
+import io
+import json
+import socket
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Connexion HTTP sur un socket Unix"""
+    
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+    
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+class InferenceClient:
+    """Appels au serveur d'inférence avec le contrat de ModelInterface"""
+    
+    def __init__(self, server_url: str, timeout: float = 30.0):
+        """
+        Args:
+            server_url: 'http://hôte:port' ou 'unix:///chemin/du/socket'
+            timeout: Délai maximal d'une requête (secondes)
+        """
+        self.server_url = server_url
+        self.timeout = timeout
+        parsed = urlparse(server_url)
+        if parsed.scheme == 'unix':
+            self._socket_path = parsed.path
+            self._host = None
+        elif parsed.scheme == 'http':
+            self._socket_path = None
+            self._host = parsed.netloc
+        else:
+            raise ValueError(f"Adresse du serveur d'inférence non reconnue: {server_url}")
+        
+        # Dernière version du modèle vue dans une réponse du serveur
+        self.model_version: Optional[str] = None
+    
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._socket_path is not None:
+            return UnixHTTPConnection(self._socket_path, self.timeout)
+        return http.client.HTTPConnection(self._host, timeout=self.timeout)
+    
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 content_type: str = 'application/json') -> Dict:
+        """Envoie une requête et décode la réponse JSON"""
+        connection = self._connection()
+        try:
+            headers = {'Content-Type': content_type} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b'{}')
+        finally:
+            connection.close()
+        if response.status >= 400 and response.status != 503:
+            raise RuntimeError(payload.get('error', f"HTTP {response.status}"))
+        return payload
+    
+    @staticmethod
+    def _error(message: str) -> Dict:
+        return {'label': 'error', 'confidence': 0.0, 'error': message}
+    
+    def health(self) -> Dict:
+        """État du serveur (modèle chargé, versions) ; lève une exception s'il est injoignable"""
+        health = self._request('GET', '/health')
+        self.model_version = health.get('model_version') or self.model_version
+        return health
+    
+    def metrics(self) -> Dict:
+        """Compteurs du serveur (profondeur de file, taille des lots...)"""
+        return self._request('GET', '/metrics')
+    
+    def _remember_version(self, results):
+        for result in results:
+            if result.get('model_version'):
+                self.model_version = result['model_version']
+                return
+    
+    def predict(self, image_path: str) -> Dict:
+        """Même contrat que ModelInterface.predict"""
+        return self.predict_batch([image_path])[image_path]
+    
+    @staticmethod
+    def _load_heatmaps(results):
+        """Cartes d'attention reçues en listes -> tableaux uint8 (h, w)"""
+        for result in results:
+            if result and result.get('heatmap') is not None:
+                result['heatmap'] = np.asarray(result['heatmap'], dtype=np.uint8)
+    
+    def predict_batch(self, image_paths: list, explain: bool = False) -> Dict[str, Dict]:
+        """Même contrat que ModelInterface.predict_batch"""
+        request = {'image_paths': list(image_paths), 'explain': explain}
+        try:
+            payload = self._request('POST', '/predict', json.dumps(request).encode('utf-8'))
+            results = payload['results']
+        except Exception as e:
+            return {image_path: self._error(f"Serveur d'inférence injoignable: {e}") for image_path in image_paths}
+        self._load_heatmaps(results.values())
+        self._remember_version(results.values())
+        return {image_path: results.get(image_path) or self._error("Réponse incomplète du serveur")
+                for image_path in image_paths}
+    
+    def predict_arrays(self, batch: np.ndarray, explain: bool = False) -> List[Dict]:
+        """Même contrat que ModelInterface.predict_arrays (tableau envoyé au format .npy)"""
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(batch), allow_pickle=False)
+        path = '/predict_arrays?explain=1' if explain else '/predict_arrays'
+        try:
+            payload = self._request('POST', path, buffer.getvalue(), 'application/x-npy')
+            results = payload['results']
+        except Exception as e:
+            return [self._error(f"Serveur d'inférence injoignable: {e}") for _ in range(len(batch))]
+        self._load_heatmaps(results)
+        self._remember_version(results)
+        return results
@@ -0,0 +1,326 @@
+"""
+Ordonnancement des analyses en attente du modèle
+
+Les images soumises depuis la vue préparateur passent par une file à
+priorités commune au processus (toutes les sessions) au lieu d'être
+analysées dans l'ordre de la liste : un examen critique n'attend plus
+derrière un lot de routine de 500 images.
+
+Priorité d'une image (niveau plus petit = servie plus tôt) :
+    - urgence saisie à l'import : Critique 0, Élevée 2, Normale 4
+    - station ou modalité prioritaire (config.SCHEDULER_PRIORITY_STATIONS /
+      SCHEDULER_PRIORITY_MODALITIES) : un niveau de moins
+    - ancienneté de la demande (import de l'image) : un niveau de moins par
+      config.SCHEDULER_AGING_SECONDS d'attente, sans dépasser le niveau Élevée
+      (une demande ancienne ne passe jamais devant un examen critique)
+
+Équité : chaque préparateur a sa propre file ; parmi les préparateurs dont
+la prochaine image est au meilleur niveau, le servi le moins récemment
+passe en premier (tourniquet). Un gros lot d'un préparateur n'empêche donc
+pas les autres d'avancer au même niveau d'urgence.
+
+Contre-pression : au-delà de config.SCHEDULER_MAX_QUEUE images en file, les
+nouvelles soumissions sont refusées (QueueFullError), sauf les examens
+critiques, toujours acceptés.
+
+Le temps d'attente en file (soumission -> passage au modèle) est mesuré
+par niveau d'urgence (voir InferenceScheduler.metrics).
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import config
+
+# Niveau de priorité par urgence saisie à l'import (plus petit = plus urgent)
+URGENCY_LEVELS = {'Critique': 0, 'Élevée': 2, 'Normale': 4}
+
+# Niveau minimal atteint par vieillissement (celui des urgences élevées)
+_AGING_FLOOR = URGENCY_LEVELS['Élevée']
+
+# Temps d'attente conservés pour les centiles de metrics()
+_WAIT_SAMPLES = 1000
+
+class QueueFullError(RuntimeError):
+    """File d'analyse pleine : soumission refusée (accepted_ids : images critiques tout de même ajoutées)"""
+    
+    def __init__(self, message: str, accepted_ids: Optional[List[str]] = None):
+        super().__init__(message)
+        self.accepted_ids = accepted_ids or []
+
+def urgency_of(image: Dict) -> str:
+    """Urgence d'une image ('Normale' si non renseignée ou inconnue)"""
+    urgency = image.get('urgency') or 'Normale'
+    return urgency if urgency in URGENCY_LEVELS else 'Normale'
+
+def priority_level(image: Dict) -> int:
+    """
+    Niveau de priorité d'une image avant vieillissement
+    
+    Args:
+        image: Image (dictionnaire du store images)
+    """
+    level = URGENCY_LEVELS[urgency_of(image)]
+    station = (image.get('station_name') or '').upper()
+    modality = (image.get('modality') or '').upper()
+    if level > 0 and (station in config.SCHEDULER_PRIORITY_STATIONS
+                      or modality in config.SCHEDULER_PRIORITY_MODALITIES):
+        level -= 1
+    return level
+
+def request_time(image: Dict) -> float:
+    """Horodatage de la demande (import de l'image), maintenant si inconnu"""
+    try:
+        return datetime.fromisoformat(image['created_at']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+class _WorkItem:
+    """Image en attente dans la file d'un préparateur"""
+    
+    __slots__ = ('key', 'seq', 'image_id', 'urgency', 'level', 'requested_at', 'enqueued_at',
+                 'preparator', 'payload', 'handler')
+    
+    def __lt__(self, other: '_WorkItem') -> bool:
+        return (self.key, self.seq) < (other.key, other.seq)
+
+class InferenceScheduler:
+    """
+    File à priorités devant le modèle, servie par un thread unique
+    
+    Les soumissions déposent des images avec la fonction qui les analyse
+    (handler) ; le thread forme des lots de config.INFERENCE_BATCH_SIZE
+    images au plus dans l'ordre des priorités et appelle chaque handler avec
+    ses images. Le handler enregistre lui-même résultats et erreurs.
+    """
+    
+    def __init__(self, capacity: int, batch_size: int, aging_seconds: float):
+        """
+        Args:
+            capacity: Nombre d'images en file au-delà duquel les soumissions non critiques sont refusées
+            batch_size: Nombre maximal d'images par appel d'un handler
+            aging_seconds: Attente qui fait gagner un niveau de priorité (0: pas de vieillissement)
+        """
+        self.capacity = max(1, capacity)
+        self.batch_size = max(1, batch_size)
+        self.aging_seconds = aging_seconds
+        self._queues = {}       # préparateur -> tas de _WorkItem
+        self._last_served = {}  # préparateur -> rang de sa dernière image servie
+        self._queued_ids = set()
+        self._seq = 0
+        self._rounds = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        
+        # Compteurs exposés par metrics() (modifiés sous self._condition)
+        self.submitted_total = 0
+        self.rejected_total = 0
+        self.processed_total = 0
+        self.errors_total = 0
+        self._waits = {urgency: deque(maxlen=_WAIT_SAMPLES) for urgency in URGENCY_LEVELS}
+        
+        self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._thread.start()
+    
+    def _sort_key(self, level: int, requested_at: float) -> float:
+        # Le vieillissement retire le même nombre de niveaux par seconde à toutes
+        # les images : l'ordre relatif dans une file ne change pas avec le temps
+        if not self.aging_seconds or level <= _AGING_FLOOR:
+            return float(level)
+        return level + requested_at / self.aging_seconds
+    
+    def _effective_level(self, item: _WorkItem, now: float) -> int:
+        """Niveau courant d'une image, vieillissement compris"""
+        if not self.aging_seconds or item.level <= _AGING_FLOOR:
+            return item.level
+        aged = item.level - (now - item.requested_at) / self.aging_seconds
+        return max(_AGING_FLOOR, math.floor(aged))
+    
+    def submit(self, images: List[Dict], preparator: str, handler: Callable[[List[Dict]], None]) -> List[str]:
+        """
+        Ajoute des images à la file
+        
+        Les images déjà en file sont ignorées. Les examens critiques sont
+        acceptés même file pleine ; ils sont ajoutés avant le refus éventuel
+        des autres images.
+        
+        Args:
+            images: Images à analyser (dictionnaires du store images)
+            preparator: Nom du préparateur (équité entre préparateurs)
+            handler: Fonction appelée par le thread de la file avec un lot de ces images
+        
+        Returns:
+            IDs des images ajoutées (à suivre avec is_queued)
+        
+        Raises:
+            QueueFullError: File pleine, images non critiques refusées (voir accepted_ids)
+        """
+        now = time.time()
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("File d'analyse arrêtée")
+            new_images = [img for img in images if img['id'] not in self._queued_ids]
+            critical = [img for img in new_images if urgency_of(img) == 'Critique']
+            others = [img for img in new_images if urgency_of(img) != 'Critique']
+            accepted = critical
+            rejected = 0
+            if len(self._queued_ids) + len(critical) + len(others) <= self.capacity:
+                accepted = critical + others
+            else:
+                rejected = len(others)
+            
+            queue = self._queues.setdefault(preparator, [])
+            for image in accepted:
+                item = _WorkItem()
+                item.image_id = image['id']
+                item.urgency = urgency_of(image)
+                item.level = priority_level(image)
+                item.requested_at = min(request_time(image), now)
+                item.key = self._sort_key(item.level, item.requested_at)
+                item.seq = self._seq
+                item.enqueued_at = time.perf_counter()
+                item.preparator = preparator
+                item.payload = image
+                item.handler = handler
+                self._seq += 1
+                heapq.heappush(queue, item)
+                self._queued_ids.add(item.image_id)
+            
+            self.submitted_total += len(accepted)
+            self.rejected_total += rejected
+            if accepted:
+                self._condition.notify()
+        
+        if rejected:
+            detail = f" ({len(critical)} examen(s) critique(s) acceptés)" if critical else ""
+            raise QueueFullError(f"File d'analyse pleine ({self.capacity} images) : "
+                                 f"{rejected} image(s) refusée(s){detail}, réessayer plus tard",
+                                 [image['id'] for image in accepted])
+        return [image['id'] for image in accepted]
+    
+    def is_queued(self, image_id: str) -> bool:
+        with self._condition:
+            return image_id in self._queued_ids
+    
+    def stop(self):
+        """Arrête le thread après le lot en cours (les images en file sont abandonnées)"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+    
+    def _pop_next(self, now: float) -> Optional[_WorkItem]:
+        """Image suivante : meilleur niveau, puis préparateur servi le moins récemment"""
+        best = None
+        for preparator, queue in self._queues.items():
+            if not queue:
+                continue
+            candidate = (self._effective_level(queue[0], now), self._last_served.get(preparator, -1), queue[0])
+            if best is None or candidate[:2] < best[:2] or (candidate[:2] == best[:2] and candidate[2] < best[2]):
+                best = candidate
+        if best is None:
+            return None
+        item = heapq.heappop(self._queues[best[2].preparator])
+        self._last_served[item.preparator] = self._rounds
+        self._rounds += 1
+        return item
+    
+    def _next_batch(self) -> List[_WorkItem]:
+        with self._condition:
+            while not self._queued_ids and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return []
+            now = time.time()
+            dispatched = time.perf_counter()
+            batch = []
+            while len(batch) < self.batch_size:
+                item = self._pop_next(now)
+                if item is None:
+                    break
+                batch.append(item)
+                self._waits[item.urgency].append(dispatched - item.enqueued_at)
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            
+            # Un appel par handler (session), dans l'ordre de priorité
+            groups = {}
+            for item in batch:
+                groups.setdefault(item.handler, []).append(item)
+            errors = 0
+            for handler, items in groups.items():
+                try:
+                    handler([item.payload for item in items])
+                except Exception as e:
+                    errors += len(items)
+                    print(f"⚠️  Erreur lors de l'analyse de {len(items)} image(s): {e}")
+            
+            with self._condition:
+                self._queued_ids.difference_update(item.image_id for item in batch)
+                self.processed_total += len(batch)
+                self.errors_total += errors
+    
+    def metrics(self) -> Dict:
+        """
+        Profondeur de la file et temps d'attente
+        
+        Returns:
+            Dictionnaire avec queue_depth, queue_depth_by_urgency, wait_ms (p50, p95,
+            max sur les dernières analyses) global et par urgence, et les compteurs
+        """
+        with self._condition:
+            depth = {urgency: 0 for urgency in URGENCY_LEVELS}
+            for queue in self._queues.values():
+                for item in queue:
+                    depth[item.urgency] += 1
+            waits = {urgency: list(samples) for urgency, samples in self._waits.items()}
+            counters = {
+                'submitted_total': self.submitted_total,
+                'rejected_total': self.rejected_total,
+                'processed_total': self.processed_total,
+                'errors_total': self.errors_total
+            }
+        
+        def summary(samples: List[float]) -> Dict:
+            if not samples:
+                return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+            ms = np.array(samples) * 1000
+            return {
+                'count': len(samples),
+                'p50': round(float(np.percentile(ms, 50)), 1),
+                'p95': round(float(np.percentile(ms, 95)), 1),
+                'max': round(float(ms.max()), 1)
+            }
+        
+        return {
+            'queue_depth': sum(depth.values()),
+            'queue_depth_by_urgency': depth,
+            'capacity': self.capacity,
+            'wait_ms': summary([w for samples in waits.values() for w in samples]),
+            'wait_ms_by_urgency': {urgency: summary(samples) for urgency, samples in waits.items()},
+            **counters
+        }
+
+_scheduler = None
+_scheduler_guard = threading.Lock()
+
+def get_scheduler() -> InferenceScheduler:
+    """File d'analyse du processus, partagée par toutes les sessions"""
+    global _scheduler
+    with _scheduler_guard:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler(config.SCHEDULER_MAX_QUEUE, config.INFERENCE_BATCH_SIZE,
+                                            config.SCHEDULER_AGING_SECONDS)
+        return _scheduler
@@ -0,0 +1,356 @@
+"""
+Serveur d'inférence local avec regroupement dynamique des requêtes
+
+Un seul processus charge le modèle (et TensorFlow) ; les processus de
+l'application l'appellent en mode client (APP_INFERENCE_SERVER_URL, voir
+inference_client.py) au lieu de garder chacun leur copie du modèle.
+
+Les requêtes concurrentes, même venant de processus différents, sont
+regroupées en lots : le premier arrivé attend au plus --max-latency-ms que
+d'autres le rejoignent, et le lot part dès qu'il atteint --max-batch images.
+Le modèle suit le registre (bascule et modèle shadow, voir model_registry.py).
+
+Points d'accès :
+    POST /predict         {"image_paths": [...], "explain": false} -> {"results": {chemin: résultat}}
+    POST /predict_arrays  tableau .npy uint8/float32 (N, 256, 256, C) -> {"results": [...]}
+                          (?explain=1 : carte d'attention 'heatmap' dans chaque résultat)
+    GET  /health          modèle chargé et versions (503 sans modèle)
+    GET  /metrics         profondeur de file, lots, temps d'attente et de calcul
+
+Usage:
+    python inference_server.py [--host 127.0.0.1] [--port 8765] [--unix /tmp/pneumonia-inference.sock]
+                               [--max-batch 32] [--max-latency-ms 10]
+"""
+
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import config
+from model_interface import ModelInterface
+
+# Taille maximale d'un corps de requête (un lot de 256 images float32)
+MAX_BODY_BYTES = 256 * 256 * 256 * 3 * 4 + 4096
+
+def _jsonable(result: Dict) -> Dict:
+    """Résultat sérialisable : carte d'attention uint8 (h, w) envoyée en listes, reconvertie par le client"""
+    if isinstance(result.get('heatmap'), np.ndarray):
+        return {**result, 'heatmap': result['heatmap'].tolist()}
+    return result
+
+class _PendingRequest:
+    """Images d'une requête en attente de passage dans un lot"""
+    
+    __slots__ = ('arrays', 'explain', 'enqueued_at', 'done', 'results', 'error')
+    
+    def __init__(self, arrays: np.ndarray, explain: bool = False):
+        self.arrays = arrays
+        self.explain = explain
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+class DynamicBatcher:
+    """
+    Regroupe les requêtes concurrentes en lots pour le modèle
+    
+    Un thread unique appelle le modèle : les requêtes déposent leurs images
+    dans une file et attendent leurs résultats.
+    """
+    
+    def __init__(self, model_interface: ModelInterface, max_batch_size: int, max_latency: float):
+        """
+        Args:
+            model_interface: Modèle local (hors mode client)
+            max_batch_size: Nombre d'images au-delà duquel un lot part sans attendre
+            max_latency: Attente maximale (secondes) du premier arrivé pour compléter un lot
+        """
+        self.model_interface = model_interface
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max(0.0, max_latency)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self.started_at = time.time()
+        
+        # Compteurs exposés par /metrics (modifiés sous self._condition)
+        self.queued_images = 0
+        self.requests_total = 0
+        self.images_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.wait_seconds_total = 0.0
+        self.inference_seconds_total = 0.0
+        self.last_batch_size = 0
+        
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+    
+    def submit(self, arrays: np.ndarray, explain: bool = False) -> List[Dict]:
+        """
+        Ajoute des images à la file et attend leurs résultats
+        
+        Args:
+            arrays: Tableau (N, 256, 256, C)
+            explain: Ajouter la carte d'attention ('heatmap') aux résultats
+        
+        Returns:
+            Résultats de prédiction, dans l'ordre des images
+        """
+        if len(arrays) == 0:
+            return []
+        request = _PendingRequest(arrays, explain)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Serveur en cours d'arrêt")
+            self._queue.append(request)
+            self.queued_images += len(arrays)
+            self._condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+    
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+    
+    def _next_batch(self) -> List[_PendingRequest]:
+        """Attend le premier arrivé puis complète le lot jusqu'à la taille ou au délai maximal"""
+        with self._condition:
+            while not self._queue and not self._stopped:
+                self._condition.wait()
+            if not self._queue:
+                return []
+            
+            deadline = self._queue[0].enqueued_at + self.max_latency
+            while self.queued_images < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            
+            batch = [self._queue.popleft()]
+            size = len(batch[0].arrays)
+            while self._queue and size + len(self._queue[0].arrays) <= self.max_batch_size:
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.arrays)
+            self.queued_images -= size
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            
+            # Un lot par nombre de canaux (RGB / niveaux de gris) et par demande de carte d'attention
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.arrays.shape[1:], request.arrays.dtype, request.explain), []).append(request)
+            
+            errors = 0
+            for (_, _, explain), requests in groups.items():
+                try:
+                    arrays = requests[0].arrays if len(requests) == 1 else np.concatenate([r.arrays for r in requests])
+                    results = self.model_interface.predict_arrays(arrays, explain=explain)
+                    offset = 0
+                    for request in requests:
+                        request.results = results[offset:offset + len(request.arrays)]
+                        offset += len(request.arrays)
+                except Exception as e:
+                    errors += len(requests)
+                    for request in requests:
+                        request.error = e
+            
+            elapsed = time.perf_counter() - started
+            with self._condition:
+                self.batches_total += 1
+                self.requests_total += len(batch)
+                self.last_batch_size = sum(len(r.arrays) for r in batch)
+                self.images_total += self.last_batch_size
+                self.errors_total += errors
+                self.inference_seconds_total += elapsed
+                self.wait_seconds_total += sum(started - r.enqueued_at for r in batch)
+            for request in batch:
+                request.done.set()
+    
+    def metrics(self) -> Dict:
+        """Compteurs cumulés et profondeur courante de la file"""
+        with self._condition:
+            return {
+                'queue_depth_requests': len(self._queue),
+                'queue_depth_images': self.queued_images,
+                'requests_total': self.requests_total,
+                'images_total': self.images_total,
+                'batches_total': self.batches_total,
+                'errors_total': self.errors_total,
+                'last_batch_size': self.last_batch_size,
+                'mean_batch_size': round(self.images_total / self.batches_total, 2) if self.batches_total else 0.0,
+                'mean_queue_wait_ms': round(self.wait_seconds_total / self.requests_total * 1000, 2) if self.requests_total else 0.0,
+                'mean_inference_ms': round(self.inference_seconds_total / self.batches_total * 1000, 2) if self.batches_total else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_latency_ms': self.max_latency * 1000,
+                'uptime_seconds': round(time.time() - self.started_at, 1)
+            }
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """Points d'accès HTTP du serveur d'inférence"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Renseignés par create_server
+    model_interface: ModelInterface = None
+    batcher: DynamicBatcher = None
+    
+    def log_message(self, format, *args):
+        # Pas de journal par requête : voir /metrics
+        pass
+    
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Requête trop volumineuse ({length} octets)")
+        return self.rfile.read(length)
+    
+    def do_GET(self):
+        if self.path == '/health':
+            model_interface = self.model_interface
+            loaded = model_interface.model is not None
+            self._send_json(200 if loaded else 503, {
+                'status': 'ok' if loaded else 'unavailable',
+                'model_version': model_interface.model_version,
+                'shadow_version': model_interface.shadow_version,
+                'backend': model_interface.backend_name,
+                'quantization': model_interface.quantization
+            })
+        elif self.path == '/metrics':
+            self._send_json(200, self.batcher.metrics())
+        else:
+            self._send_json(404, {'error': f"Chemin inconnu: {self.path}"})
+    
+    def do_POST(self):
+        try:
+            body = self._read_body()
+            if self.path == '/predict':
+                request = json.loads(body)
+                results = self._predict_paths(request['image_paths'], bool(request.get('explain')))
+                self._send_json(200, {'results': {path: _jsonable(result) for path, result in results.items()}})
+            elif urlsplit(self.path).path == '/predict_arrays':
+                explain = parse_qs(urlsplit(self.path).query).get('explain') == ['1']
+                arrays = np.load(io.BytesIO(body), allow_pickle=False)
+                if arrays.ndim != 4:
+                    raise ValueError(f"Tableau (N, 256, 256, C) attendu, reçu {arrays.shape}")
+                self._send_json(200, {'results': [_jsonable(result) for result in self.batcher.submit(arrays, explain)]})
+            else:
+                self._send_json(404, {'error': f"Chemin inconnu: {self.path}"})
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f"Requête invalide: {e}"})
+        except Exception as e:
+            self._send_json(500, {'error': f"Erreur lors de la prédiction: {e}"})
+    
+    def _predict_paths(self, image_paths: List[str], explain: bool = False) -> Dict[str, Dict]:
+        """Décode les images dans le thread de la requête, puis passe par le regroupement"""
+        model_interface = self.model_interface
+        if model_interface.model is None:
+            return {image_path: {'label': 'error', 'confidence': 0.0, 'error': 'Modèle non chargé'}
+                    for image_path in image_paths}
+        
+        results, pending = model_interface.decode_images(image_paths, model_interface.gray_model is not None)
+        # Soumis par lots de max_batch_size : une grosse requête ne forme pas un seul tableau
+        batch_size = self.batcher.max_batch_size
+        chunks = [(paths[start:start + batch_size], arrays[start:start + batch_size])
+                  for paths, arrays in pending.values() for start in range(0, len(arrays), batch_size)]
+        for paths, arrays in chunks:
+            try:
+                for image_path, result in zip(paths, self.batcher.submit(np.stack(arrays), explain)):
+                    results[image_path] = result
+            except Exception as e:
+                for image_path in paths:
+                    results[image_path] = {
+                        'label': 'error',
+                        'confidence': 0.0,
+                        'error': f"Erreur lors de la prédiction: {str(e)}"
+                    }
+        return results
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serveur HTTP sur socket Unix (un thread par connexion)"""
+    
+    daemon_threads = True
+
+def create_server(model_interface: ModelInterface, batcher: DynamicBatcher, host: str = '127.0.0.1',
+                  port: int = 8765, unix_socket: str = None):
+    """
+    Crée le serveur HTTP (TCP ou socket Unix)
+    
+    Returns:
+        Serveur prêt pour serve_forever()
+    """
+    handler = type('BoundInferenceRequestHandler', (InferenceRequestHandler,), {
+        'model_interface': model_interface,
+        'batcher': batcher
+    })
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="Écouter sur un socket Unix plutôt qu'en TCP")
+    parser.add_argument('--max-batch', type=int, default=config.INFERENCE_BATCH_SIZE, help="Images par lot au maximum")
+    parser.add_argument('--max-latency-ms', type=float, default=config.INFERENCE_MAX_LATENCY_MS,
+                        help="Attente maximale pour compléter un lot")
+    args = parser.parse_args()
+    
+    model_interface = ModelInterface(server_url='')
+    batcher = DynamicBatcher(model_interface, args.max_batch, args.max_latency_ms / 1000)
+    server = create_server(model_interface, batcher, args.host, args.port, args.unix)
+    
+    # Arrêt propre sur SIGTERM (comme Ctrl+C)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    address = f"unix://{args.unix}" if args.unix else f"http://{args.host}:{args.port}"
+    print(f"✅ Serveur d'inférence sur {address} (lots ≤ {args.max_batch} images, attente ≤ {args.max_latency_ms:g} ms)")
+    print(f"   Application: APP_INFERENCE_SERVER_URL={address} streamlit run app.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Import DICOM par étapes concurrentes reliées par des files bornées
+
+DICOMImporter.import_batch traite les fichiers l'un après l'autre (lecture,
+décodage, PNG, puis écriture des métadonnées) : disque et processeur ne
+travaillent jamais en même temps. Ici chaque étape est un groupe de tâches
+asyncio qui confient leur travail à des exécuteurs, et passe ses résultats
+à la suivante par une file bornée :
+    
+    lecture -> décodage -> images dérivées -> métadonnées -> [évaluation]
+    threads    processus    threads            un thread      un thread
+               ou threads   aperçu PNG         écriture       lots du modèle
+                            + tenseur          par lots
+
+Une étape lente remplit sa file d'entrée et fait attendre les précédentes :
+la mémoire reste bornée (APP_INGEST_QUEUE_SIZE fichiers par file). Les
+métadonnées partent par lots (DataManager.add_patients / add_images) : tout
+ce qui attend dans la file est écrit en une fois. Le tenseur du modèle est
+calculé depuis l'aperçu en mémoire et rangé dans le stockage de tenseurs,
+l'analyse ne relit donc pas le PNG.
+
+metrics() donne pour chaque étape le débit, l'occupation de ses workers et
+la profondeur de sa file d'entrée : l'étape dont la file est pleine et les
+workers occupés est le goulot.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from data_manager import DataManager
+from dicom_importer import DICOMImporter
+from image_preprocessing import to_model_input
+from records import ImageRecord
+from tensor_store import TensorStore
+
+# Fin du flux, transmise à chaque worker d'une étape
+_END = object()
+
+def patient_metadata(metadata: Dict) -> Dict:
+    """Métadonnées patient d'un fichier importé"""
+    return {
+        'sex': metadata.get('sex', ''),
+        'age': metadata.get('age', ''),
+        'institution_name': metadata.get('institution_name', ''),
+        'station_name': metadata.get('station_name', '')
+    }
+
+def image_data(result: Dict, urgency: str = 'Normale') -> Dict:
+    """Enregistrement image d'un fichier importé (voir DICOMImporter.import_file)"""
+    metadata = result['metadata']
+    return {
+        'patient_id': metadata['patient_id'],
+        'file_path': result['file_path'],
+        'image_path': result['image_path'],
+        'exam_date': metadata.get('exam_date_formatted', ''),
+        'exam_time': metadata.get('exam_time', ''),
+        'modality': metadata.get('modality', ''),
+        'body_part': metadata.get('body_part', ''),
+        'patient_position': metadata.get('patient_position', ''),
+        'view_position': metadata.get('view_position', ''),
+        'study_description': metadata.get('study_description', ''),
+        'station_name': metadata.get('station_name', ''),
+        'urgency': urgency
+    }
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+class _Stage:
+    """Étape du pipeline : file d'entrée bornée, workers et compteurs"""
+    
+    def __init__(self, name: str, workers: int, capacity: int, batch_size: int = 1, wait_full: bool = False):
+        """
+        Args:
+            name: Nom affiché dans les métriques
+            workers: Tâches consommant la file
+            capacity: Taille maximale de la file d'entrée
+            batch_size: Éléments traités ensemble au plus
+            wait_full: Attendre un lot complet (sinon, lot = ce qui attend dans la file)
+        """
+        self.name = name
+        self.workers = workers
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.wait_full = wait_full
+        self.queue = asyncio.Queue(capacity)
+        self.active = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self.first_start = None
+        self.last_end = None
+    
+    async def put(self, item):
+        await self.queue.put(item)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+    
+    async def take(self) -> Tuple[List, bool]:
+        """Prochain lot d'éléments, et True si la fin du flux a été reçue"""
+        items = []
+        while len(items) < self.batch_size:
+            if items and not self.wait_full and self.queue.empty():
+                break
+            item = await self.queue.get()
+            if item is _END:
+                return items, True
+            items.append(item)
+        return items, False
+    
+    def metrics(self, started: float) -> Dict:
+        now = time.perf_counter()
+        active_for = (self.last_end or now) - (self.first_start or now)
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'per_second': self.processed / active_for if active_for > 0 else 0.0,
+            'busy_ratio': self.busy / (self.workers * (now - started)) if now > started else 0.0,
+            'queue_depth': self.queue.qsize(),
+            'queue_max': self.max_depth,
+            'queue_capacity': self.capacity
+        }
+
+class IngestionPipeline:
+    """Import DICOM concurrent : lecture, décodage, images dérivées, métadonnées, évaluation"""
+    
+    def __init__(self, data_manager: DataManager, images_dir: Optional[str] = None, urgency: str = 'Normale',
+                 model_interface=None, workers: Optional[int] = None, decode_processes: Optional[int] = None,
+                 queue_size: Optional[int] = None, batch_size: Optional[int] = None, explain: Optional[bool] = None):
+        """
+        Args:
+            data_manager: Stockage des patients et images
+            images_dir: Répertoire des aperçus PNG (défaut: data/images)
+            urgency: Urgence de la demande, commune à tous les fichiers
+            model_interface: Modèle chargé pour évaluer les images importées (None: pas d'évaluation)
+            workers: Threads de lecture, de décodage et d'images dérivées (défaut: APP_INGEST_WORKERS)
+            decode_processes: Processus de décodage, 0 pour des threads (défaut: APP_INGEST_DECODE_PROCESSES)
+            queue_size: Capacité de chaque file (défaut: APP_INGEST_QUEUE_SIZE)
+            batch_size: Images par écriture et par lot du modèle (défaut: APP_INFERENCE_BATCH_SIZE)
+            explain: Calculer les cartes d'attention à l'évaluation (défaut: APP_EXPLAIN_HEATMAPS)
+        """
+        self.data_manager = data_manager
+        self.images_dir = images_dir or os.path.join(data_manager.data_dir, 'images')
+        self.urgency = urgency
+        self.workers = max(1, workers or config.INGEST_WORKERS)
+        self.decode_processes = max(0, config.INGEST_DECODE_PROCESSES if decode_processes is None else decode_processes)
+        self.queue_size = max(1, queue_size or config.INGEST_QUEUE_SIZE)
+        self.batch_size = max(1, batch_size or config.INFERENCE_BATCH_SIZE)
+        self.importer = DICOMImporter()
+        self.tensor_store = TensorStore(os.path.join(data_manager.data_dir, 'tensors'))
+        self.scorer = None
+        if model_interface is not None:
+            # Évaluation par lots partagée avec la réévaluation (embeddings et cartes d'attention compris)
+            from rescore_job import RescoreJob
+            self.scorer = RescoreJob(data_manager, model_interface, self.batch_size, explain=explain)
+        
+        self._stages: List[_Stage] = []
+        self._started = time.perf_counter()
+        self._results: List[Optional[Dict]] = []
+        self._done = 0
+        self._progress = None
+    
+    # ========== Exécution ==========
+    
+    def run(self, file_paths: List[str], progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """
+        Importe des fichiers DICOM (appel bloquant, hors boucle asyncio)
+        
+        Args:
+            file_paths: Fichiers à importer
+            progress: Appelée avec (fichiers terminés, total) après chaque fichier
+        
+        Returns:
+            Pour chaque fichier, dans l'ordre : file_path, success, error, metadata,
+            image_path, image_id ; avec évaluation, label et confidence (ou analysis_error)
+        """
+        return asyncio.run(self.run_async(file_paths, progress))
+    
+    async def run_async(self, file_paths: List[str], progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+        """Comme run, dans une boucle asyncio existante"""
+        os.makedirs(self.images_dir, exist_ok=True)
+        self._started = time.perf_counter()
+        self._results = [None] * len(file_paths)
+        self._done = 0
+        self._progress = progress
+        
+        io_executor = ThreadPoolExecutor(self.workers, thread_name_prefix='ingest-io')
+        cpu_executor = ThreadPoolExecutor(self.workers, thread_name_prefix='ingest-cpu')
+        if self.decode_processes:
+            # 'spawn' : les processus n'héritent pas du modèle chargé
+            decode_executor = ProcessPoolExecutor(self.decode_processes, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            decode_executor = cpu_executor
+        # Écritures et modèle : un seul thread chacun, les lots s'enchaînent
+        store_executor = ThreadPoolExecutor(1, thread_name_prefix='ingest-store')
+        score_executor = ThreadPoolExecutor(1, thread_name_prefix='ingest-score')
+        
+        steps = [
+            (_Stage('lecture', self.workers, self.queue_size), self._map(io_executor, self._read)),
+            (_Stage('décodage', self.decode_processes or self.workers, self.queue_size),
+             self._map(decode_executor, self._decode)),
+            (_Stage('images dérivées', self.workers, self.queue_size), self._map(cpu_executor, self._derive)),
+            (_Stage('métadonnées', 1, self.queue_size, self.batch_size),
+             self._run_batch(store_executor, self._persist))
+        ]
+        if self.scorer is not None:
+            steps.append((_Stage('évaluation', 1, self.queue_size, self.batch_size, wait_full=True),
+                          self._run_batch(score_executor, self._score)))
+        self._stages = [stage for stage, _ in steps]
+        
+        try:
+            tasks = []
+            for position, (stage, handler) in enumerate(steps):
+                next_stage = steps[position + 1][0] if position + 1 < len(steps) else None
+                tasks += [asyncio.create_task(self._work(stage, handler, next_stage)) for _ in range(stage.workers)]
+            
+            first = self._stages[0]
+            for index, file_path in enumerate(file_paths):
+                await first.put({
+                    'index': index,
+                    'result': {'file_path': file_path, 'success': False, 'error': None,
+                               'metadata': None, 'image_path': None}
+                })
+            for _ in range(first.workers):
+                await first.put(_END)
+            await asyncio.gather(*tasks)
+        finally:
+            for executor in {io_executor, cpu_executor, decode_executor, store_executor, score_executor}:
+                executor.shutdown(wait=True)
+        return self._results
+    
+    async def _work(self, stage: _Stage, handler, next_stage: Optional[_Stage]):
+        """Worker d'une étape : lots de la file d'entrée -> handler -> file suivante"""
+        ended = False
+        while not ended:
+            entries, ended = await stage.take()
+            if not entries:
+                continue
+            start = time.perf_counter()
+            if stage.first_start is None:
+                stage.first_start = start
+            passed = await handler(stage, entries)
+            stage.last_end = time.perf_counter()
+            stage.busy += stage.last_end - start
+            stage.processed += len(entries)
+            for entry in passed:
+                if next_stage is not None:
+                    await next_stage.put(entry)
+                else:
+                    self._finish(entry)
+        
+        stage.active -= 1
+        if stage.active == 0 and next_stage is not None:
+            for _ in range(next_stage.workers):
+                await next_stage.put(_END)
+    
+    def _map(self, executor: Executor, step: Callable):
+        """Handler d'une étape élément par élément : step(executor, entrée) est une coroutine"""
+        async def handler(stage: _Stage, entries: List[Dict]) -> List[Dict]:
+            passed = []
+            for entry in entries:
+                try:
+                    await step(executor, entry)
+                except Exception as e:
+                    self._fail(stage, entry, str(e))
+                else:
+                    passed.append(entry)
+            return passed
+        return handler
+    
+    def _run_batch(self, executor: Executor, step: Callable):
+        """Handler d'une étape par lots : step(entrées) s'exécute dans l'exécuteur"""
+        async def handler(stage: _Stage, entries: List[Dict]) -> List[Dict]:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(executor, step, entries)
+            except Exception as e:
+                for entry in entries:
+                    self._fail(stage, entry, str(e))
+                return []
+        return handler
+    
+    def _fail(self, stage: _Stage, entry: Dict, error: str):
+        stage.failed += 1
+        if entry['result']['success']:
+            # Échec de l'évaluation : l'image est importée et reste en attente d'analyse
+            entry['result']['analysis_error'] = error
+        else:
+            entry['result']['error'] = error
+        self._finish(entry)
+    
+    def _finish(self, entry: Dict):
+        self._results[entry['index']] = entry['result']
+        self._done += 1
+        if self._progress:
+            self._progress(self._done, len(self._results))
+    
+    # ========== Étapes ==========
+    
+    async def _read(self, executor: Executor, entry: Dict):
+        entry['raw'] = await asyncio.get_running_loop().run_in_executor(executor, _read_file, entry['result']['file_path'])
+    
+    async def _decode(self, executor: Executor, entry: Dict):
+        metadata, entry['pixels'] = await asyncio.get_running_loop().run_in_executor(
+            executor, self.importer.decode, entry['result']['file_path'], entry.pop('raw')
+        )
+        entry['result']['metadata'] = metadata
+    
+    async def _derive(self, executor: Executor, entry: Dict):
+        await asyncio.get_running_loop().run_in_executor(executor, self._write_preview, entry)
+    
+    def _write_preview(self, entry: Dict):
+        """Aperçu PNG (comme DICOMImporter.save_image_preview) et tenseur du modèle calculé depuis l'aperçu"""
+        result = entry['result']
+        preview = self.importer.make_preview(entry.pop('pixels'))
+        if preview is None:
+            raise ValueError("Impossible de sauvegarder l'image")
+        image_path = self.importer.preview_path(result['file_path'], result['metadata'], self.images_dir)
+        preview.save(image_path, format='PNG')
+        result['image_path'] = image_path
+        # Mêmes pixels que le décodage du PNG sans perte par TensorStore.ensure
+        entry['tensor'] = to_model_input(preview, allow_grayscale=True)
+    
+    def _persist(self, entries: List[Dict]) -> List[Dict]:
+        patients = {}
+        for entry in entries:
+            metadata = entry['result']['metadata']
+            patients.setdefault(metadata['patient_id'], patient_metadata(metadata))
+        self.data_manager.add_patients(patients)
+        
+        records = [image_data(entry['result'], self.urgency) for entry in entries]
+        image_ids = self.data_manager.add_images(records)
+        self.tensor_store.put_many([(image_id, entry.pop('tensor')) for image_id, entry in zip(image_ids, entries)])
+        for image_id, record, entry in zip(image_ids, records, entries):
+            entry['record'] = {'id': image_id, **record}
+            entry['result'].update({'success': True, 'image_id': image_id})
+        return entries
+    
+    def _score(self, entries: List[Dict]) -> List[Dict]:
+        predictions, failed = self.scorer.score_and_save([ImageRecord.from_dict(entry['record']) for entry in entries])
+        
+        by_image = {prediction['image_id']: prediction for prediction in predictions}
+        for entry in entries:
+            image_id = entry['result']['image_id']
+            if image_id in by_image:
+                entry['result'].update({'label': by_image[image_id]['label'],
+                                        'confidence': by_image[image_id]['confidence']})
+            else:
+                entry['result']['analysis_error'] = failed.get(image_id, 'Erreur inconnue')
+        return entries
+    
+    # ========== Suivi ==========
+    
+    def metrics(self) -> Dict:
+        """
+        État du pipeline (utilisable pendant l'import, depuis la boucle ou un autre thread)
+        
+        Returns:
+            elapsed_s, files, done et, par étape : workers, processed, failed,
+            per_second, busy_ratio (occupation des workers), queue_depth,
+            queue_max, queue_capacity (file d'entrée)
+        """
+        return {
+            'elapsed_s': time.perf_counter() - self._started,
+            'files': len(self._results),
+            'done': self._done,
+            'stages': {stage.name: stage.metrics(self._started) for stage in self._stages}
+        }
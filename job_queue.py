@@ -0,0 +1,345 @@
+"""
+Table de jobs de scoring partagée par les workers (SQLite)
+
+Chaque job demande l'évaluation d'une image par le modèle. Les workers
+(scoring_worker.py), sur une ou plusieurs machines, réservent des lots de
+jobs pour une durée limitée (bail), prolongent leur bail tant qu'ils
+travaillent (heartbeat) puis valident les prédictions.
+
+Cycle de vie d'un job :
+    queued -> leased -> done
+                     -> queued (échec, nouvelle tentative) -> ... -> failed
+Un bail expiré (worker arrêté ou bloqué) rend ses jobs à nouveau
+réservables ; après config.JOB_MAX_ATTEMPTS tentatives, le job passe en
+échec définitif.
+
+Unicité : l'identifiant d'un job est '<campagne>:<image_id>' ; mettre en
+file deux fois la même image dans une campagne ne crée qu'un job. Une
+prédiction validée porte cet identifiant (job_id) et
+DataManager.add_predictions_once refuse une seconde prédiction pour le même
+job : un job n'est jamais validé deux fois, même si un worker dont le bail a
+expiré termine son lot après qu'un autre l'a repris.
+
+Plusieurs machines : la base (config.JOB_QUEUE_PATH, dans le répertoire des
+données par défaut) doit être sur un stockage partagé qui gère les verrous
+POSIX ; désactiver alors le journal WAL (APP_JOB_QUEUE_WAL=0), qui ne
+fonctionne pas sur un système de fichiers réseau.
+
+Usage:
+    python job_queue.py enqueue [--campaign intake] [--status pending] [--all]
+    python job_queue.py stats [--campaign intake]
+    python job_queue.py retry-failed [--campaign intake]
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import config
+from inference_scheduler import priority_level
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    campaign TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    model_version TEXT,
+    prediction_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, priority, created_at);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (lease_token);
+"""
+
+STATES = ('queued', 'leased', 'done', 'failed')
+
+def job_key(campaign: str, image_id: str) -> str:
+    """Identifiant (clé d'idempotence) du job d'une image dans une campagne"""
+    return f"{campaign}:{image_id}"
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class Lease:
+    """Lot de jobs réservé par un worker"""
+    
+    def __init__(self, token: str, worker_id: str, jobs: List[Dict], expires_at: float):
+        """
+        Args:
+            token: Jeton du bail (seul son détenteur peut valider ces jobs)
+            worker_id: Worker détenteur
+            jobs: Jobs réservés ({'job_id', 'image_id', 'attempts'})
+            expires_at: Expiration du bail (horodatage)
+        """
+        self.token = token
+        self.worker_id = worker_id
+        self.jobs = jobs
+        self.expires_at = expires_at
+    
+    @property
+    def job_ids(self) -> List[str]:
+        return [job['job_id'] for job in self.jobs]
+
+class JobQueue:
+    """Accès à la table de jobs (une connexion SQLite par thread)"""
+    
+    def __init__(self, db_path: Optional[str] = None, lease_seconds: Optional[float] = None,
+                 max_attempts: Optional[int] = None):
+        """
+        Args:
+            db_path: Base SQLite (défaut: config.JOB_QUEUE_PATH)
+            lease_seconds: Durée d'un bail sans heartbeat (défaut: config.JOB_LEASE_SECONDS)
+            max_attempts: Tentatives avant échec définitif (défaut: config.JOB_MAX_ATTEMPTS)
+        """
+        self.db_path = db_path or config.JOB_QUEUE_PATH
+        self.lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        self.max_attempts = max(1, max_attempts or config.JOB_MAX_ATTEMPTS)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+    
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Transactions explicites (BEGIN IMMEDIATE) : un seul écrivain à la fois
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            if config.JOB_QUEUE_WAL:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _transaction(self):
+        """Transaction en écriture, verrou pris dès le début (pas d'interblocage lecture -> écriture)"""
+        return _ImmediateTransaction(self._connection())
+    
+    # ========== Mise en file ==========
+    
+    def enqueue(self, images: List[Dict], campaign: str = 'intake') -> int:
+        """
+        Met en file l'évaluation d'images (sans effet pour un job déjà existant)
+        
+        Args:
+            images: Images (dictionnaires du store images) ; l'urgence fixe la priorité
+            campaign: Campagne (ex: 'intake', 'rescore-2024-06')
+        
+        Returns:
+            Nombre de jobs créés
+        """
+        now = time.time()
+        rows = [(job_key(campaign, img['id']), campaign, img['id'], priority_level(img), now, now)
+                for img in images]
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (job_id, campaign, image_id, priority, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            return connection.total_changes - before
+    
+    # ========== Réservation ==========
+    
+    def claim(self, worker_id: str, limit: int, campaign: Optional[str] = None) -> Optional[Lease]:
+        """
+        Réserve jusqu'à `limit` jobs, par priorité puis ancienneté
+        
+        Les jobs d'un bail expiré sont réservables comme les jobs en file ;
+        ceux qui ont épuisé leurs tentatives passent d'abord en échec.
+        
+        Returns:
+            Bail, ou None si aucun job n'est disponible
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        expires_at = now + self.lease_seconds
+        campaign_filter = "AND campaign = ?" if campaign else ""
+        campaign_args = (campaign,) if campaign else ()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = 'failed', lease_token = NULL, updated_at = ?, "
+                "last_error = 'Bail expiré à la dernière tentative (worker arrêté ?)' "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            rows = connection.execute(
+                "SELECT job_id, image_id, attempts FROM jobs "
+                f"WHERE (state = 'queued' OR (state = 'leased' AND lease_expires < ?)) {campaign_filter} "
+                "ORDER BY priority, created_at LIMIT ?",
+                (now, *campaign_args, limit)
+            ).fetchall()
+            if not rows:
+                return None
+            connection.executemany(
+                "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_token = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                [(worker_id, token, expires_at, now, row['job_id']) for row in rows]
+            )
+        jobs = [{'job_id': row['job_id'], 'image_id': row['image_id'], 'attempts': row['attempts'] + 1}
+                for row in rows]
+        return Lease(token, worker_id, jobs, expires_at)
+    
+    def heartbeat(self, lease: Lease) -> int:
+        """
+        Prolonge un bail
+        
+        Returns:
+            Nombre de jobs encore détenus (0 : bail expiré et repris par un autre worker)
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            held = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE lease_token = ? AND state = 'leased' AND lease_expires >= ?",
+                (now + self.lease_seconds, now, lease.token, now)
+            ).rowcount
+        lease.expires_at = now + self.lease_seconds
+        return held
+    
+    def confirm(self, lease: Lease) -> List[str]:
+        """
+        Jobs du bail encore détenus, juste avant l'enregistrement des prédictions
+        
+        Le bail est prolongé pour laisser le temps d'enregistrer ; un job repris
+        entre-temps par un autre worker n'est pas retourné.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT job_id FROM jobs WHERE lease_token = ? AND state = 'leased' AND lease_expires >= ?",
+                (lease.token, now)
+            ).fetchall()
+            connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE lease_token = ? AND state = 'leased'",
+                (now + self.lease_seconds, lease.token)
+            )
+        return [row['job_id'] for row in rows]
+    
+    # ========== Fin de traitement ==========
+    
+    def complete(self, lease: Lease, done: Dict[str, str], model_version: Optional[str],
+                 failed: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        Termine les jobs d'un bail (uniquement ceux encore détenus par ce bail)
+        
+        Args:
+            lease: Bail du worker
+            done: ID du job -> ID de la prédiction enregistrée
+            model_version: Version du modèle ayant évalué le lot
+            failed: ID du job -> erreur ; le job est remis en file tant qu'il
+                lui reste des tentatives
+        
+        Returns:
+            IDs des jobs passés en échec définitif
+        """
+        failed = failed or {}
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE jobs SET state = 'done', prediction_id = ?, model_version = ?, last_error = NULL, "
+                "lease_token = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE job_id = ? AND lease_token = ? AND state = 'leased'",
+                [(prediction_id, model_version, now, job_id, lease.token) for job_id, prediction_id in done.items()]
+            )
+            exhausted = [
+                row['job_id'] for row in connection.execute(
+                    "SELECT job_id, attempts FROM jobs WHERE lease_token = ? AND state = 'leased'", (lease.token,)
+                ) if row['job_id'] in failed and row['attempts'] >= self.max_attempts
+            ]
+            connection.executemany(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "last_error = ?, lease_token = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE job_id = ? AND lease_token = ? AND state = 'leased'",
+                [(self.max_attempts, error, now, job_id, lease.token) for job_id, error in failed.items()]
+            )
+        return exhausted
+    
+    def release(self, lease: Lease, error: str) -> List[str]:
+        """Rend tous les jobs d'un bail après une erreur du lot entier (tentative comptée)"""
+        return self.complete(lease, {}, None, {job_id: error for job_id in lease.job_ids})
+    
+    def retry_failed(self, campaign: Optional[str] = None) -> int:
+        """Remet en file les jobs en échec définitif (tentatives remises à zéro)"""
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, updated_at = ? "
+                "WHERE state = 'failed'" + (" AND campaign = ?" if campaign else ""),
+                (time.time(), campaign) if campaign else (time.time(),)
+            ).rowcount
+    
+    # ========== Suivi ==========
+    
+    def stats(self, campaign: Optional[str] = None) -> Dict:
+        """Nombre de jobs par état, baux expirés et workers actifs"""
+        now = time.time()
+        where, args = ("WHERE campaign = ?", (campaign,)) if campaign else ("", ())
+        connection = self._connection()
+        counts = {state: 0 for state in STATES}
+        for row in connection.execute(f"SELECT state, COUNT(*) AS n FROM jobs {where} GROUP BY state", args):
+            counts[row['state']] = row['n']
+        leased = connection.execute(
+            "SELECT lease_owner, lease_expires FROM jobs WHERE state = 'leased'"
+            + (" AND campaign = ?" if campaign else ""), args
+        ).fetchall()
+        return {
+            **counts,
+            'expired_leases': sum(1 for row in leased if row['lease_expires'] < now),
+            'workers': sorted({row['lease_owner'] for row in leased if row['lease_expires'] >= now})
+        }
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK sur exception)"""
+    
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+    
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['enqueue', 'stats', 'retry-failed'])
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--db', help="Base des jobs (défaut: APP_JOB_QUEUE_PATH)")
+    parser.add_argument('--campaign', default=None, help="Campagne (enqueue: 'intake' par défaut)")
+    parser.add_argument('--status', action='append', help="enqueue: statut d'image à inclure (défaut: pending)")
+    parser.add_argument('--all', action='store_true', help="enqueue: toutes les images, quel que soit leur statut")
+    args = parser.parse_args()
+    
+    queue = JobQueue(args.db)
+    if args.command == 'stats':
+        stats = queue.stats(args.campaign)
+        print(f"Jobs{' (' + args.campaign + ')' if args.campaign else ''}: "
+              + ', '.join(f"{state} {stats[state]}" for state in STATES))
+        print(f"Baux expirés: {stats['expired_leases']}, workers actifs: {', '.join(stats['workers']) or '-'}")
+    elif args.command == 'retry-failed':
+        print(f"✅ {queue.retry_failed(args.campaign)} job(s) remis en file")
+    else:
+        from data_manager import DataManager
+        
+        statuses = args.status or ['pending']
+        images = [img.to_dict() for img in DataManager(args.data_dir).get_records('images')
+                  if img.get('image_path') and (args.all or img.get('status', 'pending') in statuses)]
+        created = queue.enqueue(images, args.campaign or 'intake')
+        print(f"✅ {created} job(s) créé(s) ({len(images) - created} déjà en file)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Test de charge de l'API REST (api_server.py)
+
+Prépare un répertoire de données temporaire (images, prédictions et
+annotations simulées), démarre le serveur dans un sous-processus puis envoie
+des requêtes depuis plusieurs clients (connexions keep-alive) pendant une
+durée fixe :
+    - 60 % détail d'un cas      GET /cases/<image_id>
+    - 30 % liste de travail     GET /worklist?status=pending&limit=50
+    - 10 % liste complète       GET /worklist?format=ndjson (réponse en flux)
+
+Affiche le débit soutenu (requêtes/s), les latences p50/p95/p99 et les
+erreurs par type de requête ; --imports envoie d'abord des fichiers DICOM
+par POST /import.
+
+Usage:
+    python load_test_api.py [--cases 5000] [--clients 16] [--seconds 10] [--pool-size 4] [--imports 0]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from data_manager import DataManager
+
+URGENCIES = ['Normale'] * 7 + ['Élevée'] * 2 + ['Critique']
+
+def seed_data(data_dir: str, count: int) -> list:
+    """Images, prédictions et annotations simulées ; retourne les identifiants des images"""
+    data_manager = DataManager(data_dir)
+    rng = random.Random(0)
+    now = datetime.now()
+    data_manager.add_patients({f"P{i:05d}": {'patient_name': f"Patient {i}", 'patient_sex': rng.choice('MF')}
+                               for i in range(count // 4 + 1)})
+    image_ids = data_manager.add_images([{
+        'patient_id': f"P{i // 4:05d}",
+        'file_path': f"dicom/IMG{i:06d}.dcm",
+        'image_path': f"images/IMG{i:06d}.png",
+        'exam_date': (now - timedelta(days=rng.randint(0, 30))).strftime('%Y%m%d'),
+        'modality': 'DX',
+        'urgency': rng.choice(URGENCIES),
+        'status': 'pending',
+        'created_at': (now - timedelta(seconds=count - i)).isoformat()
+    } for i in range(count)])
+    data_manager.add_predictions([{
+        'image_id': image_id,
+        'label': rng.choice(['NORMAL', 'PNEUMONIA']),
+        'confidence': round(rng.uniform(0.5, 1.0), 4),
+        'raw_prediction': rng.random(),
+        'model_version': 'load-test'
+    } for image_id in image_ids])
+    for i, image_id in enumerate(image_ids[:count // 20]):
+        data_manager.add_annotation({
+            'image_id': image_id,
+            'patient_id': f"P{i // 4:05d}",
+            'label': rng.choice(['NORMAL', 'PNEUMONIA']),
+            'user_name': 'Test de charge',
+            'user_role': 'Préparateur'
+        })
+    return image_ids
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_ready(port: int, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage")
+        with contextlib.suppress(OSError):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return
+        time.sleep(0.2)
+    raise RuntimeError("Le serveur ne répond pas")
+
+def post_imports(port: int, count: int) -> float:
+    """Envoie des fichiers DICOM simulés ; retourne le débit (fichiers/s)"""
+    from generate_test_data import create_test_dicom
+    
+    work_dir = tempfile.mkdtemp(prefix='load_api_dicom_')
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = []
+            for i in range(count):
+                path = os.path.join(work_dir, f"UP{i:05d}.dcm")
+                create_test_dicom(f"U{i:05d}", path, is_sick=i % 2 == 0)
+                paths.append(path)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        start = time.perf_counter()
+        for path in paths:
+            with open(path, 'rb') as f:
+                connection.request('POST', f"/import?filename={os.path.basename(path)}", f.read(),
+                                   {'Content-Type': 'application/dicom'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                print(f"⚠️  Import {path}: HTTP {response.status}")
+        return count / (time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def client(port: int, image_ids: list, deadline: float, seed: int, results: dict, lock: threading.Lock):
+    rng = random.Random(seed)
+    local = {}
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.perf_counter() < deadline:
+        draw = rng.random()
+        if draw < 0.6:
+            kind, path = 'cas', f"/cases/{rng.choice(image_ids)}"
+        elif draw < 0.9:
+            kind, path = 'liste (50)', "/worklist?status=pending&limit=50"
+        else:
+            kind, path = 'liste complète', "/worklist?format=ndjson"
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        stats = local.setdefault(kind, {'latencies': [], 'errors': 0})
+        stats['latencies'].append(time.perf_counter() - start)
+        stats['errors'] += 0 if ok else 1
+    connection.close()
+    with lock:
+        for kind, stats in local.items():
+            merged = results.setdefault(kind, {'latencies': [], 'errors': 0})
+            merged['latencies'].extend(stats['latencies'])
+            merged['errors'] += stats['errors']
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=5000, help="Images simulées")
+    parser.add_argument('--clients', type=int, default=16, help="Clients simultanés")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Durée de la charge")
+    parser.add_argument('--pool-size', type=int, default=4, help="DataManager du pool de stockage du serveur")
+    parser.add_argument('--imports', type=int, default=0, help="Fichiers DICOM envoyés avant la charge")
+    args = parser.parse_args()
+    
+    data_dir = tempfile.mkdtemp(prefix='load_api_')
+    process = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            image_ids = seed_data(data_dir, args.cases)
+        port = free_port()
+        env = dict(os.environ, APP_API_TOKEN='')
+        process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_server.py'),
+                                    '--port', str(port), '--data-dir', data_dir, '--pool-size', str(args.pool_size)],
+                                   env=env, stdout=subprocess.DEVNULL)
+        wait_ready(port, process)
+        
+        print(f"Test de charge API: {args.cases} cas, {args.clients} clients, {args.seconds:.0f} s, "
+              f"pool de stockage {args.pool_size}, {os.cpu_count()} cœur(s)")
+        print("=" * 72)
+        if args.imports:
+            print(f"Import: {args.imports} fichiers DICOM envoyés, {post_imports(port, args.imports):.1f} fichiers/s")
+        
+        results = {}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        threads = [threading.Thread(target=client, args=(port, image_ids, deadline, i, results, lock))
+                   for i in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        print(f"{'Requête':<18}{'Nombre':>9}{'Req/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'Erreurs':>9}")
+        total = errors = 0
+        for kind in ('cas', 'liste (50)', 'liste complète'):
+            stats = results.get(kind, {'latencies': [], 'errors': 0})
+            latencies = sorted(stats['latencies'])
+            total += len(latencies)
+            errors += stats['errors']
+            print(f"{kind:<18}{len(latencies):>9}{len(latencies) / elapsed:>9.1f}{percentile(latencies, 0.5):>10.1f}"
+                  f"{percentile(latencies, 0.95):>10.1f}{percentile(latencies, 0.99):>10.1f}{stats['errors']:>9}")
+        print("=" * 72)
+        print(f"Débit soutenu: {total / elapsed:.1f} requêtes/s ({total} requêtes, {errors} erreurs)")
+        
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connection.request('GET', '/metrics')
+        metrics = json.loads(connection.getresponse().read())
+        print("Latences côté serveur (jusqu'au début de la réponse):")
+        for route, stats in metrics['routes'].items():
+            print(f"  {route:<10} {stats['count']:>7} requêtes  p50 {stats['p50_ms']:.1f} ms  p99 {stats['p99_ms']:.1f} ms")
+    finally:
+        if process is not None:
+            process.terminate()
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                process.wait(timeout=10)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
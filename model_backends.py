@@ -0,0 +1,386 @@
+"""
+Moteurs d'inférence du modèle de détection de pneumonie
+
+Le même réseau peut être servi par plusieurs moteurs :
+    - 'keras'  : model.h5 via TensorFlow/Keras (référence)
+    - 'tflite' : model.tflite via tflite_runtime (ou tf.lite si absent)
+    - 'onnx'   : model.onnx via ONNX Runtime
+
+Les fichiers .tflite et .onnx sont produits une fois par convert_model.py.
+Chaque moteur reçoit un lot float32 (N, 256, 256, 3) de pixels 0-255 (1 canal
+pour un modèle niveaux de gris, voir fold_grayscale.py) et
+retourne les probabilités d'être malade (N,). TensorFlow n'est importé que
+par le moteur qui en a besoin.
+
+Le même appel peut aussi retourner l'embedding de chaque image (voir
+build_embedding_model), utilisé par la recherche de cas similaires
+(embedding_index.py).
+"""
+
+import json
+import os
+from typing import Dict, Optional, Set
+
+import numpy as np
+
+import config
+
+_cpu_configured = False
+
+def parse_cpu_list(value: str) -> Set[int]:
+    """
+    Lit une liste de cœurs au format de taskset (ex: "0-3,6")
+    
+    Returns:
+        Ensemble des numéros de cœurs
+    """
+    cpus = set()
+    for part in value.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+def available_cpus() -> int:
+    """Nombre de cœurs utilisables par le processus (affinité comprise)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def configure_cpu():
+    """
+    Applique l'affinité CPU du processus (APP_CPU_AFFINITY), une seule fois
+    
+    Appelé avant le chargement du premier modèle : les threads des moteurs
+    créés ensuite héritent de l'affinité.
+    """
+    global _cpu_configured
+    if _cpu_configured:
+        return
+    _cpu_configured = True
+    if config.CPU_AFFINITY and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, parse_cpu_list(config.CPU_AFFINITY))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Affinité CPU ignorée ({config.CPU_AFFINITY}): {e}")
+
+def build_embedding_model(model):
+    """
+    Modèle Keras à deux sorties : probabilités et embeddings
+    
+    L'embedding est la moyenne spatiale (global average pooling) de la
+    dernière carte de caractéristiques du réseau (dernière sortie 4D, avant
+    Flatten) : 64 valeurs pour model.h5, au lieu des 61 504 de la couche
+    Flatten, et peu sensible à la position des motifs dans l'image.
+    
+    Args:
+        model: Modèle Keras chargé
+    
+    Returns:
+        Modèle Keras (N, H, W, C) -> [(N, 1), (N, D)]
+    """
+    import tensorflow as tf
+    feature_layers = [layer for layer in model.layers if len(layer.output_shape) == 4]
+    if not feature_layers:
+        raise ValueError("Aucune carte de caractéristiques 4D dans le modèle")
+    pooled = tf.keras.layers.GlobalAveragePooling2D(name='embedding')(feature_layers[-1].output)
+    return tf.keras.Model(model.inputs, [model.output, pooled])
+
+def build_explainer(model):
+    """
+    Fonction Grad-CAM par lot : probabilités, embeddings et cartes d'attention
+    
+    Les gradients sont pris sur le logit de la couche Dense finale (avant la
+    sigmoïde, qui s'annule pour les prédictions très confiantes) par rapport
+    à la dernière carte de caractéristiques. Chaque image du lot n'influant
+    que sur sa propre sortie, un seul passage arrière donne les gradients de
+    tout le lot. La carte (ReLU de la somme des canaux pondérés par leur
+    gradient moyen) garde la résolution de la carte de caractéristiques
+    (31x31 pour model.h5), normalisée en uint8 ; elle est agrandie à
+    l'affichage.
+    
+    Args:
+        model: Modèle Keras Sequential terminé par une couche Dense
+    
+    Returns:
+        Fonction lot float32 (N, H, W, C) -> (probabilités (N,), embeddings (N, D),
+        cartes uint8 (N, h, w)), à envelopper dans tf.function
+    """
+    import tensorflow as tf
+    if not isinstance(model, tf.keras.Sequential):
+        raise ValueError("Cartes d'attention disponibles pour les modèles Sequential uniquement")
+    layers = model.layers
+    feature_index = max(index for index, layer in enumerate(layers) if len(layer.output_shape) == 4)
+    head, last = layers[feature_index + 1:-1], layers[-1]
+    if not isinstance(last, tf.keras.layers.Dense) or last.units != 1:
+        raise ValueError("Couche Dense à une sortie attendue en fin de modèle")
+    feature_model = tf.keras.Model(model.inputs, layers[feature_index].output)
+    
+    def explain(batch):
+        features = feature_model(batch, training=False)
+        with tf.GradientTape() as tape:
+            tape.watch(features)
+            x = features
+            for layer in head:
+                x = layer(x, training=False)
+            logits = tf.matmul(x, last.kernel) + last.bias
+            score = tf.reduce_sum(logits)
+        gradients = tape.gradient(score, features)
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * features, axis=-1))
+        peaks = tf.reduce_max(cams, axis=(1, 2), keepdims=True)
+        heatmaps = tf.cast(tf.round(255.0 * tf.math.divide_no_nan(cams, peaks)), tf.uint8)
+        probabilities = tf.reshape(last.activation(logits), [-1])
+        return probabilities, tf.reduce_mean(features, axis=(1, 2)), heatmaps
+    
+    return explain
+
+def intra_op_threads() -> int:
+    """Threads de calcul par opération : APP_INFERENCE_INTRA_OP_THREADS, sinon cœurs disponibles"""
+    return config.INFERENCE_INTRA_OP_THREADS or available_cpus()
+
+class InferenceBackend:
+    """Interface d'un moteur d'inférence"""
+    
+    name = 'base'
+    extension = ''
+    
+    # Nombre de canaux d'entrée du modèle chargé (3: RGB, 1: niveaux de gris)
+    channels = 3
+    # Forme d'entrée du modèle chargé (taille de lot libre)
+    input_shape = (None, 256, 256, 3)
+    # Taille des embeddings retournés par predict_with_embeddings (0: non disponibles)
+    embedding_dim = 0
+    # Cartes d'attention disponibles (voir explain)
+    supports_explain = False
+    
+    def __init__(self, model_path: str):
+        """
+        Charge le modèle
+        
+        Args:
+            model_path: Chemin vers le fichier du modèle
+        """
+        self.model_path = model_path
+        configure_cpu()
+        self._load()
+    
+    def _load(self):
+        raise NotImplementedError
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Calcule les probabilités pour un lot d'images prétraitées
+        
+        Args:
+            batch: Tableau float32 (N, 256, 256, channels)
+        
+        Returns:
+            Tableau float32 (N,) des probabilités d'être malade
+        """
+        return self.predict_with_embeddings(batch)[0]
+    
+    def predict_with_embeddings(self, batch: np.ndarray) -> tuple:
+        """
+        Probabilités et embeddings d'un lot, en un seul passage dans le réseau
+        
+        Returns:
+            (probabilités float32 (N,), embeddings float32 (N, embedding_dim) ou None)
+        """
+        raise NotImplementedError
+    
+    def explain(self, batch: np.ndarray) -> tuple:
+        """
+        Probabilités, embeddings et cartes d'attention d'un lot (si supports_explain)
+        
+        Returns:
+            (probabilités float32 (N,), embeddings float32 (N, embedding_dim),
+             cartes uint8 (N, h, w) à la résolution de la dernière carte de
+             caractéristiques, 255 = zone la plus déterminante)
+        """
+        raise NotImplementedError(f"Cartes d'attention non disponibles avec le moteur {self.name}")
+
+class KerasBackend(InferenceBackend):
+    """
+    Modèle Keras d'origine (model.h5)
+    
+    Par défaut (APP_MODEL_COMPILE=1), le modèle est appelé via une
+    tf.function à signature fixe (N, 256, 256, C) float32 : un seul traçage,
+    sans la boucle générique de model.predict (adaptateur de données,
+    callbacks) à chaque appel. Avec APP_MODEL_XLA=1, l'appel est compilé par
+    XLA et les lots sont complétés à la puissance de 2 supérieure, pour
+    qu'un petit nombre de formes soit compilé. Le modèle est préchauffé au
+    chargement : la première prédiction ne paie ni traçage ni compilation.
+    
+    L'appel retourne aussi les embeddings (voir build_embedding_model), dont
+    le coût est négligeable devant celui des convolutions. Seul ce moteur
+    calcule des cartes d'attention (gradients, voir build_explainer) ; leur
+    fonction est tracée au premier appel d'explain.
+    """
+    
+    name = 'keras'
+    extension = '.h5'
+    
+    def _load(self):
+        import tensorflow as tf
+        self._configure_threads(tf)
+        self.model = tf.keras.models.load_model(self.model_path)
+        self.input_shape = (None,) + tuple(self.model.input_shape[1:])
+        self.channels = self.input_shape[-1]
+        embedding_model = build_embedding_model(self.model)
+        self.embedding_dim = int(embedding_model.output_shape[1][-1])
+        
+        self.xla = bool(config.MODEL_XLA)
+        if config.MODEL_COMPILE or self.xla:
+            signature = tf.TensorSpec(self.input_shape, tf.float32)
+            self._call = tf.function(lambda batch: embedding_model(batch, training=False),
+                                     input_signature=[signature], jit_compile=self.xla)
+        else:
+            # Appel direct plutôt que model.predict : pas de création de dataset par appel
+            self._call = lambda batch: embedding_model(batch, training=False)
+        self._warm_up()
+        
+        try:
+            self._explain = tf.function(build_explainer(self.model),
+                                        input_signature=[tf.TensorSpec(self.input_shape, tf.float32)])
+            self.supports_explain = True
+        except ValueError as e:
+            print(f"⚠️  {e} ({self.model_path})")
+    
+    @staticmethod
+    def _configure_threads(tf):
+        """Fixe les pools de threads de TensorFlow (possible seulement avant sa première opération)"""
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads())
+            if config.INFERENCE_INTER_OP_THREADS:
+                tf.config.threading.set_inter_op_parallelism_threads(config.INFERENCE_INTER_OP_THREADS)
+        except RuntimeError:
+            # Runtime déjà initialisé (second modèle du processus) : réglages déjà appliqués
+            pass
+    
+    def _padded_size(self, batch_size: int) -> int:
+        """Taille de lot effectivement calculée (puissance de 2 supérieure avec XLA)"""
+        return 1 << (batch_size - 1).bit_length() if self.xla else batch_size
+    
+    def _warm_up(self):
+        """Trace (et compile avec XLA) l'appel pour les tailles de lot servies"""
+        max_size = self._padded_size(max(1, config.INFERENCE_BATCH_SIZE))
+        sizes = [1 << i for i in range(max_size.bit_length())] if self.xla else sorted({1, max_size})
+        for size in sizes:
+            self._call(np.zeros((size,) + self.input_shape[1:], dtype=np.float32))
+    
+    def predict_with_embeddings(self, batch: np.ndarray) -> tuple:
+        batch = np.asarray(batch, dtype=np.float32)
+        count = len(batch)
+        padded = self._padded_size(count)
+        if padded != count:
+            batch = np.concatenate([batch, np.zeros((padded - count,) + batch.shape[1:], dtype=np.float32)])
+        probabilities, embeddings = self._call(batch)
+        return np.asarray(probabilities).reshape(-1)[:count], np.asarray(embeddings)[:count]
+    
+    def explain(self, batch: np.ndarray) -> tuple:
+        if not self.supports_explain:
+            return super().explain(batch)
+        probabilities, embeddings, heatmaps = self._explain(np.asarray(batch, dtype=np.float32))
+        return np.asarray(probabilities), np.asarray(embeddings), np.asarray(heatmaps)
+
+class TFLiteBackend(InferenceBackend):
+    """Modèle converti TensorFlow Lite (model.tflite)"""
+    
+    name = 'tflite'
+    extension = '.tflite'
+    
+    def _load(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=self.model_path, num_threads=intra_op_threads())
+        input_details = self.interpreter.get_input_details()[0]
+        self.input_index = input_details['index']
+        self.input_shape = (None,) + tuple(int(dim) for dim in input_details['shape'][1:])
+        self.channels = self.input_shape[-1]
+        # Sortie des embeddings si le modèle a été converti avec (convert_model.py)
+        outputs = sorted(self.interpreter.get_output_details(), key=lambda details: details['shape'][-1])
+        self.output_index = outputs[0]['index']
+        self.embedding_output_index = outputs[1]['index'] if len(outputs) > 1 else None
+        self.embedding_dim = int(outputs[1]['shape'][-1]) if len(outputs) > 1 else 0
+        self._batch_size = None
+    
+    def predict_with_embeddings(self, batch: np.ndarray) -> tuple:
+        # Le graphe TFLite a une taille de lot fixe : on le redimensionne si elle change
+        if batch.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch.shape[0]
+        self.interpreter.set_tensor(self.input_index, np.ascontiguousarray(batch, dtype=np.float32))
+        self.interpreter.invoke()
+        probabilities = self.interpreter.get_tensor(self.output_index).reshape(-1).copy()
+        if self.embedding_output_index is None:
+            return probabilities, None
+        return probabilities, self.interpreter.get_tensor(self.embedding_output_index).copy()
+
+class OnnxBackend(InferenceBackend):
+    """Modèle converti ONNX (model.onnx)"""
+    
+    name = 'onnx'
+    extension = '.onnx'
+    
+    def _load(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads()
+        if config.INFERENCE_INTER_OP_THREADS:
+            options.inter_op_num_threads = config.INFERENCE_INTER_OP_THREADS
+        self.session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = (None,) + tuple(model_input.shape[1:])
+        self.channels = self.input_shape[-1]
+        # Sortie des embeddings si le modèle a été converti avec (convert_model.py)
+        outputs = sorted(self.session.get_outputs(), key=lambda output: output.shape[-1])
+        self.output_names = [output.name for output in outputs[:2]]
+        self.embedding_dim = int(outputs[1].shape[-1]) if len(outputs) > 1 else 0
+    
+    def predict_with_embeddings(self, batch: np.ndarray) -> tuple:
+        outputs = self.session.run(self.output_names, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})
+        return outputs[0].reshape(-1), outputs[1] if len(outputs) > 1 else None
+
+BACKENDS: Dict[str, type] = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend
+}
+
+def get_backend_class(name: str) -> type:
+    """
+    Retourne la classe du moteur demandé
+    
+    Args:
+        name: 'keras', 'tflite' ou 'onnx'
+    
+    Returns:
+        Sous-classe de InferenceBackend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Moteur d'inférence inconnu: {name} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+def quantization_report_path(model_path: str) -> str:
+    """Rapport de validation associé à un modèle quantifié (model_int8.tflite -> model_int8.report.json)"""
+    return os.path.splitext(model_path)[0] + '.report.json'
+
+def load_quantization_report(model_path: str) -> Optional[Dict]:
+    """
+    Charge le rapport de validation d'un modèle quantifié
+    
+    Returns:
+        Rapport produit par quantize_model.py, ou None s'il est absent
+    """
+    try:
+        with open(quantization_report_path(model_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -1,70 +1,373 @@
 import numpy as np
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
+import atexit
 import os
-import tensorflow as tf
-from keras.utils import load_img, img_to_array
+import threading
+import config
+from image_preprocessing import BatchPreprocessor, decode_image
+from inference_client import InferenceClient
+from model_backends import get_backend_class, load_quantization_report
+from model_registry import ModelRegistry, PROJECT_DIR, file_sha256
+
+class ServedModel:
+    """
+    Modèle prêt à servir : moteur, modèle niveaux de gris, version et seuil
+    
+    Construit entièrement avant d'être publié ; une bascule remplace
+    l'instance d'un bloc, et une prédiction en cours garde celle qu'elle a lue.
+    """
+    
+    __slots__ = ('backend', 'gray_backend', 'path', 'version', 'threshold', 'registry_version')
+    
+    def __init__(self, backend, gray_backend, path: str, version: str, threshold: float = 0.5,
+                 registry_version: Optional[str] = None):
+        self.backend = backend
+        self.gray_backend = gray_backend
+        self.path = path
+        self.version = version
+        self.threshold = threshold
+        self.registry_version = registry_version
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Probabilités d'être malade pour un lot, routé selon son nombre de canaux"""
+        return self.predict_with_embeddings(batch)[0]
+    
+    def _route(self, batch: np.ndarray) -> tuple:
+        """
+        Moteur adapté au nombre de canaux du lot : (moteur, lot)
+        
+        Le modèle niveaux de gris est équivalent au modèle RGB jusqu'à la
+        sortie (fold_grayscale.py) : ses embeddings sont comparables.
+        """
+        if batch.shape[-1] == 1:
+            if self.gray_backend is not None:
+                return self.gray_backend, batch
+            # Sans modèle niveaux de gris, le canal unique est répliqué (comme la conversion RGB)
+            batch = np.repeat(batch, 3, axis=-1)
+        return self.backend, batch
+    
+    def predict_with_embeddings(self, batch: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Probabilités et embeddings d'un lot, routé selon son nombre de canaux"""
+        backend, batch = self._route(batch)
+        return backend.predict_with_embeddings(batch)
+    
+    def explain(self, batch: np.ndarray) -> Optional[tuple]:
+        """
+        Probabilités, embeddings et cartes d'attention d'un lot
+        
+        Returns:
+            Résultat de InferenceBackend.explain, ou None si le moteur ne calcule pas de cartes
+        """
+        backend, batch = self._route(batch)
+        return backend.explain(batch) if backend.supports_explain else None
 
 class ModelInterface:
     """
     Interface pour le modèle de détection de pneumonie
     
-    Utilise un modèle TensorFlow/Keras pour faire les prédictions.
+    Les prédictions passent par un moteur d'inférence interchangeable
+    (Keras, TFLite ou ONNX, voir model_backends.py).
     """
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, backend: Optional[str] = None,
+                 quantization: Optional[str] = None, follow_registry: bool = True,
+                 server_url: Optional[str] = None, lazy: bool = False):
         """
         Initialise l'interface du modèle
         
         Args:
-            model_path: Chemin vers le modèle (par défaut: 'model.h5' dans le dossier du projet)
+            model_path: Chemin vers le modèle (par défaut: version active du registre
+                models/, sinon 'model.h5', 'model.tflite' ou 'model.onnx' dans le
+                dossier du projet selon le moteur)
+            backend: Moteur d'inférence (par défaut: configuration APP_MODEL_BACKEND)
+            quantization: Variante quantifiée 'int8' ou 'float16' (par défaut:
+                configuration APP_MODEL_QUANTIZATION) ; servie par le moteur TFLite
+            follow_registry: Suivre les changements de version active et shadow
+                du registre sans redémarrage (False: version figée au chargement)
+            server_url: Serveur d'inférence à utiliser au lieu d'un modèle local
+                (par défaut: configuration APP_INFERENCE_SERVER_URL si model_path
+                n'est pas donné ; '' pour forcer le modèle local), voir inference_server.py
+            lazy: Différer le chargement du modèle (et l'import de TensorFlow)
+                jusqu'à la première prédiction
         """
-        # Chemin par défaut vers le modèle
-        if model_path is None:
-            # Chercher model.h5 dans le dossier du projet
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            model_path = os.path.join(current_dir, 'model.h5')
-            
-            # Si pas trouvé, chercher dans le dossier parent ou Downloads
-            if not os.path.exists(model_path):
-                parent_model = os.path.join(os.path.dirname(current_dir), 'main_project 3', 'model.h5')
-                downloads_model = os.path.join(os.path.expanduser('~'), 'Downloads', 'main_project 3', 'model.h5')
-                
-                if os.path.exists(parent_model):
-                    model_path = parent_model
-                elif os.path.exists(downloads_model):
-                    model_path = downloads_model
-        
-        self.model_path = model_path
-        self.model = None
-        
-        # Charger le modèle si le chemin existe
-        if model_path and os.path.exists(model_path):
+        self.quantization = quantization or config.MODEL_QUANTIZATION
+        if self.quantization != 'none':
+            backend = 'tflite'
+        self.backend_name = backend or config.MODEL_BACKEND
+        backend_class = get_backend_class(self.backend_name)
+        
+        # Fichier du modèle pour ce moteur (dans le dossier du projet ou d'une version du registre)
+        if self.quantization != 'none':
+            self.model_file = f"model_{self.quantization}{backend_class.extension}"
+        else:
+            self.model_file = f"model{backend_class.extension}"
+        
+        self._served: Optional[ServedModel] = None
+        self._shadow: Optional[ServedModel] = None
+        self._registry_stamp = None
+        self._swap_lock = threading.Lock()
+        self.preprocessor = BatchPreprocessor()
+        # Processus de décodage (APP_DECODE_PROCESSES), créés au premier lot
+        self._decode_pool = None
+        self._decode_pool_lock = threading.Lock()
+        self.client = None
+        self.registry = None
+        self._default_path = model_path
+        
+        # Chargement différé (lazy) : effectué une seule fois, au premier besoin
+        self._init_lock = threading.RLock()
+        self._load_args = (model_path, follow_registry, server_url)
+        self._loading = False
+        self._ready = False
+        if not lazy:
+            self.ensure_loaded()
+    
+    def ensure_loaded(self) -> bool:
+        """
+        Charge le modèle (ou contacte le serveur d'inférence) si ce n'est pas déjà fait
+        
+        Returns:
+            True si des prédictions sont possibles
+        """
+        if not self._ready:
+            with self._init_lock:
+                # _loading : accès aux propriétés pendant le chargement lui-même
+                if not self._ready and not self._loading:
+                    self._loading = True
+                    try:
+                        self._load(*self._load_args)
+                    finally:
+                        self._loading = False
+                        self._ready = True
+        return self.client is not None or self._served is not None
+    
+    def _load(self, model_path: Optional[str], follow_registry: bool, server_url: Optional[str]):
+        """Résout le modèle à servir et le charge (voir __init__ pour les arguments)"""
+        # Mode client : le modèle est chargé une seule fois, par le serveur d'inférence
+        # (un fichier modèle explicite est toujours chargé localement)
+        if server_url is None:
+            server_url = config.INFERENCE_SERVER_URL if model_path is None else ''
+        self.client = InferenceClient(server_url) if server_url else None
+        if self.client is not None:
+            self.registry = None
+            self._default_path = server_url
             try:
-                self.model = tf.keras.models.load_model(model_path)
-                print(f"✅ Modèle chargé depuis: {model_path}")
+                health = self.client.health()
+                print(f"✅ Serveur d'inférence {server_url} (modèle {health.get('model_version')})")
             except Exception as e:
-                print(f"❌ Erreur lors du chargement du modèle: {e}")
-                self.model = None
-        else:
-            print(f"⚠️  Modèle non trouvé à: {model_path}")
+                print(f"⚠️  Serveur d'inférence injoignable à {server_url}: {e}")
+            return
+        
+        # Chemin par défaut vers le modèle
+        if model_path is None:
+            model_path = config.MODEL_PATH or None
+        if model_path is None:
+            self.registry = ModelRegistry()
+            self.reload_from_registry()
+            if self._served is None:
+                model_path = os.path.join(PROJECT_DIR, self.model_file)
+            if not follow_registry:
+                self.registry = None
+        
+        self._default_path = model_path
+        
+        # Charger le modèle si le chemin existe (sauf s'il vient déjà du registre)
+        if self._served is None:
+            if model_path and os.path.exists(model_path):
+                self.load_model(model_path)
+            else:
+                print(f"⚠️  Modèle non trouvé à: {model_path}")
+    
+    # Modèle actuellement servi (lecture d'une seule référence, voir ServedModel)
+    
+    @property
+    def model(self):
+        self.ensure_loaded()
+        if self.client is not None:
+            return self.client
+        served = self._served
+        return served.backend if served is not None else None
+    
+    @property
+    def gray_model(self):
+        self.ensure_loaded()
+        served = self._served
+        return served.gray_backend if served is not None else None
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        self.ensure_loaded()
+        if self.client is not None:
+            return self.client.model_version
+        served = self._served
+        return served.version if served is not None else None
+    
+    @property
+    def model_path(self) -> Optional[str]:
+        self.ensure_loaded()
+        served = self._served
+        return served.path if served is not None else self._default_path
+    
+    @property
+    def shadow_version(self) -> Optional[str]:
+        self.ensure_loaded()
+        shadow = self._shadow
+        return shadow.version if shadow is not None else None
     
     def _preprocess_image(self, image_path: str) -> np.ndarray:
         """
         Prépare l'image pour la prédiction (même preprocessing que dans deployment.py)
         
+        Reproduit keras.utils.load_img(target_size=(256, 256)) + img_to_array
+        au bit près (mode exact de image_preprocessing), sans importer Keras.
+        
         Args:
             image_path: Chemin vers l'image
-            
+        
         Returns:
             Array numpy prêt pour la prédiction
         """
+        return self._load_pixels(image_path, allow_grayscale=False)
+    
+    @staticmethod
+    def _load_pixels(image_path: str, allow_grayscale: bool, fast: bool = False) -> np.ndarray:
+        """
+        Charge une image en 256x256 (lot de taille 1)
+        
+        Args:
+            image_path: Chemin vers l'image
+            allow_grayscale: Retourner un seul canal (N, 256, 256, 1) si l'image
+                est réellement en niveaux de gris (mode 'L' ou canaux RGB identiques)
+            fast: Réduction au décodage pour les JPEG (voir image_preprocessing)
+        
+        Returns:
+            Array float32 (1, 256, 256, 3) ou (1, 256, 256, 1)
+        """
         # Charger l'image en 256x256 (comme dans deployment.py)
-        img = load_img(image_path, target_size=(256, 256))
-        img = img_to_array(img)
-        img = np.expand_dims(img, axis=0)  # Ajouter dimension batch
+        img = decode_image(image_path, allow_grayscale, fast)
+        return np.expand_dims(img, axis=0).astype(np.float32)  # Ajouter dimension batch
+    
+    @staticmethod
+    def _load_grayscale(image_path: str) -> Optional[np.ndarray]:
+        """Charge une image en un seul canal (1, 256, 256, 1), ou None si elle est en couleur"""
+        img = ModelInterface._load_pixels(image_path, allow_grayscale=True)
+        return img if img.shape[-1] == 1 else None
+    
+    def _load_for_inference(self, image_path: str) -> np.ndarray:
+        """Charge une image sur un canal si le modèle niveaux de gris est disponible, sinon en RGB"""
+        return self._load_pixels(image_path, self.gray_model is not None, self.preprocessor.fast)
+    
+    def _predict_array(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Probabilités d'être malade pour un lot prétraité (N, 256, 256, 3)
+        
+        Un lot à un seul canal est envoyé au modèle niveaux de gris (voir
+        fold_grayscale.py). Le lot est découpé selon APP_INFERENCE_BATCH_SIZE.
+        """
+        self.ensure_loaded()
+        return self._run_batch(batch, self._served, None)[0]
+    
+    @staticmethod
+    def _run_batch(batch: np.ndarray, served: ServedModel, shadow: Optional[ServedModel],
+                   explain: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Passe un lot dans le modèle servi et, s'il y en a un, dans le modèle shadow
+        
+        Le lot est découpé selon APP_INFERENCE_BATCH_SIZE ; chaque morceau passe
+        dans le modèle shadow juste après le modèle servi. Une erreur du modèle
+        shadow n'affecte jamais les prédictions servies.
+        
+        Args:
+            explain: Calculer aussi les cartes d'attention, dans le même passage
+                (si le moteur le permet, voir model_backends.build_explainer)
+        
+        Returns:
+            (probabilités du modèle servi, probabilités shadow ou None,
+             sorties par image du modèle servi: 'embedding' et 'heatmap', chacune
+             absente si le moteur ne la fournit pas)
+        """
+        batch_size = max(1, config.INFERENCE_BATCH_SIZE)
+        chunks = [batch] if len(batch) <= batch_size else [
+            batch[start:start + batch_size] for start in range(0, len(batch), batch_size)
+        ]
+        
+        preds = []
+        outputs = {'embedding': [], 'heatmap': []}
+        shadow_preds = [] if shadow is not None else None
+        for chunk in chunks:
+            explained = served.explain(chunk) if explain else None
+            if explained is None:
+                chunk_preds, chunk_embeddings = served.predict_with_embeddings(chunk)
+                chunk_heatmaps = None
+            else:
+                chunk_preds, chunk_embeddings, chunk_heatmaps = explained
+            preds.append(chunk_preds)
+            outputs['embedding'].append(chunk_embeddings)
+            outputs['heatmap'].append(chunk_heatmaps)
+            if shadow_preds is not None:
+                try:
+                    shadow_preds.append(shadow.predict(chunk))
+                except Exception as e:
+                    print(f"⚠️  Modèle shadow {shadow.version} en erreur: {e}")
+                    shadow_preds = None
+        
+        def join(parts: list) -> Optional[np.ndarray]:
+            if parts is None or any(part is None for part in parts):
+                return None
+            return parts[0] if len(parts) == 1 else np.concatenate(parts)
         
-        return img
+        outputs = {name: join(parts) for name, parts in outputs.items()}
+        return join(preds), join(shadow_preds), {name: values for name, values in outputs.items() if values is not None}
+    
+    @staticmethod
+    def _format_prediction(pred: float, threshold: float = 0.5) -> Dict:
+        """Convertit une probabilité d'être malade en label et confidence"""
+        # Le modèle retourne une probabilité (0-1)
+        # Dans le code original, une valeur élevée = malade
+        # pred est la probabilité d'être malade
+        
+        # Convertir en label et confidence
+        if pred >= threshold:
+            label = 'malade'
+            confidence = float(pred)
+        else:
+            label = 'sain'
+            confidence = float(1 - pred)  # Confidence d'être sain
+        
+        return {
+            'label': label,
+            'confidence': round(confidence, 3),
+            'raw_prediction': round(float(pred), 3)  # Probabilité brute d'être malade
+        }
+    
+    def _score(self, batch: np.ndarray, served: ServedModel, shadow: Optional[ServedModel],
+               explain: bool = False) -> List[Dict]:
+        """
+        Prédictions formatées pour un lot, avec la version du modèle servi
+        
+        Si un modèle shadow est actif, chaque résultat contient aussi 'shadow'
+        (label, confidence, raw_prediction, model_version), à stocker à part
+        (DataManager.add_shadow_predictions). Si le moteur fournit des
+        embeddings, chaque résultat contient 'embedding' (liste de floats,
+        à ajouter à l'index des cas similaires, voir embedding_index.py) ;
+        avec explain, 'heatmap' (carte d'attention uint8 (h, w), voir
+        heatmap_cache.py).
+        """
+        preds, shadow_preds, outputs = self._run_batch(batch, served, shadow, explain)
+        results = []
+        for i, pred in enumerate(preds):
+            result = self._format_prediction(pred, served.threshold)
+            result['model_version'] = served.version
+            if 'embedding' in outputs:
+                result['embedding'] = outputs['embedding'][i].tolist()
+            if 'heatmap' in outputs:
+                result['heatmap'] = outputs['heatmap'][i]
+            if shadow_preds is not None:
+                result['shadow'] = self._format_prediction(shadow_preds[i], shadow.threshold)
+                result['shadow']['model_version'] = shadow.version
+            results.append(result)
+        return results
     
     def predict(self, image_path: str) -> Dict:
         """
@@ -72,13 +375,22 @@ class ModelInterface:
         
         Args:
             image_path: Chemin vers l'image à analyser
-            
+        
         Returns:
             Dictionnaire avec:
                 - label: 'sain' ou 'malade'
                 - confidence: score de confiance entre 0 et 1
+                - model_version: version du modèle ayant répondu
+                - embedding: embedding de l'image, si le moteur en fournit
+                - shadow: résultat du modèle shadow, s'il y en a un
         """
-        if self.model is None:
+        self.ensure_loaded()
+        if self.client is not None:
+            return self.client.predict(image_path)
+        
+        self._check_registry()
+        served, shadow = self._served, self._shadow
+        if served is None:
             return {
                 'label': 'error',
                 'confidence': 0.0,
@@ -94,29 +406,11 @@ class ModelInterface:
         
         try:
             # Preprocessing
-            img = self._preprocess_image(image_path)
+            img = self._load_pixels(image_path, served.gray_backend is not None, self.preprocessor.fast)
             
             # Prédiction (comme dans deployment.py)
-            pred = self.model.predict(img, verbose=0)[0][0]  # verbose=0 pour éviter les logs
-            
-            # Le modèle retourne une probabilité (0-1)
-            # Dans le code original, une valeur élevée = malade
-            # pred est la probabilité d'être malade
-            
-            # Convertir en label et confidence
-            if pred >= 0.5:
-                label = 'malade'
-                confidence = float(pred)
-            else:
-                label = 'sain'
-                confidence = float(1 - pred)  # Confidence d'être sain
-            
-            return {
-                'label': label,
-                'confidence': round(confidence, 3),
-                'raw_prediction': round(float(pred), 3)  # Probabilité brute d'être malade
-            }
-            
+            return self._score(img, served, shadow)[0]
+        
         except Exception as e:
             return {
                 'label': 'error',
@@ -124,39 +418,363 @@ class ModelInterface:
                 'error': f"Erreur lors de la prédiction: {str(e)}"
             }
     
-    def predict_batch(self, image_paths: list) -> Dict[str, Dict]:
+    def predict_batch(self, image_paths: list, explain: bool = False) -> Dict[str, Dict]:
         """
         Prédit sur un lot d'images
         
+        Les images sont décodées en parallèle puis envoyées ensemble au
+        moteur d'inférence.
+        
         Args:
             image_paths: Liste des chemins vers les images
-            
+            explain: Ajouter la carte d'attention ('heatmap') aux résultats, calculée
+                dans le même passage (moteur keras local uniquement)
+        
         Returns:
             Dictionnaire avec image_path comme clé et le résultat de prédiction comme valeur
         """
+        self.ensure_loaded()
+        if self.client is not None:
+            return self.client.predict_batch(image_paths, explain=explain)
+        
+        self._check_registry()
+        served, shadow = self._served, self._shadow
+        if served is None:
+            return {image_path: {
+                'label': 'error',
+                'confidence': 0.0,
+                'error': 'Modèle non chargé'
+            } for image_path in image_paths}
+        
+        if config.DECODE_PROCESSES > 0:
+            return self._predict_batch_decoded_in_processes(image_paths, served, shadow, explain)
+        
+        results, pending = self.decode_images(image_paths, allow_grayscale=served.gray_backend is not None)
+        batch_size = self.preprocessor.max_batch
+        chunks = [(paths[start:start + batch_size], arrays[start:start + batch_size])
+                  for paths, arrays in pending.values() for start in range(0, len(arrays), batch_size)]
+        for valid_paths, arrays in chunks:
+            try:
+                scored = self._score(self.preprocessor.to_batch(arrays), served, shadow, explain)
+                for image_path, result in zip(valid_paths, scored):
+                    results[image_path] = result
+            except Exception as e:
+                for image_path in valid_paths:
+                    results[image_path] = {
+                        'label': 'error',
+                        'confidence': 0.0,
+                        'error': f"Erreur lors de la prédiction: {str(e)}"
+                    }
+        
+        return {image_path: results[image_path] for image_path in image_paths}
+    
+    def _predict_batch_decoded_in_processes(self, image_paths: list, served: ServedModel,
+                                            shadow: Optional[ServedModel], explain: bool) -> Dict[str, Dict]:
+        """
+        predict_batch avec décodage dans des processus (voir shm_ring.py)
+        
+        Les tenseurs arrivent dans l'anneau de mémoire partagée et sont
+        convertis en float32 directement depuis leurs slots.
+        """
         results = {}
+        readable = []
         for image_path in image_paths:
             if os.path.exists(image_path):
-                results[image_path] = self.predict(image_path)
+                readable.append(image_path)
             else:
+                results[image_path] = {'label': 'error', 'confidence': 0.0, 'error': f"Image non trouvée: {image_path}"}
+        
+        with self._decode_pool_lock:
+            pool = self._get_decode_pool(allow_grayscale=served.gray_backend is not None)
+            for indices, views, errors in pool.iter_batches(readable):
+                for index, error in errors.items():
+                    results[readable[index]] = {
+                        'label': 'error',
+                        'confidence': 0.0,
+                        'error': f"Erreur lors de la prédiction: {error}"
+                    }
+                if not indices:
+                    continue
+                try:
+                    scored = self._score(self.preprocessor.to_batch(views), served, shadow, explain)
+                except Exception as e:
+                    scored = [{'label': 'error', 'confidence': 0.0, 'error': f"Erreur lors de la prédiction: {str(e)}"}
+                              for _ in indices]
+                for index, result in zip(indices, scored):
+                    results[readable[index]] = result
+                # Slots rendus à l'anneau au lot suivant : plus aucune vue ne doit y pointer
+                del views
+        
+        return {image_path: results[image_path] for image_path in image_paths}
+    
+    def _get_decode_pool(self, allow_grayscale: bool):
+        """Pool de décodage du processus, recréé si le mode niveaux de gris change ou si un processus est mort"""
+        from shm_ring import DecodePool
+        
+        pool = self._decode_pool
+        if pool is not None and (pool.broken or pool.allow_grayscale != allow_grayscale):
+            pool.close()
+            atexit.unregister(pool.close)
+            pool = None
+        if pool is None:
+            pool = self._decode_pool = DecodePool(allow_grayscale=allow_grayscale, fast=self.preprocessor.fast)
+            # Segment de mémoire partagée supprimé à la sortie du processus
+            atexit.register(pool.close)
+        return pool
+    
+    def decode_images(self, image_paths: list, allow_grayscale: bool) -> Tuple[Dict[str, Dict], Dict[int, Tuple[List[str], List[np.ndarray]]]]:
+        """
+        Décode un lot d'images en parallèle, groupées par nombre de canaux
+        
+        Args:
+            image_paths: Liste des chemins vers les images
+            allow_grayscale: Garder un seul canal pour les images en niveaux de gris
+        
+        Returns:
+            (résultats d'erreur par chemin pour les images absentes ou illisibles,
+             {canaux: (chemins, tableaux uint8 (256, 256, canaux))})
+        """
+        results = {}
+        readable = []
+        for image_path in image_paths:
+            if not os.path.exists(image_path):
                 results[image_path] = {
                     'label': 'error',
                     'confidence': 0.0,
                     'error': f"Image non trouvée: {image_path}"
                 }
+            else:
+                readable.append(image_path)
+        
+        # Lots séparés pour les images RGB (3 canaux) et niveaux de gris (1 canal)
+        pending = {}
+        decoded = self.preprocessor.decode_many(readable, allow_grayscale=allow_grayscale)
+        for image_path, img in zip(readable, decoded):
+            if isinstance(img, Exception):
+                results[image_path] = {
+                    'label': 'error',
+                    'confidence': 0.0,
+                    'error': f"Erreur lors de la prédiction: {str(img)}"
+                }
+            else:
+                paths, arrays = pending.setdefault(img.shape[-1], ([], []))
+                paths.append(image_path)
+                arrays.append(img)
+        return results, pending
+    
+    def predict_arrays(self, batch: np.ndarray, explain: bool = False) -> List[Dict]:
+        """
+        Prédit sur des images déjà prétraitées (ex: TensorStore)
+        
+        Args:
+            batch: Tableau uint8 ou float32 (N, 256, 256, C), C = 1 ou 3
+            explain: Ajouter la carte d'attention ('heatmap'), voir predict_batch
+        
+        Returns:
+            Liste des résultats de prédiction, dans l'ordre du lot
+        """
+        self.ensure_loaded()
+        if self.client is not None:
+            return self.client.predict_arrays(batch, explain=explain)
+        
+        self._check_registry()
+        served, shadow = self._served, self._shadow
+        if served is None:
+            return [{'label': 'error', 'confidence': 0.0, 'error': 'Modèle non chargé'} for _ in range(len(batch))]
+        
+        if batch.dtype == np.float32:
+            return self._score(batch, served, shadow, explain)
+        # Conversion float32 par morceaux : le tampon du préprocesseur reste borné
+        batch_size = self.preprocessor.max_batch
+        results = []
+        for start in range(0, len(batch), batch_size):
+            results.extend(self._score(self.preprocessor.to_batch(batch[start:start + batch_size]),
+                                       served, shadow, explain))
         return results
     
-    def load_model(self, model_path: str):
+    def load_model(self, model_path: str, threshold: float = 0.5) -> bool:
         """
         Charge le modèle depuis un fichier
         
+        Le nouveau modèle est entièrement chargé avant de remplacer l'ancien :
+        en cas d'échec, le modèle précédent reste servi.
+        
         Args:
             model_path: Chemin vers le fichier du modèle
+            threshold: Seuil de probabilité du label 'malade'
+        
+        Returns:
+            True si le modèle a été chargé
         """
         try:
-            self.model = tf.keras.models.load_model(model_path)
-            self.model_path = model_path
+            self._served = self._build_served_model(model_path, threshold)
             print(f"✅ Modèle chargé depuis: {model_path}")
+            return True
         except Exception as e:
             print(f"❌ Erreur lors du chargement du modèle: {e}")
-            self.model = None
+            return False
+    
+    def _build_served_model(self, model_path: str, threshold: float = 0.5,
+                            registry_metadata: Optional[Dict] = None) -> ServedModel:
+        """
+        Charge un modèle et son modèle niveaux de gris, sans le publier
+        
+        Args:
+            model_path: Chemin vers le fichier du modèle
+            threshold: Seuil de probabilité du label 'malade'
+            registry_metadata: Métadonnées du registre (forme d'entrée vérifiée)
+        """
+        if self.quantization != 'none':
+            refusal = self._check_quantization_gate(model_path)
+            if refusal:
+                raise ValueError(f"Modèle quantifié refusé: {refusal}")
+        
+        backend = get_backend_class(self.backend_name)(model_path)
+        registry_version = None
+        if registry_metadata is not None:
+            registry_version = registry_metadata['version']
+            expected = tuple(registry_metadata['input_shape'][1:])
+            if tuple(backend.input_shape[1:]) != expected:
+                raise ValueError(f"forme d'entrée {backend.input_shape} différente du registre {list(expected)}")
+        
+        return ServedModel(
+            backend, self._load_grayscale_model(model_path), model_path,
+            self.compute_model_version(model_path), threshold, registry_version
+        )
+    
+    def _load_registry_version(self, version: str) -> ServedModel:
+        """Charge une version du registre (fichier du moteur configuré dans son dossier)"""
+        metadata = self.registry.get_metadata(version)
+        if metadata is None:
+            raise ValueError(f"version {version} absente du registre")
+        model_path = self.registry.model_path(version, self.model_file)
+        if not os.path.exists(model_path):
+            raise ValueError(f"{self.model_file} absent de la version {version}")
+        return self._build_served_model(model_path, metadata.get('threshold', 0.5), metadata)
+    
+    def reload_from_registry(self, stamp: Optional[tuple] = None) -> bool:
+        """
+        Aligne les modèles servi et shadow sur les pointeurs du registre
+        
+        Chaque modèle est chargé à côté de l'ancien puis publié d'un bloc ;
+        si le chargement échoue, l'ancien reste en service.
+        
+        Args:
+            stamp: Signature des pointeurs lus (défaut: lue maintenant)
+        
+        Returns:
+            True si un modèle a changé
+        """
+        if self.registry is None:
+            return False
+        if stamp is None:
+            stamp = self.registry.pointer_stamp()
+        try:
+            pointers = self.registry.read_pointers()
+        except Exception as e:
+            print(f"❌ Registre des modèles illisible: {e}")
+            self._registry_stamp = stamp
+            return False
+        
+        changed = False
+        served = self._served
+        active = pointers['active']
+        if active and (served is None or served.registry_version != active):
+            try:
+                self._served = self._load_registry_version(active)
+                print(f"✅ Modèle actif: version {active} ({self._served.path})")
+                changed = True
+            except Exception as e:
+                print(f"❌ Version {active} non chargée, le modèle précédent reste servi: {e}")
+        
+        shadow = self._shadow
+        wanted = pointers['shadow']
+        if not wanted and shadow is not None:
+            self._shadow = None
+            changed = True
+        elif wanted and (shadow is None or shadow.registry_version != wanted):
+            try:
+                self._shadow = self._load_registry_version(wanted)
+                print(f"✅ Modèle shadow: version {wanted}")
+                changed = True
+            except Exception as e:
+                print(f"❌ Modèle shadow {wanted} non chargé: {e}")
+        
+        self._registry_stamp = stamp
+        return changed
+    
+    def _check_registry(self):
+        """
+        Détecte un changement des pointeurs du registre (un stat par appel)
+        
+        Le chargement se fait dans un thread : les prédictions continuent
+        sur le modèle courant jusqu'à la bascule.
+        """
+        if self.registry is None:
+            return
+        stamp = self.registry.pointer_stamp()
+        if stamp == self._registry_stamp or not self._swap_lock.acquire(blocking=False):
+            return
+        
+        def reload():
+            try:
+                self.reload_from_registry(stamp)
+            finally:
+                self._swap_lock.release()
+        
+        threading.Thread(target=reload, name='model-registry-reload', daemon=True).start()
+    
+    def _load_grayscale_model(self, model_path: str):
+        """
+        Charge le modèle niveaux de gris associé (model.h5 -> model_gray.h5), s'il existe
+        
+        Non utilisé pour les variantes quantifiées ni si APP_GRAYSCALE_FOLDING=0.
+        """
+        if not config.GRAYSCALE_FOLDING or self.quantization != 'none':
+            return None
+        
+        root, extension = os.path.splitext(model_path)
+        gray_path = f"{root}_gray{extension}"
+        if not os.path.exists(gray_path):
+            return None
+        
+        try:
+            gray_model = get_backend_class(self.backend_name)(gray_path)
+        except Exception as e:
+            print(f"⚠️  Modèle niveaux de gris ignoré ({gray_path}): {e}")
+            return None
+        if gray_model.channels != 1:
+            print(f"⚠️  Modèle niveaux de gris ignoré ({gray_path}): entrée à {gray_model.channels} canaux")
+            return None
+        print(f"✅ Modèle niveaux de gris chargé depuis: {gray_path}")
+        return gray_model
+    
+    @staticmethod
+    def _check_quantization_gate(model_path: str) -> Optional[str]:
+        """
+        Vérifie qu'un modèle quantifié respecte le seuil de précision
+        
+        Le taux de désaccord mesuré par quantize_model.py est comparé au seuil
+        courant (APP_QUANTIZATION_MAX_DISAGREEMENT) : 'passed' n'est que le
+        verdict du seuil en vigueur lors de la mesure.
+        
+        Returns:
+            Motif du refus, ou None si le modèle peut être servi
+        """
+        report = load_quantization_report(model_path)
+        if report is None:
+            return "aucun rapport de validation (lancer quantize_model.py)"
+        
+        if report.get('model_sha256') != file_sha256(model_path):
+            return "le rapport de validation ne correspond pas à ce fichier"
+        rate = report.get('disagreement_rate')
+        if not isinstance(rate, (int, float)):
+            return "taux de désaccord absent du rapport de validation (relancer quantize_model.py)"
+        if rate > config.QUANTIZATION_MAX_DISAGREEMENT:
+            return f"taux de désaccord {rate:.1%} > {config.QUANTIZATION_MAX_DISAGREEMENT:.1%}"
+        return None
+    
+    @staticmethod
+    def compute_model_version(model_path: str) -> str:
+        """Version d'un modèle : début de l'empreinte SHA-256 de son fichier"""
+        return file_sha256(model_path)[:12]
@@ -0,0 +1,328 @@
+"""
+Registre versionné des modèles
+
+Chaque modèle enregistré est copié dans son propre dossier, nommé d'après
+sa version (début de l'empreinte SHA-256 du fichier) :
+    
+    models/
+        registry.json          pointeurs {"active": ..., "shadow": ...}
+        3f2a9c1d0b7e/
+            model.h5
+            metadata.json      empreinte, forme d'entrée, seuil, date
+            model.tflite       variantes produites dans le même dossier
+                               (convert_model.py, quantize_model.py, fold_grayscale.py)
+
+Le pointeur `active` désigne le modèle servi : ModelInterface le surveille
+(un simple stat par prédiction), charge la nouvelle version en arrière-plan
+puis bascule d'un bloc, sans redémarrage ni requête en échec. Le pointeur
+`shadow` désigne un modèle candidat qui évalue les mêmes lots que le modèle
+actif ; ses résultats sont stockés à part (data/shadow_predictions.json)
+pour comparaison avant promotion.
+
+Usage:
+    python model_registry.py register model.h5 [--threshold 0.5] [--notes "..."] [--activate]
+    python model_registry.py list
+    python model_registry.py activate <version>
+    python model_registry.py shadow <version> | --clear
+    python model_registry.py compare [<version>]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+from model_backends import BACKENDS
+from storage_io import atomic_write_bytes, file_lock, StorageCorruptionError
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def default_registry_dir() -> str:
+    """Répertoire du registre (APP_MODEL_REGISTRY_DIR, relatif au dossier du projet)"""
+    return os.path.join(PROJECT_DIR, config.MODEL_REGISTRY_DIR)
+
+def file_sha256(file_path: str) -> str:
+    """Empreinte SHA-256 d'un fichier, lu par blocs"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def _backend_for_file(model_path: str) -> type:
+    """Classe du moteur capable de charger un fichier, d'après son extension"""
+    extension = os.path.splitext(model_path)[1]
+    for backend_class in BACKENDS.values():
+        if backend_class.extension == extension:
+            return backend_class
+    raise ValueError(f"Format de modèle non reconnu: {model_path}")
+
+class ModelRegistry:
+    """Dossier de modèles versionnés avec pointeurs actif / shadow"""
+    
+    def __init__(self, registry_dir: Optional[str] = None):
+        """
+        Args:
+            registry_dir: Répertoire du registre (défaut: APP_MODEL_REGISTRY_DIR)
+        """
+        self.registry_dir = registry_dir or default_registry_dir()
+        self.pointer_file = os.path.join(self.registry_dir, 'registry.json')
+    
+    # ========== Pointeurs ==========
+    
+    def read_pointers(self) -> Dict:
+        """
+        Lit les pointeurs du registre
+        
+        Returns:
+            Dictionnaire avec 'active' et 'shadow' (None si non définis)
+        """
+        try:
+            with open(self.pointer_file, 'rb') as f:
+                pointers = json.loads(f.read())
+        except FileNotFoundError:
+            pointers = {}
+        except ValueError as e:
+            raise StorageCorruptionError(f"Registre des modèles illisible: {self.pointer_file} ({e})") from e
+        return {'active': pointers.get('active'), 'shadow': pointers.get('shadow'), **pointers}
+    
+    def pointer_stamp(self) -> Optional[tuple]:
+        """Signature du fichier de pointeurs (change à chaque écriture), None s'il n'existe pas"""
+        try:
+            stat = os.stat(self.pointer_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _update_pointers(self, **changes) -> Dict:
+        """Modifie les pointeurs (lecture-modification-écriture verrouillée)"""
+        os.makedirs(self.registry_dir, exist_ok=True)
+        with file_lock(self.pointer_file):
+            pointers = self.read_pointers()
+            pointers.update(changes)
+            pointers['updated_at'] = datetime.now().isoformat()
+            atomic_write_bytes(self.pointer_file, json.dumps(pointers, indent=2).encode('utf-8'))
+        return pointers
+    
+    def set_active(self, version: str) -> Dict:
+        """
+        Désigne le modèle servi
+        
+        La version précédente est conservée dans 'previous' (retour arrière) ;
+        un modèle shadow promu cesse d'être shadow.
+        """
+        self._require(version)
+        with file_lock(self.pointer_file):
+            pointers = self.read_pointers()
+            changes = {'active': version}
+            if pointers['active'] != version:
+                changes['previous'] = pointers['active']
+            if pointers['shadow'] == version:
+                changes['shadow'] = None
+            return self._update_pointers(**changes)
+    
+    def set_shadow(self, version: Optional[str]) -> Dict:
+        """Désigne le modèle shadow (None pour le retirer)"""
+        if version is not None:
+            self._require(version)
+        return self._update_pointers(shadow=version)
+    
+    # ========== Versions ==========
+    
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.registry_dir, version)
+    
+    def model_path(self, version: str, model_file: str = 'model.h5') -> str:
+        """Chemin d'un fichier modèle (ou d'une variante) d'une version"""
+        return os.path.join(self.version_dir(version), model_file)
+    
+    def get_metadata(self, version: str) -> Optional[Dict]:
+        """Métadonnées d'une version, ou None si elle n'est pas enregistrée"""
+        metadata_path = os.path.join(self.version_dir(version), 'metadata.json')
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise StorageCorruptionError(f"Métadonnées illisibles: {metadata_path} ({e})") from e
+    
+    def _require(self, version: str) -> Dict:
+        metadata = self.get_metadata(version) if version.isalnum() else None
+        if metadata is None:
+            raise ValueError(f"Version de modèle inconnue: {version}")
+        return metadata
+    
+    def list_versions(self) -> List[Dict]:
+        """Métadonnées de toutes les versions, de la plus ancienne à la plus récente"""
+        if not os.path.isdir(self.registry_dir):
+            return []
+        versions = []
+        for name in os.listdir(self.registry_dir):
+            if name.startswith('.') or not os.path.isdir(self.version_dir(name)):
+                continue
+            metadata = self.get_metadata(name)
+            if metadata is not None:
+                versions.append(metadata)
+        return sorted(versions, key=lambda m: m.get('registered_at', ''))
+    
+    def register(self, model_path: str, threshold: float = 0.5, notes: str = '') -> str:
+        """
+        Enregistre un fichier modèle (copie) sous sa version
+        
+        Le modèle est chargé une fois pour relever sa forme d'entrée. La copie
+        est préparée dans un dossier temporaire puis publiée par renommage :
+        une version visible est toujours complète. Enregistrer deux fois le
+        même fichier est sans effet.
+        
+        Args:
+            model_path: Fichier modèle (.h5, .tflite ou .onnx)
+            threshold: Seuil de probabilité au-delà duquel le label est 'malade'
+            notes: Description libre (données d'entraînement, changements...)
+        
+        Returns:
+            Version du modèle
+        """
+        backend_class = _backend_for_file(model_path)
+        sha256 = file_sha256(model_path)
+        version = sha256[:12]
+        if self.get_metadata(version) is not None:
+            return version
+        
+        backend = backend_class(model_path)
+        metadata = {
+            'version': version,
+            'sha256': sha256,
+            'model_file': f"model{backend_class.extension}",
+            'backend': backend_class.name,
+            'input_shape': list(backend.input_shape),
+            'threshold': threshold,
+            'source': os.path.abspath(model_path),
+            'notes': notes,
+            'registered_at': datetime.now().isoformat()
+        }
+        
+        os.makedirs(self.registry_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=f".{version}.", dir=self.registry_dir)
+        try:
+            target = os.path.join(staging_dir, metadata['model_file'])
+            shutil.copyfile(model_path, target)
+            with open(target, 'rb+') as f:
+                os.fsync(f.fileno())
+            atomic_write_bytes(os.path.join(staging_dir, 'metadata.json'),
+                               json.dumps(metadata, indent=2, ensure_ascii=False).encode('utf-8'))
+            os.rename(staging_dir, self.version_dir(version))
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if self.get_metadata(version) is None:
+                raise
+        return version
+
+def compare_shadow(data_manager, shadow_version: Optional[str] = None) -> Dict:
+    """
+    Compare les prédictions shadow aux prédictions actives de la même passe
+    
+    Args:
+        data_manager: DataManager contenant les deux stores
+        shadow_version: Version du modèle shadow (défaut: toutes)
+    
+    Returns:
+        Nombre de paires comparées, labels différents et écarts de probabilité brute
+    """
+    active = {p.id: p for p in data_manager.get_records('predictions')}
+    compared = label_mismatches = 0
+    diffs = []
+    for shadow in data_manager.get_records('shadow_predictions'):
+        if shadow_version is not None and shadow.get('model_version') != shadow_version:
+            continue
+        prediction = active.get(shadow.get('prediction_id'))
+        if prediction is None:
+            continue
+        compared += 1
+        if shadow.get('label') != prediction.get('label'):
+            label_mismatches += 1
+        if shadow.get('raw_prediction') is not None and prediction.get('raw_prediction') is not None:
+            diffs.append(abs(shadow.raw_prediction - prediction.raw_prediction))
+    
+    return {
+        'compared': compared,
+        'label_mismatches': label_mismatches,
+        'agreement_rate': 1 - label_mismatches / compared if compared else None,
+        'max_abs_diff': max(diffs) if diffs else None,
+        'mean_abs_diff': sum(diffs) / len(diffs) if diffs else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registry-dir', default=None, help="Répertoire du registre (défaut: APP_MODEL_REGISTRY_DIR)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    register_parser = commands.add_parser('register', help="Enregistrer un fichier modèle")
+    register_parser.add_argument('model')
+    register_parser.add_argument('--threshold', type=float, default=0.5)
+    register_parser.add_argument('--notes', default='')
+    register_parser.add_argument('--activate', action='store_true', help="Servir immédiatement cette version")
+    
+    commands.add_parser('list', help="Lister les versions")
+    
+    activate_parser = commands.add_parser('activate', help="Changer le modèle servi")
+    activate_parser.add_argument('version')
+    
+    shadow_parser = commands.add_parser('shadow', help="Désigner le modèle shadow")
+    shadow_parser.add_argument('version', nargs='?')
+    shadow_parser.add_argument('--clear', action='store_true', help="Retirer le modèle shadow")
+    
+    compare_parser = commands.add_parser('compare', help="Comparer les prédictions shadow et actives")
+    compare_parser.add_argument('version', nargs='?', help="Version shadow (défaut: pointeur shadow)")
+    compare_parser.add_argument('--data-dir', default=config.DATA_DIR)
+    args = parser.parse_args()
+    
+    registry = ModelRegistry(args.registry_dir)
+    try:
+        if args.command == 'register':
+            version = registry.register(args.model, args.threshold, args.notes)
+            print(f"✅ Modèle enregistré: {version} ({registry.version_dir(version)})")
+            if args.activate:
+                registry.set_active(version)
+                print(f"✅ Version active: {version}")
+        
+        elif args.command == 'list':
+            pointers = registry.read_pointers()
+            for metadata in registry.list_versions():
+                version = metadata['version']
+                role = 'actif' if version == pointers['active'] else 'shadow' if version == pointers['shadow'] else ''
+                print(f"{version}  {role:<7}{metadata['registered_at'][:19]}  seuil {metadata['threshold']}  "
+                      f"entrée {metadata['input_shape']}  {metadata.get('notes', '')}")
+        
+        elif args.command == 'activate':
+            pointers = registry.set_active(args.version)
+            print(f"✅ Version active: {args.version} (précédente: {pointers.get('previous')})")
+        
+        elif args.command == 'shadow':
+            if args.clear == bool(args.version):
+                parser.error("indiquer une version ou --clear")
+            registry.set_shadow(None if args.clear else args.version)
+            print(f"✅ Modèle shadow: {args.version or 'aucun'}")
+        
+        elif args.command == 'compare':
+            from data_manager import DataManager
+            version = args.version or registry.read_pointers()['shadow']
+            result = compare_shadow(DataManager(args.data_dir), version)
+            print(f"Version shadow: {version or 'toutes'}")
+            print(f"Prédictions comparées: {result['compared']}")
+            if result['compared']:
+                print(f"Labels différents: {result['label_mismatches']} (accord {result['agreement_rate']:.1%})")
+                if result['mean_abs_diff'] is not None:
+                    print(f"Écart raw_prediction: max {result['max_abs_diff']:.4f}, moyen {result['mean_abs_diff']:.4f}")
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
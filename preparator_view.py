@@ -1,11 +1,17 @@
 import streamlit as st
 import os
+import time
 from dicom_importer import DICOMImporter
 from model_interface import ModelInterface
 import pandas as pd
 from datetime import datetime, date
 from PIL import Image
 import uuid
+from storage_io import ConcurrentModificationError
+from ingestion_pipeline import IngestionPipeline
+from inference_scheduler import URGENCY_LEVELS, QueueFullError, get_scheduler, urgency_of
+from records import ImageRecord
+from rescore_job import RescoreJob
 
 class PreparatorView:
     """Vue pour le rôle Préparateur"""
@@ -13,7 +19,12 @@ class PreparatorView:
     def __init__(self):
         self.data_manager = st.session_state.data_manager
         self.dicom_importer = DICOMImporter()
-        self.model_interface = ModelInterface()
+        
+        # Modèle conservé pour la session, chargé à la première analyse seulement
+        # (TensorFlow n'est pas importé tant qu'aucune prédiction n'est demandée)
+        if 'model_interface' not in st.session_state:
+            st.session_state.model_interface = ModelInterface(lazy=True)
+        self.model_interface = st.session_state.model_interface
     
     def render(self):
         st.header("👨‍💼 Vue Préparateur")
@@ -61,8 +72,15 @@ class PreparatorView:
             )
             
             if uploaded_dicom_files:
+                dicom_urgency = st.selectbox(
+                    "Urgence de la demande",
+                    list(URGENCY_LEVELS),
+                    index=list(URGENCY_LEVELS).index('Normale'),
+                    help="Ordre de passage dans la file d'analyse du modèle",
+                    key="dicom_urgency"
+                )
                 if st.button("Importer les fichiers DICOM", type="primary", key="import_dicom"):
-                    self._import_files(uploaded_dicom_files)
+                    self._import_files(uploaded_dicom_files, dicom_urgency)
         
         with col2:
             st.subheader("🖼️ Import Images Simples")
@@ -116,7 +134,8 @@ class PreparatorView:
                             patient_metadata[uploaded_file.name] = {
                                 'sex': patient_sex,
                                 'age': 0,
-                                'exam_date': datetime.now().date()
+                                'exam_date': datetime.now().date(),
+                                'urgency': 'Normale'
                             }
                         
                         # Âge et date d'examen (optionnel, peut être partagé)
@@ -136,11 +155,19 @@ class PreparatorView:
                                     value=datetime.now().date(),
                                     key=f"exam_date_{st.session_state.image_uploader_key}"
                                 )
+                            urgency = st.selectbox(
+                                "Urgence de la demande",
+                                list(URGENCY_LEVELS),
+                                index=list(URGENCY_LEVELS).index('Normale'),
+                                help="Ordre de passage dans la file d'analyse du modèle",
+                                key=f"urgency_{st.session_state.image_uploader_key}"
+                            )
                             
                             # Appliquer à toutes les images
                             for img_name in patient_ids.keys():
                                 patient_metadata[img_name]['age'] = patient_age
                                 patient_metadata[img_name]['exam_date'] = exam_date
+                                patient_metadata[img_name]['urgency'] = urgency
                     
                     submitted = st.form_submit_button("Importer les images", type="primary")
                     
@@ -163,11 +190,11 @@ class PreparatorView:
         # Afficher les fichiers récemment importés
         st.divider()
         st.subheader("📋 Fichiers importés récemment")
-        images = self.data_manager.get_all_images()
+        images = self.data_manager.get_records('images')
         if images:
             recent_images = sorted(images, key=lambda x: x.get('created_at', ''), reverse=True)[:10]
             df_recent = pd.DataFrame([{
-                'ID Image': img['id'],
+                'ID Image': img.id,
                 'ID Patient': img.get('patient_id', 'N/A'),
                 'Date Examen': img.get('exam_date', 'N/A'),
                 'Type': img.get('import_type', 'DICOM'),
@@ -177,8 +204,8 @@ class PreparatorView:
         else:
             st.info("Aucun fichier importé pour le moment")
     
-    def _import_files(self, uploaded_files):
-        """Importe les fichiers DICOM"""
+    def _import_files(self, uploaded_files, urgency: str = 'Normale'):
+        """Importe les fichiers DICOM (urgence de la demande commune à tous les fichiers)"""
         progress_bar = st.progress(0)
         status_text = st.empty()
         
@@ -193,44 +220,14 @@ class PreparatorView:
                 f.write(uploaded_file.getbuffer())
             file_paths.append(file_path)
         
-        # Importer les fichiers
-        results = self.dicom_importer.import_batch(file_paths)
-        
-        success_count = 0
-        error_count = 0
+        # Importer les fichiers (lecture, décodage, aperçus et écritures en parallèle)
+        pipeline = IngestionPipeline(self.data_manager, urgency=urgency)
+        results = pipeline.run(file_paths, progress=lambda done, total: progress_bar.progress(done / total))
         
-        for i, result in enumerate(results):
-            progress = (i + 1) / len(results)
-            progress_bar.progress(progress)
-            
-            if result['success']:
-                # Ajouter le patient
-                patient_id = result['metadata']['patient_id']
-                patient_metadata = {
-                    'sex': result['metadata'].get('sex', ''),
-                    'age': result['metadata'].get('age', ''),
-                    'institution_name': result['metadata'].get('institution_name', ''),
-                    'station_name': result['metadata'].get('station_name', '')
-                }
-                self.data_manager.add_patient(patient_id, patient_metadata)
-                
-                # Ajouter l'image
-                image_data = {
-                    'patient_id': patient_id,
-                    'file_path': result['file_path'],
-                    'image_path': result['image_path'],
-                    'exam_date': result['metadata'].get('exam_date_formatted', ''),
-                    'exam_time': result['metadata'].get('exam_time', ''),
-                    'modality': result['metadata'].get('modality', ''),
-                    'body_part': result['metadata'].get('body_part', ''),
-                    'patient_position': result['metadata'].get('patient_position', ''),
-                    'view_position': result['metadata'].get('view_position', ''),
-                    'study_description': result['metadata'].get('study_description', '')
-                }
-                self.data_manager.add_image(image_data)
-                success_count += 1
-            else:
-                error_count += 1
+        success_count = sum(1 for result in results if result['success'])
+        error_count = len(results) - success_count
+        for result in results:
+            if not result['success']:
                 st.warning(f"Erreur pour {os.path.basename(result['file_path'])}: {result['error']}")
         
         progress_bar.empty()
@@ -326,12 +323,13 @@ class PreparatorView:
                     'patient_position': '',
                     'view_position': '',
                     'study_description': 'CHEST',
+                    'urgency': metadata.get('urgency', 'Normale'),
                     'import_type': 'Simple Image'  # Pour distinguer des DICOM
                 }
                 
                 self.data_manager.add_image(image_data)
                 success_count += 1
-                
+            
             except Exception as e:
                 error_count += 1
                 st.warning(f"Erreur pour {uploaded_image.name}: {str(e)}")
@@ -351,8 +349,8 @@ class PreparatorView:
         st.subheader("Lancement de l'Analyse par le Modèle")
         
         # Sélection des images à analyser
-        images = self.data_manager.get_all_images()
-        pending_images = [img for img in images if img.get('status') == 'pending']
+        images = self.data_manager.get_records('images')
+        pending_images = [img.to_dict() for img in images if img.get('status') == 'pending']
         
         if not pending_images:
             st.info("Aucune image en attente d'analyse")
@@ -377,12 +375,14 @@ class PreparatorView:
         if filtered_images:
             st.write(f"**{len(filtered_images)} image(s) sélectionnée(s)**")
             
-            # Afficher la liste
+            # Afficher la liste (les images déjà en file d'analyse ne sont pas resoumises)
+            scheduler = get_scheduler()
             df_pending = pd.DataFrame([{
                 'ID Image': img['id'],
                 'ID Patient': img.get('patient_id', 'N/A'),
                 'Date Examen': img.get('exam_date', 'N/A'),
-                'Statut': img.get('status', 'pending')
+                'Urgence': urgency_of(img),
+                'Statut': 'en file' if scheduler.is_queued(img['id']) else img.get('status', 'pending')
             } for img in filtered_images])
             st.dataframe(df_pending, use_container_width=True)
             
@@ -393,7 +393,7 @@ class PreparatorView:
         
         # Afficher les statuts d'analyse
         st.subheader("Statut des Analyses")
-        all_images = self.data_manager.get_all_images()
+        all_images = self.data_manager.get_records('images')
         status_counts = {}
         for img in all_images:
             status = img.get('status', 'pending')
@@ -405,55 +405,112 @@ class PreparatorView:
         col3.metric("Terminé", status_counts.get('completed', 0))
         col4.metric("Erreur", status_counts.get('failed', 0))
         
+        # File d'analyse partagée par tous les préparateurs
+        queue_metrics = get_scheduler().metrics()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("En file d'analyse", f"{queue_metrics['queue_depth']}/{queue_metrics['capacity']}")
+        col2.metric("Dont critiques", queue_metrics['queue_depth_by_urgency']['Critique'])
+        col3.metric("Attente médiane (s)", f"{queue_metrics['wait_ms']['p50'] / 1000:.1f}")
+        col4.metric("Attente critiques p95 (s)", f"{queue_metrics['wait_ms_by_urgency']['Critique']['p95'] / 1000:.1f}")
+        
         # Liste des erreurs
         failed_images = [img for img in all_images if img.get('status') == 'failed']
         if failed_images:
             st.subheader("Images en Erreur")
             df_failed = pd.DataFrame([{
-                'ID Image': img['id'],
+                'ID Image': img.id,
                 'ID Patient': img.get('patient_id', 'N/A'),
                 'Erreur': img.get('error', 'Erreur inconnue')
             } for img in failed_images])
             st.dataframe(df_failed, use_container_width=True)
     
     def _run_model_analysis(self, images):
-        """Lance l'analyse du modèle sur les images"""
+        """
+        Soumet les images à la file d'analyse et suit leur avancement
+        
+        Les images passent par ordre de priorité (urgence, station, ancienneté),
+        avec celles des autres préparateurs ; voir inference_scheduler.py.
+        """
+        # Première analyse de la session : chargement du modèle (et de TensorFlow)
+        with st.spinner("Chargement du modèle..."):
+            model_available = self.model_interface.ensure_loaded()
+        if not model_available:
+            st.error("❌ Modèle non disponible (voir la section « Emplacement du modèle » du README)")
+            return
+        
+        # Évaluation reprise par le thread de la file : créée ici, dans le script
+        self.scorer = self._get_scorer()
+        
+        scheduler = get_scheduler()
+        refused = None
+        try:
+            image_ids = scheduler.submit(images, st.session_state.current_user_name, self._analyse_batch)
+        except QueueFullError as e:
+            # Seules les images acceptées (examens critiques) sont suivies
+            image_ids = e.accepted_ids
+            refused = str(e)
+        if refused:
+            st.warning(f"⚠️ {refused}")
+        if not image_ids:
+            if not refused:
+                st.info("Images déjà en file d'analyse")
+            return
+        
         progress_bar = st.progress(0)
         status_text = st.empty()
+        while True:
+            remaining = sum(1 for image_id in image_ids if scheduler.is_queued(image_id))
+            done = len(image_ids) - remaining
+            progress_bar.progress(done / len(image_ids))
+            status_text.text(f"Analyse: {done}/{len(image_ids)} image(s), "
+                             f"{scheduler.metrics()['queue_depth']} en file (tous préparateurs)")
+            if remaining == 0:
+                break
+            time.sleep(0.25)
         
-        for i, image in enumerate(images):
-            progress = (i + 1) / len(images)
-            progress_bar.progress(progress)
-            status_text.text(f"Analyse de l'image {i+1}/{len(images)}: {image['id']}")
-            
-            # Mettre à jour le statut
-            self.data_manager.update_image_status(image['id'], 'processing')
-            
-            # Lancer la prédiction
+        progress_bar.empty()
+        status_text.empty()
+        st.success(f"✅ Analyse terminée pour {len(image_ids)} image(s)")
+        if not refused:
+            # Avec un refus, pas de rechargement : l'avertissement reste affiché
+            st.rerun()
+    
+    def _get_scorer(self) -> RescoreJob:
+        """Évaluation par lots de la session, recréée quand la version du modèle change"""
+        scorer = st.session_state.get('preparator_scorer')
+        if scorer is None or scorer.data_manager is not self.data_manager \
+                or scorer.model_version != self.model_interface.model_version:
+            scorer = st.session_state.preparator_scorer = RescoreJob(self.data_manager, self.model_interface)
+        return scorer
+    
+    def _analyse_batch(self, images):
+        """
+        Analyse un lot d'images et enregistre les résultats
+        
+        Appelée par le thread de la file d'analyse (pas d'appel Streamlit ici) :
+        le lot est marqué 'processing' puis chaque image 'completed' ou 'failed'.
+        Tenseurs, prédictions, résultats shadow et statuts sont écrits une fois
+        par store (RescoreJob.score_and_save) ; une image passée en revue
+        pendant son attente en file garde son statut.
+        """
+        found = []
+        missing = {}
+        for image in images:
             image_path = image.get('image_path')
             if image_path and os.path.exists(image_path):
-                try:
-                    prediction = self.model_interface.predict(image_path)
-                    
-                    # Sauvegarder la prédiction
-                    self.data_manager.add_prediction({
-                        'image_id': image['id'],
-                        'patient_id': image.get('patient_id'),
-                        'label': prediction['label'],
-                        'confidence': prediction['confidence']
-                    })
-                    
-                    # Mettre à jour le statut
-                    self.data_manager.update_image_status(image['id'], 'completed')
-                except Exception as e:
-                    self.data_manager.update_image_status(image['id'], 'failed', str(e))
+                found.append(ImageRecord.from_dict(image))
             else:
-                self.data_manager.update_image_status(image['id'], 'failed', "Image non trouvée")
+                missing[image['id']] = "Image non trouvée"
+        if missing:
+            self.data_manager.set_analysis_statuses([], missing)
+        if not found:
+            return
         
-        progress_bar.empty()
-        status_text.empty()
-        st.success(f"✅ Analyse terminée pour {len(images)} image(s)")
-        st.rerun()
+        self.data_manager.set_processing_statuses([image.id for image in found])
+        try:
+            self.scorer.score_and_save(found)
+        except Exception as e:
+            self.data_manager.set_analysis_statuses([], {image.id: str(e) for image in found})
     
     def _render_visualization_tab(self):
         """Onglet de visualisation et filtrage"""
@@ -624,6 +681,14 @@ class PreparatorView:
         # Récupérer l'annotation existante
         annotation = self.data_manager.get_annotation_by_image(image['id'])
         
+        # Version affichée à l'utilisateur (détection des modifications concurrentes) :
+        # un formulaire ne relance le script qu'à la soumission, la version attendue
+        # est donc celle du passage précédent ; chaque affichage suit la version chargée
+        version_key = f"annotation_version_{image['id']}"
+        loaded_version = annotation.get('version', 0) if annotation else 0
+        seen_version = st.session_state.get(version_key, loaded_version)
+        st.session_state[version_key] = loaded_version
+        
         # Formulaire d'annotation
         with st.form(f"annotation_form_{image['id']}"):
             st.subheader("Annotation")
@@ -694,17 +759,23 @@ class PreparatorView:
             if submitted:
                 if annotation:
                     # Mettre à jour l'annotation existante
-                    self.data_manager.update_annotation(
-                        image['id'],
-                        st.session_state.current_user_name,
-                        {
-                            'label': label,
-                            'confidence': confidence,
-                            'notes': notes,
-                            'additional_info': additional_info,
-                            'user_role': 'Préparateur'
-                        }
-                    )
+                    try:
+                        self.data_manager.update_annotation(
+                            image['id'],
+                            st.session_state.current_user_name,
+                            {
+                                'label': label,
+                                'confidence': confidence,
+                                'notes': notes,
+                                'additional_info': additional_info,
+                                'user_role': 'Préparateur'
+                            },
+                            expected_version=seen_version
+                        )
+                    except ConcurrentModificationError as e:
+                        del st.session_state[version_key]
+                        st.error(f"❌ {e}. Rechargez la page pour voir la version actuelle.")
+                        return
                 else:
                     # Créer une nouvelle annotation
                     self.data_manager.add_annotation({
@@ -718,6 +789,7 @@ class PreparatorView:
                         'user_role': 'Préparateur'
                     })
                 
+                st.session_state.pop(version_key, None)
                 st.success("✅ Annotation enregistrée")
                 st.rerun()
         
@@ -727,4 +799,3 @@ class PreparatorView:
             st.write(f"**Version actuelle:** {annotation.get('version', 1)}")
             st.write(f"**Dernière modification:** {annotation.get('created_at', 'N/A')}")
             st.write(f"**Par:** {annotation.get('user_name', 'N/A')}")
-
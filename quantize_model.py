@@ -0,0 +1,149 @@
+"""
+Quantification post-entraînement du modèle (TFLite INT8 ou float16)
+
+Construit une variante quantifiée de model.h5, calibrée sur un échantillon
+des images stockées par l'application, puis la compare au modèle float sur
+images-test/. Une image est en désaccord si le label change ou si la
+probabilité brute (raw_prediction) s'écarte de plus de --raw-tolerance.
+
+Le rapport (model_<variante>.report.json) indique si le taux de désaccord
+respecte --max-disagreement ; ModelInterface refuse de servir un modèle
+quantifié dont le rapport est absent, périmé ou en échec.
+
+Usage:
+    python quantize_model.py [--mode int8|float16] [--model model.h5] [--calibration-samples 200]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import config
+from convert_model import list_test_images
+from data_manager import DataManager
+from model_interface import ModelInterface
+from storage_io import atomic_write_bytes
+from model_backends import quantization_report_path
+
+def calibration_images(data_dir: str, fallback_dir: str, samples: int) -> list:
+    """
+    Échantillon d'images pour la calibration INT8
+    
+    Utilise les images importées dans l'application ; à défaut, celles du
+    répertoire de secours (la vérification porte alors sur les mêmes images).
+    """
+    paths = []
+    if os.path.isdir(data_dir):
+        manager = DataManager(data_dir)
+        paths = [
+            img.image_path for img in manager.get_records('images')
+            if img.get('image_path') and os.path.exists(img.image_path)
+        ]
+    if not paths:
+        print(f"⚠️  Aucune image stockée dans {data_dir} : calibration sur {fallback_dir}")
+        paths = list_test_images(fallback_dir)
+    
+    random.seed(0)
+    return random.sample(paths, min(samples, len(paths)))
+
+def quantize(keras_path: str, mode: str, reference: ModelInterface, calibration_paths: list) -> bytes:
+    """Convertit le modèle Keras en TFLite quantifié (entrées/sorties float32)"""
+    import tensorflow as tf
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [reference._preprocess_image(path)]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    
+    return converter.convert()
+
+def evaluate(reference: ModelInterface, candidate: ModelInterface, image_paths: list,
+             raw_tolerance: float) -> dict:
+    """Compare labels et probabilités brutes du modèle quantifié et du modèle float"""
+    batch = np.concatenate([reference._preprocess_image(path) for path in image_paths])
+    expected = reference._predict_array(batch)
+    actual = candidate._predict_array(batch)
+    
+    diffs = np.abs(expected - actual)
+    label_changed = (expected >= 0.5) != (actual >= 0.5)
+    disagree = label_changed | (diffs > raw_tolerance)
+    return {
+        'evaluation_images': len(image_paths),
+        'label_mismatches': int(label_changed.sum()),
+        'max_abs_diff': float(diffs.max()),
+        'mean_abs_diff': float(diffs.mean()),
+        'disagreements': int(disagree.sum()),
+        'disagreement_rate': float(disagree.mean()),
+        'disagreeing_images': [os.path.basename(p) for p, d in zip(image_paths, disagree) if d]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['int8', 'float16'], default='int8')
+    parser.add_argument('--model', default='model.h5', help="Modèle Keras source")
+    parser.add_argument('--output', help="Fichier de sortie (défaut: model_<mode>.tflite)")
+    parser.add_argument('--data-dir', default=config.DATA_DIR, help="Données de l'application (calibration)")
+    parser.add_argument('--images', default='images-test', help="Images du contrôle de précision")
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--max-disagreement', type=float, default=config.QUANTIZATION_MAX_DISAGREEMENT)
+    parser.add_argument('--raw-tolerance', type=float, default=config.QUANTIZATION_RAW_TOLERANCE)
+    args = parser.parse_args()
+    
+    output_path = args.output or os.path.join(os.path.dirname(args.model), f"model_{args.mode}.tflite")
+    reference = ModelInterface(args.model, backend='keras', quantization='none')
+    if reference.model is None:
+        sys.exit(1)
+    
+    calibration_paths = calibration_images(args.data_dir, args.images, args.calibration_samples) if args.mode == 'int8' else []
+    print(f"🔄 Quantification {args.mode} de {args.model} ({len(calibration_paths)} images de calibration)")
+    payload = quantize(args.model, args.mode, reference, calibration_paths)
+    atomic_write_bytes(output_path, payload)
+    print(f"✅ Modèle quantifié: {output_path} ({len(payload) / 1024:.0f} Ko)")
+    
+    image_paths = list_test_images(args.images)
+    if not image_paths:
+        print(f"❌ Aucune image dans {args.images} : contrôle de précision impossible")
+        sys.exit(1)
+    
+    candidate = ModelInterface(output_path, backend='tflite', quantization='none')
+    result = evaluate(reference, candidate, image_paths, args.raw_tolerance)
+    report = {
+        'mode': args.mode,
+        'source_model': os.path.abspath(args.model),
+        'model_sha256': hashlib.sha256(payload).hexdigest(),
+        'created_at': datetime.now().isoformat(),
+        'calibration_images': len(calibration_paths),
+        'raw_tolerance': args.raw_tolerance,
+        'max_disagreement': args.max_disagreement,
+        **result,
+        'passed': result['disagreement_rate'] <= args.max_disagreement
+    }
+    report_path = quantization_report_path(output_path)
+    atomic_write_bytes(report_path, json.dumps(report, indent=2, ensure_ascii=False).encode('utf-8'))
+    
+    print(f"Images comparées: {result['evaluation_images']}")
+    print(f"Labels différents: {result['label_mismatches']}")
+    print(f"Écart raw_prediction: max {result['max_abs_diff']:.4f}, moyen {result['mean_abs_diff']:.4f}")
+    print(f"Taux de désaccord: {result['disagreement_rate']:.1%} (maximum {args.max_disagreement:.1%})")
+    print(f"Rapport: {report_path}")
+    
+    if not report['passed']:
+        print("❌ Contrôle de précision échoué : le modèle quantifié ne sera pas servi")
+        sys.exit(1)
+    print(f"✅ Contrôle de précision réussi (APP_MODEL_QUANTIZATION={args.mode})")
+
+if __name__ == "__main__":
+    main()
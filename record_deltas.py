@@ -0,0 +1,76 @@
+"""
+Deltas compacts entre versions d'un enregistrement
+
+Un patch décrit comment passer d'une version à une autre :
+    - 's' : clés dont la valeur est remplacée
+    - 'd' : sous-dictionnaires modifiés (patch imbriqué)
+    - 'u' : clés supprimées
+Les parties vides sont omises pour garder des deltas compacts.
+"""
+
+import copy
+from typing import Dict, List
+
+def diff_records(target: Dict, source: Dict) -> Dict:
+    """
+    Calcule le patch qui transforme `source` en `target`
+    
+    Args:
+        target: Version à reconstruire
+        source: Version de départ
+    
+    Returns:
+        Patch compact (dictionnaire vide si les versions sont identiques)
+    """
+    replaced = {}
+    nested = {}
+    for key, value in target.items():
+        if key not in source:
+            replaced[key] = value
+        elif source[key] != value:
+            if isinstance(value, dict) and isinstance(source[key], dict):
+                nested[key] = diff_records(value, source[key])
+            else:
+                replaced[key] = value
+    
+    removed = [key for key in source if key not in target]
+    
+    patch = {}
+    if replaced:
+        patch['s'] = replaced
+    if nested:
+        patch['d'] = nested
+    if removed:
+        patch['u'] = removed
+    return patch
+
+def apply_patch(record: Dict, patch: Dict) -> Dict:
+    """Applique un patch et retourne une nouvelle version (le record d'origine n'est pas modifié)"""
+    result = dict(record)
+    for key, value in patch.get('s', {}).items():
+        result[key] = copy.deepcopy(value)
+    for key, sub_patch in patch.get('d', {}).items():
+        result[key] = apply_patch(result.get(key) or {}, sub_patch)
+    for key in patch.get('u', []):
+        result.pop(key, None)
+    return result
+
+def reconstruct_versions(snapshot: Dict, deltas: List[Dict]) -> List[Dict]:
+    """
+    Reconstruit toutes les versions à partir de la version courante
+    
+    Args:
+        snapshot: Version courante complète
+        deltas: Deltas inverses ({'version': n, 'patch': ...}) qui transforment
+            la version n+1 en version n
+    
+    Returns:
+        Liste des versions complètes, triée par version croissante
+    """
+    versions = [copy.deepcopy(snapshot)]
+    current = versions[0]
+    for delta in sorted(deltas, key=lambda d: d.get('version', 0), reverse=True):
+        current = apply_patch(current, delta.get('patch', {}))
+        versions.append(current)
+    versions.reverse()
+    return versions
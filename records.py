@@ -0,0 +1,160 @@
+"""
+Enregistrements typés à slots pour les données en mémoire
+
+Chaque enregistrement stocke ses champs connus dans des `__slots__` au lieu
+d'un dictionnaire par objet, ce qui réduit fortement l'empreinte mémoire des
+stores mis en cache. Un champ absent du dictionnaire d'origine reste un slot
+non initialisé, et les clés inconnues sont conservées dans `extra` : la
+conversion `from_dict` / `to_dict` est donc sans perte.
+"""
+
+import sys
+from typing import Any, Dict, List, Optional
+
+# Marqueur d'absence (distinct de None, qui est une valeur valide)
+_ABSENT = object()
+
+def _clone(value: Any) -> Any:
+    """Copie profonde rapide des structures JSON (dictionnaires et listes)"""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+class Record:
+    """Enregistrement de base"""
+    
+    __slots__ = ('extra',)
+    
+    # Champs connus, dans l'ordre de création habituel
+    FIELDS = ()
+    # Champs contenant des dictionnaires/listes (copiés à la conversion)
+    NESTED = ()
+    # Champs à faible cardinalité dont les chaînes sont internées
+    INTERNED = ()
+    
+    _FIELD_SET = frozenset()
+    _NESTED_SET = frozenset()
+    _INTERNED_SET = frozenset()
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Record':
+        """Construit un enregistrement à partir d'un dictionnaire"""
+        record = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            if key in cls._FIELD_SET:
+                if key in cls._INTERNED_SET and isinstance(value, str):
+                    value = sys.intern(value)
+                setattr(record, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        record.extra = extra
+        return record
+    
+    def to_dict(self) -> Dict:
+        """Convertit l'enregistrement en dictionnaire (copie indépendante)"""
+        data = {}
+        for key in self.FIELDS:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                continue
+            data[key] = _clone(value) if key in self._NESTED_SET else value
+        if self.extra:
+            data.update(_clone(self.extra))
+        return data
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Accès façon dictionnaire (même sémantique que dict.get)"""
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _ABSENT) is not _ABSENT
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+        cls._NESTED_SET = frozenset(cls.NESTED)
+        cls._INTERNED_SET = frozenset(cls.INTERNED)
+
+class PatientRecord(Record):
+    __slots__ = ('id', 'patient_id', 'metadata', 'created_at')
+    FIELDS = __slots__
+    NESTED = ('metadata',)
+
+class ImageRecord(Record):
+    __slots__ = (
+        'id', 'patient_id', 'file_path', 'image_path', 'exam_date', 'exam_time',
+        'modality', 'body_part', 'patient_position', 'view_position',
+        'study_description', 'import_type', 'created_at', 'status', 'updated_at',
+        'error', 'sent_for_review_at', 'sent_by', 'finalized_at', 'finalized_by',
+        'rev'
+    )
+    FIELDS = __slots__
+    INTERNED = (
+        'exam_date', 'modality', 'body_part', 'patient_position', 'view_position',
+        'study_description', 'import_type', 'status', 'sent_by', 'finalized_by'
+    )
+
+class PredictionRecord(Record):
+    __slots__ = (
+        'id', 'image_id', 'patient_id', 'label', 'confidence', 'raw_prediction',
+        'model_version', 'created_at'
+    )
+    FIELDS = __slots__
+    INTERNED = ('label', 'model_version')
+
+class ShadowPredictionRecord(Record):
+    __slots__ = (
+        'id', 'image_id', 'patient_id', 'prediction_id', 'label', 'confidence',
+        'raw_prediction', 'model_version', 'created_at'
+    )
+    FIELDS = __slots__
+    INTERNED = ('label', 'model_version')
+
+class AnnotationRecord(Record):
+    __slots__ = (
+        'id', 'image_id', 'patient_id', 'label', 'confidence', 'notes',
+        'additional_info', 'user_name', 'user_role', 'created_at', 'version',
+        'previous_version_id'
+    )
+    FIELDS = __slots__
+    NESTED = ('additional_info',)
+    INTERNED = ('label', 'user_name', 'user_role')
+
+class AuditEntry(Record):
+    __slots__ = ('id', 'user_name', 'action', 'details', 'timestamp')
+    FIELDS = __slots__
+    NESTED = ('details',)
+    INTERNED = ('user_name', 'action')
+
+def to_records(items: List[Dict], record_cls: type) -> List[Record]:
+    """Convertit une liste de dictionnaires en enregistrements typés"""
+    from_dict = record_cls.from_dict
+    return [from_dict(item) for item in items]
+
+def to_dicts(records: List[Record]) -> List[Dict]:
+    """Convertit une liste d'enregistrements en dictionnaires"""
+    return [record.to_dict() for record in records]
+
+def find_record(records: List[Record], field: str, value: Any) -> Optional[Record]:
+    """Premier enregistrement dont le champ vaut la valeur donnée"""
+    return next((r for r in records if r.get(field) == value), None)
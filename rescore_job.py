@@ -0,0 +1,278 @@
+"""
+Réévaluation de toutes les images par une nouvelle version du modèle
+
+Les images (toutes, ou filtrées par statut / patient) passent par lots dans
+le modèle ; chaque prédiction est enregistrée avec la version du modèle
+(empreinte du fichier). get_prediction_by_image retourne ensuite la plus
+récente. Les embeddings (cas similaires) et les cartes d'attention de la
+nouvelle version sont calculés dans le même passage.
+
+Reprise : une image ayant déjà une prédiction de la version courante est
+ignorée, et l'avancement est sauvegardé après chaque lot dans
+data/rescore/<version>.json. La tâche peut donc être interrompue (Ctrl+C,
+SIGTERM) et relancée avec la même commande.
+
+Bridage : le processus baisse sa priorité (nice) et s'accorde au plus
+--duty-cycle du temps (pause proportionnelle après chaque lot) et
+--max-rate images par seconde, pour ne pas pénaliser les utilisateurs.
+
+Usage:
+    python rescore_job.py [--status finalized] [--patient P001] [--batch-size 32]
+                          [--duty-cycle 0.5] [--max-rate 0] [--retry-failed] [--no-heatmaps]
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+from data_manager import DataManager
+from embedding_index import index_results, open_index
+from heatmap_cache import HeatmapCache
+from model_interface import ModelInterface
+from storage_io import atomic_write_bytes
+from tensor_store import TensorStore
+
+class RescoreJob:
+    """Réévaluation par lots, avec point de reprise et bridage"""
+    
+    def __init__(self, data_manager: DataManager, model_interface: ModelInterface,
+                 batch_size: Optional[int] = None, duty_cycle: float = 1.0, max_rate: float = 0.0,
+                 explain: Optional[bool] = None):
+        """
+        Args:
+            data_manager: Stockage des images et prédictions
+            model_interface: Modèle chargé (sa version étiquette les prédictions)
+            batch_size: Images par lot (défaut: APP_INFERENCE_BATCH_SIZE)
+            duty_cycle: Fraction maximale du temps consacrée au calcul (0-1]
+            max_rate: Débit maximal en images par seconde (0: illimité)
+            explain: Calculer les cartes d'attention avec les prédictions
+                (défaut: APP_EXPLAIN_HEATMAPS), voir heatmap_cache.py
+        """
+        self.data_manager = data_manager
+        self.model_interface = model_interface
+        self.model_version = model_interface.model_version
+        self.batch_size = batch_size or config.INFERENCE_BATCH_SIZE
+        self.duty_cycle = min(1.0, max(0.01, duty_cycle))
+        self.max_rate = max_rate
+        self.tensor_store = TensorStore(os.path.join(data_manager.data_dir, 'tensors'))
+        self.heatmap_cache = HeatmapCache(data_manager.data_dir)
+        self.explain = bool(config.EXPLAIN_HEATMAPS if explain is None else explain)
+        self.checkpoint_file = os.path.join(data_manager.data_dir, 'rescore', f"{self.model_version}.json")
+        self._stop_requested = False
+    
+    # ========== Point de reprise ==========
+    
+    def load_checkpoint(self) -> Dict:
+        """Avancement de la version courante (compteurs et images en échec)"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                'model_version': self.model_version,
+                'model_path': self.model_interface.model_path,
+                'started_at': datetime.now().isoformat(),
+                'scored': 0,
+                'failed': {}
+            }
+    
+    def _save_checkpoint(self, checkpoint: Dict):
+        checkpoint['updated_at'] = datetime.now().isoformat()
+        os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+        atomic_write_bytes(self.checkpoint_file, json.dumps(checkpoint, indent=2, ensure_ascii=False).encode('utf-8'))
+    
+    # ========== Sélection ==========
+    
+    def select_images(self, statuses: Optional[List[str]] = None, patient_id: Optional[str] = None,
+                      retry_failed: bool = False) -> List:
+        """Images restant à évaluer par la version courante"""
+        checkpoint = self.load_checkpoint()
+        done = self.data_manager.get_scored_image_ids(self.model_version)
+        if not retry_failed:
+            done |= set(checkpoint['failed'])
+        
+        return [
+            img for img in self.data_manager.get_records('images')
+            if img.id not in done
+            and img.get('image_path')
+            and (not statuses or img.get('status') in statuses)
+            and (patient_id is None or img.get('patient_id') == patient_id)
+        ]
+    
+    # ========== Exécution ==========
+    
+    def request_stop(self, *_):
+        """Arrêt propre après le lot en cours"""
+        self._stop_requested = True
+    
+    def score_batch(self, images: List) -> tuple:
+        """Évalue un lot ; retourne (prédictions à enregistrer, résultats shadow associés, échecs)"""
+        failed = {}
+        missing = [img for img in images if img.id not in self.tensor_store]
+        decoded = self.model_interface.preprocessor.decode_many(
+            [img.image_path for img in missing], allow_grayscale=True
+        )
+        new_tensors = []
+        for img, pixels in zip(missing, decoded):
+            if isinstance(pixels, Exception):
+                failed[img.id] = str(pixels)
+            else:
+                new_tensors.append((img.id, pixels))
+        if new_tensors:
+            self.tensor_store.put_many(new_tensors)
+        
+        by_id = {img.id: img for img in images}
+        predictions = []
+        shadow_results = []
+        ids = [img.id for img in images if img.id not in failed]
+        for batch_ids, batch in self.tensor_store.iter_batches(self.batch_size, image_ids=ids):
+            results = self.model_interface.predict_arrays(batch, explain=self.explain)
+            index_results(self.data_manager.data_dir, batch_ids, results)
+            self.heatmap_cache.store_results(batch_ids, results)
+            for image_id, result in zip(batch_ids, results):
+                if result['label'] == 'error':
+                    failed[image_id] = result.get('error', 'Erreur inconnue')
+                    continue
+                predictions.append({
+                    'image_id': image_id,
+                    'patient_id': by_id[image_id].get('patient_id'),
+                    'label': result['label'],
+                    'confidence': result['confidence'],
+                    'raw_prediction': result['raw_prediction'],
+                    'model_version': self.model_version
+                })
+                shadow_results.append(result.get('shadow'))
+        return predictions, shadow_results, failed
+    
+    def save_shadow_results(self, predictions: List[Dict], prediction_ids: List[str],
+                             shadow_results: List[Optional[Dict]]):
+        """Enregistre à part les résultats du modèle shadow, reliés aux prédictions du lot"""
+        shadow_predictions = [
+            {
+                'image_id': prediction['image_id'],
+                'patient_id': prediction['patient_id'],
+                'prediction_id': prediction_id,
+                **shadow
+            }
+            for prediction, prediction_id, shadow in zip(predictions, prediction_ids, shadow_results)
+            if shadow is not None
+        ]
+        if shadow_predictions:
+            self.data_manager.add_shadow_predictions(shadow_predictions)
+    
+    def score_and_save(self, images: List) -> tuple:
+        """
+        Évalue un lot d'images en attente d'analyse et enregistre les résultats
+        
+        Prédictions, résultats shadow et statuts d'analyse (completed / failed)
+        sont écrits en une fois par store.
+        
+        Returns:
+            (prédictions enregistrées, avec leur 'id' ; échecs {image_id: erreur})
+        """
+        predictions, shadow_results, failed = self.score_batch(images)
+        if predictions:
+            prediction_ids = self.data_manager.add_predictions(predictions)
+            self.save_shadow_results(predictions, prediction_ids, shadow_results)
+            for prediction, prediction_id in zip(predictions, prediction_ids):
+                prediction['id'] = prediction_id
+        self.data_manager.set_analysis_statuses([prediction['image_id'] for prediction in predictions], failed)
+        return predictions, failed
+    
+    def run(self, images: List, progress=print) -> Dict:
+        """
+        Évalue les images par lots en enregistrant l'avancement après chaque lot
+        
+        Returns:
+            Checkpoint final (compteurs cumulés de la version)
+        """
+        checkpoint = self.load_checkpoint()
+        total = len(images)
+        processed = 0
+        
+        for start in range(0, total, self.batch_size):
+            if self._stop_requested:
+                break
+            batch = images[start:start + self.batch_size]
+            
+            t0 = time.perf_counter()
+            predictions, shadow_results, failed = self.score_batch(batch)
+            if predictions:
+                prediction_ids = self.data_manager.add_predictions(predictions)
+                self.save_shadow_results(predictions, prediction_ids, shadow_results)
+            checkpoint['scored'] += len(predictions)
+            checkpoint['failed'].update(failed)
+            for prediction in predictions:
+                checkpoint['failed'].pop(prediction['image_id'], None)
+            self._save_checkpoint(checkpoint)
+            elapsed = time.perf_counter() - t0
+            
+            processed += len(batch)
+            progress(f"🔄 {processed}/{total} images ({len(failed)} échec(s) dans le lot, {elapsed:.2f}s)")
+            
+            # Bridage : part de temps de calcul et débit maximal
+            pause = elapsed * (1 - self.duty_cycle) / self.duty_cycle
+            if self.max_rate > 0:
+                pause = max(pause, len(batch) / self.max_rate - elapsed)
+            if pause > 0 and start + self.batch_size < total:
+                time.sleep(pause)
+        
+        checkpoint['completed'] = not self._stop_requested
+        self._save_checkpoint(checkpoint)
+        return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--status', action='append', help="Statut d'image à inclure (répétable)")
+    parser.add_argument('--patient', help="Restreindre à un patient")
+    parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    parser.add_argument('--duty-cycle', type=float, default=0.5, help="Fraction du temps consacrée au calcul")
+    parser.add_argument('--max-rate', type=float, default=0.0, help="Images par seconde maximum (0: illimité)")
+    parser.add_argument('--nice', type=int, default=10, help="Baisse de priorité du processus")
+    parser.add_argument('--retry-failed', action='store_true', help="Réessayer les images en échec")
+    parser.add_argument('--no-heatmaps', action='store_true', help="Ne pas calculer les cartes d'attention")
+    parser.add_argument('--user', default='rescore_job', help="Nom journalisé")
+    args = parser.parse_args()
+    
+    if args.nice and hasattr(os, 'nice'):
+        os.nice(args.nice)
+    
+    data_manager = DataManager(args.data_dir)
+    # Modèle local, version figée pour toute la tâche (le point de reprise en dépend)
+    model_interface = ModelInterface(follow_registry=False, server_url='')
+    if model_interface.model is None:
+        sys.exit(1)
+    
+    job = RescoreJob(data_manager, model_interface, args.batch_size, args.duty_cycle, args.max_rate,
+                     explain=False if args.no_heatmaps else None)
+    signal.signal(signal.SIGINT, job.request_stop)
+    signal.signal(signal.SIGTERM, job.request_stop)
+    
+    images = job.select_images(args.status, args.patient, args.retry_failed)
+    print(f"Version du modèle: {job.model_version} ({model_interface.model_path})")
+    print(f"{len(images)} image(s) à évaluer")
+    checkpoint = job.run(images)
+    
+    if not checkpoint['completed']:
+        print(f"⏸️  Interrompu : {checkpoint['scored']} image(s) évaluées, relancer la même commande pour reprendre")
+        sys.exit(130)
+    
+    if open_index(args.data_dir, job.model_version).maybe_build_ivf():
+        print("✅ Index des cas similaires (IVF) reconstruit")
+    
+    data_manager._log_change(args.user, 'rescore_completed', {
+        'model_version': job.model_version,
+        'scored': checkpoint['scored'],
+        'failed': len(checkpoint['failed'])
+    })
+    print(f"✅ Réévaluation terminée : {checkpoint['scored']} image(s), {len(checkpoint['failed'])} échec(s)")
+
+if __name__ == "__main__":
+    main()
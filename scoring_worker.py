@@ -0,0 +1,205 @@
+"""
+Worker de scoring : évalue les jobs de la table partagée (job_queue.py)
+
+Autant de workers que voulu peuvent tourner, sur une ou plusieurs machines
+partageant le répertoire des données. Chacun réserve un lot de jobs, le
+fait évaluer par son modèle local (ModelInterface, mêmes lots que
+rescore_job.py : tenseurs réutilisés, embeddings et cartes d'attention
+calculés dans le même passage), puis valide les prédictions. Un thread
+prolonge le bail pendant le calcul ; un worker arrêté brutalement laisse
+expirer son bail et ses jobs sont repris par un autre.
+
+Validation d'un lot :
+    1. JobQueue.confirm : jobs encore détenus par le bail (les autres ont été repris)
+    2. DataManager.add_predictions_once : une seule prédiction par job
+    3. JobQueue.complete : jobs terminés, échecs remis en file ou définitifs
+Un arrêt entre 2 et 3 ne crée pas de doublon : le job repris retrouve sa
+prédiction déjà enregistrée.
+
+Usage:
+    python job_queue.py enqueue                  (images en attente d'analyse)
+    python scoring_worker.py [--batch-size 32] [--campaign intake] [--exit-when-empty]
+"""
+
+import argparse
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+import config
+from data_manager import DataManager
+from embedding_index import open_index
+from job_queue import JobQueue, Lease, default_worker_id
+from model_interface import ModelInterface
+from rescore_job import RescoreJob
+
+class _Heartbeat:
+    """Prolonge un bail en arrière-plan tant que le lot est en cours"""
+    
+    def __init__(self, queue: JobQueue, lease: Lease):
+        self.queue = queue
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+    
+    def __enter__(self) -> '_Heartbeat':
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *_):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                if self.queue.heartbeat(self.lease) == 0:
+                    # Bail repris par un autre worker : confirm() écartera ces jobs
+                    return
+            except Exception as e:
+                # Base momentanément indisponible : le bail tient encore jusqu'à son expiration
+                print(f"⚠️  Heartbeat du bail impossible: {e}")
+
+class ScoringWorker:
+    """Boucle réservation -> évaluation -> validation"""
+    
+    def __init__(self, data_manager: DataManager, model_interface: ModelInterface, queue: JobQueue,
+                 batch_size: Optional[int] = None, worker_id: Optional[str] = None,
+                 campaign: Optional[str] = None, explain: Optional[bool] = None):
+        """
+        Args:
+            data_manager: Stockage des images et prédictions
+            model_interface: Modèle local (sa version étiquette les prédictions)
+            queue: Table des jobs
+            batch_size: Jobs réservés par lot (défaut: APP_INFERENCE_BATCH_SIZE)
+            worker_id: Nom du worker dans la table (défaut: machine:pid)
+            campaign: Ne traiter que les jobs de cette campagne
+            explain: Calculer les cartes d'attention (défaut: APP_EXPLAIN_HEATMAPS)
+        """
+        self.data_manager = data_manager
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.campaign = campaign
+        # Évaluation d'un lot (tenseurs, embeddings, cartes) partagée avec la réévaluation
+        self.scorer = RescoreJob(data_manager, model_interface, batch_size, explain=explain)
+        self.batch_size = self.scorer.batch_size
+        self.model_version = self.scorer.model_version
+        self._stop_requested = False
+    
+    def request_stop(self, *_):
+        """Arrêt propre après le lot en cours"""
+        self._stop_requested = True
+    
+    def process_lease(self, lease: Lease) -> Dict[str, int]:
+        """
+        Évalue et valide un lot réservé
+        
+        Returns:
+            Compteurs du lot: committed, duplicates, failed, lost
+        """
+        images = {img.id: img for img in self.data_manager.get_records('images')}
+        job_by_image = {job['image_id']: job['job_id'] for job in lease.jobs}
+        failed = {job['job_id']: "Image absente du store" for job in lease.jobs
+                  if job['image_id'] not in images or not images[job['image_id']].get('image_path')}
+        batch = [images[job['image_id']] for job in lease.jobs if job['job_id'] not in failed]
+        
+        try:
+            with _Heartbeat(self.queue, lease):
+                predictions, shadow_results, image_failures = self.scorer.score_batch(batch)
+        except Exception as e:
+            self.queue.release(lease, f"Erreur lors de l'évaluation du lot: {e}")
+            raise
+        failed.update({job_by_image[image_id]: error for image_id, error in image_failures.items()})
+        
+        # Seuls les jobs encore détenus sont validés ; les autres appartiennent à un autre worker
+        held = set(self.queue.confirm(lease))
+        kept = [(prediction, shadow) for prediction, shadow in zip(predictions, shadow_results)
+                if job_by_image[prediction['image_id']] in held]
+        predictions = [{**prediction, 'job_id': job_by_image[prediction['image_id']]} for prediction, _ in kept]
+        written = self.data_manager.add_predictions_once(predictions)
+        
+        # Résultats shadow des seules prédictions ajoutées par ce worker
+        created = [index for index, (_, is_new) in enumerate(written) if is_new]
+        if created:
+            self.scorer.save_shadow_results([predictions[i] for i in created], [written[i][0] for i in created],
+                                            [kept[i][1] for i in created])
+        
+        done = {prediction['job_id']: prediction_id for prediction, (prediction_id, _) in zip(predictions, written)}
+        failed = {job_id: error for job_id, error in failed.items() if job_id in held}
+        exhausted = set(self.queue.complete(lease, done, self.model_version, failed))
+        
+        image_by_job = {job_id: image_id for image_id, job_id in job_by_image.items()}
+        self.data_manager.set_analysis_statuses(
+            [prediction['image_id'] for prediction in predictions],
+            {image_by_job[job_id]: error for job_id, error in failed.items() if job_id in exhausted}
+        )
+        return {
+            'committed': len(created),
+            'duplicates': len(predictions) - len(created),
+            'failed': len(exhausted),
+            'lost': len(lease.jobs) - len(held)
+        }
+    
+    def run(self, exit_when_empty: bool = False, poll_seconds: float = 5.0, progress=print) -> Dict[str, int]:
+        """
+        Traite les jobs jusqu'à l'arrêt demandé (ou jusqu'à une table vide)
+        
+        Returns:
+            Compteurs cumulés
+        """
+        totals = {'committed': 0, 'duplicates': 0, 'failed': 0, 'lost': 0}
+        while not self._stop_requested:
+            lease = self.queue.claim(self.worker_id, self.batch_size, self.campaign)
+            if lease is None:
+                if exit_when_empty:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            
+            t0 = time.perf_counter()
+            try:
+                counts = self.process_lease(lease)
+            except Exception as e:
+                print(f"❌ Lot de {len(lease.jobs)} job(s) rendu: {e}")
+                continue
+            for key, value in counts.items():
+                totals[key] += value
+            progress(f"🔄 {counts['committed']} prédiction(s) validée(s) en {time.perf_counter() - t0:.2f}s"
+                     f" (doublons évités: {counts['duplicates']}, échecs définitifs: {counts['failed']},"
+                     f" jobs repris par un autre worker: {counts['lost']})")
+        return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--db', help="Base des jobs (défaut: APP_JOB_QUEUE_PATH)")
+    parser.add_argument('--batch-size', type=int, default=config.INFERENCE_BATCH_SIZE)
+    parser.add_argument('--campaign', help="Ne traiter que les jobs de cette campagne")
+    parser.add_argument('--worker-id', help="Nom du worker (défaut: machine:pid)")
+    parser.add_argument('--exit-when-empty', action='store_true', help="S'arrêter quand aucun job n'est disponible")
+    parser.add_argument('--poll-seconds', type=float, default=5.0, help="Attente entre deux réservations sans job")
+    parser.add_argument('--no-heatmaps', action='store_true', help="Ne pas calculer les cartes d'attention")
+    args = parser.parse_args()
+    
+    data_manager = DataManager(args.data_dir)
+    # Modèle local, version figée pour tout le worker
+    model_interface = ModelInterface(follow_registry=False, server_url='')
+    if model_interface.model is None:
+        sys.exit(1)
+    
+    worker = ScoringWorker(data_manager, model_interface, JobQueue(args.db), args.batch_size,
+                           args.worker_id, args.campaign, explain=False if args.no_heatmaps else None)
+    signal.signal(signal.SIGINT, worker.request_stop)
+    signal.signal(signal.SIGTERM, worker.request_stop)
+    print(f"Worker {worker.worker_id}, version du modèle {worker.model_version}")
+    totals = worker.run(args.exit_when_empty, args.poll_seconds)
+    
+    if open_index(args.data_dir, worker.model_version).maybe_build_ivf():
+        print("✅ Index des cas similaires (IVF) reconstruit")
+    print(f"✅ Worker arrêté : {totals['committed']} prédiction(s) validée(s), "
+          f"{totals['failed']} échec(s) définitif(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Décodage des images dans des processus, remis au processus d'inférence
+par mémoire partagée
+
+Les threads de BatchPreprocessor suffisent pour PIL (le décodage libère le
+GIL) mais pas pour le décodage DICOM (pydicom) ni la normalisation NumPy
+en Python. Un pool de processus classique renverrait chaque tenseur sérialisé
+(pickle) par un tube : 192 Ko par image uint8, 768 Ko en float32.
+
+Ici, un anneau de slots préalloués (multiprocessing.shared_memory) reçoit
+les tenseurs uint8 (256, 256, C) : chaque processus de décodage écrit dans
+un slot libre et n'envoie que (index, slot, canaux) ; le processus
+d'inférence lit les slots comme des vues NumPy, les assemble en lot
+(conversion float32 de BatchPreprocessor.to_batch) puis les libère. Aucun
+pixel n'est sérialisé.
+    
+    processus de décodage                     processus d'inférence
+    tasks.get() -> decode_file()              ready.get() -> vue du slot
+    free.get()  -> écriture dans le slot  ->  lot -> modèle -> free.put(slot)
+
+Utilisé par ModelInterface.predict_batch si APP_DECODE_PROCESSES > 0.
+"""
+
+import multiprocessing
+import queue
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from image_preprocessing import TARGET_SIZE, decode_file
+
+# Taille d'un slot : un tenseur uint8 RGB (une image niveaux de gris n'en occupe que le premier tiers)
+SLOT_SHAPE = (TARGET_SIZE[1], TARGET_SIZE[0], 3)
+SLOT_BYTES = int(np.prod(SLOT_SHAPE))
+
+# Attente maximale d'un résultat avant de vérifier que les processus de décodage tournent
+READY_POLL_SECONDS = 1.0
+
+class ShmRing:
+    """Slots uint8 (256, 256, 3) dans un segment de mémoire partagée"""
+    
+    def __init__(self, slots: int, name: Optional[str] = None):
+        """
+        Args:
+            slots: Nombre de slots
+            name: Segment existant à ouvrir (processus de décodage) ; None pour le créer
+        """
+        self.slots = slots
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * SLOT_BYTES)
+        else:
+            # Les processus de décodage partagent le suivi des ressources de leur
+            # parent : le segment n'est supprimé que par close() du créateur
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+    
+    def view(self, slot: int, channels: int = 3) -> np.ndarray:
+        """Vue (256, 256, canaux) sur un slot, contiguë quel que soit le nombre de canaux"""
+        return np.ndarray((SLOT_SHAPE[0], SLOT_SHAPE[1], channels), dtype=np.uint8,
+                          buffer=self.shm.buf, offset=slot * SLOT_BYTES)
+    
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _decode_worker(ring_name: str, slots: int, tasks, free, ready, decode: Callable[[str], np.ndarray]):
+    """Boucle d'un processus de décodage (fin sur None)"""
+    ring = ShmRing(slots, ring_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            generation, index, source = task
+            try:
+                pixels = decode(source)
+            except Exception as e:
+                ready.put((generation, index, None, 0, f"{type(e).__name__}: {e}"))
+                continue
+            slot = free.get()
+            np.copyto(ring.view(slot, pixels.shape[-1]), pixels)
+            ready.put((generation, index, slot, pixels.shape[-1], None))
+    finally:
+        ring.shm.close()
+
+class DecodePool:
+    """
+    Processus de décodage écrivant dans un anneau de mémoire partagée
+    
+    Les lots retournés par iter_batches sont des vues sur l'anneau : ils
+    doivent être consommés avant de demander le lot suivant, et aucune vue
+    ne doit rester référencée à la fermeture du pool. Un seul appel à
+    iter_batches à la fois (les résultats transitent par une file commune).
+    
+    Si un processus de décodage meurt (plantage pydicom, arrêt par manque de
+    mémoire), les fichiers encore attendus sont retournés en erreur et
+    broken passe à True : le pool est à fermer et à recréer.
+    """
+    
+    def __init__(self, processes: Optional[int] = None, slots: Optional[int] = None,
+                 batch_size: Optional[int] = None, allow_grayscale: bool = False, fast: Optional[bool] = None):
+        """
+        Args:
+            processes: Processus de décodage (défaut: APP_DECODE_PROCESSES)
+            slots: Slots de l'anneau (défaut: APP_DECODE_RING_SLOTS, au moins 2 lots)
+            batch_size: Taille maximale des lots (défaut: APP_INFERENCE_BATCH_SIZE)
+            allow_grayscale: Garder un seul canal pour les images en niveaux de gris
+            fast: Mode rapide du décodage JPEG (défaut: APP_PREPROCESS_FAST)
+        """
+        self.processes = max(1, processes or config.DECODE_PROCESSES)
+        self.batch_size = max(1, batch_size or config.INFERENCE_BATCH_SIZE)
+        self.slots = max(2 * self.batch_size, slots or config.DECODE_RING_SLOTS or 4 * self.batch_size)
+        self.allow_grayscale = allow_grayscale
+        fast = bool(config.PREPROCESS_FAST if fast is None else fast)
+        
+        # 'spawn' : les processus de décodage n'héritent pas du modèle (ni de TensorFlow)
+        context = multiprocessing.get_context('spawn')
+        self.ring = ShmRing(self.slots)
+        self._tasks = context.Queue()
+        self._free = context.Queue()
+        self._ready = context.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        # Numéro de l'appel à iter_batches : les résultats d'un appel abandonné sont ignorés
+        self._generation = 0
+        self.broken = False
+        decode = partial(decode_file, allow_grayscale=allow_grayscale, fast=fast)
+        self._workers = [
+            context.Process(target=_decode_worker, name=f'decode-{i}', daemon=True,
+                            args=(self.ring.name, self.slots, self._tasks, self._free, self._ready, decode))
+            for i in range(self.processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def iter_batches(self, sources: List[str]) -> Iterator[Tuple[List[int], List[np.ndarray], Dict[int, str]]]:
+        """
+        Décode des fichiers et les regroupe en lots par nombre de canaux
+        
+        Les lots suivent l'ordre de fin de décodage, pas celui des fichiers.
+        Les slots d'un lot sont libérés à la demande du lot suivant.
+        
+        Args:
+            sources: Chemins des fichiers (images ou DICOM)
+        
+        Yields:
+            (indices des fichiers dans sources, vues uint8 (256, 256, C) sur les slots,
+             erreurs {indice: message}) ; le lot est assemblé par BatchPreprocessor.to_batch
+        """
+        self._generation += 1
+        generation = self._generation
+        for index, source in enumerate(sources):
+            self._tasks.put((generation, index, source))
+        
+        pending = {}  # canaux -> [(indice, slot)]
+        held = 0
+        remaining = len(sources)
+        outstanding = set(range(len(sources)))
+        errors = {}
+        try:
+            while remaining or held:
+                flush = None
+                if remaining:
+                    try:
+                        message_generation, index, slot, channels, error = self._ready.get(timeout=READY_POLL_SECONDS)
+                    except queue.Empty:
+                        dead = [worker.name for worker in self._workers if not worker.is_alive()]
+                        if dead:
+                            # Tâche du processus mort perdue : les fichiers attendus sont en erreur
+                            self.broken = True
+                            for index in outstanding:
+                                errors[index] = f"Processus de décodage arrêté ({', '.join(dead)})"
+                            outstanding.clear()
+                            remaining = 0
+                            if not held:
+                                break
+                        continue
+                    if message_generation != generation:
+                        if slot is not None:
+                            self._free.put(slot)
+                        continue
+                    outstanding.discard(index)
+                    remaining -= 1
+                    if error is not None:
+                        errors[index] = error
+                    else:
+                        group = pending.setdefault(channels, [])
+                        group.append((index, slot))
+                        held += 1
+                        if len(group) == self.batch_size:
+                            flush = channels
+                if flush is None and held and (not remaining or held == self.slots):
+                    # Fin des fichiers, ou anneau plein de lots incomplets : le plus gros part
+                    flush = max(pending, key=lambda c: len(pending[c]))
+                if flush is None:
+                    continue
+                
+                group = pending.pop(flush)
+                held -= len(group)
+                try:
+                    yield [index for index, _ in group], [self.ring.view(slot, flush) for _, slot in group], errors
+                finally:
+                    errors = {}
+                    for _, slot in group:
+                        self._free.put(slot)
+            if errors:
+                yield [], [], errors
+        finally:
+            # Itération abandonnée : slots des lots incomplets rendus
+            for group in pending.values():
+                for _, slot in group:
+                    self._free.put(slot)
+    
+    def close(self):
+        """Arrête les processus et supprime le segment de mémoire partagée"""
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.ring.close()
@@ -0,0 +1,131 @@
+"""
+Codecs de sérialisation des fichiers de données
+
+Le format d'un fichier est détecté à la lecture : les anciens fichiers JSON
+indentés restent lisibles quel que soit le codec utilisé pour l'écriture.
+
+Codecs disponibles :
+    - 'pretty'  : JSON indenté (format historique)
+    - 'json'    : JSON compact (bibliothèque standard)
+    - 'orjson'  : JSON compact via orjson (si installé)
+    - 'msgpack' : binaire MessagePack (si installé)
+    - 'auto'    : orjson si disponible, sinon JSON compact
+"""
+
+import gc
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def decode_payload(raw: bytes) -> Any:
+    """
+    Décode le contenu d'un fichier de données, quel que soit son format
+    
+    Args:
+        raw: Contenu brut du fichier
+    
+    Returns:
+        Données décodées (liste vide pour un fichier vide)
+    """
+    stripped = raw.lstrip()
+    if not stripped:
+        return []
+    
+    # Le décodage crée des milliers de dictionnaires sans cycle : le ramasse-miettes
+    # cyclique est suspendu pendant l'opération pour éviter des passes inutiles
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # Les fichiers contiennent une liste ou un dictionnaire : un document JSON
+        # commence par '[' ou '{', un document MessagePack par un octet >= 0x80
+        if stripped[:1] in (b'[', b'{'):
+            if orjson is not None:
+                return orjson.loads(stripped)
+            return json.loads(stripped.decode('utf-8'))
+        
+        if msgpack is None:
+            raise ValueError("Fichier binaire (MessagePack) mais le module msgpack n'est pas installé")
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+class StorageCodec:
+    """Interface d'un codec de stockage"""
+    
+    name = 'base'
+    
+    def encode(self, data: Any) -> bytes:
+        raise NotImplementedError
+    
+    def decode(self, raw: bytes) -> Any:
+        return decode_payload(raw)
+
+class PrettyJsonCodec(StorageCodec):
+    """JSON indenté, lisible (format historique)"""
+    
+    name = 'pretty'
+    
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+
+class JsonCodec(StorageCodec):
+    """JSON compact sans espaces (bibliothèque standard)"""
+    
+    name = 'json'
+    
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+class OrjsonCodec(StorageCodec):
+    """JSON compact via orjson"""
+    
+    name = 'orjson'
+    
+    def encode(self, data: Any) -> bytes:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+class MsgpackCodec(StorageCodec):
+    """Binaire MessagePack"""
+    
+    name = 'msgpack'
+    
+    def encode(self, data: Any) -> bytes:
+        return msgpack.packb(data, default=str, use_bin_type=True)
+
+def get_codec(name: str = 'auto') -> StorageCodec:
+    """
+    Retourne le codec demandé
+    
+    Args:
+        name: 'auto', 'pretty', 'json', 'orjson' ou 'msgpack'
+    
+    Returns:
+        Instance du codec
+    """
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    
+    if name == 'orjson' and orjson is None:
+        raise ValueError("Codec 'orjson' demandé mais le module orjson n'est pas installé")
+    if name == 'msgpack' and msgpack is None:
+        raise ValueError("Codec 'msgpack' demandé mais le module msgpack n'est pas installé")
+    
+    codecs = {
+        'pretty': PrettyJsonCodec,
+        'json': JsonCodec,
+        'orjson': OrjsonCodec,
+        'msgpack': MsgpackCodec
+    }
+    if name not in codecs:
+        raise ValueError(f"Codec inconnu: {name}")
+    return codecs[name]()
@@ -0,0 +1,147 @@
+"""
+Écritures atomiques et verrous inter-processus pour le répertoire de données
+
+Plusieurs processus (répliques Streamlit, tâches en ligne de commande)
+peuvent partager le même répertoire `data/` :
+    - chaque fichier est écrit dans un fichier temporaire, synchronisé sur
+      disque (fsync) puis renommé : un lecteur voit l'ancienne ou la nouvelle
+      version, jamais un fichier tronqué ;
+    - les séquences lecture-modification-écriture sont protégées par un
+      verrou consultatif (flock) sur un fichier `<fichier>.lock`.
+"""
+
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus courant
+    fcntl = None
+
+def _default_file_mode() -> int:
+    """Droits d'un fichier nouvellement créé (0666 filtré par le umask du processus)"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+# mkstemp crée le temporaire en 0600 : les droits sont rétablis avant le renommage,
+# pour que les autres comptes (API, workers de scoring, répliques) lisent les stores
+_DEFAULT_FILE_MODE = _default_file_mode()
+
+class StorageError(Exception):
+    """Erreur du stockage de données"""
+
+class StorageCorruptionError(StorageError):
+    """Fichier de données illisible (jamais remplacé silencieusement par un store vide)"""
+
+class ConcurrentModificationError(StorageError):
+    """L'enregistrement a été modifié par un autre utilisateur ou processus"""
+
+def _fsync_directory(directory: str):
+    """Synchronise l'entrée de répertoire après un renommage (POSIX)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write_bytes(file_path: str, payload: bytes):
+    """
+    Écrit un fichier de manière atomique (temporaire + fsync + renommage)
+    
+    Un fichier existant garde ses droits ; un nouveau fichier reçoit les
+    droits habituels (0666 moins le umask), pas le 0600 de mkstemp.
+    
+    Args:
+        file_path: Fichier cible
+        payload: Contenu complet du fichier
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    try:
+        mode = os.stat(file_path).st_mode & 0o7777
+    except OSError:
+        mode = _DEFAULT_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix='.tmp', dir=directory)
+    try:
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+class FileLock:
+    """
+    Verrou exclusif consultatif sur `<fichier>.lock`
+    
+    Le verrou est partagé entre processus (flock) et entre threads ; il est
+    réentrant pour une même instance.
+    """
+    
+    def __init__(self, file_path: str):
+        self.lock_path = f"{file_path}.lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+    
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def file_lock(file_path: str) -> FileLock:
+    """
+    Verrou partagé par tous les gestionnaires du processus pour un fichier
+    
+    Deux descripteurs flock d'un même processus s'excluent mutuellement :
+    une instance unique par fichier garde le verrou réentrant entre
+    plusieurs DataManager ouverts sur le même répertoire.
+    """
+    key = os.path.abspath(file_path)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(key)
+        return lock
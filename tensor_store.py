@@ -0,0 +1,192 @@
+"""
+Stockage persistant des images prétraitées (tenseurs prêts pour le modèle)
+
+Chaque image est décodée une seule fois (mode exact de image_preprocessing)
+puis conservée en uint8 256x256xC dans des fichiers .npy mappés en mémoire :
+    data/tensors/
+        c1_00000.npy, c1_00001.npy, ...   images niveaux de gris (1 canal)
+        c3_00000.npy, ...                 images couleur (3 canaux)
+        index.json                        image_id -> [canaux, chunk, emplacement]
+
+Les chunks ont une capacité fixe (APP_TENSOR_CHUNK_SIZE images) et sont
+remplis séquentiellement : une nouvelle évaluation de toute la base lit les
+chunks dans l'ordre, par tranches contiguës, sans copie ni décodage.
+"""
+
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from image_preprocessing import TARGET_SIZE, decode_image
+from storage_io import atomic_write_bytes, file_lock
+
+class TensorStore:
+    """Tenseurs uint8 prétraités, indexés par ID d'image"""
+    
+    def __init__(self, store_dir: str, chunk_size: Optional[int] = None):
+        """
+        Args:
+            store_dir: Répertoire du stockage (ex: data/tensors)
+            chunk_size: Nombre d'images par chunk (défaut: APP_TENSOR_CHUNK_SIZE)
+        """
+        self.store_dir = store_dir
+        self.chunk_size = chunk_size or config.TENSOR_CHUNK_SIZE
+        self.index_file = os.path.join(store_dir, 'index.json')
+        # Chunks ouverts: (canaux, numéro, mode) -> memmap
+        self._chunks = {}
+        self._index_cache = None
+        
+        os.makedirs(store_dir, exist_ok=True)
+    
+    # ========== Index ==========
+    
+    def _load_index(self) -> Dict:
+        """Charge l'index (mis en cache tant que le fichier n'a pas changé)"""
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return {'chunk_size': self.chunk_size, 'images': {}, 'counts': {}}
+        
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._index_cache and self._index_cache[0] == key:
+            return self._index_cache[1]
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self._index_cache = (key, index)
+        return index
+    
+    def _save_index(self, index: Dict):
+        atomic_write_bytes(self.index_file, json.dumps(index, separators=(',', ':')).encode('utf-8'))
+        self._index_cache = None
+    
+    # ========== Chunks ==========
+    
+    def _chunk_path(self, channels: int, chunk: int) -> str:
+        return os.path.join(self.store_dir, f"c{channels}_{chunk:05d}.npy")
+    
+    def _open_chunk(self, channels: int, chunk: int, writable: bool = False) -> np.memmap:
+        """Ouvre (ou crée) un chunk mappé en mémoire"""
+        key = (channels, chunk, writable)
+        if key in self._chunks:
+            return self._chunks[key]
+        
+        path = self._chunk_path(channels, chunk)
+        if writable and not os.path.exists(path):
+            # Fichier creux : l'espace disque n'est alloué qu'à l'écriture
+            shape = (self._chunk_capacity(), TARGET_SIZE[1], TARGET_SIZE[0], channels)
+            array = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+        else:
+            array = np.load(path, mmap_mode='r+' if writable else 'r')
+        self._chunks[key] = array
+        return array
+    
+    def _chunk_capacity(self) -> int:
+        return self._load_index().get('chunk_size', self.chunk_size)
+    
+    # ========== Lecture / écriture ==========
+    
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._load_index()['images']
+    
+    def __len__(self) -> int:
+        return len(self._load_index()['images'])
+    
+    def get(self, image_id: str) -> Optional[np.ndarray]:
+        """
+        Tenseur d'une image (vue en lecture seule sur le fichier mappé)
+        
+        Returns:
+            Tableau uint8 (256, 256, C), ou None si l'image n'est pas stockée
+        """
+        location = self._load_index()['images'].get(image_id)
+        if location is None:
+            return None
+        channels, chunk, slot = location
+        return self._open_chunk(channels, chunk)[slot]
+    
+    def put(self, image_id: str, pixels: np.ndarray):
+        """
+        Ajoute (ou remplace) le tenseur d'une image
+        
+        Args:
+            image_id: ID de l'image
+            pixels: Tableau uint8 (256, 256, C) avec C = 1 ou 3
+        """
+        self.put_many([(image_id, pixels)])
+    
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """Ajoute plusieurs tenseurs avec une seule écriture de l'index (remplissage en masse)"""
+        with file_lock(self.index_file):
+            index = self._load_index()
+            capacity = index.get('chunk_size', self.chunk_size)
+            touched = set()
+            for image_id, pixels in items:
+                channels = pixels.shape[-1]
+                location = index['images'].get(image_id)
+                if location is None or location[0] != channels:
+                    count = index['counts'].get(str(channels), 0)
+                    location = [channels, count // capacity, count % capacity]
+                    index['counts'][str(channels)] = count + 1
+                
+                chunk = self._open_chunk(channels, location[1], writable=True)
+                chunk[location[2]] = pixels
+                touched.add((channels, location[1]))
+                index['images'][image_id] = location
+            
+            # Les données sont sur disque avant que l'index ne les référence
+            for channels, chunk in touched:
+                self._open_chunk(channels, chunk, writable=True).flush()
+            index.setdefault('chunk_size', self.chunk_size)
+            self._save_index(index)
+    
+    def ensure(self, image_id: str, image_path: str) -> np.ndarray:
+        """
+        Tenseur d'une image, décodé et stocké au premier accès
+        
+        Returns:
+            Tableau uint8 (256, 256, C)
+        """
+        pixels = self.get(image_id)
+        if pixels is None:
+            pixels = decode_image(image_path, allow_grayscale=True)
+            self.put(image_id, pixels)
+        return pixels
+    
+    def iter_batches(self, batch_size: int, image_ids: Optional[List[str]] = None) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Parcourt les tenseurs stockés dans l'ordre des fichiers
+        
+        Les emplacements contigus d'un même chunk sont retournés comme une
+        seule vue (lecture séquentielle sans copie). Les images niveaux de
+        gris et couleur forment des lots séparés.
+        
+        Args:
+            batch_size: Taille maximale des lots
+            image_ids: Restreindre à ces images (défaut: toutes)
+        
+        Yields:
+            (liste des IDs, tableau uint8 (N, 256, 256, C))
+        """
+        index = self._load_index()
+        wanted = None if image_ids is None else set(image_ids)
+        
+        # Emplacements triés par (canaux, chunk, emplacement)
+        locations = sorted(
+            (tuple(location), image_id) for image_id, location in index['images'].items()
+            if wanted is None or image_id in wanted
+        )
+        
+        run_ids, run_start, run_key = [], None, None
+        for (channels, chunk, slot), image_id in locations:
+            contiguous = run_key == (channels, chunk) and slot == run_start + len(run_ids)
+            if run_ids and (not contiguous or len(run_ids) == batch_size):
+                yield run_ids, self._open_chunk(*run_key)[run_start:run_start + len(run_ids)]
+                run_ids = []
+            if not run_ids:
+                run_key, run_start = (channels, chunk), slot
+            run_ids.append(image_id)
+        if run_ids:
+            yield run_ids, self._open_chunk(*run_key)[run_start:run_start + len(run_ids)]
@@ -0,0 +1,50 @@
+"""
+Équivalence du modèle niveaux de gris replié (fold_grayscale.py)
+
+Le modèle d'origine est replié en mémoire (model_gray.h5 n'est pas relu) :
+ses prédictions sur des images en niveaux de gris répétées en RGB doivent
+être celles du modèle replié sur l'entrée à un canal.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT_DIR
+
+tf = pytest.importorskip('tensorflow')
+
+from convert_model import list_test_images  # noqa: E402
+from fold_grayscale import fold_grayscale_model, verify_folded_model  # noqa: E402
+from model_interface import ModelInterface  # noqa: E402
+
+MODEL_PATH = os.path.join(ROOT_DIR, 'model.h5')
+IMAGES_DIR = os.path.join(ROOT_DIR, 'images-test')
+TOLERANCE = 1e-5
+
+@pytest.fixture(scope='module')
+def models():
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip("model.h5 absent")
+    model = tf.keras.models.load_model(MODEL_PATH)
+    return model, fold_grayscale_model(model)
+
+def test_folded_model_matches_on_test_images(models):
+    model, folded = models
+    gray_images = [ModelInterface._load_grayscale(path) for path in list_test_images(IMAGES_DIR)]
+    gray_images = [img for img in gray_images if img is not None]
+    if not gray_images:
+        pytest.skip("Aucune image dans images-test/")
+    assert verify_folded_model(model, folded, np.concatenate(gray_images)) < TOLERANCE
+
+def test_folded_model_matches_on_random_images(models):
+    model, folded = models
+    rng = np.random.default_rng(0)
+    batch = rng.integers(0, 256, (32,) + folded.input_shape[1:]).astype(np.float32)
+    assert verify_folded_model(model, folded, batch) < TOLERANCE
+
+def test_folded_model_takes_one_channel(models):
+    model, folded = models
+    assert folded.input_shape[-1] == 1
+    assert model.input_shape[-1] == 3